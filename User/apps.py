@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'User'
+
+    def ready(self):
+        # Connect the signal handlers that invalidate cached sessions/agreements
+        from . import session_cache  # noqa: F401
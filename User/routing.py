@@ -0,0 +1,125 @@
+"""
+Route classification for UserAuthMiddleware.
+
+All of the middleware's path rules live here and are compiled once at import
+time into a set of exact paths and two regular expressions. classify_path
+maps a request path to one of the ROUTE_* classes and memoizes the result, so
+the per-request cost is a dict lookup for paths seen before and a single
+regex scan (O(path length)) otherwise.
+"""
+import re
+from functools import lru_cache
+
+# Route classes
+ROUTE_ADMIN = 'admin'
+ROUTE_STATIC = 'static'
+ROUTE_API = 'api'
+ROUTE_PUBLIC = 'public'
+ROUTE_DATA_MINER = 'data_miner'  # public for authenticated users only
+ROUTE_PROTECTED = 'protected'
+
+# Paths that don't require authentication (matched with or without trailing slash)
+PUBLIC_PATHS = (
+    '/user/login/',
+    '/user/signup/',
+    '/user/google-login/',
+    '/user/google-callback/',
+    '/user/check-username/',
+    '/',  # Root path
+    '/website/',  # Main website page
+    '/website/about/',  # About website builder
+    '/website/pricing/',  # Pricing page
+    '/website/features/',  # Features page
+    '/website/templates/',  # Templates showcase
+    '/hr_management/employee_dashboard/',
+    '/hr_management/employee_resignation/',
+    '/hr_management/employee_documents/',
+    '/hr_management/employee_profile/',
+    '/hr_management/employee_salary_slips/',
+    '/hr_management/employee_reimbursement/',
+    '/hr_management/employee_leave/',
+    '/hr_management/employee/login/',
+    '/hr_management/employee_attendance/',
+)
+
+# Any path containing one of these fragments is public
+PUBLIC_FRAGMENTS = (
+    'contact-us',
+    'about-us',
+    'privacy-policy',
+    'terms-and-conditions',
+    'cancellation',
+    'customersupport',
+    'upi-payment',
+    'masteradmin',
+    'alavi07',
+    'onematrix',
+    'complete-profile-setup',
+    'accept-terms',
+    'payment',
+    'onboarding',
+    'employee',
+    'mark-attendance',
+    'forgot-password',
+    'reset-password',
+    'plans-and-pricing',
+    'verify-otp',
+    'attend',
+)
+
+# Any path starting with one of these prefixes is public
+PUBLIC_PREFIXES = (
+    '/website/public/',
+    '/website/s/',
+    '/website/templates/',  # Public access to website templates browsing
+    '/s/',  # Public website slugs
+)
+
+STATIC_PREFIXES = ('/static/', '/media/')
+STATIC_SUFFIXES = ('.js', '.css', '.jpg', '.png', '.ico')
+
+ADMIN_PREFIX = '/alavi07/'
+DATA_MINER_PREFIX = '/data_miner/'
+
+_PUBLIC_EXACT = frozenset(path.rstrip('/') for path in PUBLIC_PATHS)
+
+_STATIC_PATTERN = re.compile(
+    '^(?:' + '|'.join(map(re.escape, STATIC_PREFIXES)) + ')'
+    '|(?:' + '|'.join(map(re.escape, STATIC_SUFFIXES)) + ')$'
+)
+
+_PUBLIC_PATTERN = re.compile(
+    '^(?:' + '|'.join(map(re.escape, PUBLIC_PREFIXES)) + ')'
+    '|' + '|'.join(map(re.escape, PUBLIC_FRAGMENTS))
+)
+
+
+@lru_cache(maxsize=4096)
+def classify_path(path):
+    """
+    Classify a request path for the authentication middleware
+
+    Args:
+        path: request.path
+
+    Returns:
+        str: one of the ROUTE_* constants
+    """
+    if path.startswith(ADMIN_PREFIX):
+        return ROUTE_ADMIN
+    if _STATIC_PATTERN.search(path):
+        return ROUTE_STATIC
+    if '/api/' in path:
+        return ROUTE_API
+    if path.rstrip('/') in _PUBLIC_EXACT or _PUBLIC_PATTERN.search(path):
+        return ROUTE_PUBLIC
+    if path.startswith(DATA_MINER_PREFIX):
+        return ROUTE_DATA_MINER
+    return ROUTE_PROTECTED
+
+
+def is_public_route(route, is_authenticated):
+    """Whether a route class is reachable without logging in"""
+    if route == ROUTE_DATA_MINER:
+        return is_authenticated
+    return route != ROUTE_PROTECTED
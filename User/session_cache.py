@@ -0,0 +1,153 @@
+"""
+Short-lived cache of UserSession validity and agreement acceptance.
+
+UserAuthMiddleware runs on every request, so the session lookup, the latest
+active UserAgreement and the user's acceptance of it are kept in the Django
+cache for a few seconds instead of being queried on each hit. Entries are
+invalidated through model signals when a session is deleted (logout), a user
+is saved (suspension/deactivation) or an agreement/acceptance changes.
+
+last_activity writes are coalesced: a session's row is only updated when the
+previous write is older than USER_SESSION_ACTIVITY_INTERVAL minutes.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from masteradmin.models import UserAgreement
+from .models import User, UserAgreementAcceptance, UserSession
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a session lookup / agreement check is served from the cache
+SESSION_CACHE_TTL = getattr(settings, 'USER_SESSION_CACHE_TTL', 60)
+AGREEMENT_CACHE_TTL = getattr(settings, 'USER_AGREEMENT_CACHE_TTL', 300)
+
+# Minimum time between two last_activity writes for the same session
+ACTIVITY_WRITE_INTERVAL = timedelta(minutes=getattr(settings, 'USER_SESSION_ACTIVITY_INTERVAL', 5))
+
+ACTIVE_AGREEMENT_KEY = 'user:active_agreement'
+
+
+def _session_key(session_id):
+    return f'user:session:{session_id}'
+
+
+def _acceptance_key(user_id, agreement_id):
+    return f'user:agreement_accepted:{user_id}:{agreement_id}'
+
+
+def get_session_state(session_id):
+    """
+    Cached state of a UserSession
+
+    Returns:
+        dict: user_pk, session_key, expires_at, last_activity and user_ok
+        (active and not suspended), or None when the session does not exist
+    """
+    key = _session_key(session_id)
+    state = cache.get(key)
+    if state is not None:
+        return state or None
+
+    try:
+        user_session = UserSession.objects.select_related('user').only(
+            'id', 'session_key', 'expires_at', 'last_activity',
+            'user__id', 'user__is_active', 'user__is_suspended'
+        ).get(id=session_id)
+        state = {
+            'user_pk': user_session.user.pk,
+            'session_key': user_session.session_key,
+            'expires_at': user_session.expires_at,
+            'last_activity': user_session.last_activity,
+            'user_ok': user_session.user.is_active and not user_session.user.is_suspended,
+        }
+    except (UserSession.DoesNotExist, ValueError):
+        # Malformed ids raise ValueError on UUID fields; treat them as missing
+        state = {}
+
+    cache.set(key, state, SESSION_CACHE_TTL)
+    return state or None
+
+
+def is_session_valid(state, session_key):
+    """Whether a cached session state authenticates the given Django session key"""
+    return bool(
+        state and
+        state['expires_at'] > timezone.now() and
+        state['user_ok'] and
+        state['session_key'] == session_key
+    )
+
+
+def touch_session(session_id, state):
+    """Record activity on a session, writing to the database at most once per interval"""
+    now = timezone.now()
+    if state.get('last_activity') and now - state['last_activity'] < ACTIVITY_WRITE_INTERVAL:
+        return False
+
+    UserSession.objects.filter(id=session_id).update(last_activity=now)
+    state['last_activity'] = now
+    cache.set(_session_key(session_id), state, SESSION_CACHE_TTL)
+    return True
+
+
+def get_active_agreement_id():
+    """Id of the most recent active UserAgreement, or None when there is none"""
+    agreement_id = cache.get(ACTIVE_AGREEMENT_KEY)
+    if agreement_id is None:
+        agreement = UserAgreement.objects.filter(is_active=True).only('id').order_by('-created_at').first()
+        agreement_id = str(agreement.id) if agreement else ''
+        cache.set(ACTIVE_AGREEMENT_KEY, agreement_id, AGREEMENT_CACHE_TTL)
+    return agreement_id or None
+
+
+def has_accepted_agreement(user_pk, agreement_id):
+    """Whether the user has accepted the given agreement"""
+    key = _acceptance_key(user_pk, agreement_id)
+    accepted = cache.get(key)
+    if accepted is None:
+        accepted = UserAgreementAcceptance.objects.filter(user_id=user_pk, agreement_id=agreement_id).exists()
+        cache.set(key, accepted, AGREEMENT_CACHE_TTL)
+    return accepted
+
+
+def invalidate_session(session_id):
+    cache.delete(_session_key(session_id))
+
+
+def invalidate_user_sessions(user_pk):
+    """Drop the cached state of every session of a user"""
+    session_ids = UserSession.objects.filter(user_id=user_pk).values_list('id', flat=True)
+    cache.delete_many([_session_key(session_id) for session_id in session_ids])
+
+
+@receiver(post_delete, sender=UserSession)
+def session_deleted(sender, instance, **kwargs):
+    invalidate_session(instance.id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Suspension or deactivation must take effect on the next request
+    if not created:
+        invalidate_user_sessions(instance.pk)
+
+
+@receiver(post_save, sender=UserAgreement)
+@receiver(post_delete, sender=UserAgreement)
+def agreement_changed(sender, **kwargs):
+    cache.delete(ACTIVE_AGREEMENT_KEY)
+
+
+@receiver(post_save, sender=UserAgreementAcceptance)
+@receiver(post_delete, sender=UserAgreementAcceptance)
+def acceptance_changed(sender, instance, **kwargs):
+    if instance.agreement_id:
+        cache.delete(_acceptance_key(instance.user_id, instance.agreement_id))
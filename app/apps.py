@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # Connect the signal handlers that refresh the disabled app registry
+        from . import registry  # noqa: F401
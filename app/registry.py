@@ -0,0 +1,118 @@
+"""
+Process-wide registry of temporarily disabled apps.
+
+AppMaintenanceMiddleware and AppAccessMiddleware both need to know, on every
+request, whether the path belongs to a disabled app. The disabled apps change
+a few times a month, so they are loaded once per process into compiled
+keyword matchers and reused until an Apps row is saved or deleted.
+
+Invalidation across processes goes through a version counter in the shared
+cache: the signal handlers bump it, and each process re-reads the counter at
+most every VERSION_CHECK_INTERVAL seconds and reloads when it has moved.
+"""
+import logging
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Apps
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'app:disabled_apps:version'
+
+# Seconds between two reads of the shared version counter in one process
+VERSION_CHECK_INTERVAL = 5
+
+
+class DisabledAppRegistry:
+    """Disabled apps with precompiled path matchers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._names = {}
+        self._segment_pattern = None
+        self._substring_pattern = None
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 1, timeout=None)
+            version = cache.get(VERSION_KEY, 1)
+        return version
+
+    def _load(self, version):
+        apps = list(
+            Apps.objects.filter(is_temporarily_disabled=True)
+            .exclude(url_keyword__isnull=True).exclude(url_keyword='')
+            .values_list('url_keyword', 'name')
+        )
+        self._names = dict(apps)
+        if apps:
+            # Longer keywords first so the most specific app wins when keywords overlap
+            keywords = '|'.join(re.escape(keyword) for keyword in sorted(self._names, key=len, reverse=True))
+            self._segment_pattern = re.compile(f'/({keywords})/')
+            self._substring_pattern = re.compile(f'({keywords})')
+        else:
+            self._segment_pattern = None
+            self._substring_pattern = None
+        self._version = version
+        logger.info(f"Loaded {len(apps)} disabled apps (version {version})")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if self._version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return
+            version = self._current_version()
+            if version != self._version:
+                self._load(version)
+            self._checked_at = now
+
+    def match(self, path, segment=False):
+        """
+        Name of the disabled app a path belongs to
+
+        Args:
+            path: request path
+            segment: only match the keyword as a whole path segment ('/keyword/')
+
+        Returns:
+            str: app name, or None when the path is not in a disabled app
+        """
+        self._refresh()
+        pattern = self._segment_pattern if segment else self._substring_pattern
+        if pattern is None:
+            return None
+        found = pattern.search(path)
+        return self._names[found.group(1)] if found else None
+
+    def invalidate(self):
+        """Force every process to reload on its next version check"""
+        try:
+            if not cache.add(VERSION_KEY, 2, timeout=None):
+                cache.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not bump disabled apps version: {e}")
+        # Reload in this process right away
+        self._version = None
+
+
+disabled_apps = DisabledAppRegistry()
+
+
+@receiver(post_save, sender=Apps)
+@receiver(post_delete, sender=Apps)
+def apps_changed(sender, **kwargs):
+    # Wait for the commit so other processes reload the new state
+    transaction.on_commit(disabled_apps.invalidate)
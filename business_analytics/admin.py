@@ -4,3 +4,4 @@ from .models import *
 
 admin.site.register(SalesDataFile)
 admin.site.register(SalesAnalysisResult)
+admin.site.register(ColumnMappingCache)
@@ -3,10 +3,15 @@ import numpy as np
 import os
 import json
 import logging
+import re
 import traceback
+from functools import lru_cache
 import google.generativeai as genai
 from django.conf import settings
 
+from .mapping_cache import get_cached_mapping, store_mapping
+from .sales_engine import build_typed_frame, compute_dashboard_analysis, compute_headline_metrics
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -59,6 +64,35 @@ def clean_dataframe(df):
         return df
 
 def identify_columns_with_gemini(df, file_path=None, platform_type=None):
+    """
+    Identify the analysis columns of the dataset, reusing the mapping of a
+    previously seen header layout when one is cached
+    
+    Args:
+        df: pandas DataFrame containing the sales data
+        file_path: path to the original file (optional)
+        platform_type: type of platform data comes from (optional)
+        
+    Returns:
+        dict: Mapping of analysis categories to column names
+    """
+    # Explicit platform mappings are cheap, and descriptor-like files get data-specific warnings
+    cacheable = platform_type is None and df.shape[0] >= 3 and df.shape[1] >= 3
+    if not cacheable:
+        return _identify_columns(df, file_path=file_path, platform_type=platform_type)
+    
+    detected_platform = detect_marketplace_format(df)
+    cached_mapping = get_cached_mapping(df.columns, detected_platform)
+    if cached_mapping is not None:
+        return cached_mapping
+    
+    column_mapping = _identify_columns(df, file_path=file_path, platform_type=platform_type)
+    # Only remember layouts that produced a usable mapping
+    if column_mapping.get('sales_amount'):
+        store_mapping(df.columns, detected_platform, column_mapping)
+    return column_mapping
+
+def _identify_columns(df, file_path=None, platform_type=None):
     """
     Use Gemini AI ONLY for column identification in the dataset
     
@@ -1115,14 +1149,19 @@ def ensure_json_serializable(data):
         # Convert any other types to string
         return str(data)
 
-def analyze_sales_data(df, column_mapping, platform_type=None):
+def analyze_sales_data(df, column_mapping, platform_type=None, typed=None):
     """
     Analyze sales data to extract insights for the dashboard
     
+    The mapped columns are normalized once into a typed frame (see
+    sales_engine.build_typed_frame) and every dashboard aggregate is computed
+    from it in a single vectorized pass.
+    
     Args:
         df: pandas DataFrame containing the sales data
         column_mapping: dictionary mapping column types to actual column names
         platform_type: optional platform type for specialized analysis
+        typed: optional TypedSalesFrame already built for df and column_mapping
         
     Returns:
         dict: Dictionary containing analysis results
@@ -1143,1066 +1182,24 @@ def analyze_sales_data(df, column_mapping, platform_type=None):
     if '_warnings' in column_mapping:
         logger.warning(f"Column mapping warnings: {column_mapping['_warnings']}")
     
-    # Initialize analysis structure
-    analysis = {
-        "summary": {},
-        "time_series": {"labels": [], "data": []},
-        "top_products": [],
-        "top_regions": [],
-        "sales_channels": [],
-        "order_metrics": {},  # Make sure order_metrics is initialized
-        "platform_specific": {}
-    }
-    
-    # Add small dataset warning if needed
     if len(df_clean) < 5:
-        analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-            f"Analysis is based on a very small dataset ({len(df_clean)} records). Results may not be statistically significant."
-        ]
         logger.warning(f"Analyzing a very small dataset ({len(df_clean)} records)")
     
     try:
-        # Generate basic summary stats regardless of column mapping
-        analysis["summary"]["row_count"] = len(df_clean)
-        analysis["summary"]["column_count"] = len(df_clean.columns)
-        
-        # For very small datasets, indicate limited reliability
-        if len(df_clean) < 5:
-            analysis["summary"]["reliability"] = "low"
-        elif len(df_clean) < 20:
-            analysis["summary"]["reliability"] = "medium"
-        else:
-            analysis["summary"]["reliability"] = "high"
-        
-        # Add column mapping to the analysis for reference
-        # Filter out meta fields with underscore prefix
-        filtered_mapping = {k: v for k, v in column_mapping.items() if not k.startswith('_')}
-        analysis["summary"]["column_mapping"] = filtered_mapping
-        
-        # Print column names and data types for debugging
-        logger.info(f"Columns in dataframe: {df_clean.columns.tolist()}")
-        logger.info(f"Data types: {df_clean.dtypes.to_dict()}")
-        
-        # Create a working copy of the dataframe for analysis with potential type conversions
-        # This doesn't modify the original data structure, only creates a temporary version for analysis
-        df_analysis = df_clean.copy()
-        
-        # Data type conversions for specific columns (only in the analysis copy)
-        # Sales amount to numeric
-        sales_col = column_mapping.get('sales_amount')
-        if sales_col and sales_col in df_analysis.columns:
-            try:
-                if not pd.api.types.is_numeric_dtype(df_analysis[sales_col]):
-                    logger.info(f"Converting sales column '{sales_col}' to numeric for analysis")
-                    # Store original column
-                    original_sales = df_analysis[sales_col].copy()
-                    # Try to convert, using coerce to handle non-numeric values
-                    df_analysis[sales_col] = pd.to_numeric(df_analysis[sales_col], errors='coerce')
-                    # Count successful conversions
-                    valid_count = df_analysis[sales_col].notna().sum()
-                    logger.info(f"Converted {valid_count}/{len(df_analysis)} sales values to numeric")
-                    
-                    # If too many NaN values after conversion (> 50%), restore original and add warning
-                    if valid_count < 0.5 * len(df_analysis):
-                        logger.warning(f"Sales column conversion failed for most values, restoring original")
-                        df_analysis[sales_col] = original_sales
-                        analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                            f"Could not convert sales column '{sales_col}' to numeric"
-                        ]
-            except Exception as e:
-                logger.error(f"Error converting sales column to numeric: {e}")
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error converting sales column: {str(e)}"
-                ]
+        if typed is None:
+            typed = build_typed_frame(df_clean, column_mapping)
         
-        # Order date to datetime
-        date_col = column_mapping.get('order_date')
-        if date_col and date_col in df_analysis.columns:
-            try:
-                if not pd.api.types.is_datetime64_dtype(df_analysis[date_col]):
-                    logger.info(f"Converting date column '{date_col}' to datetime for analysis")
-                    # Store original column
-                    original_dates = df_analysis[date_col].copy()
-                    # Try to convert, using coerce to handle non-date values
-                    df_analysis[date_col] = pd.to_datetime(df_analysis[date_col], errors='coerce')
-                    # Count successful conversions
-                    valid_date_count = df_analysis[date_col].notna().sum()
-                    logger.info(f"Converted {valid_date_count}/{len(df_analysis)} date values to datetime")
-                    
-                    # If too many NaN values after conversion (> 50%), restore original and add warning
-                    if valid_date_count < 0.5 * len(df_analysis):
-                        logger.warning(f"Date column conversion failed for most values, restoring original")
-                        df_analysis[date_col] = original_dates
-                        analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                            f"Could not convert date column '{date_col}' to datetime"
-                        ]
-            except Exception as e:
-                logger.error(f"Error converting date column to datetime: {e}")
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error converting date column: {str(e)}"
-                ]
-        
-        # Quantity to numeric
-        qty_col = column_mapping.get('quantity')
-        if qty_col and qty_col in df_analysis.columns:
-            try:
-                if not pd.api.types.is_numeric_dtype(df_analysis[qty_col]):
-                    logger.info(f"Converting quantity column '{qty_col}' to numeric for analysis")
-                    df_analysis[qty_col] = pd.to_numeric(df_analysis[qty_col], errors='coerce')
-                    valid_qty_count = df_analysis[qty_col].notna().sum()
-                    logger.info(f"Converted {valid_qty_count}/{len(df_analysis)} quantity values to numeric")
-            except Exception as e:
-                logger.error(f"Error converting quantity column to numeric: {e}")
-        
-        # Unit price to numeric
-        price_col = column_mapping.get('unit_price')
-        if price_col and price_col in df_analysis.columns:
-            try:
-                if not pd.api.types.is_numeric_dtype(df_analysis[price_col]):
-                    logger.info(f"Converting unit price column '{price_col}' to numeric for analysis")
-                    df_analysis[price_col] = pd.to_numeric(df_analysis[price_col], errors='coerce')
-                    valid_price_count = df_analysis[price_col].notna().sum()
-                    logger.info(f"Converted {valid_price_count}/{len(df_analysis)} price values to numeric")
-            except Exception as e:
-                logger.error(f"Error converting unit price column to numeric: {e}")
-                
-        # Find transaction type column from mapping or through detection
-        transaction_type_col = column_mapping.get('transaction_type')
-        if not transaction_type_col:
-            # Try to find it if not provided in mapping
-            for col in df_analysis.columns:
-                col_str = str(col).lower()
-                if ('status' in col_str or 'state' in col_str or 'type' in col_str) and col_str != 'state' and col_str != 'type':
-                    # Check if column contains typical status values
-                    unique_vals = df_analysis[col].astype(str).str.lower().unique()
-                    status_keywords = ['complete','Shipment','Shipped','Refund','Refunded','cancel', 'return', 'refund', 'ship', 'deliver', 'process', 'pending']
-                    matches = sum(1 for val in unique_vals if any(keyword in val for keyword in status_keywords))
-                    
-                    # If at least some values match status keywords, use this column
-                    if matches > 0:
-                        transaction_type_col = col
-                        logger.info(f"Auto-detected transaction type column: {col}")
-                        break
-        
-        # Initialize order metrics
-        analysis["order_metrics"] = {
-            "total_orders": df_analysis.shape[0],
-            "regular_orders": df_analysis.shape[0],  # Will be adjusted if we find other order types
-            "cancelled_orders": 0,
-            "returned_orders": 0,
-            "replaced_orders": 0,
-            "refunded_orders": 0
-        }
-        
-        # Process transaction types if column is available
-        if transaction_type_col and transaction_type_col in df_analysis.columns:
-            logger.info(f"Analyzing transaction types from column: {transaction_type_col}")
-            
-            # Convert to string and lowercase for consistent analysis
-            status_values = df_analysis[transaction_type_col].astype(str).str.lower()
-            
-            # Count various transaction types
-            cancelled_mask = status_values.apply(lambda x: 'cancel' in x)
-            cancelled_count = cancelled_mask.sum()
-            
-            replaced_mask = status_values.apply(lambda x: 'replace' in x or 'exchange' in x)
-            replaced_count = replaced_mask.sum()
-            
-            # Combined mask for returns and refunds (treating them as the same)
-            returned_refunded_mask = status_values.apply(lambda x: 'return' in x or 'refund' in x or 'money back' in x or 'chargeback' in x)
-            returned_count = returned_refunded_mask.sum()
-            
-            # We're treating returns and refunds as the same, so set refunded_count to 0
-            refunded_count = 0
-            
-            # Count regular orders (not cancelled, replaced, or returned/refunded)
-            problem_orders = cancelled_mask | replaced_mask | returned_refunded_mask
-            regular_count = (~problem_orders).sum()
-            
-            # Calculate total orders
-            total_orders = len(status_values)
-            
-            # Update order metrics
-            analysis["order_metrics"]["total_orders"] = int(total_orders)
-            analysis["order_metrics"]["regular_orders"] = int(regular_count)
-            analysis["order_metrics"]["cancelled_orders"] = int(cancelled_count)
-            analysis["order_metrics"]["replaced_orders"] = int(replaced_count)
-            analysis["order_metrics"]["refunded_orders"] = int(refunded_count)
-            analysis["order_metrics"]["returned_orders"] = int(returned_count)
-            
-            # Calculate corresponding values if sales column is available
-            if sales_col and sales_col in df_analysis.columns:
-                try:
-                    # Calculate values for different order types
-                    if cancelled_count > 0:
-                        cancelled_value = float(df_analysis.loc[cancelled_mask, sales_col].sum())
-                        analysis["order_metrics"]["cancelled_value"] = cancelled_value
-                    
-                    if replaced_count > 0:
-                        replaced_value = float(df_analysis.loc[replaced_mask, sales_col].sum())
-                        analysis["order_metrics"]["replaced_value"] = replaced_value
-                    
-                    if refunded_count > 0:
-                        refunded_value = float(df_analysis.loc[returned_refunded_mask, sales_col].sum())
-                        analysis["order_metrics"]["refunded_value"] = refunded_value
-                    
-                    if returned_count > 0:
-                        returned_value = float(df_analysis.loc[returned_refunded_mask, sales_col].sum())
-                        analysis["order_metrics"]["returned_value"] = returned_value
-                    
-                    # Calculate rates based on total orders
-                    if total_orders > 0:
-                        # Calculate successful orders (excluding cancelled orders)
-                        successful_orders = total_orders - cancelled_count
-                        
-                        # Calculate rates using appropriate denominators
-                        analysis["order_metrics"]["cancellation_rate"] = float(round((cancelled_count / total_orders) * 100, 2))
-                        analysis["order_metrics"]["replacement_rate"] = float(round((replaced_count / successful_orders) * 100, 2))
-                        analysis["order_metrics"]["refund_rate"] = float(round((refunded_count / successful_orders) * 100, 2))
-                        analysis["order_metrics"]["return_rate"] = float(round((returned_count / successful_orders) * 100, 2))
-                        
-                        # Calculate overall issue rate (excluding cancellations from numerator)
-                        problem_order_count = replaced_count + refunded_count + returned_count
-                        analysis["order_metrics"]["issue_rate"] = float(round((problem_order_count / successful_orders) * 100, 2))
-                    
-                    logger.info(f"Order metrics - Regular: {regular_count}, Cancelled: {cancelled_count}, " +
-                               f"Replaced: {replaced_count}, Refunded: {refunded_count}, Returned: {returned_count}, " +
-                               f"Successful orders: {successful_orders}")
-                except Exception as e:
-                    logger.error(f"Error calculating transaction values: {e}")
-            
-            # Add transaction type distribution for visualization
-            try:
-                # Get value counts
-                status_counts = status_values.value_counts().reset_index()
-                status_counts.columns = ['status', 'count']
-                
-                # Prepare for visualization (limit to top 5)
-                analysis["transaction_types"] = [
-                    {
-                        "name": str(row['status']),
-                        "count": int(row['count']),
-                        "percentage": float(round((row['count'] / len(status_values)) * 100, 2))
-                    }
-                    for _, row in status_counts.head(5).iterrows()
-                ]
-                
-                logger.info(f"Added transaction type distribution with {len(analysis['transaction_types'])} categories")
-            except Exception as e:
-                logger.error(f"Error creating transaction type distribution: {e}")
-        
-        # Add return rate and other metrics to the summary for easy access
-        if "order_metrics" in analysis and analysis["order_metrics"]:
-            if "return_rate" in analysis["order_metrics"]:
-                analysis["summary"]["return_rate"] = analysis["order_metrics"]["return_rate"]
-            if "cancellation_rate" in analysis["order_metrics"]:
-                analysis["summary"]["cancellation_rate"] = analysis["order_metrics"]["cancellation_rate"]
-            if "issue_rate" in analysis["order_metrics"]:
-                analysis["summary"]["issue_rate"] = analysis["order_metrics"]["issue_rate"]
-                
-            # Calculate total return amount and add to summary
-            if transaction_type_col and transaction_type_col in df_analysis.columns and sales_col and sales_col in df_analysis.columns:
-                try:
-                    # Convert to string and lowercase for consistent analysis
-                    status_values = df_analysis[transaction_type_col].astype(str).str.lower()
-                    
-                    # Identify returned transactions (match: return, refunded, returned)
-                    # Note: We're treating returns and refunds as the same
-                    returned_mask = status_values.apply(lambda x: any(kw in x for kw in ['return', 'refund', 'refunded', 'money back', 'chargeback']))
-                    
-                    # Calculate return amount
-                    return_amount = df_analysis.loc[returned_mask, sales_col].sum()
-                    analysis["summary"]["total_return_amount"] = float(return_amount) if not pd.isna(return_amount) else 0
-                    
-                    logger.info(f"Total return/refund amount: {analysis['summary']['total_return_amount']}")
-                except Exception as e:
-                    logger.error(f"Error calculating total return amount: {e}")
-                    analysis["summary"]["total_return_amount"] = 0
-                
-                # Also calculate total replacements
-                try:
-                    # Identify replaced transactions (match: replacement, replaced, exchange)
-                    replacement_mask = status_values.apply(lambda x: any(kw in x for kw in ['replace', 'replaced', 'replacement', 'exchange']))
-                    
-                    # Count replacements
-                    replacement_count = replacement_mask.sum()
-                    analysis["summary"]["total_replacements"] = int(replacement_count)
-                    
-                    logger.info(f"Total replacements: {analysis['summary']['total_replacements']}")
-                except Exception as e:
-                    logger.error(f"Error calculating total replacements: {e}")
-                    analysis["summary"]["total_replacements"] = 0
+        analysis = compute_dashboard_analysis(typed, column_mapping)
         
-        # Calculate total units if quantity column is available
-        if qty_col and qty_col in df_analysis.columns:
-            try:
-                # Sum total units across all orders
-                total_units = df_analysis[qty_col].sum()
-                analysis["order_metrics"]["total_units"] = float(total_units)
-                logger.info(f"Total units sold: {total_units}")
-            except Exception as e:
-                logger.error(f"Error calculating total units: {e}")
+        # Platform analyzers expect the converted sales and date columns.
+        # df_clean is already a private copy, so the typed columns are written back in place.
+        df_analysis = df_clean if df_clean is not df else df.copy()
+        for typed_col in ('amount', 'order_date', 'quantity', 'unit_price'):
+            source_col = typed.source_columns.get(typed_col)
+            if source_col in df_analysis.columns:
+                df_analysis[source_col] = typed.frame[typed_col].to_numpy()
         
-        # Calculate basic summary statistics
-        if sales_col and sales_col in df_analysis.columns:
-            try:
-                # Filter out NaN values in sales column for analysis
-                sales_values = df_analysis[sales_col].dropna()
-                
-                # Count valid sales rows
-                valid_sales_rows = len(sales_values)
-                logger.info(f"Valid sales values for analysis: {valid_sales_rows} out of {len(df_analysis)}")
-                
-                if valid_sales_rows > 0:
-                    # Calculate basic stats
-                    total_sales = sales_values.sum()
-                    avg_sale = sales_values.mean()
-                    max_sale = sales_values.max()
-                    min_sale = sales_values.min()
-                    median_sale = sales_values.median()
-                    
-                    logger.info(f"Sales analysis: Total={total_sales}, Avg={avg_sale}, Max={max_sale}, Min={min_sale}, Median={median_sale}")
-                    
-                    analysis["summary"]["total_sales"] = float(total_sales)
-                    analysis["summary"]["average_sales"] = float(avg_sale)
-                    analysis["summary"]["max_sale"] = float(max_sale)
-                    analysis["summary"]["min_sale"] = float(min_sale)
-                    analysis["summary"]["median_sale"] = float(median_sale)
-                    
-                    # Number of transactions
-                    analysis["summary"]["total_transactions"] = int(valid_sales_rows)
-                    
-                    # Calculate unit economics if both quantity and sales amount are available
-                    qty_col = column_mapping.get('quantity')
-                    if qty_col and qty_col in df_analysis.columns:
-                        # Create a temporary dataframe with just quantity and sales for analysis
-                        temp_df = pd.DataFrame({
-                            'quantity': df_analysis[qty_col],
-                            'sales': df_analysis[sales_col]
-                        }).dropna()
-                        
-                        if len(temp_df) > 0:
-                            total_quantity = temp_df['quantity'].sum()
-                            average_order_size = temp_df['quantity'].mean()
-                            
-                            analysis["summary"]["total_quantity"] = float(total_quantity)
-                            analysis["summary"]["average_order_size"] = float(average_order_size)
-                            
-                            # Calculate average price per unit if sensible
-                            if total_quantity > 0:
-                                avg_price_per_unit = total_sales / total_quantity
-                                analysis["summary"]["average_price_per_unit"] = float(avg_price_per_unit)
-                    
-                    # Sales by time period (if date column exists)
-                    if date_col and date_col in df_analysis.columns:
-                        # Create a temporary dataframe with just date and sales for analysis
-                        temp_df = pd.DataFrame({
-                            'date': df_analysis[date_col],
-                            'sales': df_analysis[sales_col]
-                        }).dropna()
-                        
-                        if len(temp_df) > 0:
-                            # Get the date range
-                            min_date = temp_df['date'].min()
-                            max_date = temp_df['date'].max()
-                            if pd.notna(min_date) and pd.notna(max_date):
-                                try:
-                                    analysis["summary"]["date_range"] = {
-                                        "start": min_date.strftime('%Y-%m-%d'),
-                                        "end": max_date.strftime('%Y-%m-%d')
-                                    }
-                                    logger.info(f"Date range: {min_date.strftime('%Y-%m-%d')} to {max_date.strftime('%Y-%m-%d')}")
-                                    
-                                    # Calculate duration of data in days
-                                    duration_days = (max_date - min_date).days
-                                    analysis["summary"]["duration_days"] = duration_days
-                                    
-                                    # Calculate average daily sales
-                                    if duration_days > 0:
-                                        avg_daily_sales = total_sales / (duration_days + 1)  # +1 to include end date
-                                        analysis["summary"]["average_daily_sales"] = float(avg_daily_sales)
-                                except Exception as e:
-                                    logger.error(f"Error calculating date range: {e}")
-                            
-                            # Determine appropriate time grouping based on date range
-                            if isinstance(min_date, pd.Timestamp) and isinstance(max_date, pd.Timestamp):
-                                date_range = (max_date - min_date).days
-                                
-                                logger.info(f"Date range span: {date_range} days")
-                                
-                                if date_range > 365*2:  # More than 2 years of data
-                                    # Group by quarter
-                                    try:
-                                        temp_df['period'] = temp_df['date'].dt.to_period('Q').astype(str)
-                                        period_format = 'Quarterly'
-                                    except:
-                                        # Fallback if period conversion fails
-                                        temp_df['period'] = temp_df['date'].dt.strftime('%Y-%m')
-                                        period_format = 'Monthly'
-                                elif date_range > 90:  # More than 3 months of data
-                                    # Group by month
-                                    temp_df['period'] = temp_df['date'].dt.strftime('%Y-%m')
-                                    period_format = 'Monthly'
-                                elif date_range > 10:  # More than 10 days of data
-                                    # Group by day
-                                    temp_df['period'] = temp_df['date'].dt.strftime('%Y-%m-%d')
-                                    period_format = 'Daily'
-                                else:
-                                    # Group by hour for very short time spans
-                                    temp_df['period'] = temp_df['date'].dt.strftime('%Y-%m-%d %H:00')
-                                    period_format = 'Hourly'
-                                
-                                # Calculate period sales using pandas groupby
-                                period_sales = temp_df.groupby('period')['sales'].sum().reset_index()
-                                
-                                # Ensure periods are sorted chronologically
-                                period_sales = period_sales.sort_values('period')
-                                
-                                analysis["time_series"]["labels"] = period_sales['period'].tolist()
-                                analysis["time_series"]["data"] = [float(x) for x in period_sales['sales'].tolist()]
-                                analysis["time_series"]["period_type"] = period_format
-                                
-                                logger.info(f"Time series analysis: {period_format} periods, {len(period_sales)} data points")
-                                
-                                # Calculate growth metrics
-                                if len(period_sales) > 1:
-                                    first_period = period_sales['sales'].iloc[0]
-                                    last_period = period_sales['sales'].iloc[-1]
-                                    
-                                    # Calculate overall growth rate
-                                    if first_period > 0:  # Avoid division by zero
-                                        growth_rate = ((last_period - first_period) / first_period) * 100
-                                        analysis["sales_growth"]["rate"] = float(round(growth_rate, 2))
-                                        analysis["sales_growth"]["is_positive"] = "true" if growth_rate > 0 else "false"
-                                        logger.info(f"Overall growth rate: {growth_rate:.2f}%")
-                                    
-                                    # Calculate month-over-month or period-over-period growth
-                                    if len(period_sales) >= 3:
-                                        # Get the last 3 periods
-                                        last_periods = period_sales.tail(3)
-                                        current = last_periods['sales'].iloc[2]
-                                        previous = last_periods['sales'].iloc[1]
-                                        
-                                        if previous > 0:
-                                            recent_growth = ((current - previous) / previous) * 100
-                                            analysis["sales_growth"]["recent_rate"] = float(round(recent_growth, 2))
-                                            analysis["sales_growth"]["recent_is_positive"] = "true" if recent_growth > 0 else "false"
-                                            logger.info(f"Recent growth rate: {recent_growth:.2f}%")
-                                
-                                # Add trend analysis (simple linear regression)
-                                try:
-                                    import numpy as np
-                                    from scipy import stats
-                                    
-                                    # Create X as indexes (0, 1, 2...) and Y as sales values
-                                    x = np.arange(len(period_sales))
-                                    y = period_sales['sales'].values
-                                    
-                                    # Perform linear regression
-                                    slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-                                    
-                                    # Calculate trend metrics
-                                    analysis["sales_growth"]["trend"] = {
-                                        "slope": float(slope),
-                                        "r_squared": float(r_value**2),
-                                        "direction": "upward" if slope > 0 else "downward",
-                                        "strength": "strong" if abs(r_value) > 0.7 else "moderate" if abs(r_value) > 0.3 else "weak"
-                                    }
-                                    
-                                    # Generate trend line data for visualization
-                                    trend_line = [(intercept + slope * i) for i in range(len(period_sales))]
-                                    
-                                    # Add trend line to time series data
-                                    analysis["time_series"]["trend_line"] = [float(round(v, 2)) for v in trend_line]
-                                    
-                                    # Add moving average for smoothed visualization (if enough data points)
-                                    if len(period_sales) >= 5:
-                                        window_size = min(3, len(period_sales) // 3)  # Dynamic window size
-                                        sales_moving_avg = period_sales['sales'].rolling(window=window_size, center=True).mean()
-                                        analysis["time_series"]["moving_average"] = [float(v) if not np.isnan(v) else None for v in sales_moving_avg]
-                                    
-                                    logger.info(f"Sales trend analysis: direction={analysis['sales_growth']['trend']['direction']}, strength={analysis['sales_growth']['trend']['strength']}")
-                                except Exception as e:
-                                    logger.error(f"Error in trend analysis: {e}")
-                                    logger.error(traceback.format_exc())
-                                    
-                                # Add period-over-period comparison (if enough data)
-                                if len(period_sales) >= 6:
-                                    try:
-                                        # Calculate period-over-period growth rates
-                                        period_sales['previous'] = period_sales['sales'].shift(1)
-                                        period_sales['growth_rate'] = ((period_sales['sales'] - period_sales['previous']) / period_sales['previous']) * 100
-                                        
-                                        # Remove first row with NaN growth rate
-                                        growth_rates = period_sales.dropna()
-                                        
-                                        if len(growth_rates) > 0:
-                                            analysis["time_series"]["growth_rates"] = {
-                                                "labels": growth_rates['period'].tolist(),
-                                                "data": [float(round(x, 2)) for x in growth_rates['growth_rate'].tolist()],
-                                                "average": float(round(growth_rates['growth_rate'].mean(), 2))
-                                            }
-                                    except Exception as e:
-                                        logger.error(f"Error in period-over-period analysis: {e}")
-                else:
-                    logger.warning("No valid sales data found for analysis")
-                    analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                        "No valid sales data found for analysis"
-                    ]
-            except Exception as e:
-                logger.error(f"Error analyzing sales data: {e}")
-                logger.error(traceback.format_exc())
-                analysis["summary"]["error"] = f"Could not analyze sales amount column: {str(e)}"
-        else:
-            logger.warning(f"Sales column not identified. Available columns: {df_clean.columns.tolist()}")
-            analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                "Sales column not identified"
-            ]
-            
-        # Top products analysis using pandas
-        product_col = column_mapping.get('product_name')
-        if product_col and product_col in df_analysis.columns and sales_col and sales_col in df_analysis.columns:
-            try:
-                # Create a temporary dataframe for analysis with non-null products and sales
-                temp_df = df_analysis[[product_col, sales_col]].dropna()
-                
-                if len(temp_df) > 0:
-                    # Group by product and sum sales using pandas
-                    product_sales = temp_df.groupby(product_col)[sales_col].sum().reset_index()
-                    
-                    # Add count of transactions per product
-                    product_count = temp_df.groupby(product_col).size().reset_index(name='transaction_count')
-                    product_sales = pd.merge(product_sales, product_count, on=product_col)
-                    
-                    # Sort by sales amount and take top 10
-                    top_products = product_sales.sort_values(by=sales_col, ascending=False).head(10)
-                    
-                    # Sort by sales amount and take bottom 10 for the bar chart
-                    bottom_products = product_sales.sort_values(by=sales_col, ascending=True).head(10)
-                    
-                    logger.info(f"Top products analysis: found {len(top_products)} products")
-                    logger.info(f"Bottom products analysis: found {len(bottom_products)} products")
-                    
-                    # Format product names to prevent excessively long strings
-                    analysis["top_products"] = [
-                        {
-                            "name": str(row[product_col])[:50] + ('...' if len(str(row[product_col])) > 50 else ''),
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count'])
-                        }
-                        for _, row in top_products.iterrows()
-                    ]
-                    
-                    # Add formatted bottom products data
-                    analysis["bottom_products"] = [
-                        {
-                            "name": str(row[product_col])[:50] + ('...' if len(str(row[product_col])) > 50 else ''),
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count'])
-                        }
-                        for _, row in bottom_products.iterrows()
-                    ]
-                    
-                    # Create bottom products bar chart data in a consistent format with other charts
-                    analysis["bottom_products_chart"] = {
-                        "labels": [str(row[product_col])[:20] + ('...' if len(str(row[product_col])) > 20 else '') for _, row in bottom_products.iterrows()],
-                        "data": [float(row[sales_col]) for _, row in bottom_products.iterrows()]
-                    }
-                    
-                    # Add additional visualization format that the frontend might expect
-                    analysis["bottom_product_distribution"] = {
-                        "labels": [str(row[product_col])[:20] + ('...' if len(str(row[product_col])) > 20 else '') for _, row in bottom_products.iterrows()],
-                        "data": [float(row[sales_col]) for _, row in bottom_products.iterrows()],
-                        "percentages": [float(round((row[sales_col] / product_sales[sales_col].sum()) * 100, 2)) for _, row in bottom_products.iterrows()]
-                    }
-                    
-                    # Calculate product diversity metrics
-                    total_products = len(product_sales)
-                    analysis["summary"]["total_products"] = total_products
-                    
-                    # Calculate concentration metrics
-                    if total_products > 0:
-                        # Top 5 products as percentage of total sales
-                        top5_sales = product_sales.nlargest(5, sales_col)[sales_col].sum()
-                        top5_pct = (top5_sales / product_sales[sales_col].sum()) * 100
-                        analysis["summary"]["top5_products_pct"] = float(round(top5_pct, 2))
-                        
-                        # Format for visualization - prepare product distribution data
-                        all_products_total = product_sales[sales_col].sum()
-                        
-                        # Get top 5 products for chart
-                        top5_products = product_sales.nlargest(5, sales_col)
-                        top5_list = [
-                            {
-                                "name": str(row[product_col])[:30] + ('...' if len(str(row[product_col])) > 30 else ''),
-                                "value": float(row[sales_col]),
-                                "percentage": float(round((row[sales_col] / all_products_total) * 100, 2))
-                            }
-                            for _, row in top5_products.iterrows()
-                        ]
-                        
-                        # Add "Others" category for remaining products
-                        others_value = all_products_total - top5_sales
-                        if others_value > 0:
-                            top5_list.append({
-                                "name": "Others",
-                                "value": float(others_value),
-                                "percentage": float(round((others_value / all_products_total) * 100, 2))
-                            })
-                        
-                        # Add pie chart data
-                        analysis["product_distribution"] = {
-                            "labels": [item["name"] for item in top5_list],
-                            "data": [item["value"] for item in top5_list],
-                            "percentages": [item["percentage"] for item in top5_list]
-                        }
-                        
-                        logger.info(f"Product concentration: top 5 products = {top5_pct:.2f}% of sales")
-            except Exception as e:
-                logger.error(f"Error analyzing top products: {e}")
-                logger.error(traceback.format_exc())
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error analyzing products: {str(e)}"
-                ]
-        
-        # Regional analysis using pandas
-        region_col = column_mapping.get('customer_location')
-        if region_col and region_col in df_analysis.columns and sales_col and sales_col in df_analysis.columns:
-            try:
-                # Create a temporary dataframe for analysis with non-null regions and sales
-                temp_df = df_analysis[[region_col, sales_col]].dropna()
-                
-                if len(temp_df) > 0:
-                    # Check if this column has at least 10 different values (likely to be a state column)
-                    unique_regions = temp_df[region_col].nunique()
-                    if unique_regions < 10:
-                        logger.warning(f"Selected region column '{region_col}' has only {unique_regions} unique values, which may not be a proper state column")
-                        # We'll still use it, but with a warning
-                        analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                            f"Selected region column has only {unique_regions} unique values, which may not represent states"
-                        ]
-                    
-                    # Group by region and sum sales using pandas
-                    region_sales = temp_df.groupby(region_col)[sales_col].sum().reset_index()
-                    
-                    # Add count of transactions per region
-                    region_count = temp_df.groupby(region_col).size().reset_index(name='transaction_count')
-                    region_sales = pd.merge(region_sales, region_count, on=region_col)
-                    
-                    # Sort by sales amount and take top 10
-                    top_regions = region_sales.sort_values(by=sales_col, ascending=False).head(10)
-                    
-                    # Sort by sales amount and take bottom 10 for the bar chart
-                    bottom_regions = region_sales.sort_values(by=sales_col, ascending=True).head(10)
-                    
-                    # Calculate percentage of total sales for each region
-                    total_region_sales = region_sales[sales_col].sum()
-                    if total_region_sales > 0:
-                        top_regions['percentage'] = (top_regions[sales_col] / total_region_sales) * 100
-                        bottom_regions['percentage'] = (bottom_regions[sales_col] / total_region_sales) * 100
-                    
-                    logger.info(f"Top regions analysis: found {len(top_regions)} regions")
-                    logger.info(f"Bottom regions analysis: found {len(bottom_regions)} regions")
-                    
-                    analysis["top_regions"] = [
-                        {
-                            "name": str(row[region_col])[:50],
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count']),
-                            "percentage": float(row.get('percentage', 0))
-                        }
-                        for _, row in top_regions.iterrows()
-                    ]
-                    
-                    # Add bottom regions data
-                    analysis["bottom_regions"] = [
-                        {
-                            "name": str(row[region_col])[:50],
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count']),
-                            "percentage": float(row.get('percentage', 0))
-                        }
-                        for _, row in bottom_regions.iterrows()
-                    ]
-                    
-                    # Create bottom regions bar chart data in a consistent format with other charts
-                    analysis["bottom_regions_chart"] = {
-                        "labels": [str(row[region_col])[:20] for _, row in bottom_regions.iterrows()],
-                        "data": [float(row[sales_col]) for _, row in bottom_regions.iterrows()]
-                    }
-                    
-                    # Add additional visualization format that the frontend might expect
-                    analysis["bottom_region_distribution"] = {
-                        "regions": [str(row[region_col])[:20] for _, row in bottom_regions.iterrows()],
-                        "values": [float(row[sales_col]) for _, row in bottom_regions.iterrows()],
-                        "percentages": [float(row.get('percentage', 0)) for _, row in bottom_regions.iterrows()]
-                    }
-                    
-                    # Get the top selling state
-                    if len(region_sales) > 0:
-                        top_state = region_sales.iloc[0]
-                        analysis["order_metrics"]["top_selling_state"] = {
-                            "name": str(top_state[region_col])[:50],
-                            "value": float(top_state[sales_col]),
-                            "transaction_count": int(top_state['transaction_count']),
-                            "percentage": float(round((top_state[sales_col] / total_region_sales) * 100, 2)) if total_region_sales > 0 else 0
-                        }
-                        logger.info(f"Top selling state: {top_state[region_col]} with {top_state[sales_col]} sales")
-                    
-                    # Get the lowest selling state
-                    if len(region_sales) > 1:
-                        bottom_state = region_sales.iloc[-1]
-                        analysis["order_metrics"]["lowest_selling_state"] = {
-                            "name": str(bottom_state[region_col])[:50],
-                            "value": float(bottom_state[sales_col]),
-                            "transaction_count": int(bottom_state['transaction_count']),
-                            "percentage": float(round((bottom_state[sales_col] / total_region_sales) * 100, 2)) if total_region_sales > 0 else 0
-                        }
-                        logger.info(f"Lowest selling state: {bottom_state[region_col]} with {bottom_state[sales_col]} sales")
-                    
-                    # Format for visualization - prepare region map data
-                    # Create a distribution for the map chart
-                    all_regions = region_sales.sort_values(by=sales_col, ascending=False)
-                    analysis["region_distribution"] = {
-                        "regions": [str(row[region_col]) for _, row in all_regions.iterrows()],
-                        "values": [float(row[sales_col]) for _, row in all_regions.iterrows()],
-                        "percentages": [float(round((row[sales_col] / total_region_sales) * 100, 2)) for _, row in all_regions.iterrows()]
-                    }
-                    
-                    # For geographic chart visualization - prepare a color-coded dataset
-                    if len(all_regions) > 0:
-                        # Calculate quartiles for color coding
-                        percentiles = [0, 25, 50, 75, 100]
-                        # Ensure np is accessible from parent scope
-                        import numpy as np
-                        thresholds = [np.percentile(all_regions[sales_col], p) for p in percentiles]
-                        
-                        # Assign color categories based on sales value
-                        def get_category(value):
-                            for i, threshold in enumerate(thresholds[1:], 1):
-                                if value <= threshold:
-                                    return i
-                            return len(thresholds)
-                        
-                        all_regions['category'] = all_regions[sales_col].apply(get_category)
-                        
-                        # Prepare formatted data for map visualization
-                        analysis["region_map_data"] = [
-                            {
-                                "region": str(row[region_col]),
-                                "value": float(row[sales_col]),
-                                "category": int(row['category']),
-                                "percentage": float(round((row[sales_col] / total_region_sales) * 100, 2))
-                            }
-                            for _, row in all_regions.iterrows()
-                        ]
-                    
-                    # Calculate regional concentration metrics
-                    total_regions = len(region_sales)
-                    analysis["summary"]["total_regions"] = total_regions
-                    
-                    # Geographic diversity
-                    if total_regions > 0:
-                        # Top 3 regions as percentage of total sales
-                        top3_region_sales = region_sales.nlargest(3, sales_col)[sales_col].sum()
-                        top3_region_pct = (top3_region_sales / total_region_sales) * 100
-                        analysis["summary"]["top3_regions_pct"] = float(round(top3_region_pct, 2))
-                        
-                        logger.info(f"Geographic concentration: top 3 regions = {top3_region_pct:.2f}% of sales")
-            except Exception as e:
-                logger.error(f"Error analyzing regions: {e}")
-                logger.error(traceback.format_exc())
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error analyzing regions: {str(e)}"
-                ]
-                
-        # Top products analysis using pandas
-        product_col = column_mapping.get('product_name')
-        if product_col and product_col in df_analysis.columns and sales_col and sales_col in df_analysis.columns:
-            try:
-                # Create a temporary dataframe for analysis with non-null products and sales
-                temp_df = df_analysis[[product_col, sales_col]].dropna()
-                
-                if len(temp_df) > 0:
-                    # Group by product and sum sales using pandas
-                    product_sales = temp_df.groupby(product_col)[sales_col].sum().reset_index()
-                    
-                    # Add count of transactions per product
-                    product_count = temp_df.groupby(product_col).size().reset_index(name='transaction_count')
-                    product_sales = pd.merge(product_sales, product_count, on=product_col)
-                    
-                    # Sort by sales amount and take top 10
-                    top_products = product_sales.sort_values(by=sales_col, ascending=False).head(10)
-                    
-                    # Sort by sales amount and take bottom 10
-                    bottom_products = product_sales.sort_values(by=sales_col, ascending=True).head(10)
-                    
-                    logger.info(f"Top products analysis: found {len(top_products)} products")
-                    logger.info(f"Bottom products analysis: found {len(bottom_products)} products")
-                    
-                    # Format product names to prevent excessively long strings
-                    analysis["top_products"] = [
-                        {
-                            "name": str(row[product_col])[:50] + ('...' if len(str(row[product_col])) > 50 else ''),
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count'])
-                        }
-                        for _, row in top_products.iterrows()
-                    ]
-                    
-                    analysis["bottom_products"] = [
-                        {
-                            "name": str(row[product_col])[:50] + ('...' if len(str(row[product_col])) > 50 else ''),
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count'])
-                        }
-                        for _, row in bottom_products.iterrows()
-                    ]
-                    
-                    # Create bottom products bar chart data
-                    analysis["bottom_products_chart"] = {
-                        "labels": [str(row[product_col])[:20] + ('...' if len(str(row[product_col])) > 20 else '') for _, row in bottom_products.iterrows()],
-                        "data": [float(row[sales_col]) for _, row in bottom_products.iterrows()]
-                    }
-                    
-                    # Calculate product diversity metrics
-                    total_products = len(product_sales)
-                    analysis["summary"]["total_products"] = total_products
-                    
-                    # Calculate concentration metrics
-                    if total_products > 0:
-                        # Top 5 products as percentage of total sales
-                        top5_sales = product_sales.nlargest(5, sales_col)[sales_col].sum()
-                        top5_pct = (top5_sales / product_sales[sales_col].sum()) * 100
-                        analysis["summary"]["top5_products_pct"] = float(round(top5_pct, 2))
-                        
-                        # Format for visualization - prepare product distribution data
-                        all_products_total = product_sales[sales_col].sum()
-                        
-                        # Get top 5 products for chart
-                        top5_products = product_sales.nlargest(5, sales_col)
-                        top5_list = [
-                            {
-                                "name": str(row[product_col])[:30] + ('...' if len(str(row[product_col])) > 30 else ''),
-                                "value": float(row[sales_col]),
-                                "percentage": float(round((row[sales_col] / all_products_total) * 100, 2))
-                            }
-                            for _, row in top5_products.iterrows()
-                        ]
-                        
-                        # Add "Others" category for remaining products
-                        others_value = all_products_total - top5_sales
-                        if others_value > 0:
-                            top5_list.append({
-                                "name": "Others",
-                                "value": float(others_value),
-                                "percentage": float(round((others_value / all_products_total) * 100, 2))
-                            })
-                        
-                        # Add pie chart data
-                        analysis["product_distribution"] = {
-                            "labels": [item["name"] for item in top5_list],
-                            "data": [item["value"] for item in top5_list],
-                            "percentages": [item["percentage"] for item in top5_list]
-                        }
-                        
-                        logger.info(f"Product concentration: top 5 products = {top5_pct:.2f}% of sales")
-            except Exception as e:
-                logger.error(f"Error analyzing top products: {e}")
-                logger.error(traceback.format_exc())
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error analyzing products: {str(e)}"
-                ]
-        
-        # Sales channel analysis using pandas
-        channel_col = column_mapping.get('sales_channel')
-        if channel_col and channel_col in df_analysis.columns and sales_col and sales_col in df_analysis.columns:
-            try:
-                # Create a temporary dataframe for analysis with non-null channels and sales
-                temp_df = df_analysis[[channel_col, sales_col]].dropna()
-                
-                if len(temp_df) > 0:
-                    # Group by channel and sum sales using pandas
-                    channel_sales = temp_df.groupby(channel_col)[sales_col].sum().reset_index()
-                    
-                    # Add count of transactions per channel
-                    channel_count = temp_df.groupby(channel_col).size().reset_index(name='transaction_count')
-                    channel_sales = pd.merge(channel_sales, channel_count, on=channel_col)
-                    
-                    # Calculate percentage of total sales for each channel
-                    total_channel_sales = channel_sales[sales_col].sum()
-                    channel_sales['percentage'] = (channel_sales[sales_col] / total_channel_sales) * 100 if total_channel_sales > 0 else 0
-                    
-                    # Sort by sales amount in descending order
-                    channel_sales = channel_sales.sort_values(by=sales_col, ascending=False)
-                    
-                    logger.info(f"Sales channel analysis: found {len(channel_sales)} channels")
-                    
-                    analysis["sales_channels"] = [
-                        {
-                            "name": str(row[channel_col])[:50],
-                            "value": float(row[sales_col]),
-                            "transaction_count": int(row['transaction_count']),
-                            "percentage": float(row['percentage'])
-                        }
-                        for _, row in channel_sales.iterrows()
-                    ]
-                    
-                    # Create formatted data for pie/donut chart visualization
-                    analysis["channel_distribution"] = {
-                        "labels": [str(row[channel_col])[:30] for _, row in channel_sales.iterrows()],
-                        "data": [float(row[sales_col]) for _, row in channel_sales.iterrows()],
-                        "percentages": [float(round(row['percentage'], 2)) for _, row in channel_sales.iterrows()]
-                    }
-                    
-                    # Calculate channel efficiency (sales per transaction) for bar chart
-                    channel_sales['efficiency'] = channel_sales[sales_col] / channel_sales['transaction_count']
-                    
-                    analysis["channel_efficiency"] = {
-                        "labels": [str(row[channel_col])[:30] for _, row in channel_sales.iterrows()],
-                        "data": [float(round(row['efficiency'], 2)) for _, row in channel_sales.iterrows()]
-                    }
-                    
-                    # Add channel concentration metrics
-                    if len(channel_sales) > 1:
-                        # Calculate channel diversity
-                        analysis["summary"]["channel_count"] = len(channel_sales)
-                        
-                        # Percentage of sales from top channel
-                        top_channel_pct = float(round(channel_sales.iloc[0]['percentage'], 2))
-                        analysis["summary"]["top_channel_pct"] = top_channel_pct
-                        
-                        logger.info(f"Top sales channel accounts for {top_channel_pct}% of sales")
-            except Exception as e:
-                logger.error(f"Error analyzing sales channels: {e}")
-                logger.error(traceback.format_exc())
-                analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [
-                    f"Error analyzing sales channels: {str(e)}"
-                ]
-        
-        # Add platform-specific analysis if platform type is provided
-        if platform_type:
-            platform_type = platform_type.lower().strip()
-            
-            # Set an empty dictionary for platform_specific
-            # All platform types will use the default analysis behavior
-            analysis["platform_specific"] = {}
-            
-            # Log the platform type but don't perform platform-specific analysis
-            logger.info(f"Platform type '{platform_type}' detected, using default analysis behavior")
-                
-        # Create a consolidated key metrics section with all the requested metrics
-        key_metrics = {}
-        
-        # Total orders metrics
-        key_metrics["total_orders"] = analysis["order_metrics"].get("total_orders", 0)
-        key_metrics["total_units"] = analysis["order_metrics"].get("total_units", analysis["summary"].get("total_quantity", 0))
-        
-        # Order issue metrics
-        key_metrics["total_cancelled_orders"] = analysis["order_metrics"].get("cancelled_orders", 0)
-        key_metrics["cancelled_value"] = analysis["order_metrics"].get("cancelled_value", 0)
-        key_metrics["total_replacements"] = analysis["order_metrics"].get("replaced_orders", 0)
-        key_metrics["replacement_value"] = analysis["order_metrics"].get("replaced_value", 0)
-        key_metrics["total_refunded_orders"] = analysis["order_metrics"].get("refunded_orders", 0)
-        key_metrics["refunded_value"] = analysis["order_metrics"].get("refunded_value", 0)
-        key_metrics["total_returned_orders"] = analysis["order_metrics"].get("returned_orders", 0)
-        key_metrics["returned_value"] = analysis["order_metrics"].get("returned_value", 0)
-        
-        # Sales metrics
-        key_metrics["total_sales"] = analysis["summary"].get("total_sales", 0)
-        key_metrics["average_sales"] = analysis["summary"].get("average_sales", 0)
-        
-        # Regional metrics
-        if "top_selling_state" in analysis["order_metrics"]:
-            key_metrics["top_selling_state"] = analysis["order_metrics"]["top_selling_state"]["name"]
-            key_metrics["top_selling_state_value"] = analysis["order_metrics"]["top_selling_state"]["value"]
-        
-        if "lowest_selling_state" in analysis["order_metrics"]:
-            key_metrics["lowest_selling_state"] = analysis["order_metrics"]["lowest_selling_state"]["name"]
-            key_metrics["lowest_selling_state_value"] = analysis["order_metrics"]["lowest_selling_state"]["value"]
-        
-        # Product metrics
-        if len(analysis["top_products"]) > 0:
-            key_metrics["top_product"] = analysis["top_products"][0]["name"]
-            key_metrics["top_product_value"] = analysis["top_products"][0]["value"]
-        
-        if "bottom_products" in analysis and len(analysis["bottom_products"]) > 0:
-            key_metrics["lowest_product"] = analysis["bottom_products"][0]["name"]
-            key_metrics["lowest_product_value"] = analysis["bottom_products"][0]["value"]
-        
-        # Add key metrics to analysis
-        analysis["key_metrics"] = key_metrics
-        logger.info(f"Generated consolidated key metrics: {key_metrics}")
-        
-        # Prepare visualization structure for key metrics dashboard display
-        analysis["visualization_data"] = {
-            "order_metrics": [
-                {"label": "Total Orders", "value": key_metrics["total_orders"], "category": "orders"},
-                {"label": "Total Units", "value": key_metrics["total_units"], "category": "orders"},
-                {"label": "Total Sales", "value": key_metrics["total_sales"], "category": "sales", "format": "currency"},
-                {"label": "Average Sale", "value": key_metrics["average_sales"], "category": "sales", "format": "currency"}
-            ],
-            "issue_metrics": [
-                {"label": "Cancelled Orders", "value": key_metrics["total_cancelled_orders"], "category": "issues"},
-                {"label": "Cancelled Value", "value": key_metrics["cancelled_value"], "category": "issues", "format": "currency"},
-                {"label": "Replacements", "value": key_metrics["total_replacements"], "category": "issues"},
-                {"label": "Replacement Value", "value": key_metrics["replacement_value"], "category": "issues", "format": "currency"},
-                {"label": "Refunded Orders", "value": key_metrics["total_refunded_orders"], "category": "issues"},
-                {"label": "Refunded Value", "value": key_metrics["refunded_value"], "category": "issues", "format": "currency"},
-                {"label": "Returned Orders", "value": key_metrics["total_returned_orders"], "category": "issues"},
-                {"label": "Returned Value", "value": key_metrics["returned_value"], "category": "issues", "format": "currency"}
-            ],
-            "region_metrics": [
-                {"label": "Top Selling State", "value": key_metrics.get("top_selling_state", "N/A"), "category": "regions"},
-                {"label": "Top State Sales", "value": key_metrics.get("top_selling_state_value", 0), "category": "regions", "format": "currency"},
-                {"label": "Lowest Selling State", "value": key_metrics.get("lowest_selling_state", "N/A"), "category": "regions"},
-                {"label": "Lowest State Sales", "value": key_metrics.get("lowest_selling_state_value", 0), "category": "regions", "format": "currency"}
-            ],
-            "product_metrics": [
-                {"label": "Top Product", "value": key_metrics.get("top_product", "N/A"), "category": "products"},
-                {"label": "Top Product Sales", "value": key_metrics.get("top_product_value", 0), "category": "products", "format": "currency"},
-                {"label": "Lowest Product", "value": key_metrics.get("lowest_product", "N/A"), "category": "products"},
-                {"label": "Lowest Product Sales", "value": key_metrics.get("lowest_product_value", 0), "category": "products", "format": "currency"}
-            ]
-        }
-        
-        # Apply platform-specific analyses
-        if not platform_type:
-            # Auto-detect marketplace format if platform_type is not provided
-            platform_type = detect_marketplace_format(df_analysis)
-            logger.info(f"Auto-detected platform type: {platform_type}")
-        
-        # Apply format-specific column mapping if needed
-        if platform_type == "amazon" and '_detected_format' not in column_mapping:
-            column_mapping = map_amazon_columns(df_analysis, column_mapping)
-            logger.info("Applied Amazon-specific column mapping")
-        elif platform_type == "amazon_b2b" and '_detected_format' not in column_mapping:
-            column_mapping = map_amazon_b2b_columns(df_analysis, column_mapping)
-            logger.info("Applied Amazon B2B-specific column mapping")
-        elif platform_type == "flipkart" and '_detected_format' not in column_mapping:
-            column_mapping = map_flipkart_columns(df_analysis, column_mapping)
-            logger.info("Applied Flipkart-specific column mapping")
-        elif platform_type == "meesho" and '_detected_format' not in column_mapping:
-            column_mapping = map_meesho_columns(df_analysis, column_mapping)
-            logger.info("Applied Meesho-specific column mapping")
-        
-        # Apply platform-specific analysis based on the platform type
-        if platform_type == "amazon":
-            logger.info("Running Amazon-specific analysis")
-            analysis["platform_specific"] = analyze_amazon_data(df_analysis, column_mapping)
-        elif platform_type == "amazon_b2b":
-            logger.info("Running Amazon B2B-specific analysis")
-            analysis["platform_specific"] = analyze_amazon_b2b_data(df_analysis, column_mapping)
-        elif platform_type == "flipkart":
-            logger.info("Running Flipkart-specific analysis")
-            analysis["platform_specific"] = analyze_flipkart_data(df_analysis, column_mapping)
-        elif platform_type == "meesho":
-            logger.info("Running Meesho-specific analysis")
-            analysis["platform_specific"] = analyze_meesho_data(df_analysis, column_mapping)
-        else:
-            # Use default analysis behavior for unknown platform types
-            analysis["platform_specific"] = {}
-            logger.info(f"No specific analysis for platform type: {platform_type}")
+        analysis["platform_specific"] = analyze_platform_data(df_analysis, column_mapping, platform_type)
         
     except Exception as e:
         logger.error(f"Error in analyze_sales_data: {e}")
@@ -2234,6 +1231,59 @@ def analyze_sales_data(df, column_mapping, platform_type=None):
             }
         }
 
+def analyze_platform_data(df, column_mapping, platform_type=None):
+    """
+    Run the marketplace-specific part of the analysis
+    
+    Kept separate from the dashboard aggregates so a platform change can be
+    re-analyzed without recomputing everything else.
+    
+    Args:
+        df: pandas DataFrame with normalized column names and converted sales/date columns
+        column_mapping: dictionary mapping column types to actual column names
+        platform_type: optional platform type; detected from the data when omitted
+        
+    Returns:
+        dict: platform-specific analysis results (empty for unknown platforms)
+    """
+    # Apply platform-specific analyses
+    if not platform_type:
+        # Auto-detect marketplace format if platform_type is not provided
+        platform_type = detect_marketplace_format(df)
+        logger.info(f"Auto-detected platform type: {platform_type}")
+
+    # Apply format-specific column mapping if needed
+    if platform_type == "amazon" and '_detected_format' not in column_mapping:
+        column_mapping = map_amazon_columns(df, column_mapping)
+        logger.info("Applied Amazon-specific column mapping")
+    elif platform_type == "amazon_b2b" and '_detected_format' not in column_mapping:
+        column_mapping = map_amazon_b2b_columns(df, column_mapping)
+        logger.info("Applied Amazon B2B-specific column mapping")
+    elif platform_type == "flipkart" and '_detected_format' not in column_mapping:
+        column_mapping = map_flipkart_columns(df, column_mapping)
+        logger.info("Applied Flipkart-specific column mapping")
+    elif platform_type == "meesho" and '_detected_format' not in column_mapping:
+        column_mapping = map_meesho_columns(df, column_mapping)
+        logger.info("Applied Meesho-specific column mapping")
+
+    # Apply platform-specific analysis based on the platform type
+    if platform_type == "amazon":
+        logger.info("Running Amazon-specific analysis")
+        return analyze_amazon_data(df, column_mapping)
+    elif platform_type == "amazon_b2b":
+        logger.info("Running Amazon B2B-specific analysis")
+        return analyze_amazon_b2b_data(df, column_mapping)
+    elif platform_type == "flipkart":
+        logger.info("Running Flipkart-specific analysis")
+        return analyze_flipkart_data(df, column_mapping)
+    elif platform_type == "meesho":
+        logger.info("Running Meesho-specific analysis")
+        return analyze_meesho_data(df, column_mapping)
+    else:
+        # Use default analysis behavior for unknown platform types
+        logger.info(f"No specific analysis for platform type: {platform_type}")
+        return {}
+
 def analyze_amazon_data(df, column_mapping):
     """
     Analyze Amazon-specific sales data
@@ -3328,7 +2378,7 @@ def map_amazon_b2b_columns(df, column_mapping):
     
     return column_mapping
 
-def compute_sales_metrics(df, column_mapping):
+def compute_sales_metrics(df, column_mapping, typed=None):
     """
     Compute specific sales metrics as requested:
     - Total Sales
@@ -3343,6 +2393,7 @@ def compute_sales_metrics(df, column_mapping):
     Args:
         df: pandas DataFrame containing the sales data
         column_mapping: dictionary mapping column types to actual column names
+        typed: optional TypedSalesFrame already built for df and column_mapping
         
     Returns:
         dict: Dictionary containing the computed metrics in the requested format
@@ -3365,170 +2416,9 @@ def compute_sales_metrics(df, column_mapping):
         return metrics
     
     try:
-        # Create a clean copy of the dataframe for analysis
-        df_analysis = df.copy()
-        
-        # Standardize source type field name
-        if '__source_type__' in df_analysis.columns:
-            df_analysis['record_type'] = df_analysis['__source_type__']
-            df_analysis.drop('__source_type__', axis=1, inplace=True)
-        
-        # Check if this is a Meesho dataset with source_type column (from merged files)
-        is_meesho_merged = 'record_type' in df_analysis.columns and 'cancel_return_date' in column_mapping
-        
-        # 1. Total Sales & Average Sales - Sum of all numeric sales_amount values
-        sales_col = column_mapping.get('sales_amount')
-        if sales_col and sales_col in df_analysis.columns:
-            # Convert sales column to numeric, coercing errors to NaN
-            if not pd.api.types.is_numeric_dtype(df_analysis[sales_col]):
-                df_analysis[sales_col] = pd.to_numeric(df_analysis[sales_col], errors='coerce')
-            
-            # For Meesho merged data, use only sales records for total sales calculation
-            if is_meesho_merged:
-                sales_records = df_analysis[df_analysis['record_type'] == 'sale']
-                valid_sales = sales_records[sales_col].dropna()
-            else:
-                valid_sales = df_analysis[sales_col].dropna()
-            
-            metrics["total_sales"] = float(valid_sales.sum()) if len(valid_sales) > 0 else 0
-            
-            # Calculate average sales (mean of all valid, non-zero sales amounts)
-            non_zero_sales = valid_sales[valid_sales > 0]
-            metrics["average_sales"] = float(non_zero_sales.mean()) if len(non_zero_sales) > 0 else 0
-            
-            logger.info(f"Total sales: {metrics['total_sales']}, Average sales: {metrics['average_sales']}")
-        
-        # 2. Return & Cancellation Rates, Total Return Amount, Total Replacements
-        transaction_col = column_mapping.get('transaction_type')
-        
-        # Special handling for Meesho merged data
-        if is_meesho_merged:
-            # Count total orders from sales records
-            sales_records = df_analysis[df_analysis['record_type'] == 'sale']
-            total_orders = len(sales_records)
-            
-            # Count returns from return records
-            return_records = df_analysis[df_analysis['record_type'] == 'return']
-            returned_count = len(return_records)
-            
-            # Calculate return rate
-            if total_orders > 0:
-                metrics["return_rate"] = float(round((returned_count / total_orders) * 100, 2))
-            
-            # Use cancel_return_date to identify cancellations vs returns if status column exists
-            status_col = None
-            for col in df_analysis.columns:
-                col_str = str(col).lower()
-                if 'status' in col_str or 'state' in col_str or 'order_state' in col_str:
-                    status_col = col
-                    break
-            
-            if status_col:
-                # Convert to string and lowercase for consistent analysis
-                return_records['status_lower'] = return_records[status_col].astype(str).str.lower()
-                
-                # Count cancellations (match: cancelled, canceled, cxl)
-                cancelled_mask = return_records['status_lower'].apply(lambda x: any(kw in x for kw in ['cancel', 'cancelled', 'canceled', 'cxl']))
-                cancelled_count = cancelled_mask.sum()
-                
-                # Calculate cancellation rate
-                if total_orders > 0:
-                    metrics["cancellation_rate"] = float(round((cancelled_count / total_orders) * 100, 2))
-                
-                # Count replacements (match: replacement, replaced, exchange)
-                replacement_mask = return_records['status_lower'].apply(lambda x: any(kw in x for kw in ['replace', 'replaced', 'replacement', 'exchange']))
-                metrics["total_replacements"] = int(replacement_mask.sum())
-            
-            # Calculate total return amount if sales_col exists
-            if sales_col and sales_col in return_records.columns:
-                if not pd.api.types.is_numeric_dtype(return_records[sales_col]):
-                    return_records[sales_col] = pd.to_numeric(return_records[sales_col], errors='coerce')
-                
-                metrics["total_return_amount"] = float(return_records[sales_col].sum())
-            
-            logger.info(f"Meesho return analysis - Return rate: {metrics['return_rate']}%, " +
-                      f"Cancellation rate: {metrics['cancellation_rate']}%, " +
-                      f"Total return amount: {metrics['total_return_amount']}")
-            
-        elif transaction_col and transaction_col in df_analysis.columns:
-            total_orders = len(df_analysis)
-            
-            if total_orders > 0:
-                try:
-                    # Convert to string and lowercase for consistent analysis
-                    status_values = df_analysis[transaction_col].astype(str).str.lower()
-                    
-                    # Identify returned transactions (match: return, refund, refunded, rto)
-                    returned_mask = status_values.apply(lambda x: any(kw in x for kw in ['return', 'refund', 'refunded', 'rto']))
-                    returned_count = returned_mask.sum()
-                    
-                    # Identify cancelled transactions (match: cancelled, canceled, cxl)
-                    cancelled_mask = status_values.apply(lambda x: any(kw in x for kw in ['cancel', 'cancelled', 'canceled', 'cxl']))
-                    cancelled_count = cancelled_mask.sum()
-                    
-                    # Calculate replacement count (match: replacement, replaced, exchange)
-                    replacement_mask = status_values.apply(lambda x: any(kw in x for kw in ['replace', 'replaced', 'replacement', 'exchange']))
-                    metrics["total_replacements"] = int(replacement_mask.sum())
-                    
-                    # Calculate rates as percentages
-                    metrics["return_rate"] = float(round((returned_count / total_orders) * 100, 2))
-                    metrics["cancellation_rate"] = float(round((cancelled_count / total_orders) * 100, 2))
-                    
-                    # Calculate total return amount
-                    if sales_col and sales_col in df_analysis.columns:
-                        # Make sure sales column is numeric
-                        if not pd.api.types.is_numeric_dtype(df_analysis[sales_col]):
-                            df_analysis[sales_col] = pd.to_numeric(df_analysis[sales_col], errors='coerce')
-                        
-                        # Sum sales amount for returned transactions
-                        return_sales = df_analysis.loc[returned_mask, sales_col].fillna(0)
-                        metrics["total_return_amount"] = float(return_sales.sum())
-                    
-                    logger.info(f"Return analysis - Return rate: {metrics['return_rate']}%, " +
-                               f"Cancellation rate: {metrics['cancellation_rate']}%, " +
-                               f"Total return amount: {metrics['total_return_amount']}")
-                
-                except Exception as e:
-                    logger.error(f"Error analyzing transaction types: {e}")
-                    logger.error(traceback.format_exc())
-        
-        # 3. Total Unique Regions - Count unique customer locations (usually states)
-        location_col = column_mapping.get('customer_location')
-        if location_col and location_col in df_analysis.columns:
-            try:
-                # Convert location to string and extract state information
-                locations = df_analysis[location_col].astype(str)
-                
-                # Try to extract state from addresses
-                if locations.str.len().max() > 20:  # If some values are long, they might be full addresses
-                    cleaned_locations = locations.apply(extract_state)
-                else:
-                    cleaned_locations = locations
-                
-                # Count unique valid locations (excluding empty, NA, etc.)
-                valid_locations = cleaned_locations[cleaned_locations.str.len() > 1]
-                metrics["total_regions"] = int(valid_locations.nunique())
-                
-                logger.info(f"Total unique regions: {metrics['total_regions']}")
-            
-            except Exception as e:
-                logger.error(f"Error counting unique regions: {e}")
-                logger.error(traceback.format_exc())
-        
-        # 4. Total Number of Products - Count unique product names
-        product_col = column_mapping.get('product_name')
-        if product_col and product_col in df_analysis.columns:
-            try:
-                products = df_analysis[product_col].astype(str)
-                valid_products = products[products.str.len() > 1]
-                metrics["total_products"] = int(valid_products.nunique())
-                
-                logger.info(f"Total unique products: {metrics['total_products']}")
-            
-            except Exception as e:
-                logger.error(f"Error counting unique products: {e}")
-                logger.error(traceback.format_exc())
-    
+        if typed is None:
+            typed = build_typed_frame(df, column_mapping)
+        metrics = compute_headline_metrics(typed, column_mapping, state_extractor=extract_states)
     except Exception as e:
         logger.error(f"Error computing sales metrics: {e}")
         logger.error(traceback.format_exc())
@@ -3537,52 +2427,88 @@ def compute_sales_metrics(df, column_mapping):
     metrics = ensure_json_serializable(metrics)
     
     return metrics
-def extract_state(location_str):
-    """Helper function to extract state information from addresses"""
-    # Skip empty or short values
-    if not isinstance(location_str, str) or len(location_str) < 3:
-        return location_str
-                
-    # Common Indian state names
-    indian_states = [
-        'andhra pradesh', 'arunachal pradesh', 'assam', 'bihar', 'chhattisgarh', 
-        'goa', 'gujarat', 'haryana', 'himachal pradesh', 'jharkhand', 'karnataka',
-        'kerala', 'madhya pradesh', 'maharashtra', 'manipur', 'meghalaya', 'mizoram',
-        'nagaland', 'odisha', 'punjab', 'rajasthan', 'sikkim', 'tamil nadu', 'telangana',
-        'tripura', 'uttar pradesh', 'uttarakhand', 'west bengal', 'andaman and nicobar',
-        'chandigarh', 'dadra and nagar haveli', 'daman and diu', 'delhi', 'jammu and kashmir',
-        'ladakh', 'lakshadweep', 'puducherry'
-    ]
-    
-    # Normalize input
+# Common Indian state names, in match priority order
+INDIAN_STATES = [
+    'andhra pradesh', 'arunachal pradesh', 'assam', 'bihar', 'chhattisgarh', 
+    'goa', 'gujarat', 'haryana', 'himachal pradesh', 'jharkhand', 'karnataka',
+    'kerala', 'madhya pradesh', 'maharashtra', 'manipur', 'meghalaya', 'mizoram',
+    'nagaland', 'odisha', 'punjab', 'rajasthan', 'sikkim', 'tamil nadu', 'telangana',
+    'tripura', 'uttar pradesh', 'uttarakhand', 'west bengal', 'andaman and nicobar',
+    'chandigarh', 'dadra and nagar haveli', 'daman and diu', 'delhi', 'jammu and kashmir',
+    'ladakh', 'lakshadweep', 'puducherry'
+]
+
+# Common state abbreviations, in match priority order
+STATE_ABBREVIATIONS = {
+    'ap': 'Andhra Pradesh', 'ar': 'Arunachal Pradesh', 'as': 'Assam',
+    'br': 'Bihar', 'cg': 'Chhattisgarh', 'ga': 'Goa', 'gj': 'Gujarat',
+    'hr': 'Haryana', 'hp': 'Himachal Pradesh', 'jh': 'Jharkhand',
+    'ka': 'Karnataka', 'kl': 'Kerala', 'mp': 'Madhya Pradesh',
+    'mh': 'Maharashtra', 'mn': 'Manipur', 'ml': 'Meghalaya',
+    'mz': 'Mizoram', 'nl': 'Nagaland', 'or': 'Odisha', 'pb': 'Punjab',
+    'rj': 'Rajasthan', 'sk': 'Sikkim', 'tn': 'Tamil Nadu', 'tg': 'Telangana',
+    'tr': 'Tripura', 'up': 'Uttar Pradesh', 'uk': 'Uttarakhand',
+    'wb': 'West Bengal', 'dl': 'Delhi', 'jk': 'Jammu and Kashmir',
+    'la': 'Ladakh', 'ch': 'Chandigarh', 'py': 'Puducherry'
+}
+
+# State names may appear anywhere (even inside other words); the lookahead reports
+# every candidate position so the highest-priority state can be chosen
+STATE_NAME_PATTERN = re.compile('(?=(' + '|'.join(re.escape(state) for state in INDIAN_STATES) + '))')
+# Abbreviations must stand alone: " ka " / start or end of string, or " ka,"
+STATE_ABBR_PATTERN = re.compile(
+    r'(?<![^ ])(' + '|'.join(STATE_ABBREVIATIONS) + r')(?![^ ])'
+    r'|(?<= )(' + '|'.join(STATE_ABBREVIATIONS) + r')(?=,)'
+)
+STATE_NAME_PRIORITY = {state: index for index, state in enumerate(INDIAN_STATES)}
+STATE_ABBR_PRIORITY = {abbr: index for index, abbr in enumerate(STATE_ABBREVIATIONS)}
+
+
+@lru_cache(maxsize=50000)
+def _match_state(location_str):
+    """Resolve a single location string (memoized, since addresses repeat across orders)"""
     location_lower = location_str.lower().strip()
     
     # First try direct state matching
-    for state in indian_states:
-        if state in location_lower:
-            return state.title()
-    
-    # Common state abbreviations
-    state_abbr = {
-        'ap': 'Andhra Pradesh', 'ar': 'Arunachal Pradesh', 'as': 'Assam',
-        'br': 'Bihar', 'cg': 'Chhattisgarh', 'ga': 'Goa', 'gj': 'Gujarat',
-        'hr': 'Haryana', 'hp': 'Himachal Pradesh', 'jh': 'Jharkhand',
-        'ka': 'Karnataka', 'kl': 'Kerala', 'mp': 'Madhya Pradesh',
-        'mh': 'Maharashtra', 'mn': 'Manipur', 'ml': 'Meghalaya',
-        'mz': 'Mizoram', 'nl': 'Nagaland', 'or': 'Odisha', 'pb': 'Punjab',
-        'rj': 'Rajasthan', 'sk': 'Sikkim', 'tn': 'Tamil Nadu', 'tg': 'Telangana',
-        'tr': 'Tripura', 'up': 'Uttar Pradesh', 'uk': 'Uttarakhand',
-        'wb': 'West Bengal', 'dl': 'Delhi', 'jk': 'Jammu and Kashmir',
-        'la': 'Ladakh', 'ch': 'Chandigarh', 'py': 'Puducherry'
-    }
+    names = STATE_NAME_PATTERN.findall(location_lower)
+    if names:
+        return min(names, key=STATE_NAME_PRIORITY.__getitem__).title()
     
     # Look for abbreviations with surrounding word boundaries
-    for abbr, state in state_abbr.items():
-        if f" {abbr} " in f" {location_lower} " or f" {abbr}," in location_lower:
-            return state
+    abbreviations = [standalone or before_comma for standalone, before_comma in STATE_ABBR_PATTERN.findall(location_lower)]
+    if abbreviations:
+        return STATE_ABBREVIATIONS[min(abbreviations, key=STATE_ABBR_PRIORITY.__getitem__)]
     
     # Return the original string if no match found
     return location_str
+
+def extract_state(location_str):
+    """Helper function to extract state information from addresses"""
+    # Skip empty or short values
+    if not isinstance(location_str, str) or len(location_str) < 3:
+        return location_str
+    return _match_state(location_str)
+
+def extract_states(locations):
+    """
+    Extract state information for a whole Series of locations at once
+    
+    Each distinct location is resolved a single time and the result is
+    broadcast back to the rows, so repeated addresses/pincodes cost one lookup.
+    
+    Args:
+        locations: pandas Series (object or categorical) of location strings
+        
+    Returns:
+        pandas Series: states aligned with the input index
+    """
+    if isinstance(locations.dtype, pd.CategoricalDtype):
+        codes, uniques = locations.cat.codes.to_numpy(), locations.cat.categories
+    else:
+        codes, uniques = pd.factorize(locations)
+    # Code -1 (missing value) picks the trailing NaN
+    resolved = np.array([extract_state(value) for value in uniques] + [np.nan], dtype=object)
+    return pd.Series(resolved[codes], index=locations.index, name=locations.name)
 def analyze_amazon_b2b_data(df, column_mapping):
     """
     Analyze Amazon B2B-specific sales data from GST reports
@@ -0,0 +1,528 @@
+"""
+Ingestion layer for uploaded sales files.
+
+Every reader of an uploaded CSV/Excel file goes through this module:
+
+* the CSV encoding, delimiter and header row are detected once from a small
+  sample instead of re-parsing the whole file for every guess;
+* once the column mapping is known, only the mapped columns are read, with
+  categorical dtypes for the text dimensions, optionally in chunks;
+* pyarrow is used as the CSV engine when it is installed, streaming the file
+  in record batches so progress can still be reported while it is read;
+* Excel workbooks are converted once to a Parquet copy next to the stored
+  file, so re-analysis of the same SalesDataFile never re-parses the xlsx.
+"""
+import csv
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .analysis_helper import detect_marketplace_format
+from .sales_engine import clean_column_name
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# pyarrow is optional: it provides the fast CSV engine and the Parquet cache for Excel files
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Number of CSV rows parsed per chunk
+CSV_CHUNK_SIZE = 50000
+
+# Bytes of CSV parsed per pyarrow record batch
+ARROW_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Number of rows read up front to identify the columns of a CSV file
+CSV_SAMPLE_ROWS = 5000
+
+# Column mapping keys whose columns are read as categoricals
+CATEGORICAL_MAPPING_KEYS = ['product_name', 'customer_location', 'sales_channel', 'transaction_type', 'product_category']
+
+# Columns kept in addition to the mapped ones (merged-file markers used by the metrics)
+EXTRA_COLUMNS = ['record_type', '__source_type__']
+
+# Suffix of the Parquet copy stored next to an Excel upload
+PARQUET_CACHE_SUFFIX = '.parquet'
+
+
+def normalize_column_names(df):
+    """Strip whitespace and newlines from column names (same cleanup the upload view always did)"""
+    df.columns = [str(col).strip().replace('\n', ' ') for col in df.columns]
+    return df
+
+
+def sniff_csv_file(file_path):
+    """
+    Detect delimiter, header row and encoding of a CSV file from a small sample
+
+    Returns:
+        tuple: (delimiter, has_header, encoding)
+    """
+    with open(file_path, 'rb') as f:
+        raw_sample = f.read(65536)
+
+    try:
+        raw_sample.decode('utf-8')
+        encoding = 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character may have been cut at the end of the sample
+        encoding = 'utf-8' if e.start >= len(raw_sample) - 4 else 'latin1'
+
+    sample = raw_sample[:4096].decode(encoding, errors='replace')
+    sniffer = csv.Sniffer()
+
+    try:
+        delimiter = sniffer.sniff(sample).delimiter
+        logger.info(f"Detected delimiter: '{delimiter}'")
+    except Exception:
+        delimiter = ','
+        logger.warning("Failed to detect delimiter, defaulting to comma")
+
+    # If the header row does not split with the sniffed delimiter, try the usual alternatives
+    first_line = sample.splitlines()[0] if sample else ''
+    if len(first_line.split(delimiter)) <= 1:
+        for candidate in [',', ';', '\t', '|']:
+            if len(first_line.split(candidate)) > 1:
+                logger.info(f"Using alternate delimiter: '{candidate}'")
+                delimiter = candidate
+                break
+
+    try:
+        has_header = sniffer.has_header(sample)
+    except Exception:
+        has_header = True
+        logger.warning("Failed to detect header, assuming it exists")
+
+    return delimiter, has_header, encoding
+
+
+def _csv_read_options(csv_format, usecols=None, dtype=None):
+    delimiter, has_header, encoding = csv_format
+    options = {
+        'delimiter': delimiter,
+        'header': 0 if has_header else None,
+        'on_bad_lines': 'skip',
+    }
+    if usecols is not None:
+        options['usecols'] = usecols
+    if dtype:
+        options['dtype'] = dtype
+    return options
+
+
+def read_csv_sample(file_path, csv_format=None, nrows=CSV_SAMPLE_ROWS):
+    """
+    Read the first rows of a CSV file (all columns) for column identification
+
+    Returns:
+        pandas DataFrame with the raw column names of the file
+    """
+    csv_format = csv_format or sniff_csv_file(file_path)
+    with open(file_path, 'r', encoding=csv_format[2], errors='replace', newline='') as f:
+        return pd.read_csv(f, nrows=nrows, **_csv_read_options(csv_format))
+
+
+def iter_csv_chunks(file_path, chunk_size=CSV_CHUNK_SIZE, usecols=None, dtype=None, csv_format=None):
+    """
+    Stream a CSV file in chunks
+
+    Yields:
+        tuple: (chunk DataFrame, fraction of the file consumed so far)
+    """
+    csv_format = csv_format or sniff_csv_file(file_path)
+    total_size = os.path.getsize(file_path) or 1
+
+    with open(file_path, 'r', encoding=csv_format[2], errors='replace', newline='') as f:
+        reader = pd.read_csv(f, chunksize=chunk_size, **_csv_read_options(csv_format, usecols, dtype))
+        for chunk in reader:
+            try:
+                fraction = min(f.buffer.tell() / total_size, 1.0)
+            except Exception:
+                fraction = 0.0
+            yield chunk, fraction
+
+
+def iter_arrow_csv_batches(file_path, usecols=None, dtype=None, csv_format=None, block_size=ARROW_BLOCK_SIZE):
+    """
+    Stream a CSV file in record batches with pyarrow's multi-threaded reader
+
+    Column types are inferred from the first batch; a later batch that does
+    not fit them raises pyarrow.ArrowInvalid. Files without a header row are
+    not supported (pyarrow names their columns differently from pandas).
+
+    Yields:
+        tuple: (chunk DataFrame, fraction of the file consumed so far)
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    delimiter, has_header, encoding = csv_format or sniff_csv_file(file_path)
+    if not has_header:
+        raise ValueError("pyarrow batches need a header row")
+    total_size = os.path.getsize(file_path) or 1
+    dtype = dtype or {}
+
+    with open(file_path, 'rb') as f:
+        reader = pa_csv.open_csv(
+            f,
+            read_options=pa_csv.ReadOptions(block_size=block_size, encoding=encoding),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter, invalid_row_handler=lambda row: 'skip'),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=usecols,
+                strings_can_be_null=True,
+                # Categorical columns are read as text, whatever the first batch looks like
+                column_types={col: pa.string() for col, kind in dtype.items() if kind == 'category'},
+            ),
+        )
+        # The reader reads ahead, so the position in the file says little; every batch is one block
+        for blocks, batch in enumerate(reader, start=1):
+            chunk = batch.to_pandas()
+            if dtype:
+                chunk = chunk.astype({col: kind for col, kind in dtype.items() if col in chunk.columns})
+            yield chunk, min(blocks * block_size / total_size, 1.0)
+
+
+def concat_chunks(chunks):
+    """Concatenate CSV chunks, keeping categorical columns categorical"""
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    categorical_columns = [col for col in chunks[0].columns
+                           if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)]
+    df = pd.concat(chunks, ignore_index=True)
+    for col in categorical_columns:
+        # Chunks carry different category sets, which pd.concat would turn into object
+        df[col] = union_categoricals([chunk[col] for chunk in chunks], ignore_order=True)
+    return df
+
+
+def read_csv_file(file_path, usecols=None, dtype=None, csv_format=None):
+    """
+    Read a whole CSV file in one pass, using the pyarrow engine when it is available
+
+    Returns:
+        pandas DataFrame with the raw column names of the file
+    """
+    csv_format = csv_format or sniff_csv_file(file_path)
+
+    if PYARROW_AVAILABLE:
+        try:
+            return pd.read_csv(file_path, engine='pyarrow', encoding=csv_format[2],
+                               **_csv_read_options(csv_format, usecols, dtype))
+        except Exception as e:
+            logger.warning(f"pyarrow CSV engine failed, falling back to the C engine: {e}")
+
+    return concat_chunks([chunk for chunk, _ in iter_csv_chunks(file_path, usecols=usecols, dtype=dtype,
+                                                                 csv_format=csv_format)])
+
+
+def _unnamed_count(df):
+    return sum(1 for col in df.columns if 'Unnamed:' in str(col))
+
+
+def read_excel_file(file_path, file_extension):
+    """
+    Read an Excel file, searching for the real header row/sheet when the
+    first row does not contain column names.
+
+    Returns:
+        pandas DataFrame
+    """
+    logger.info("Reading Excel file with openpyxl engine")
+
+    try:
+        df = pd.read_excel(file_path, engine='openpyxl')
+
+        # Unnamed columns usually mean the header isn't in the first row
+        unnamed_cols = _unnamed_count(df)
+
+        if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
+            logger.warning(f"Detected {unnamed_cols} unnamed columns, trying alternative header rows")
+
+            for header_row in range(1, 10):
+                try:
+                    temp_df = pd.read_excel(file_path, engine='openpyxl', header=header_row)
+                    temp_unnamed = _unnamed_count(temp_df)
+                    if temp_unnamed < unnamed_cols:
+                        logger.info(f"Found better header row at position {header_row}")
+                        df = temp_df
+                        unnamed_cols = temp_unnamed
+                        if unnamed_cols == 0:
+                            break
+                except Exception as e:
+                    logger.warning(f"Error trying header row {header_row}: {e}")
+
+            if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
+                for skiprows in range(1, 10):
+                    try:
+                        temp_df = pd.read_excel(file_path, engine='openpyxl', header=0, skiprows=skiprows)
+                        temp_unnamed = _unnamed_count(temp_df)
+                        if temp_unnamed < unnamed_cols:
+                            logger.info(f"Found better data skipping {skiprows} rows")
+                            df = temp_df
+                            unnamed_cols = temp_unnamed
+                            if unnamed_cols == 0:
+                                break
+                    except Exception as e:
+                        logger.warning(f"Error trying skiprows {skiprows}: {e}")
+
+        # The real data may be on another sheet
+        if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
+            logger.info("Checking if data is in another sheet")
+            import openpyxl
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            sheet_names = workbook.sheetnames
+            workbook.close()
+
+            if len(sheet_names) > 1:
+                for sheet_name in sheet_names:
+                    try:
+                        temp_df = pd.read_excel(file_path, engine='openpyxl', sheet_name=sheet_name)
+                        temp_unnamed = _unnamed_count(temp_df)
+                        if temp_unnamed < unnamed_cols and len(temp_df.columns) > 0:
+                            logger.info(f"Found better data in sheet '{sheet_name}'")
+                            df = temp_df
+                            unnamed_cols = temp_unnamed
+
+                            for header_row in range(1, 5):
+                                try:
+                                    sub_temp_df = pd.read_excel(file_path, engine='openpyxl',
+                                                                sheet_name=sheet_name, header=header_row)
+                                    if _unnamed_count(sub_temp_df) < temp_unnamed:
+                                        logger.info(f"Found better header in sheet '{sheet_name}' at row {header_row}")
+                                        df = sub_temp_df
+                                        break
+                                except Exception as e:
+                                    logger.warning(f"Error trying header row {header_row} in sheet '{sheet_name}': {e}")
+                    except Exception as e:
+                        logger.warning(f"Error reading sheet '{sheet_name}': {e}")
+
+        # If every column is still unnamed, use the first data row as header
+        all_unnamed = all('Unnamed:' in str(col) for col in df.columns)
+        if all_unnamed and len(df) > 0:
+            logger.info("All columns unnamed, creating generic column names")
+            first_row = df.iloc[0]
+            if not first_row.isna().all():
+                df.columns = [str(x).strip() if not pd.isna(x) else f"Column_{i}"
+                              for i, x in enumerate(first_row)]
+                df = df.iloc[1:].reset_index(drop=True)
+            else:
+                df.columns = [f"Column_{i}" for i in range(len(df.columns))]
+
+    except Exception as e:
+        logger.error(f"First attempt to read Excel file failed: {e}")
+
+        # Try with xlrd engine for xls files as fallback
+        if file_extension == '.xls':
+            logger.info("Attempting to read XLS with xlrd engine")
+            try:
+                df = pd.read_excel(file_path, engine='xlrd')
+            except Exception as e2:
+                logger.error(f"Second attempt to read Excel file failed: {e2}")
+                raise ValueError(f"Could not read Excel file: {e2}")
+        else:
+            raise ValueError(f"Could not read Excel file: {e}")
+
+    if df.empty or df.shape[1] == 0:
+        logger.error("Excel file resulted in empty DataFrame or no columns")
+        raise ValueError("Excel file has no data or no columns could be parsed")
+
+    return df
+
+
+def write_parquet(df, target):
+    """
+    Write a DataFrame as Parquet (requires pyarrow)
+
+    Parquet needs string column names and single-typed columns, so mixed object
+    columns are stored as strings.
+
+    Args:
+        df: pandas DataFrame
+        target: file path or binary buffer
+    """
+    parquet_df = df.copy(deep=False)
+    parquet_df.columns = [str(col) for col in parquet_df.columns]
+    for col in parquet_df.select_dtypes(include=['object']).columns:
+        parquet_df[col] = parquet_df[col].map(lambda x: x if pd.isna(x) else str(x))
+    parquet_df.to_parquet(target, index=False)
+
+
+def excel_cache_path(file_path):
+    """Location of the Parquet copy of an Excel upload"""
+    return f"{file_path}{PARQUET_CACHE_SUFFIX}"
+
+
+def read_excel_cached(file_path, file_extension):
+    """
+    Read an Excel file through its Parquet copy, creating the copy on first read
+
+    Only for stored SalesDataFile uploads: the copy is kept next to the file.
+    Without pyarrow this is the same as read_excel_file.
+
+    Returns:
+        pandas DataFrame
+    """
+    if not PYARROW_AVAILABLE:
+        return read_excel_file(file_path, file_extension)
+
+    cache_path = excel_cache_path(file_path)
+    try:
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+            logger.info(f"Reading cached Parquet copy of {file_path}")
+            return pd.read_parquet(cache_path)
+    except Exception as e:
+        logger.warning(f"Could not read Parquet copy {cache_path}: {e}")
+
+    df = read_excel_file(file_path, file_extension)
+    try:
+        write_parquet(df, cache_path)
+        logger.info(f"Stored Parquet copy of {file_path}")
+    except Exception as e:
+        logger.warning(f"Could not store Parquet copy of {file_path}: {e}")
+    return df
+
+
+def mapped_columns(column_mapping, columns):
+    """
+    Columns and dtypes to read once the column mapping is known
+
+    Marketplace reports (Amazon, Flipkart, Meesho) are read in full since the
+    platform-specific analyses use columns outside the mapping.
+
+    Args:
+        column_mapping: dictionary mapping column types to column names
+        columns: raw column names of the file
+
+    Returns:
+        tuple: (usecols list or None for all columns, dtype dictionary)
+    """
+    if not column_mapping or detect_marketplace_format(pd.DataFrame(columns=list(columns))):
+        return None, {}
+
+    by_clean_name = {}
+    for col in columns:
+        by_clean_name.setdefault(clean_column_name(col), col)
+
+    wanted = {}
+    for key, value in column_mapping.items():
+        if key.startswith('_') or not isinstance(value, str):
+            continue
+        col = by_clean_name.get(clean_column_name(value))
+        if col is not None:
+            wanted.setdefault(col, key)
+
+    if not wanted:
+        return None, {}
+
+    for col in columns:
+        col_str = str(col).lower()
+        # Status-like columns are still needed for transaction type detection
+        if col in EXTRA_COLUMNS or 'status' in col_str or 'state' in col_str or 'type' in col_str:
+            wanted.setdefault(col, None)
+
+    usecols = [col for col in columns if col in wanted]
+    dtype = {col: 'category' for col, key in wanted.items() if key in CATEGORICAL_MAPPING_KEYS}
+    return usecols, dtype
+
+
+def read_sales_file(file_path, file_extension, cache_excel=False):
+    """
+    Read a whole uploaded sales file into a DataFrame with normalized column names
+
+    Args:
+        file_path: path of the CSV/Excel file
+        file_extension: '.csv', '.xlsx' or '.xls'
+        cache_excel: read Excel files through their Parquet copy (stored
+            SalesDataFile uploads only, never temporary files)
+
+    Returns:
+        pandas DataFrame
+    """
+    if file_extension == '.csv':
+        df = read_csv_file(file_path)
+    elif file_extension in ['.xlsx', '.xls']:
+        df = read_excel_cached(file_path, file_extension) if cache_excel else read_excel_file(file_path, file_extension)
+    else:
+        raise ValueError(f"Unsupported file extension: {file_extension}")
+
+    return normalize_column_names(df)
+
+
+def load_mapped_sales_file(file_path, file_extension, resolve_mapping):
+    """
+    Read an uploaded sales file, parsing only the columns its mapping needs
+
+    Args:
+        file_path: path of the CSV/Excel file
+        file_extension: '.csv', '.xlsx' or '.xls'
+        resolve_mapping: callable returning the column mapping for a sample DataFrame
+
+    Returns:
+        tuple: (DataFrame, column_mapping, available_columns)
+    """
+    if file_extension != '.csv':
+        df = read_sales_file(file_path, file_extension)
+        return df, resolve_mapping(df), df.columns.tolist()
+
+    csv_format = sniff_csv_file(file_path)
+    sample = read_csv_sample(file_path, csv_format)
+    raw_columns = list(sample.columns)
+    normalize_column_names(sample)
+    column_mapping = resolve_mapping(sample)
+
+    usecols, dtype = mapped_columns(column_mapping, raw_columns)
+    df = normalize_column_names(read_csv_file(file_path, usecols=usecols, dtype=dtype, csv_format=csv_format))
+    return df, column_mapping, sample.columns.tolist()
+
+
+def _remove_excel_cache(file_path):
+    try:
+        os.unlink(excel_cache_path(file_path))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning(f"Failed to delete Parquet copy of temporary file: {file_path}")
+
+
+@contextmanager
+def uploaded_file_path(file_obj):
+    """
+    Path of an uploaded file on disk
+
+    Large uploads already live in a temporary file; small in-memory uploads are
+    written to one, which is removed afterwards. A Parquet copy written next to
+    the file (read_excel_cached) is removed as well.
+    """
+    if hasattr(file_obj, 'temporary_file_path'):
+        file_path = file_obj.temporary_file_path()
+        try:
+            yield file_path
+        finally:
+            _remove_excel_cache(file_path)
+        return
+
+    suffix = os.path.splitext(file_obj.name)[1].lower()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        for chunk in file_obj.chunks():
+            temp_file.write(chunk)
+        temp_file_path = temp_file.name
+    logger.info(f"Saved file temporarily to: {temp_file_path}")
+    try:
+        yield temp_file_path
+    finally:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            logger.warning(f"Failed to delete temporary file: {temp_file_path}")
+        _remove_excel_cache(temp_file_path)
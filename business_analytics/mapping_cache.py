@@ -0,0 +1,138 @@
+"""
+Persistent cache of column mappings keyed by header layout.
+
+Sellers upload the same marketplace report layout week after week, so the
+mapping produced by identify_columns_with_gemini is stored against a
+fingerprint of the normalized header row plus the detected platform. Repeat
+layouts are served from the database without calling Gemini or running the
+heuristic scan. The table is capped with least-recently-used eviction.
+"""
+import hashlib
+import json
+import logging
+import traceback
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ColumnMappingCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Maximum number of layouts kept; the least recently used ones are evicted beyond this
+MAX_CACHED_LAYOUTS = 500
+
+# Counter keys in the Django cache (shared across workers when a shared backend is configured)
+HITS_KEY = 'business_analytics:column_mapping_cache:hits'
+MISSES_KEY = 'business_analytics:column_mapping_cache:misses'
+
+# Mapping keys describing the data of one file rather than its layout; never cached
+FILE_SPECIFIC_KEYS = ('_warnings', '_data_type_warnings')
+
+
+def normalize_header(columns):
+    """
+    Normalize a header row the same way clean_dataframe does
+
+    Case is kept: cached mappings name the cleaned columns, so layouts that
+    only differ in case need their own entries.
+    """
+    return [str(col).strip().replace(' ', '_').replace('\n', '_').replace('-', '_') for col in columns]
+
+
+def header_fingerprint(columns, platform_type=None):
+    """
+    Fingerprint of a header layout
+
+    Args:
+        columns: column names of the uploaded file
+        platform_type: result of detect_marketplace_format for the file
+
+    Returns:
+        str: hex SHA-256 digest
+    """
+    payload = json.dumps({"columns": normalize_header(columns), "platform": platform_type or ""})
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _layout_mapping(column_mapping):
+    return {key: value for key, value in column_mapping.items() if key not in FILE_SPECIFIC_KEYS}
+
+
+def _increment(key):
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Could not update column mapping cache counter {key}: {e}")
+
+
+def get_cached_mapping(columns, platform_type=None):
+    """
+    Look up the column mapping for a header layout
+
+    Returns:
+        dict: the cached column mapping, or None on a miss
+    """
+    fingerprint = header_fingerprint(columns, platform_type)
+    try:
+        entry = ColumnMappingCache.objects.filter(fingerprint=fingerprint).only('id', 'column_mapping').first()
+        if entry is None:
+            _increment(MISSES_KEY)
+            return None
+        ColumnMappingCache.objects.filter(id=entry.id).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now()
+        )
+        _increment(HITS_KEY)
+        logger.info(f"Column mapping cache hit for layout {fingerprint[:12]} ({platform_type or 'generic'})")
+        # Entries stored before FILE_SPECIFIC_KEYS were stripped may still carry them
+        return _layout_mapping(entry.column_mapping)
+    except Exception as e:
+        logger.error(f"Error reading column mapping cache: {e}")
+        logger.error(traceback.format_exc())
+        return None
+
+
+def store_mapping(columns, platform_type, column_mapping):
+    """Remember the column mapping for a header layout and evict the least recently used layouts"""
+    fingerprint = header_fingerprint(columns, platform_type)
+    try:
+        # Round-trip through JSON so only serializable values are stored
+        mapping = json.loads(json.dumps(_layout_mapping(column_mapping), default=str))
+        ColumnMappingCache.objects.update_or_create(
+            fingerprint=fingerprint,
+            defaults={
+                "platform_type": platform_type,
+                "columns": normalize_header(columns),
+                "column_mapping": mapping,
+                "last_used_at": timezone.now(),
+            }
+        )
+        stale_ids = list(
+            ColumnMappingCache.objects.order_by('-last_used_at')
+            .values_list('id', flat=True)[MAX_CACHED_LAYOUTS:]
+        )
+        if stale_ids:
+            ColumnMappingCache.objects.filter(id__in=stale_ids).delete()
+            logger.info(f"Evicted {len(stale_ids)} least recently used column mapping layouts")
+    except Exception as e:
+        logger.error(f"Error storing column mapping in cache: {e}")
+        logger.error(traceback.format_exc())
+
+
+def get_cache_stats():
+    """Hit/miss counters and size of the column mapping cache"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round((hits / lookups) * 100, 2) if lookups else 0,
+        "cached_layouts": ColumnMappingCache.objects.count(),
+        "max_layouts": MAX_CACHED_LAYOUTS,
+        "total_entry_hits": ColumnMappingCache.objects.aggregate(total=Sum('hit_count'))['total'] or 0,
+    }
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_analytics', '0003_auto_20250601_1910'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesanalysisresult',
+            name='progress',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salesanalysisresult',
+            name='rows_processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salesanalysisresult',
+            name='task_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
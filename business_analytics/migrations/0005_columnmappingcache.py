@@ -0,0 +1,27 @@
+# Generated by Django 4.2.20 on 2026-10-17 11:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_analytics', '0004_salesanalysisresult_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnMappingCache',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('platform_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('columns', models.JSONField(default=list)),
+                ('column_mapping', models.JSONField()),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.20 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_analytics', '0005_columnmappingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesdatafile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='salesdatafile',
+            name='snapshot',
+            field=models.FileField(blank=True, null=True, upload_to='sales_data/snapshots/'),
+        ),
+        migrations.AddField(
+            model_name='salesdatafile',
+            name='snapshot_column_mapping',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='salesdatafile',
+            name='snapshot_columns',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='salesdatafile',
+            name='snapshot_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -29,6 +29,11 @@ class SalesDataFile(models.Model):
     file_name = models.CharField(max_length=255)
     file_type = models.CharField(max_length=50)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)  # SHA-256 of the raw upload
+    snapshot = models.FileField(upload_to='sales_data/snapshots/', blank=True, null=True)  # Parsed, typed data as Parquet
+    snapshot_columns = models.JSONField(blank=True, null=True)  # Columns stored in the snapshot
+    snapshot_column_mapping = models.JSONField(blank=True, null=True)  # Mapping the snapshot columns were typed with
+    snapshot_created_at = models.DateTimeField(blank=True, null=True)
     
     def __str__(self):
         return f"{self.file_name} ({self.id})"
@@ -44,6 +49,9 @@ class SalesAnalysisResult(models.Model):
     column_mappings = models.JSONField(blank=True, null=True)  # Store the detected column mappings
     analysis_data = models.JSONField(blank=True, null=True)  # Store the analysis results
     platform_type = models.CharField(max_length=50, blank=True, null=True)  # Store the marketplace platform type (Amazon, Flipkart, Meesho)
+    progress = models.IntegerField(default=0)  # Percentage of the background analysis completed (0-100)
+    rows_processed = models.IntegerField(default=0)  # Number of data rows read so far by the background task
+    task_id = models.CharField(max_length=255, blank=True, null=True)  # Celery task id of the background analysis
     
     def __str__(self):
         return f"Analysis for {self.sales_data_file.file_name} ({self.status})"
@@ -76,3 +84,17 @@ class SalesAnalysisResult(models.Model):
                 logger.error(f"Error converting analysis_data to JSON: {e}")
                 return "{}"
         return "{}"
+
+class ColumnMappingCache(models.Model):
+    """Column mappings remembered per header layout, so repeat report formats skip AI/heuristic identification"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    fingerprint = models.CharField(max_length=64, unique=True)  # SHA-256 of the normalized header row + detected platform
+    platform_type = models.CharField(max_length=50, blank=True, null=True)  # Result of detect_marketplace_format for the layout
+    columns = models.JSONField(default=list)  # Normalized header row the mapping was computed for
+    column_mapping = models.JSONField()
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)  # Drives LRU eviction
+    
+    def __str__(self):
+        return f"Column mapping for {self.platform_type or 'generic'} layout ({self.fingerprint[:12]})"
@@ -0,0 +1,334 @@
+"""
+Background processing pipeline for uploaded sales data files.
+
+The upload view only stores the file and creates a SalesAnalysisResult in
+'processing' state; everything in this module runs afterwards (normally inside
+the Celery task in tasks.py). Files are read through the ingestion layer in
+ingestion.py: the columns of a CSV file are identified on a sample, a preview
+analysis of that sample is stored so the dashboard has something to show early,
+and then only the mapped columns are read, reporting progress along the way.
+"""
+import logging
+import os
+import traceback
+
+from django.utils import timezone
+
+from .models import SalesAnalysisResult, ensure_json_serializable
+from .analysis_helper import identify_columns_with_gemini, analyze_sales_data, analyze_platform_data, clean_dataframe
+from .ingestion import (
+    PYARROW_AVAILABLE, concat_chunks, iter_arrow_csv_batches, iter_csv_chunks, mapped_columns,
+    normalize_column_names, read_csv_sample, read_excel_file, read_sales_file, sniff_csv_file,
+)
+from .snapshots import load_snapshot, snapshot_covers, snapshot_source, store_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Progress checkpoints (percent) for the different pipeline stages
+PROGRESS_STARTED = 5
+PROGRESS_READ_DONE = 80
+PROGRESS_ANALYSIS_DONE = 100
+
+
+def update_progress(analysis_id, progress, **fields):
+    """
+    Update the progress of an analysis without touching its JSON payloads.
+
+    Uses a queryset update so that frequent progress writes from the chunk loop
+    do not re-serialize analysis_data every time.
+    """
+    fields['progress'] = max(0, min(int(progress), 100))
+    fields['updated_at'] = timezone.now()
+    SalesAnalysisResult.objects.filter(pk=analysis_id).update(**fields)
+
+
+def build_column_mapping(df, manual_column_mapping=None, file_extension=None):
+    """
+    Identify columns and collect the issues that should be shown to the user
+
+    Returns:
+        tuple: (column_mapping, column_mapping_issues)
+    """
+    logger.info("Starting column identification with Gemini")
+    column_mapping = identify_columns_with_gemini(df, platform_type=None)
+    logger.info(f"Column mapping result: {column_mapping}")
+
+    # Manual mapping always overrides the automatic one
+    if manual_column_mapping:
+        for key, value in manual_column_mapping.items():
+            if value:
+                column_mapping[key] = value
+                logger.info(f"Manual override for {key}: {value}")
+
+    return column_mapping, collect_mapping_issues(column_mapping, df, file_extension)
+
+
+def collect_mapping_issues(column_mapping, df, file_extension=None):
+    """
+    Issues with a column mapping that should be shown to the user
+
+    Returns:
+        list: issue messages
+    """
+    column_mapping_issues = []
+    if '_warnings' in column_mapping:
+        column_mapping_issues.extend(column_mapping['_warnings'])
+    if '_data_type_warnings' in column_mapping:
+        column_mapping_issues.extend(column_mapping['_data_type_warnings'])
+
+    if not column_mapping.get('sales_amount'):
+        column_mapping_issues.append("Sales amount column could not be identified. Analysis may be limited.")
+    if not column_mapping.get('order_date'):
+        column_mapping_issues.append("Order date column could not be identified. Time-based analysis will be unavailable.")
+    if not column_mapping.get('product_name'):
+        column_mapping_issues.append("Product name/ID column could not be identified. Product-based analysis will be unavailable.")
+
+    unnamed_cols = sum(1 for col in df.columns if 'Unnamed:' in str(col) or 'Column_' in str(col))
+    if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
+        column_mapping_issues.append("Your Excel file contains unnamed columns. Consider adding header row with descriptive column names.")
+        logger.warning("Excel file contains mostly unnamed columns")
+        if file_extension in ['.xlsx', '.xls']:
+            column_mapping_issues.append("Try ensuring the first row contains headers and there are no merged cells or blank rows at the top.")
+
+    if column_mapping_issues:
+        logger.warning(f"Column mapping issues: {column_mapping_issues}")
+        if len(df.columns) <= 5:
+            column_mapping_issues.append(f"Your file contains only {len(df.columns)} columns. Please use the Advanced Options to manually map columns.")
+
+    return column_mapping_issues
+
+
+def _run_analysis(df, column_mapping, column_mapping_issues, available_columns=None):
+    """
+    Run analyze_sales_data and attach the mapping issues and available columns
+
+    available_columns is the full header of the file, which can be wider than df
+    when only the mapped columns were read.
+    """
+    available_columns = list(available_columns) if available_columns is not None else df.columns.tolist()
+    try:
+        analysis_data = analyze_sales_data(df, column_mapping, platform_type=None)
+        analysis_data.setdefault('summary', {})['column_count'] = len(available_columns)
+    except Exception as analysis_error:
+        logger.error(f"Error in data analysis: {analysis_error}")
+        logger.error(traceback.format_exc())
+        analysis_data = {
+            "summary": {
+                "error": f"Analysis error: {str(analysis_error)}",
+                "row_count": len(df),
+                "column_count": len(available_columns),
+            }
+        }
+
+    if column_mapping_issues:
+        analysis_data.setdefault('summary', {})['column_mapping_issues'] = column_mapping_issues
+    analysis_data['available_columns'] = available_columns
+    return analysis_data
+
+
+def _store_preview(analysis_id, df, column_mapping, column_mapping_issues):
+    """Store a partial analysis computed from the first rows so pollers can render early results"""
+    preview = _run_analysis(df, column_mapping, column_mapping_issues)
+    preview.setdefault('summary', {})['is_partial'] = True
+    SalesAnalysisResult.objects.filter(pk=analysis_id).update(
+        column_mappings=ensure_json_serializable(column_mapping),
+        analysis_data=ensure_json_serializable(preview),
+        updated_at=timezone.now()
+    )
+
+
+def _read_chunks(analysis_id, chunks_with_fraction):
+    chunks = []
+    rows_processed = 0
+    for chunk, fraction in chunks_with_fraction:
+        chunks.append(chunk)
+        rows_processed += len(chunk)
+        progress = PROGRESS_STARTED + fraction * (PROGRESS_READ_DONE - PROGRESS_STARTED)
+        update_progress(analysis_id, progress, rows_processed=rows_processed)
+    return concat_chunks(chunks)
+
+
+def _read_mapped_csv(analysis_id, file_path, csv_format, usecols, dtype):
+    """
+    Read the mapped columns of a CSV file, reporting progress as it goes
+
+    The file is streamed in pyarrow record batches when pyarrow is available,
+    or in pandas chunks otherwise (or when pyarrow cannot parse it), and
+    progress is published after every batch.
+    """
+    if PYARROW_AVAILABLE and csv_format[1]:
+        try:
+            return _read_chunks(analysis_id, iter_arrow_csv_batches(file_path, usecols=usecols, dtype=dtype,
+                                                                    csv_format=csv_format))
+        except Exception as e:
+            logger.warning(f"pyarrow CSV reader failed, falling back to the C engine: {e}")
+
+    return _read_chunks(analysis_id, iter_csv_chunks(file_path, usecols=usecols, dtype=dtype, csv_format=csv_format))
+
+
+def load_sales_dataframe(analysis_id, file_path, file_extension, manual_column_mapping=None):
+    """
+    Read the uploaded file, reporting progress as it goes
+
+    The columns are identified on a sample first, so that only the mapped
+    columns have to be parsed from the full file.
+
+    Returns:
+        tuple: (DataFrame, column_mapping, column_mapping_issues, available_columns)
+    """
+    if file_extension == '.csv':
+        csv_format = sniff_csv_file(file_path)
+        sample = read_csv_sample(file_path, csv_format)
+        raw_columns = list(sample.columns)
+        normalize_column_names(sample)
+        if sample.shape[1] == 0:
+            raise ValueError("CSV file has no columns to parse")
+
+        # Identify columns once, on the sample, and publish a preview
+        column_mapping, column_mapping_issues = build_column_mapping(sample, manual_column_mapping, file_extension)
+        _store_preview(analysis_id, sample, column_mapping, column_mapping_issues)
+        available_columns = sample.columns.tolist()
+
+        usecols, dtype = mapped_columns(column_mapping, raw_columns)
+        if usecols:
+            logger.info(f"Reading {len(usecols)} of {len(raw_columns)} columns: {usecols}")
+        df = normalize_column_names(_read_mapped_csv(analysis_id, file_path, csv_format, usecols, dtype))
+
+        if df.empty:
+            raise ValueError("CSV file has no data")
+
+    elif file_extension in ['.xlsx', '.xls']:
+        # Not read through the Excel Parquet copy: the snapshot stored after this read holds every column
+        df = normalize_column_names(read_excel_file(file_path, file_extension))
+        column_mapping, column_mapping_issues = build_column_mapping(df, manual_column_mapping, file_extension)
+        available_columns = df.columns.tolist()
+        update_progress(analysis_id, PROGRESS_READ_DONE, rows_processed=len(df))
+
+    else:
+        raise ValueError(f"Unsupported file extension: {file_extension}")
+
+    logger.info(f"Successfully read file with shape: {df.shape}")
+    return df, column_mapping, column_mapping_issues, available_columns
+
+
+def load_from_snapshot(analysis_id, sales_file, manual_column_mapping=None):
+    """
+    Load the data of sales_file from its Parquet snapshot instead of the raw upload
+
+    The mapping stored with the snapshot is reused, with manual overrides
+    applied on top.
+
+    Returns:
+        tuple: (DataFrame, column_mapping, column_mapping_issues, available_columns),
+            or None when there is no snapshot holding every mapped column
+    """
+    source = snapshot_source(sales_file)
+    if source is None:
+        return None
+
+    column_mapping = dict(source.snapshot_column_mapping or {})
+    for key, value in (manual_column_mapping or {}).items():
+        if value:
+            column_mapping[key] = value
+    if not column_mapping or not snapshot_covers(source, column_mapping):
+        logger.info(f"Snapshot of {source.file_name} does not cover the column mapping, reading the upload")
+        return None
+
+    df = load_snapshot(source)
+    if df is None:
+        return None
+
+    file_extension = os.path.splitext(sales_file.file_name)[1].lower()
+    column_mapping_issues = collect_mapping_issues(column_mapping, df, file_extension)
+    update_progress(analysis_id, PROGRESS_READ_DONE, rows_processed=len(df))
+    return df, column_mapping, column_mapping_issues, source.snapshot_columns or df.columns.tolist()
+
+
+def reanalyze_platform(analysis_result, platform_type):
+    """
+    Recompute only the platform-specific section of a completed analysis
+
+    The dashboard aggregates do not depend on the platform, so they are kept
+    as stored and only analyze_platform_data is re-run, on the snapshot when
+    one exists.
+
+    Returns:
+        SalesAnalysisResult: the updated analysis
+    """
+    sales_file = analysis_result.sales_data_file
+    source = snapshot_source(sales_file)
+    df = load_snapshot(source) if source is not None else None
+    if df is None:
+        file_extension = os.path.splitext(sales_file.file_name)[1].lower()
+        df = read_sales_file(sales_file.file.path, file_extension, cache_excel=True)
+
+    column_mapping = dict(analysis_result.column_mappings or {})
+    platform_specific = analyze_platform_data(clean_dataframe(df), column_mapping, platform_type)
+
+    analysis_data = dict(analysis_result.analysis_data or {})
+    analysis_data['platform_specific'] = platform_specific
+    analysis_result.analysis_data = analysis_data
+    analysis_result.platform_type = platform_type
+    analysis_result.save()
+    return analysis_result
+
+
+def run_sales_analysis(analysis_id, manual_column_mapping=None, task_id=None):
+    """
+    Full analysis of an uploaded sales file, updating the SalesAnalysisResult as it goes
+
+    Args:
+        analysis_id: primary key of the SalesAnalysisResult to fill in
+        manual_column_mapping: optional mapping overrides submitted with the upload
+        task_id: optional Celery task id, stored for reference
+
+    Returns:
+        dict: status information about the run
+    """
+    analysis_result = SalesAnalysisResult.objects.select_related('sales_data_file').get(pk=analysis_id)
+    sales_file = analysis_result.sales_data_file
+    file_extension = os.path.splitext(sales_file.file_name)[1].lower()
+
+    fields = {'status': 'processing'}
+    if task_id:
+        fields['task_id'] = task_id
+    update_progress(analysis_id, PROGRESS_STARTED, **fields)
+
+    try:
+        loaded = load_from_snapshot(analysis_id, sales_file, manual_column_mapping)
+        if loaded is not None:
+            df, column_mapping, column_mapping_issues, available_columns = loaded
+        else:
+            df, column_mapping, column_mapping_issues, available_columns = load_sales_dataframe(
+                analysis_id, sales_file.file.path, file_extension, manual_column_mapping
+            )
+            store_snapshot(sales_file, df, column_mapping, available_columns)
+
+        if df.shape[0] < 5:
+            logger.warning(f"File contains very few records: {df.shape[0]} (minimum 5 recommended)")
+            column_mapping_issues.append(f"File contains only {df.shape[0]} records. Analysis results may be limited.")
+
+        logger.info("Starting data analysis with pandas")
+        analysis_data = _run_analysis(df, column_mapping, column_mapping_issues, available_columns)
+
+        analysis_result.refresh_from_db()
+        analysis_result.column_mappings = column_mapping
+        analysis_result.analysis_data = analysis_data
+        analysis_result.rows_processed = len(df)
+        analysis_result.progress = PROGRESS_ANALYSIS_DONE
+        analysis_result.status = 'completed'
+        analysis_result.save()
+
+        logger.info(f"Analysis {analysis_id} completed and saved to database")
+        return {"success": True, "analysis_id": str(analysis_id), "rows": len(df)}
+
+    except Exception as e:
+        logger.error(f"Error analyzing file {sales_file.file_name}: {e}")
+        logger.error(traceback.format_exc())
+        SalesAnalysisResult.objects.filter(pk=analysis_id).update(
+            status='failed',
+            error_message=str(e),
+            updated_at=timezone.now()
+        )
+        return {"success": False, "analysis_id": str(analysis_id), "error": str(e)}
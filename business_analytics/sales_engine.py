@@ -0,0 +1,829 @@
+"""
+Single-pass aggregation engine for the sales dashboard.
+
+The mapped columns of an uploaded report are normalized once into a typed,
+columnar frame (float64 amounts, datetime64 dates, categoricals for product,
+region, channel and status). Every dashboard aggregate is then computed from
+that frame with vectorized group-bys over the categorical codes, instead of
+copying and re-coercing the source DataFrame for each section of the analysis.
+"""
+import logging
+import traceback
+
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# column_mapping key -> column name in the typed frame
+NUMERIC_FIELDS = {
+    'sales_amount': 'amount',
+    'quantity': 'quantity',
+    'unit_price': 'unit_price',
+}
+CATEGORICAL_FIELDS = {
+    'product_name': 'product',
+    'customer_location': 'region',
+    'sales_channel': 'channel',
+    'transaction_type': 'status',
+}
+
+# Keyword groups used to classify transaction statuses on the dashboard
+CANCEL_KEYWORDS = ('cancel',)
+REPLACE_KEYWORDS = ('replace', 'exchange')
+RETURN_KEYWORDS = ('return', 'refund', 'money back', 'chargeback')
+
+# Keyword groups used by the headline metrics (compute_sales_metrics)
+METRICS_CANCEL_KEYWORDS = ('cancel', 'cxl')
+METRICS_RETURN_KEYWORDS = ('return', 'refund', 'rto')
+
+# Values that identify a status column when transaction_type is not mapped
+STATUS_DETECTION_KEYWORDS = ['complete', 'shipment', 'shipped', 'refund', 'refunded', 'cancel',
+                             'return', 'ship', 'deliver', 'process', 'pending']
+
+
+def clean_column_name(name):
+    """Same normalization clean_dataframe applies to column names"""
+    return str(name).strip().replace(' ', '_').replace('\n', '_').replace('-', '_')
+
+
+def _to_float64(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype('float64')
+    return pd.to_numeric(series, errors='coerce').astype('float64')
+
+
+def _to_datetime64(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _to_category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    return series.astype('category')
+
+
+def _category_flags(status, keywords):
+    """
+    Boolean row mask for statuses containing any of the keywords.
+
+    The keyword scan runs once per distinct status (category), and is then
+    broadcast to the rows through the category codes.
+    """
+    labels = status.cat.categories.astype(str).str.lower()
+    per_category = np.array([any(kw in label for kw in keywords) for label in labels] + [False])
+    # Code -1 (missing value) indexes the trailing False
+    return per_category[status.cat.codes.to_numpy()]
+
+
+class TypedSalesFrame:
+    """
+    Typed, columnar view over the mapped columns of a sales DataFrame.
+
+    Attributes:
+        frame: DataFrame with canonical columns (amount, quantity, unit_price,
+            order_date, product, region, channel, status, record_type)
+        source_columns: canonical column -> column name in the source DataFrame
+        detected_columns: canonical columns found by detection rather than the mapping
+        warnings: conversion warnings to surface in the analysis summary
+        row_count / column_count: shape of the source DataFrame
+    """
+
+    def __init__(self, frame, source_columns, warnings, row_count, column_count, detected_columns=()):
+        self.frame = frame
+        self.source_columns = source_columns
+        self.detected_columns = set(detected_columns)
+        self.warnings = warnings
+        self.row_count = row_count
+        self.column_count = column_count
+
+    def has(self, column):
+        return column in self.frame.columns
+
+    def __len__(self):
+        return self.row_count
+
+
+def resolve_column(df, name, _lookup=None):
+    """
+    Find a mapped column in df, accepting both the raw and the cleaned name.
+
+    Column mappings come from identify_columns_with_gemini, which works on
+    cleaned names (spaces replaced by underscores), while callers may pass the
+    raw upload.
+    """
+    if not name:
+        return None
+    if name in df.columns:
+        return name
+    lookup = _lookup if _lookup is not None else {clean_column_name(col): col for col in df.columns}
+    return lookup.get(clean_column_name(name))
+
+
+def detect_transaction_type_column(df):
+    """Find a status-like column when transaction_type is not mapped"""
+    for col in df.columns:
+        col_str = str(col).lower()
+        if ('status' in col_str or 'state' in col_str or 'type' in col_str) and col_str not in ('state', 'type'):
+            unique_vals = pd.Series(df[col].dropna().unique()).astype(str).str.lower()
+            if any(any(keyword in val for keyword in STATUS_DETECTION_KEYWORDS) for val in unique_vals):
+                logger.info(f"Auto-detected transaction type column: {col}")
+                return col
+    return None
+
+
+def build_typed_frame(df, column_mapping, detect_transaction_type=True):
+    """
+    Normalize the mapped columns of df once into a TypedSalesFrame
+
+    Args:
+        df: pandas DataFrame containing the sales data (raw or cleaned column names)
+        column_mapping: dictionary mapping column types to actual column names
+        detect_transaction_type: look for a status column when none is mapped
+
+    Returns:
+        TypedSalesFrame
+    """
+    lookup = {clean_column_name(col): col for col in df.columns}
+    data = {}
+    source_columns = {}
+    warnings = []
+    row_count = len(df)
+
+    for key, target in NUMERIC_FIELDS.items():
+        col = resolve_column(df, column_mapping.get(key), lookup)
+        if col is None:
+            continue
+        try:
+            values = _to_float64(df[col])
+            valid_count = int(values.notna().sum())
+            logger.info(f"Converted {valid_count}/{row_count} values of '{col}' to numeric")
+            if key == 'sales_amount' and row_count and valid_count < 0.5 * row_count:
+                logger.warning(f"Sales column conversion failed for most values")
+                warnings.append(f"Could not convert sales column '{col}' to numeric")
+            data[target] = values
+            source_columns[target] = col
+        except Exception as e:
+            logger.error(f"Error converting column '{col}' to numeric: {e}")
+            if key == 'sales_amount':
+                warnings.append(f"Error converting sales column: {str(e)}")
+
+    date_col = resolve_column(df, column_mapping.get('order_date'), lookup)
+    if date_col is not None:
+        try:
+            dates = _to_datetime64(df[date_col])
+            valid_date_count = int(dates.notna().sum())
+            logger.info(f"Converted {valid_date_count}/{row_count} date values to datetime")
+            if row_count and valid_date_count < 0.5 * row_count:
+                logger.warning(f"Date column conversion failed for most values")
+                warnings.append(f"Could not convert date column '{date_col}' to datetime")
+            else:
+                data['order_date'] = dates
+                source_columns['order_date'] = date_col
+        except Exception as e:
+            logger.error(f"Error converting date column to datetime: {e}")
+            warnings.append(f"Error converting date column: {str(e)}")
+
+    detected_columns = []
+    status_source = column_mapping.get('transaction_type')
+    if not resolve_column(df, status_source, lookup) and detect_transaction_type:
+        status_source = detect_transaction_type_column(df)
+        if status_source is not None:
+            detected_columns.append('status')
+
+    for key, target in CATEGORICAL_FIELDS.items():
+        source = status_source if key == 'transaction_type' else column_mapping.get(key)
+        col = resolve_column(df, source, lookup)
+        if col is None:
+            continue
+        data[target] = _to_category(df[col])
+        source_columns[target] = col
+
+    # Merged Meesho files carry the origin of each row
+    record_col = 'record_type' if 'record_type' in df.columns else (
+        '__source_type__' if '__source_type__' in df.columns else None)
+    if record_col:
+        data['record_type'] = _to_category(df[record_col])
+        source_columns['record_type'] = record_col
+        for col in df.columns:
+            col_str = str(col).lower()
+            if 'status' in col_str or 'state' in col_str:
+                data['record_status'] = _to_category(df[col])
+                source_columns['record_status'] = col
+                break
+
+    frame = pd.DataFrame(data, index=df.index)
+    return TypedSalesFrame(frame, source_columns, warnings, row_count, len(df.columns), detected_columns)
+
+
+def _grouped_totals(categories, amounts):
+    """
+    Sum and count of amounts per category in one vectorized pass over the category codes
+
+    Returns:
+        DataFrame with columns name, value, transaction_count (only groups that occur)
+    """
+    valid = (categories.cat.codes >= 0) & amounts.notna()
+    totals = amounts[valid].groupby(categories.cat.codes[valid], sort=True).agg(['sum', 'count'])
+    return pd.DataFrame({
+        'name': np.asarray(categories.cat.categories)[totals.index.to_numpy()],
+        'value': totals['sum'].to_numpy(),
+        'transaction_count': totals['count'].to_numpy(),
+    })
+
+
+def _truncate(value, length):
+    text = str(value)
+    return text[:length] + ('...' if len(text) > length else '')
+
+
+def _add_warning(analysis, message):
+    analysis["summary"]["warnings"] = analysis["summary"].get("warnings", []) + [message]
+
+
+def _analyze_orders(analysis, frame):
+    """Order counts, issue values and rates from the status column"""
+    total_orders = len(frame)
+    analysis["order_metrics"] = {
+        "total_orders": total_orders,
+        "regular_orders": total_orders,
+        "cancelled_orders": 0,
+        "returned_orders": 0,
+        "replaced_orders": 0,
+        "refunded_orders": 0
+    }
+    if 'status' not in frame.columns:
+        return
+
+    status = frame['status']
+    cancelled_mask = _category_flags(status, CANCEL_KEYWORDS)
+    replaced_mask = _category_flags(status, REPLACE_KEYWORDS)
+    returned_mask = _category_flags(status, RETURN_KEYWORDS)
+
+    cancelled_count = int(cancelled_mask.sum())
+    replaced_count = int(replaced_mask.sum())
+    returned_count = int(returned_mask.sum())
+    # Returns and refunds are treated as the same thing
+    refunded_count = 0
+    regular_count = int((~(cancelled_mask | replaced_mask | returned_mask)).sum())
+
+    order_metrics = analysis["order_metrics"]
+    order_metrics.update({
+        "total_orders": total_orders,
+        "regular_orders": regular_count,
+        "cancelled_orders": cancelled_count,
+        "replaced_orders": replaced_count,
+        "refunded_orders": refunded_count,
+        "returned_orders": returned_count,
+    })
+
+    if 'amount' in frame.columns:
+        amounts = frame['amount'].to_numpy()
+        if cancelled_count > 0:
+            order_metrics["cancelled_value"] = float(np.nansum(amounts[cancelled_mask]))
+        if replaced_count > 0:
+            order_metrics["replaced_value"] = float(np.nansum(amounts[replaced_mask]))
+        if returned_count > 0:
+            order_metrics["returned_value"] = float(np.nansum(amounts[returned_mask]))
+
+        if total_orders > 0:
+            successful_orders = total_orders - cancelled_count
+            order_metrics["cancellation_rate"] = float(round((cancelled_count / total_orders) * 100, 2))
+            if successful_orders > 0:
+                order_metrics["replacement_rate"] = float(round((replaced_count / successful_orders) * 100, 2))
+                order_metrics["refund_rate"] = float(round((refunded_count / successful_orders) * 100, 2))
+                order_metrics["return_rate"] = float(round((returned_count / successful_orders) * 100, 2))
+                problem_order_count = replaced_count + refunded_count + returned_count
+                order_metrics["issue_rate"] = float(round((problem_order_count / successful_orders) * 100, 2))
+
+        analysis["summary"]["total_return_amount"] = float(np.nansum(amounts[returned_mask]))
+        analysis["summary"]["total_replacements"] = replaced_count
+
+    for key in ("return_rate", "cancellation_rate", "issue_rate"):
+        if key in order_metrics:
+            analysis["summary"][key] = order_metrics[key]
+
+    # Transaction type distribution (top 5), counted per lower-cased status
+    counts = status.value_counts(dropna=False)
+    counts.index = ['nan' if pd.isna(label) else str(label).lower() for label in counts.index]
+    counts = counts.groupby(level=0, sort=False).sum().sort_values(ascending=False)
+    analysis["transaction_types"] = [
+        {
+            "name": label,
+            "count": int(count),
+            "percentage": float(round((count / total_orders) * 100, 2)) if total_orders else 0
+        }
+        for label, count in counts.head(5).items()
+    ]
+
+    logger.info(f"Order metrics - Regular: {regular_count}, Cancelled: {cancelled_count}, "
+                f"Replaced: {replaced_count}, Returned: {returned_count}")
+
+
+def _period_grouping(date_range):
+    """Pick the time bucket for the sales time series from the date span"""
+    if date_range > 365 * 2:
+        return 'Q', 'Quarterly', None
+    elif date_range > 90:
+        return 'M', 'Monthly', '%Y-%m'
+    elif date_range > 10:
+        return 'D', 'Daily', '%Y-%m-%d'
+    return 'h', 'Hourly', '%Y-%m-%d %H:00'
+
+
+def _analyze_time_series(analysis, frame, total_sales):
+    valid = frame['order_date'].notna() & frame['amount'].notna()
+    if not valid.any():
+        return
+    dates = frame['order_date'][valid]
+    amounts = frame['amount'][valid]
+
+    min_date = dates.min()
+    max_date = dates.max()
+    duration_days = (max_date - min_date).days
+    analysis["summary"]["date_range"] = {
+        "start": min_date.strftime('%Y-%m-%d'),
+        "end": max_date.strftime('%Y-%m-%d')
+    }
+    analysis["summary"]["duration_days"] = duration_days
+    if duration_days > 0:
+        analysis["summary"]["average_daily_sales"] = float(total_sales / (duration_days + 1))
+
+    freq, period_format, label_format = _period_grouping(duration_days)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    period_sales = amounts.groupby(dates.dt.to_period(freq), sort=True).sum()
+    labels = [str(p) if label_format is None else p.strftime(label_format) for p in period_sales.index]
+    sales = period_sales.to_numpy(dtype='float64')
+
+    analysis["time_series"]["labels"] = labels
+    analysis["time_series"]["data"] = [float(x) for x in sales]
+    analysis["time_series"]["period_type"] = period_format
+    logger.info(f"Time series analysis: {period_format} periods, {len(labels)} data points")
+
+    if len(sales) > 1:
+        first_period, last_period = sales[0], sales[-1]
+        if first_period > 0:
+            growth_rate = ((last_period - first_period) / first_period) * 100
+            analysis["sales_growth"]["rate"] = float(round(growth_rate, 2))
+            analysis["sales_growth"]["is_positive"] = "true" if growth_rate > 0 else "false"
+        if len(sales) >= 3 and sales[-2] > 0:
+            recent_growth = ((sales[-1] - sales[-2]) / sales[-2]) * 100
+            analysis["sales_growth"]["recent_rate"] = float(round(recent_growth, 2))
+            analysis["sales_growth"]["recent_is_positive"] = "true" if recent_growth > 0 else "false"
+
+        try:
+            from scipy import stats
+            x = np.arange(len(sales))
+            slope, intercept, r_value, p_value, std_err = stats.linregress(x, sales)
+            analysis["sales_growth"]["trend"] = {
+                "slope": float(slope),
+                "r_squared": float(r_value ** 2),
+                "direction": "upward" if slope > 0 else "downward",
+                "strength": "strong" if abs(r_value) > 0.7 else "moderate" if abs(r_value) > 0.3 else "weak"
+            }
+            analysis["time_series"]["trend_line"] = [float(round(intercept + slope * i, 2)) for i in x]
+
+            if len(sales) >= 5:
+                window_size = min(3, len(sales) // 3)
+                moving_avg = pd.Series(sales).rolling(window=window_size, center=True).mean()
+                analysis["time_series"]["moving_average"] = [float(v) if not np.isnan(v) else None for v in moving_avg]
+        except Exception as e:
+            logger.error(f"Error in trend analysis: {e}")
+
+        if len(sales) >= 6:
+            previous = sales[:-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                growth = (sales[1:] - previous) / previous * 100
+            keep = np.isfinite(growth)
+            if keep.any():
+                analysis["time_series"]["growth_rates"] = {
+                    "labels": [label for label, k in zip(labels[1:], keep) if k],
+                    "data": [float(round(v, 2)) for v in growth[keep]],
+                    "average": float(round(growth[keep].mean(), 2))
+                }
+
+
+def _analyze_sales(analysis, frame):
+    sales_values = frame['amount'].dropna()
+    valid_sales_rows = len(sales_values)
+    if valid_sales_rows == 0:
+        logger.warning("No valid sales data found for analysis")
+        _add_warning(analysis, "No valid sales data found for analysis")
+        return
+
+    total_sales = float(sales_values.sum())
+    summary = analysis["summary"]
+    summary["total_sales"] = total_sales
+    summary["average_sales"] = float(sales_values.mean())
+    summary["max_sale"] = float(sales_values.max())
+    summary["min_sale"] = float(sales_values.min())
+    summary["median_sale"] = float(sales_values.median())
+    summary["total_transactions"] = int(valid_sales_rows)
+
+    if 'quantity' in frame.columns:
+        valid = frame['quantity'].notna() & frame['amount'].notna()
+        if valid.any():
+            quantities = frame['quantity'][valid]
+            total_quantity = float(quantities.sum())
+            summary["total_quantity"] = total_quantity
+            summary["average_order_size"] = float(quantities.mean())
+            if total_quantity > 0:
+                summary["average_price_per_unit"] = float(total_sales / total_quantity)
+
+    if 'order_date' in frame.columns:
+        _analyze_time_series(analysis, frame, total_sales)
+
+
+def _analyze_products(analysis, frame):
+    product_sales = _grouped_totals(frame['product'], frame['amount'])
+    if product_sales.empty:
+        return
+
+    top_products = product_sales.sort_values(by='value', ascending=False, kind='stable')
+    bottom_products = product_sales.sort_values(by='value', ascending=True, kind='stable').head(10)
+    all_products_total = product_sales['value'].sum()
+
+    def product_entry(row):
+        return {
+            "name": _truncate(row.name_, 50),
+            "value": float(row.value),
+            "transaction_count": int(row.transaction_count)
+        }
+
+    top_rows = list(top_products.head(10).rename(columns={'name': 'name_'}).itertuples(index=False))
+    bottom_rows = list(bottom_products.rename(columns={'name': 'name_'}).itertuples(index=False))
+
+    analysis["top_products"] = [product_entry(row) for row in top_rows]
+    analysis["bottom_products"] = [product_entry(row) for row in bottom_rows]
+    analysis["bottom_products_chart"] = {
+        "labels": [_truncate(row.name_, 20) for row in bottom_rows],
+        "data": [float(row.value) for row in bottom_rows]
+    }
+    analysis["bottom_product_distribution"] = {
+        "labels": [_truncate(row.name_, 20) for row in bottom_rows],
+        "data": [float(row.value) for row in bottom_rows],
+        "percentages": [float(round((row.value / all_products_total) * 100, 2)) if all_products_total else 0
+                        for row in bottom_rows]
+    }
+
+    analysis["summary"]["total_products"] = len(product_sales)
+
+    top5 = top_products.head(5)
+    top5_sales = top5['value'].sum()
+    if all_products_total:
+        analysis["summary"]["top5_products_pct"] = float(round((top5_sales / all_products_total) * 100, 2))
+
+    top5_list = [
+        {
+            "name": _truncate(name, 30),
+            "value": float(value),
+            "percentage": float(round((value / all_products_total) * 100, 2)) if all_products_total else 0
+        }
+        for name, value in zip(top5['name'], top5['value'])
+    ]
+    others_value = all_products_total - top5_sales
+    if others_value > 0:
+        top5_list.append({
+            "name": "Others",
+            "value": float(others_value),
+            "percentage": float(round((others_value / all_products_total) * 100, 2))
+        })
+    analysis["product_distribution"] = {
+        "labels": [item["name"] for item in top5_list],
+        "data": [item["value"] for item in top5_list],
+        "percentages": [item["percentage"] for item in top5_list]
+    }
+
+
+def _analyze_regions(analysis, frame):
+    region_sales = _grouped_totals(frame['region'], frame['amount'])
+    if region_sales.empty:
+        return
+
+    unique_regions = len(region_sales)
+    if unique_regions < 10:
+        logger.warning(f"Selected region column has only {unique_regions} unique values")
+        _add_warning(analysis, f"Selected region column has only {unique_regions} unique values, which may not represent states")
+
+    total_region_sales = region_sales['value'].sum()
+    if total_region_sales > 0:
+        region_sales['percentage'] = (region_sales['value'] / total_region_sales) * 100
+    else:
+        region_sales['percentage'] = 0.0
+
+    all_regions = region_sales.sort_values(by='value', ascending=False, kind='stable')
+    top_regions = all_regions.head(10)
+    bottom_regions = region_sales.sort_values(by='value', ascending=True, kind='stable').head(10)
+
+    def region_entry(name, value, count, percentage):
+        return {
+            "name": str(name)[:50],
+            "value": float(value),
+            "transaction_count": int(count),
+            "percentage": float(percentage)
+        }
+
+    def entries(rows):
+        return [region_entry(*values) for values in
+                zip(rows['name'], rows['value'], rows['transaction_count'], rows['percentage'])]
+
+    analysis["top_regions"] = entries(top_regions)
+    analysis["bottom_regions"] = entries(bottom_regions)
+    analysis["bottom_regions_chart"] = {
+        "labels": [str(name)[:20] for name in bottom_regions['name']],
+        "data": [float(v) for v in bottom_regions['value']]
+    }
+    analysis["bottom_region_distribution"] = {
+        "regions": [str(name)[:20] for name in bottom_regions['name']],
+        "values": [float(v) for v in bottom_regions['value']],
+        "percentages": [float(p) for p in bottom_regions['percentage']]
+    }
+
+    def state_entry(row):
+        return {
+            "name": str(row['name'])[:50],
+            "value": float(row['value']),
+            "transaction_count": int(row['transaction_count']),
+            "percentage": float(round(row['percentage'], 2)) if total_region_sales > 0 else 0
+        }
+
+    analysis["order_metrics"]["top_selling_state"] = state_entry(all_regions.iloc[0])
+    if len(all_regions) > 1:
+        analysis["order_metrics"]["lowest_selling_state"] = state_entry(all_regions.iloc[-1])
+
+    percentages = [float(round(p, 2)) for p in all_regions['percentage']]
+    analysis["region_distribution"] = {
+        "regions": [str(name) for name in all_regions['name']],
+        "values": [float(v) for v in all_regions['value']],
+        "percentages": percentages
+    }
+
+    # Quartile categories for the map colours
+    thresholds = np.percentile(all_regions['value'], [25, 50, 75, 100])
+    categories = np.searchsorted(thresholds, all_regions['value'].to_numpy(), side='left') + 1
+    analysis["region_map_data"] = [
+        {
+            "region": str(name),
+            "value": float(value),
+            "category": int(category),
+            "percentage": percentage
+        }
+        for name, value, category, percentage in zip(all_regions['name'], all_regions['value'], categories, percentages)
+    ]
+
+    analysis["summary"]["total_regions"] = len(region_sales)
+    if total_region_sales > 0:
+        top3_region_sales = all_regions.head(3)['value'].sum()
+        analysis["summary"]["top3_regions_pct"] = float(round((top3_region_sales / total_region_sales) * 100, 2))
+
+
+def _analyze_channels(analysis, frame):
+    channel_sales = _grouped_totals(frame['channel'], frame['amount'])
+    if channel_sales.empty:
+        return
+
+    total_channel_sales = channel_sales['value'].sum()
+    channel_sales['percentage'] = (channel_sales['value'] / total_channel_sales) * 100 if total_channel_sales > 0 else 0
+    channel_sales = channel_sales.sort_values(by='value', ascending=False, kind='stable')
+    channel_sales['efficiency'] = channel_sales['value'] / channel_sales['transaction_count']
+
+    rows = list(zip(channel_sales['name'], channel_sales['value'], channel_sales['transaction_count'],
+                    channel_sales['percentage'], channel_sales['efficiency']))
+    analysis["sales_channels"] = [
+        {
+            "name": str(name)[:50],
+            "value": float(value),
+            "transaction_count": int(count),
+            "percentage": float(percentage)
+        }
+        for name, value, count, percentage, _ in rows
+    ]
+    analysis["channel_distribution"] = {
+        "labels": [str(row[0])[:30] for row in rows],
+        "data": [float(row[1]) for row in rows],
+        "percentages": [float(round(row[3], 2)) for row in rows]
+    }
+    analysis["channel_efficiency"] = {
+        "labels": [str(row[0])[:30] for row in rows],
+        "data": [float(round(row[4], 2)) for row in rows]
+    }
+    if len(rows) > 1:
+        analysis["summary"]["channel_count"] = len(rows)
+        analysis["summary"]["top_channel_pct"] = float(round(rows[0][3], 2))
+
+
+def build_key_metrics(analysis):
+    """Consolidated key metrics and the visualization structure for the dashboard cards"""
+    order_metrics = analysis["order_metrics"]
+    summary = analysis["summary"]
+    key_metrics = {
+        "total_orders": order_metrics.get("total_orders", 0),
+        "total_units": order_metrics.get("total_units", summary.get("total_quantity", 0)),
+        "total_cancelled_orders": order_metrics.get("cancelled_orders", 0),
+        "cancelled_value": order_metrics.get("cancelled_value", 0),
+        "total_replacements": order_metrics.get("replaced_orders", 0),
+        "replacement_value": order_metrics.get("replaced_value", 0),
+        "total_refunded_orders": order_metrics.get("refunded_orders", 0),
+        "refunded_value": order_metrics.get("refunded_value", 0),
+        "total_returned_orders": order_metrics.get("returned_orders", 0),
+        "returned_value": order_metrics.get("returned_value", 0),
+        "total_sales": summary.get("total_sales", 0),
+        "average_sales": summary.get("average_sales", 0),
+    }
+
+    if "top_selling_state" in order_metrics:
+        key_metrics["top_selling_state"] = order_metrics["top_selling_state"]["name"]
+        key_metrics["top_selling_state_value"] = order_metrics["top_selling_state"]["value"]
+    if "lowest_selling_state" in order_metrics:
+        key_metrics["lowest_selling_state"] = order_metrics["lowest_selling_state"]["name"]
+        key_metrics["lowest_selling_state_value"] = order_metrics["lowest_selling_state"]["value"]
+    if analysis.get("top_products"):
+        key_metrics["top_product"] = analysis["top_products"][0]["name"]
+        key_metrics["top_product_value"] = analysis["top_products"][0]["value"]
+    if analysis.get("bottom_products"):
+        key_metrics["lowest_product"] = analysis["bottom_products"][0]["name"]
+        key_metrics["lowest_product_value"] = analysis["bottom_products"][0]["value"]
+
+    visualization_data = {
+        "order_metrics": [
+            {"label": "Total Orders", "value": key_metrics["total_orders"], "category": "orders"},
+            {"label": "Total Units", "value": key_metrics["total_units"], "category": "orders"},
+            {"label": "Total Sales", "value": key_metrics["total_sales"], "category": "sales", "format": "currency"},
+            {"label": "Average Sale", "value": key_metrics["average_sales"], "category": "sales", "format": "currency"}
+        ],
+        "issue_metrics": [
+            {"label": "Cancelled Orders", "value": key_metrics["total_cancelled_orders"], "category": "issues"},
+            {"label": "Cancelled Value", "value": key_metrics["cancelled_value"], "category": "issues", "format": "currency"},
+            {"label": "Replacements", "value": key_metrics["total_replacements"], "category": "issues"},
+            {"label": "Replacement Value", "value": key_metrics["replacement_value"], "category": "issues", "format": "currency"},
+            {"label": "Refunded Orders", "value": key_metrics["total_refunded_orders"], "category": "issues"},
+            {"label": "Refunded Value", "value": key_metrics["refunded_value"], "category": "issues", "format": "currency"},
+            {"label": "Returned Orders", "value": key_metrics["total_returned_orders"], "category": "issues"},
+            {"label": "Returned Value", "value": key_metrics["returned_value"], "category": "issues", "format": "currency"}
+        ],
+        "region_metrics": [
+            {"label": "Top Selling State", "value": key_metrics.get("top_selling_state", "N/A"), "category": "regions"},
+            {"label": "Top State Sales", "value": key_metrics.get("top_selling_state_value", 0), "category": "regions", "format": "currency"},
+            {"label": "Lowest Selling State", "value": key_metrics.get("lowest_selling_state", "N/A"), "category": "regions"},
+            {"label": "Lowest State Sales", "value": key_metrics.get("lowest_selling_state_value", 0), "category": "regions", "format": "currency"}
+        ],
+        "product_metrics": [
+            {"label": "Top Product", "value": key_metrics.get("top_product", "N/A"), "category": "products"},
+            {"label": "Top Product Sales", "value": key_metrics.get("top_product_value", 0), "category": "products", "format": "currency"},
+            {"label": "Lowest Product", "value": key_metrics.get("lowest_product", "N/A"), "category": "products"},
+            {"label": "Lowest Product Sales", "value": key_metrics.get("lowest_product_value", 0), "category": "products", "format": "currency"}
+        ]
+    }
+    return key_metrics, visualization_data
+
+
+def compute_dashboard_analysis(typed, column_mapping):
+    """
+    Compute every dashboard aggregate from a TypedSalesFrame
+
+    Args:
+        typed: TypedSalesFrame built by build_typed_frame
+        column_mapping: dictionary mapping column types to actual column names
+
+    Returns:
+        dict: analysis in the structure returned by analyze_sales_data
+            (without the platform_specific section)
+    """
+    frame = typed.frame
+    analysis = {
+        "summary": {},
+        "time_series": {"labels": [], "data": []},
+        "sales_growth": {},
+        "top_products": [],
+        "top_regions": [],
+        "sales_channels": [],
+        "order_metrics": {},
+        "platform_specific": {}
+    }
+    summary = analysis["summary"]
+
+    if typed.row_count < 5:
+        _add_warning(analysis, f"Analysis is based on a very small dataset ({typed.row_count} records). Results may not be statistically significant.")
+    for warning in typed.warnings:
+        _add_warning(analysis, warning)
+
+    summary["row_count"] = typed.row_count
+    summary["column_count"] = typed.column_count
+    if typed.row_count < 5:
+        summary["reliability"] = "low"
+    elif typed.row_count < 20:
+        summary["reliability"] = "medium"
+    else:
+        summary["reliability"] = "high"
+    summary["column_mapping"] = {k: v for k, v in column_mapping.items() if not k.startswith('_')}
+
+    sections = [("orders", _analyze_orders, ())]
+    if 'amount' in frame.columns:
+        sections.append(("sales data", _analyze_sales, ('amount',)))
+        sections.append(("products", _analyze_products, ('amount', 'product')))
+        sections.append(("regions", _analyze_regions, ('amount', 'region')))
+        sections.append(("sales channels", _analyze_channels, ('amount', 'channel')))
+    else:
+        logger.warning("Sales column not identified")
+        _add_warning(analysis, "Sales column not identified")
+
+    for name, section, required in sections:
+        if not all(column in frame.columns for column in required):
+            continue
+        try:
+            section(analysis, frame)
+        except Exception as e:
+            logger.error(f"Error analyzing {name}: {e}")
+            logger.error(traceback.format_exc())
+            _add_warning(analysis, f"Error analyzing {name}: {str(e)}")
+
+    if 'quantity' in frame.columns:
+        analysis["order_metrics"]["total_units"] = float(frame['quantity'].sum())
+
+    analysis["key_metrics"], analysis["visualization_data"] = build_key_metrics(analysis)
+    return analysis
+
+
+def compute_headline_metrics(typed, column_mapping, state_extractor=None):
+    """
+    Headline metrics (total/average sales, return and cancellation rates,
+    return amount, replacements, regions, products) from a TypedSalesFrame
+
+    Args:
+        typed: TypedSalesFrame built by build_typed_frame
+        column_mapping: dictionary mapping column types to actual column names
+        state_extractor: optional callable mapping a Series of locations to states
+
+    Returns:
+        dict: metrics in the structure returned by compute_sales_metrics
+    """
+    frame = typed.frame
+    metrics = {
+        "total_sales": 0,
+        "average_sales": 0,
+        "return_rate": 0,
+        "cancellation_rate": 0,
+        "total_return_amount": 0,
+        "total_replacements": 0,
+        "total_regions": 0,
+        "total_products": 0
+    }
+
+    is_meesho_merged = 'record_type' in frame.columns and 'cancel_return_date' in column_mapping
+    if is_meesho_merged:
+        record_type = frame['record_type'].astype(object)
+        sale_rows = (record_type == 'sale').to_numpy()
+        return_rows = (record_type == 'return').to_numpy()
+
+    if 'amount' in frame.columns:
+        amounts = frame['amount'][sale_rows] if is_meesho_merged else frame['amount']
+        valid_sales = amounts.dropna()
+        metrics["total_sales"] = float(valid_sales.sum()) if len(valid_sales) > 0 else 0
+        non_zero_sales = valid_sales[valid_sales > 0]
+        metrics["average_sales"] = float(non_zero_sales.mean()) if len(non_zero_sales) > 0 else 0
+
+    if is_meesho_merged:
+        total_orders = int(sale_rows.sum())
+        returned_count = int(return_rows.sum())
+        if total_orders > 0:
+            metrics["return_rate"] = float(round((returned_count / total_orders) * 100, 2))
+        if 'record_status' in frame.columns:
+            status = frame['record_status']
+            cancelled_count = int((_category_flags(status, METRICS_CANCEL_KEYWORDS) & return_rows).sum())
+            if total_orders > 0:
+                metrics["cancellation_rate"] = float(round((cancelled_count / total_orders) * 100, 2))
+            metrics["total_replacements"] = int((_category_flags(status, REPLACE_KEYWORDS) & return_rows).sum())
+        if 'amount' in frame.columns:
+            metrics["total_return_amount"] = float(np.nansum(frame['amount'].to_numpy()[return_rows]))
+
+    elif 'status' in frame.columns and 'status' not in typed.detected_columns and len(frame) > 0:
+        # Headline rates only use an explicitly mapped transaction type column
+        status = frame['status']
+        total_orders = len(frame)
+        returned_mask = _category_flags(status, METRICS_RETURN_KEYWORDS)
+        cancelled_mask = _category_flags(status, METRICS_CANCEL_KEYWORDS)
+        metrics["total_replacements"] = int(_category_flags(status, REPLACE_KEYWORDS).sum())
+        metrics["return_rate"] = float(round((returned_mask.sum() / total_orders) * 100, 2))
+        metrics["cancellation_rate"] = float(round((cancelled_mask.sum() / total_orders) * 100, 2))
+        if 'amount' in frame.columns:
+            metrics["total_return_amount"] = float(np.nansum(frame['amount'].to_numpy()[returned_mask]))
+
+    if 'region' in frame.columns:
+        # Work on the distinct locations only
+        regions = frame['region']
+        locations = pd.Series(regions.cat.categories[np.unique(regions.cat.codes[regions.cat.codes >= 0])]).astype(str)
+        if state_extractor is not None and len(locations) and locations.str.len().max() > 20:
+            locations = state_extractor(locations).astype(str)
+        metrics["total_regions"] = int(locations[locations.str.len() > 1].nunique())
+
+    if 'product' in frame.columns:
+        products = frame['product']
+        names = pd.Series(products.cat.categories[np.unique(products.cat.codes[products.cat.codes >= 0])]).astype(str)
+        metrics["total_products"] = int(names[names.str.len() > 1].nunique())
+
+    logger.info(f"Headline metrics: {metrics}")
+    return metrics
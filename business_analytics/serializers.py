@@ -11,5 +11,6 @@ class SalesAnalysisResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = SalesAnalysisResult
         fields = ['id', 'sales_data_file', 'analysis_data', 'column_mappings', 
-                 'created_at', 'updated_at', 'status', 'error_message']
-        read_only_fields = ['id', 'created_at', 'updated_at'] 
\ No newline at end of file
+                 'created_at', 'updated_at', 'status', 'error_message',
+                 'progress', 'rows_processed', 'platform_type']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'progress', 'rows_processed']
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Parquet snapshots of parsed sales data.
+
+After a SalesDataFile has been ingested once, its parsed DataFrame is stored as
+a Parquet file next to the raw upload, with the mapped columns already typed
+(numeric amounts, datetime dates, categorical dimensions). Re-analyses read the
+snapshot (memory-mapped, and only the columns they need) instead of re-parsing
+the original CSV/XLSX, and re-uploads of an identical file are matched by
+content hash so they are never ingested twice.
+
+Snapshots require pyarrow; without it every helper here degrades to a no-op
+and callers fall back to reading the raw upload.
+"""
+import hashlib
+import io
+import logging
+import os
+import traceback
+
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .ingestion import PYARROW_AVAILABLE, read_sales_file, uploaded_file_path, write_parquet
+from .models import SalesDataFile
+from .sales_engine import CATEGORICAL_FIELDS, NUMERIC_FIELDS, clean_column_name
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def file_content_hash(file_obj):
+    """SHA-256 of an uploaded file, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        digest.update(chunk)
+    try:
+        file_obj.seek(0)
+    except Exception:
+        pass
+    return digest.hexdigest()
+
+
+def _mapped_source_columns(df, column_mapping, keys):
+    """Columns of df referenced by the given mapping keys (raw or cleaned names)"""
+    by_clean_name = {clean_column_name(col): col for col in df.columns}
+    columns = []
+    for key in keys:
+        value = column_mapping.get(key)
+        col = by_clean_name.get(clean_column_name(value)) if isinstance(value, str) else None
+        if col is not None and col not in columns:
+            columns.append(col)
+    return columns
+
+
+def typed_snapshot_frame(df, column_mapping):
+    """
+    Convert the mapped columns of df to their analysis dtypes
+
+    Conversions that would lose most values (e.g. amounts with currency text)
+    are skipped so the snapshot never holds less information than the upload.
+    """
+    if not column_mapping:
+        return df
+
+    converted = {}
+    for col in _mapped_source_columns(df, column_mapping, NUMERIC_FIELDS):
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            values = pd.to_numeric(df[col], errors='coerce')
+            if values.notna().sum() >= 0.5 * df[col].notna().sum():
+                converted[col] = values
+    for col in _mapped_source_columns(df, column_mapping, ['order_date']):
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            values = pd.to_datetime(df[col], errors='coerce')
+            if values.notna().sum() >= 0.5 * df[col].notna().sum():
+                converted[col] = values
+    for col in _mapped_source_columns(df, column_mapping, CATEGORICAL_FIELDS):
+        if col not in converted and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            converted[col] = df[col].astype(str).where(df[col].notna()).astype('category')
+
+    return df.assign(**converted) if converted else df
+
+
+def store_snapshot(sales_file, df, column_mapping=None, available_columns=None):
+    """
+    Store df as the Parquet snapshot of sales_file
+
+    Args:
+        sales_file: SalesDataFile the data was parsed from
+        df: parsed DataFrame (normalized column names)
+        column_mapping: mapping used to type the snapshot columns
+        available_columns: full header of the upload (df may hold fewer columns)
+
+    Returns:
+        bool: True when the snapshot was written
+    """
+    if not PYARROW_AVAILABLE:
+        return False
+
+    try:
+        buffer = io.BytesIO()
+        write_parquet(typed_snapshot_frame(df, column_mapping), buffer)
+
+        if sales_file.snapshot:
+            sales_file.snapshot.delete(save=False)
+        sales_file.snapshot.save(f"{sales_file.id}.parquet", ContentFile(buffer.getvalue()), save=False)
+        sales_file.snapshot_columns = list(available_columns) if available_columns is not None else [str(col) for col in df.columns]
+        sales_file.snapshot_column_mapping = {
+            k: v for k, v in (column_mapping or {}).items() if isinstance(v, str) or v is None
+        }
+        sales_file.snapshot_created_at = timezone.now()
+        sales_file.save(update_fields=['snapshot', 'snapshot_columns', 'snapshot_column_mapping', 'snapshot_created_at'])
+        logger.info(f"Stored Parquet snapshot for {sales_file.file_name} ({df.shape[0]} rows, {df.shape[1]} columns)")
+        return True
+    except Exception as e:
+        logger.error(f"Error storing snapshot for {sales_file.file_name}: {e}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+def snapshot_stored_columns(sales_file):
+    """Columns physically present in the snapshot, or None when there is no usable snapshot"""
+    if not PYARROW_AVAILABLE or not sales_file.snapshot:
+        return None
+    try:
+        import pyarrow.parquet as pq
+        path = sales_file.snapshot.path
+        if not os.path.exists(path):
+            return None
+        return pq.ParquetFile(path).schema_arrow.names
+    except Exception as e:
+        logger.warning(f"Could not read snapshot schema for {sales_file.file_name}: {e}")
+        return None
+
+
+def snapshot_covers(sales_file, column_mapping):
+    """Whether every column referenced by column_mapping is stored in the snapshot"""
+    stored = snapshot_stored_columns(sales_file)
+    if stored is None:
+        return False
+    stored_clean = {clean_column_name(col) for col in stored}
+    return all(
+        clean_column_name(value) in stored_clean
+        for key, value in (column_mapping or {}).items()
+        if not key.startswith('_') and isinstance(value, str) and value
+    )
+
+
+def snapshot_source(sales_file):
+    """
+    SalesDataFile whose snapshot holds the data of sales_file
+
+    That is sales_file itself once ingested, or an earlier upload of the same
+    content by the same user.
+    """
+    if not PYARROW_AVAILABLE:
+        return None
+    if sales_file.snapshot:
+        return sales_file
+    if not sales_file.content_hash:
+        return None
+    return _find_snapshotted_file(sales_file.user_id, sales_file.content_hash)
+
+
+def _find_snapshotted_file(user_id, content_hash, file_type=None):
+    """Most recent upload of the given content by the user that has a snapshot"""
+    files = SalesDataFile.objects.filter(user_id=user_id, content_hash=content_hash)
+    if file_type:
+        files = files.filter(file_type=file_type)
+    return files.exclude(snapshot='').exclude(snapshot__isnull=True).order_by('-uploaded_at').first()
+
+
+def load_snapshot(sales_file, columns=None):
+    """
+    Read the snapshot of sales_file (memory-mapped)
+
+    Args:
+        sales_file: SalesDataFile
+        columns: optional subset of columns to read
+
+    Returns:
+        pandas DataFrame, or None when no usable snapshot exists
+    """
+    stored = snapshot_stored_columns(sales_file)
+    if stored is None:
+        return None
+    if columns is not None:
+        columns = [col for col in columns if col in stored]
+    try:
+        df = pd.read_parquet(sales_file.snapshot.path, columns=columns, memory_map=True)
+        logger.info(f"Loaded snapshot for {sales_file.file_name}: {df.shape}")
+        return df
+    except Exception as e:
+        logger.warning(f"Could not load snapshot for {sales_file.file_name}: {e}")
+        return None
+
+
+def ingest_upload(user, file_obj, file_type):
+    """
+    Ingest an uploaded file once per content
+
+    An identical file already ingested for the same user is served from its
+    snapshot; otherwise the upload is stored as a new SalesDataFile, parsed
+    and snapshotted. Without pyarrow the upload is simply parsed.
+
+    Returns:
+        tuple: (SalesDataFile or None, DataFrame)
+    """
+    file_extension = os.path.splitext(file_obj.name)[1].lower()
+    if not PYARROW_AVAILABLE:
+        with uploaded_file_path(file_obj) as file_path:
+            return None, read_sales_file(file_path, file_extension)
+
+    content_hash = file_content_hash(file_obj)
+    existing = _find_snapshotted_file(user.id, content_hash, file_type)
+    if existing is not None:
+        df = load_snapshot(existing)
+        if df is not None:
+            logger.info(f"Reusing snapshot of {existing.file_name} for {file_obj.name}")
+            return existing, df
+
+    with uploaded_file_path(file_obj) as file_path:
+        df = read_sales_file(file_path, file_extension)
+
+    sales_file = SalesDataFile.objects.create(
+        user=user,
+        file=file_obj,
+        file_name=file_obj.name,
+        file_type=file_type,
+        content_hash=content_hash
+    )
+    store_snapshot(sales_file, df)
+    return sales_file, df
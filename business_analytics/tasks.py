@@ -0,0 +1,24 @@
+import logging
+
+from celery import shared_task
+
+from .pipeline import run_sales_analysis
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name="business_analytics.tasks.process_sales_upload")
+def process_sales_upload(self, analysis_id, manual_column_mapping=None):
+    """
+    Analyze an uploaded sales data file in the background
+
+    Args:
+        analysis_id (str): ID of the SalesAnalysisResult created by the upload view
+        manual_column_mapping (dict): Optional column mapping overrides from the user
+
+    Returns:
+        dict: Result of the analysis run
+    """
+    logger.info(f"Starting process_sales_upload task {self.request.id} for analysis {analysis_id}")
+    return run_sales_analysis(analysis_id, manual_column_mapping, task_id=self.request.id)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import SalesDataUploadView, BusinessAnalyticsView, AnalysisResultView, SalesMetricsView
+from .views import SalesDataUploadView, BusinessAnalyticsView, AnalysisResultView, SalesMetricsView, ColumnMappingCacheStatsView
 
 app_name = 'business_analytics'
 
@@ -9,6 +9,7 @@ urlpatterns = [
     path('api/analysis/', AnalysisResultView.as_view(), name='analysis_list'),
     path('api/analysis/<uuid:analysis_id>/', AnalysisResultView.as_view(), name='analysis_detail'),
     path('api/metrics/', SalesMetricsView.as_view(), name='sales_metrics'),
+    path('api/column-mapping-cache/stats/', ColumnMappingCacheStatsView.as_view(), name='column_mapping_cache_stats'),
     
     # Dashboard view
     path('dashboard/', BusinessAnalyticsView.as_view(), name='dashboard'),
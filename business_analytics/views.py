@@ -10,16 +10,21 @@ import os
 import json
 import logging
 import traceback
-import csv
-import tempfile
 import io
 import sys
+import threading
 from django.conf import settings
+from django.urls import reverse
 from django.contrib.auth.models import User as DjangoUser
 
 from .models import SalesDataFile, SalesAnalysisResult
 from .serializers import SalesDataFileSerializer, SalesAnalysisResultSerializer
 from .analysis_helper import identify_columns_with_gemini, analyze_sales_data, compute_sales_metrics
+from .sales_engine import build_typed_frame
+from .pipeline import run_sales_analysis, reanalyze_platform
+from .mapping_cache import get_cache_stats
+from .ingestion import load_mapped_sales_file, read_sales_file, uploaded_file_path
+from .snapshots import file_content_hash, ingest_upload
 from User.models import User as CustomUser
 
 # Configure logging
@@ -149,6 +154,29 @@ def get_user_from_session(request):
     debug_print("=== END SESSION DEBUG ===")
     return custom_user, user_email, django_user
 
+def dispatch_sales_analysis(analysis_result, manual_column_mapping=None):
+    """
+    Queue the background analysis of an uploaded file.
+
+    Falls back to a daemon thread when the Celery broker cannot be reached so an
+    upload is never left in 'processing' state without anything working on it.
+    """
+    analysis_id = str(analysis_result.id)
+    try:
+        from .tasks import process_sales_upload
+        task = process_sales_upload.delay(analysis_id, manual_column_mapping)
+        SalesAnalysisResult.objects.filter(pk=analysis_result.pk).update(task_id=task.id)
+        analysis_result.task_id = task.id
+        logger.info(f"Queued process_sales_upload task {task.id} for analysis {analysis_id}")
+    except Exception as e:
+        logger.warning(f"Could not queue Celery task for analysis {analysis_id} ({e}), running in a background thread")
+        thread = threading.Thread(
+            target=run_sales_analysis,
+            args=(analysis_id, manual_column_mapping),
+            daemon=True
+        )
+        thread.start()
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SalesDataUploadView(APIView):
     """
@@ -234,496 +262,34 @@ class SalesDataUploadView(APIView):
                 user=django_user,
                 file=file_obj,
                 file_name=file_name,
-                file_type=file_type
+                file_type=file_type,
+                content_hash=file_content_hash(file_obj)
             )
             
-            # Create a pending analysis result
+            # Create the analysis result; the background task fills it in
             analysis_result = SalesAnalysisResult.objects.create(
                 sales_data_file=sales_file,
                 status='processing',
+                progress=0,
                 platform_type=None  # Always use None for consistent analysis
             )
             
-            # Read the file into a pandas DataFrame
-            try:
-                # Save the file to a temporary location to ensure it can be read multiple times
-                with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                    for chunk in file_obj.chunks():
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-                
-                logger.info(f"Saved file temporarily to: {temp_file_path}")
-                
-                # Now read the file based on its type
-                if file_extension == '.csv':
-                    # First, try to detect the delimiter
-                    with open(temp_file_path, 'r', encoding='utf-8', errors='replace') as f:
-                        sample = f.read(4096)
-                    
-                    sniffer = csv.Sniffer()
-                    try:
-                        dialect = sniffer.sniff(sample)
-                        detected_delimiter = dialect.delimiter
-                        logger.info(f"Detected delimiter: '{detected_delimiter}'")
-                    except:
-                        # Default to comma if detection fails
-                        detected_delimiter = ','
-                        logger.warning("Failed to detect delimiter, defaulting to comma")
-                        debug_print("Failed to detect delimiter, defaulting to comma")
-                    
-                    # Try to determine if there's a header row
-                    try:
-                        has_header = sniffer.has_header(sample)
-                        logger.info(f"Detected header row: {has_header}")
-                    except:
-                        has_header = True
-                        logger.warning("Failed to detect header, assuming it exists")
-                    
-                    # Try multiple approaches to read the CSV
-                    try:
-                        # Try with detected delimiter first
-                        logger.info(f"Attempting to read CSV with delimiter: '{detected_delimiter}', header: {0 if has_header else None}")
-                        df = pd.read_csv(
-                            temp_file_path, 
-                            delimiter=detected_delimiter,
-                            header=0 if has_header else None,
-                            encoding='utf-8',
-                            low_memory=False,
-                            on_bad_lines='skip'
-                        )
-                    except Exception as e:
-                        logger.error(f"First attempt to read CSV failed: {e}")
-                        debug_print(f"First attempt to read CSV failed: {e}")
-                        
-                        # Try with different encoding
-                        logger.info("Attempting to read CSV with latin1 encoding")
-                        df = pd.read_csv(
-                            temp_file_path,
-                            delimiter=detected_delimiter,
-                            header=0 if has_header else None,
-                            encoding='latin1',
-                            low_memory=False,
-                            on_bad_lines='skip'
-                        )
-                    
-                    # Check if DataFrame is empty or has no columns
-                    if df.empty:
-                        logger.error("CSV file resulted in empty DataFrame")
-                        debug_print("CSV file resulted in empty DataFrame")
-                        raise ValueError("CSV file has no data")
-                    
-                    if df.shape[1] == 0:
-                        logger.error("CSV file resulted in DataFrame with no columns")
-                        debug_print("CSV file resulted in DataFrame with no columns")
-                        raise ValueError("CSV file has no columns to parse")
-                    
-                    # If we only have one column, the delimiter might be wrong
-                    if df.shape[1] == 1:
-                        logger.warning(f"Only one column detected with delimiter '{detected_delimiter}', trying alternatives")
-                        debug_print(f"Only one column detected with delimiter '{detected_delimiter}', trying alternatives")
-                        # Try some common alternative delimiters
-                        for delimiter in [';', '\t', '|']:
-                            try:
-                                logger.info(f"Trying alternate delimiter: '{delimiter}'")
-                                temp_df = pd.read_csv(
-                                    temp_file_path,
-                                    delimiter=delimiter,
-                                    header=0 if has_header else None,
-                                    encoding='utf-8',
-                                    low_memory=False,
-                                    on_bad_lines='skip'
-                                )
-                                if temp_df.shape[1] > 1:
-                                    logger.info(f"Success with delimiter '{delimiter}': {temp_df.shape[1]} columns found")
-                                    debug_print(f"Success with delimiter '{delimiter}': {temp_df.shape[1]} columns found")
-                                    df = temp_df
-                                    break
-                            except Exception as e:
-                                logger.warning(f"Failed with delimiter '{delimiter}': {e}")
-                
-                elif file_extension in ['.xlsx', '.xls']:
-                    # For Excel files, try with explicit engine and more robust detection
-                    logger.info("Reading Excel file with openpyxl engine")
-                    
-                    # First try to read with default parameters
-                    try:
-                        df = pd.read_excel(temp_file_path, engine='openpyxl')
-                        
-                        # Check if we got unnamed columns and few rows, which often indicates
-                        # headers or data aren't in the expected location
-                        unnamed_cols = sum(1 for col in df.columns if 'Unnamed:' in str(col))
-                        
-                        # If most columns are unnamed, try reading with different header rows
-                        if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
-                            logger.warning(f"Detected {unnamed_cols} unnamed columns, trying alternative header rows")
-                            debug_print(f"Detected {unnamed_cols} unnamed columns, trying alternative header rows")
-                            
-                            # Try with different header row positions
-                            for header_row in range(1, 10):  # Try rows 1-9 as header
-                                try:
-                                    temp_df = pd.read_excel(temp_file_path, engine='openpyxl', header=header_row)
-                                    # If we get more named columns, use this dataframe
-                                    temp_unnamed = sum(1 for col in temp_df.columns if 'Unnamed:' in str(col))
-                                    
-                                    if temp_unnamed < unnamed_cols:
-                                        logger.info(f"Found better header row at position {header_row}")
-                                        debug_print(f"Found better header row at position {header_row}")
-                                        df = temp_df
-                                        unnamed_cols = temp_unnamed
-                                        
-                                        # Break if we have no unnamed columns
-                                        if unnamed_cols == 0:
-                                            break
-                                except Exception as e:
-                                    logger.warning(f"Error trying header row {header_row}: {e}")
-                            
-                            # If still mostly unnamed columns, try first row as header and skip rows
-                            if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
-                                for skiprows in range(1, 10):
-                                    try:
-                                        temp_df = pd.read_excel(temp_file_path, engine='openpyxl', header=0, skiprows=skiprows)
-                                        temp_unnamed = sum(1 for col in temp_df.columns if 'Unnamed:' in str(col))
-                                        
-                                        if temp_unnamed < unnamed_cols:
-                                            logger.info(f"Found better data skipping {skiprows} rows")
-                                            debug_print(f"Found better data skipping {skiprows} rows")
-                                            df = temp_df
-                                            unnamed_cols = temp_unnamed
-                                            
-                                            # Break if we have no unnamed columns
-                                            if unnamed_cols == 0:
-                                                break
-                                    except Exception as e:
-                                        logger.warning(f"Error trying skiprows {skiprows}: {e}")
-                        
-                        # Try to detect if the real data is in the second sheet
-                        if unnamed_cols > 0 and unnamed_cols >= len(df.columns) / 2:
-                            logger.info("Checking if data is in another sheet")
-                            debug_print("Checking if data is in another sheet")
-                            
-                            # Get sheet names
-                            import openpyxl
-                            workbook = openpyxl.load_workbook(temp_file_path, read_only=True, data_only=True)
-                            sheet_names = workbook.sheetnames
-                            workbook.close()
-                            
-                            # If there are multiple sheets, try each one
-                            if len(sheet_names) > 1:
-                                for sheet_name in sheet_names:
-                                    try:
-                                        temp_df = pd.read_excel(temp_file_path, engine='openpyxl', sheet_name=sheet_name)
-                                        temp_unnamed = sum(1 for col in temp_df.columns if 'Unnamed:' in str(col))
-                                        
-                                        # If this sheet has more named columns, use it
-                                        if temp_unnamed < unnamed_cols and len(temp_df.columns) > 0:
-                                            logger.info(f"Found better data in sheet '{sheet_name}'")
-                                            debug_print(f"Found better data in sheet '{sheet_name}'")
-                                            df = temp_df
-                                            unnamed_cols = temp_unnamed
-                                            
-                                            # Try different header rows on this sheet too
-                                            for header_row in range(1, 5):
-                                                try:
-                                                    sub_temp_df = pd.read_excel(temp_file_path, engine='openpyxl', 
-                                                                             sheet_name=sheet_name, header=header_row)
-                                                    sub_temp_unnamed = sum(1 for col in sub_temp_df.columns if 'Unnamed:' in str(col))
-                                                    
-                                                    if sub_temp_unnamed < temp_unnamed:
-                                                        logger.info(f"Found better header in sheet '{sheet_name}' at row {header_row}")
-                                                        df = sub_temp_df
-                                                        break
-                                                except Exception as e:
-                                                    logger.warning(f"Error trying header row {header_row} in sheet '{sheet_name}': {e}")
-                                    except Exception as e:
-                                        logger.warning(f"Error reading sheet '{sheet_name}': {e}")
-                    
-                        # After all attempts, if all columns are still unnamed but we have data,
-                        # try to create meaningful column names
-                        all_unnamed = all('Unnamed:' in str(col) for col in df.columns)
-                        if all_unnamed and len(df) > 0:
-                            logger.info("All columns unnamed, creating generic column names")
-                            debug_print("All columns unnamed, creating generic column names")
-                            
-                            # Look at first row to see if it might contain column names
-                            if len(df) > 0:
-                                first_row = df.iloc[0]
-                                if not first_row.isna().all() and isinstance(first_row, pd.Series):
-                                    # Use first row as header and skip it
-                                    logger.info("Using first data row as header")
-                                    debug_print("Using first data row as header")
-                                    df.columns = [str(x).strip() if not pd.isna(x) else f"Column_{i}" 
-                                               for i, x in enumerate(first_row)]
-                                    df = df.iloc[1:].reset_index(drop=True)
-                                else:
-                                    # Create generic column names based on position
-                                    df.columns = [f"Column_{i}" for i in range(len(df.columns))]
-                    
-                    except Exception as e:
-                        logger.error(f"First attempt to read Excel file failed: {e}")
-                        debug_print(f"First attempt to read Excel file failed: {e}")
-                        
-                        # Try with xlrd engine for xls files as fallback
-                        if file_extension == '.xls':
-                            logger.info("Attempting to read XLS with xlrd engine")
-                            try:
-                                df = pd.read_excel(temp_file_path, engine='xlrd')
-                            except Exception as e2:
-                                logger.error(f"Second attempt to read Excel file failed: {e2}")
-                                debug_print(f"Second attempt to read Excel file failed: {e2}")
-                                raise ValueError(f"Could not read Excel file: {e2}")
-                        else:
-                            raise ValueError(f"Could not read Excel file: {e}")
-                    
-                    # Check if DataFrame is empty
-                    if df.empty or df.shape[1] == 0:
-                        logger.error("Excel file resulted in empty DataFrame or no columns")
-                        debug_print("Excel file resulted in empty DataFrame or no columns")
-                        raise ValueError("Excel file has no data or no columns could be parsed")
-                        
-                    # Debug: print the detected column names
-                    debug_print(f"Final detected columns: {df.columns.tolist()}")
-                    debug_print(f"Data types: {df.dtypes.to_dict()}")
-                else:
-                    raise ValueError(f"Unsupported file extension: {file_extension}")
-                
-                # Remove the temporary file
-                try:
-                    os.unlink(temp_file_path)
-                    logger.info("Temporary file removed")
-                except Exception as e:
-                    logger.warning(f"Failed to remove temporary file: {e}")
-                
-                # Log DataFrame info for debugging
-                logger.info(f"Successfully read file with shape: {df.shape}")
-                debug_print(f"Successfully read file with shape: {df.shape}")
-                debug_print(f"Columns: {df.columns.tolist()}")
-                
-                # Print sample data for debugging
-                sample_data = df.head(5).to_string()
-                debug_print(f"Sample data:\n{sample_data}")
-                
-                # Initialize column_mapping early to avoid "referenced before assignment" error
-                column_mapping = {}
-                column_mapping_issues = []
-                
-                # Check if we have enough data to analyze
-                if df.shape[0] < 5:
-                    logger.warning(f"File contains very few records: {df.shape[0]} (minimum 5 recommended)")
-                    debug_print(f"File contains very few records: {df.shape[0]} (minimum 5 recommended)")
-                    
-                    # Add a warning instead of throwing an error
-                    if '_warnings' not in column_mapping:
-                        column_mapping['_warnings'] = []
-                    column_mapping['_warnings'].append(f"File contains only {df.shape[0]} records. Analysis may be limited.")
-                    
-                    # Add to the issues list for UI display
-                    column_mapping_issues.append(f"File contains only {df.shape[0]} records. Analysis results may be limited.")
-                    
-                    # Continue processing - no need to raise an exception
-                
-                # Preprocess the dataframe - clean column names for consistency
-                # This won't change the actual data, just normalizes column names
-                clean_df = df.copy()
-                clean_df.columns = [str(col).strip().replace('\n', ' ') for col in clean_df.columns]
-                
-                # Identify columns using Gemini AI - only for column identification
-                logger.info("Starting column identification with Gemini")
-                column_mapping = identify_columns_with_gemini(clean_df, platform_type=None)
-                logger.info(f"Column mapping result: {column_mapping}")
-                debug_print(f"Column mapping result: {json.dumps(column_mapping, indent=2)}")
-                
-                # Apply manual column mapping if provided
-                if manual_column_mapping:
-                    # Override automatic mapping with manual mapping
-                    for key, value in manual_column_mapping.items():
-                        if value:  # Only override if a value was actually provided
-                            column_mapping[key] = value
-                            logger.info(f"Manual override for {key}: {value}")
-                    
-                    debug_print(f"Column mapping after manual overrides: {json.dumps(column_mapping, indent=2)}")
-                
-                # Check for warnings or data type issues in column mapping
-                column_mapping_issues = []
-                
-                # Extract warnings from the column mapping
-                if '_warnings' in column_mapping:
-                    column_mapping_issues.extend(column_mapping['_warnings'])
-                
-                # Extract data type warnings from the column mapping
-                if '_data_type_warnings' in column_mapping:
-                    column_mapping_issues.extend(column_mapping['_data_type_warnings'])
-                
-                # Validate critical columns are present
-                if not column_mapping.get('sales_amount'):
-                    column_mapping_issues.append("Sales amount column could not be identified. Analysis may be limited.")
-                
-                if not column_mapping.get('order_date'):
-                    column_mapping_issues.append("Order date column could not be identified. Time-based analysis will be unavailable.")
-                
-                if not column_mapping.get('product_name'):
-                    column_mapping_issues.append("Product name/ID column could not be identified. Product-based analysis will be unavailable.")
-                
-                # For Excel files with few columns or mostly unnamed columns, add a specific message
-                unnamed_cols = sum(1 for col in clean_df.columns if 'Unnamed:' in str(col) or 'Column_' in str(col))
-                if unnamed_cols > 0 and unnamed_cols >= len(clean_df.columns) / 2:
-                    column_mapping_issues.append("Your Excel file contains unnamed columns. Consider adding header row with descriptive column names.")
-                    logger.warning("Excel file contains mostly unnamed columns")
-                    debug_print("Excel file contains mostly unnamed columns")
-                    
-                    # Add some more specific suggestions
-                    if file_extension in ['.xlsx', '.xls']:
-                        # Provide guidance on typical Excel file issues
-                        column_mapping_issues.append("Try ensuring the first row contains headers and there are no merged cells or blank rows at the top.")
-                        
-                        # Show the available columns to help with debugging
-                        available_cols_str = ", ".join([str(col) for col in clean_df.columns])
-                        debug_print(f"Available columns in Excel file: {available_cols_str}")
-                
-                # Log issues found during column mapping
-                if column_mapping_issues:
-                    logger.warning(f"Column mapping issues: {column_mapping_issues}")
-                    debug_print(f"Column mapping issues: {column_mapping_issues}")
-                    
-                    # For files with few columns, give more specific mapping instructions
-                    if len(clean_df.columns) <= 5:
-                        debug_print(f"Excel file contains only {len(clean_df.columns)} columns. Consider using manual column mapping.")
-                        column_mapping_issues.append(f"Your file contains only {len(clean_df.columns)} columns. Please use the Advanced Options to manually map columns.")
-                
-                # Analyze the data using pandas
-                logger.info("Starting data analysis with pandas")
-                try:
-                    analysis_data = analyze_sales_data(clean_df, column_mapping, platform_type=None)
-                    logger.info("Data analysis completed")
-                    
-                    # Add column mapping issues to the analysis summary
-                    if column_mapping_issues:
-                        if 'summary' not in analysis_data:
-                            analysis_data['summary'] = {}
-                        analysis_data['summary']['column_mapping_issues'] = column_mapping_issues
-                    
-                    # Debug print the analysis data
-                    try:
-                        debug_print(f"Analysis data (summary):\n{json.dumps(analysis_data.get('summary', {}), indent=2)}")
-                        if 'time_series' in analysis_data and 'labels' in analysis_data['time_series']:
-                            debug_print(f"Time series data: {len(analysis_data['time_series']['labels'])} periods")
-                        debug_print(f"Top products: {len(analysis_data.get('top_products', []))} items")
-                        debug_print(f"Top regions: {len(analysis_data.get('top_regions', []))} items")
-                        debug_print(f"Sales channels: {len(analysis_data.get('sales_channels', []))} items")
-                        if platform_type:
-                            debug_print(f"Platform-specific data: {json.dumps(analysis_data.get('platform_specific', {}), indent=2)}")
-                    except TypeError as e:
-                        logger.error(f"Error printing analysis data: {e}")
-                        debug_print(f"Error printing analysis data: {e}")
-                except Exception as analysis_error:
-                    logger.error(f"Error in data analysis: {analysis_error}")
-                    debug_print(f"Error in data analysis: {analysis_error}")
-                    debug_print(traceback.format_exc())
-                    
-                    # Provide a basic analysis structure if analysis fails
-                    analysis_data = {
-                        "summary": {
-                            "error": f"Analysis error: {str(analysis_error)}",
-                            "row_count": len(clean_df),
-                            "column_count": len(clean_df.columns),
-                            "column_mapping_issues": column_mapping_issues
-                        }
-                    }
-                
-                # Update the analysis result
-                analysis_result.column_mappings = column_mapping
-                analysis_result.analysis_data = analysis_data
-                analysis_result.status = 'completed'
-                analysis_result.save()
-                
-                logger.info("Analysis completed and saved to database")
-                
-                # Prepare response
-                response_data = {
-                    "success": True,
-                    "message": "File uploaded and analyzed successfully",
-                    "file_id": str(sales_file.id),
-                    "analysis_id": str(analysis_result.id),
-                    "column_mapping": {k: v for k, v in column_mapping.items() if not k.startswith('_')},  # Filter out metadata fields
-                    "column_mapping_issues": column_mapping_issues if column_mapping_issues else None,
-                    "analysis": analysis_data,
-                    "platform_type": platform_type,
-                    "available_columns": clean_df.columns.tolist()  # Include all available columns in response
-                }
-                
-                # Debug print the response status
-                debug_print("Sending successful response with analysis data")
-                
-                # Ensure we can serialize the data properly
-                try:
-                    # Test JSON serialization to catch any issues
-                    json_string = json.dumps(response_data)
-                    debug_print(f"Successfully serialized response data ({len(json_string)} bytes)")
-                except Exception as json_error:
-                    logger.error(f"JSON serialization error: {json_error}")
-                    debug_print(f"JSON serialization error: {json_error}")
-                    
-                    # Try to identify which key is causing the serialization error
-                    problematic_keys = []
-                    for key in response_data:
-                        try:
-                            json.dumps(response_data[key])
-                        except Exception as key_error:
-                            problematic_keys.append(key)
-                            logger.error(f"Serialization error in key '{key}': {key_error}")
-                            debug_print(f"Serialization error in key '{key}': {key_error}")
-                            
-                            # If it's the analysis, try to identify which subkey is problematic
-                            if key == 'analysis' and isinstance(response_data[key], dict):
-                                for subkey in response_data[key]:
-                                    try:
-                                        json.dumps(response_data[key][subkey])
-                                    except Exception as subkey_error:
-                                        logger.error(f"Serialization error in analysis.{subkey}: {subkey_error}")
-                                        debug_print(f"Serialization error in analysis.{subkey}: {subkey_error}")
-                    
-                    debug_print(f"Problematic keys identified: {problematic_keys}")
-                    
-                    # Find the problematic field and sanitize it
-                    sanitized_data = self.sanitize_data_for_json(response_data)
-                    
-                    # Try again with sanitized data
-                    try:
-                        json_string = json.dumps(sanitized_data)
-                        debug_print(f"Successfully serialized sanitized data ({len(json_string)} bytes)")
-                        return Response(sanitized_data, status=status.HTTP_200_OK)
-                    except Exception as second_error:
-                        logger.error(f"Second JSON serialization error: {second_error}")
-                        debug_print(f"Second JSON serialization error: {second_error}")
-                        
-                        # Provide a simplified response if serialization failed
-                        return Response({
-                            "success": True,
-                            "message": "Analysis completed but results couldn't be fully serialized",
-                            "file_id": str(sales_file.id),
-                            "analysis_id": str(analysis_result.id),
-                            "column_mapping_issues": column_mapping_issues if column_mapping_issues else None,
-                            "platform_type": platform_type,
-                            "available_columns": clean_df.columns.tolist()
-                        }, status=status.HTTP_200_OK)
-                
-                return Response(response_data, status=status.HTTP_200_OK)
-                
-            except Exception as e:
-                # Log the error
-                logger.error(f"Error analyzing file {file_name}: {e}")
-                logger.error(traceback.format_exc())
-                debug_print(f"Error analyzing file {file_name}: {e}")
-                debug_print(traceback.format_exc())
-                
-                # Update the analysis result with error
-                analysis_result.status = 'failed'
-                analysis_result.error_message = str(e)
-                analysis_result.save()
-                
-                return Response(
-                    {"success": False, "error": f"Error analyzing file: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+            # Hand the heavy lifting (reading, column identification, analysis) to Celery
+            dispatch_sales_analysis(analysis_result, manual_column_mapping)
+            
+            response_data = {
+                "success": True,
+                "message": "File uploaded, analysis is in progress",
+                "file_id": str(sales_file.id),
+                "analysis_id": str(analysis_result.id),
+                "status": analysis_result.status,
+                "progress": analysis_result.progress,
+                "platform_type": platform_type,
+                "poll_url": reverse('business_analytics:analysis_detail', args=[analysis_result.id])
+            }
+            
+            debug_print(f"Queued analysis {analysis_result.id} for {file_name}")
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
                 
         except Exception as e:
             # Log the error
@@ -820,6 +386,11 @@ class BusinessAnalyticsView(APIView):
 class AnalysisResultView(APIView):
     """
     API view for retrieving analysis results
+
+    While an upload is still being analyzed, clients poll the detail endpoint
+    and read status, progress and the partial analysis_data stored from the
+    first chunk. The current state is returned right away; the request never
+    waits for the analysis.
     """
     def get(self, request, analysis_id=None, format=None):
         try:
@@ -874,6 +445,84 @@ class AnalysisResultView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def post(self, request, analysis_id=None, format=None):
+        """
+        Re-run an analysis with a different platform type and/or column mapping
+
+        A platform change only recomputes the platform-specific section and is
+        answered directly. A mapping change re-runs the analysis in the
+        background, reading the Parquet snapshot instead of the raw upload.
+        """
+        try:
+            custom_user, user_email, django_user = get_user_from_session(request)
+            if not django_user:
+                return Response(
+                    {"error": "Authentication required"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            
+            analysis = SalesAnalysisResult.objects.select_related('sales_data_file').filter(
+                id=analysis_id,
+                sales_data_file__user=django_user
+            ).first()
+            if not analysis:
+                return Response({"error": "Analysis not found"}, status=status.HTTP_404_NOT_FOUND)
+            if analysis.status in ('pending', 'processing'):
+                return Response({"error": "Analysis is still in progress"}, status=status.HTTP_409_CONFLICT)
+            
+            manual_column_mapping = request.data.get('manual_column_mapping')
+            if isinstance(manual_column_mapping, str):
+                try:
+                    manual_column_mapping = json.loads(manual_column_mapping)
+                except json.JSONDecodeError:
+                    return Response({"error": "Invalid manual column mapping format"}, status=status.HTTP_400_BAD_REQUEST)
+            platform_type = request.data.get('platform_type') or None
+            
+            if manual_column_mapping:
+                SalesAnalysisResult.objects.filter(pk=analysis.pk).update(
+                    status='processing', progress=0, error_message=None
+                )
+                dispatch_sales_analysis(analysis, manual_column_mapping)
+                return Response({
+                    "success": True,
+                    "analysis_id": str(analysis.id),
+                    "status": 'processing',
+                    "poll_url": reverse('business_analytics:analysis_detail', args=[analysis.id])
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            if 'platform_type' in request.data:
+                analysis = reanalyze_platform(analysis, platform_type)
+                serializer = SalesAnalysisResultSerializer(analysis)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+            
+            return Response({"error": "Nothing to re-analyze"}, status=status.HTTP_400_BAD_REQUEST)
+            
+        except Exception as e:
+            logger.error(f"Error re-running analysis: {e}")
+            logger.error(traceback.format_exc())
+            return Response(
+                {"error": f"Error re-running analysis: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class ColumnMappingCacheStatsView(APIView):
+    """
+    API view exposing the hit/miss counters of the column mapping cache
+    """
+    def get(self, request, format=None):
+        custom_user, user_email, django_user = get_user_from_session(request)
+        if not django_user:
+            return Response(
+                {"error": "Authentication required"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        try:
+            return Response(get_cache_stats())
+        except Exception as e:
+            logger.error(f"Error reading column mapping cache stats: {e}")
+            logger.error(traceback.format_exc())
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SalesMetricsView(APIView):
     """
@@ -953,107 +602,35 @@ class SalesMetricsView(APIView):
             
             # Process the file and read it into a pandas DataFrame
             try:
-                # Save the file to a temporary location
-                with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                    for chunk in file_obj.chunks():
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-                
-                logger.info(f"Saved file temporarily to: {temp_file_path}")
-                
-                # Determine the file type and read accordingly
-                df = None
-                if file_extension == '.csv':
-                    # Use the same CSV reading logic from the upload view
-                    with open(temp_file_path, 'r', encoding='utf-8', errors='replace') as f:
-                        sample = f.read(4096)
-                    
-                    sniffer = csv.Sniffer()
-                    try:
-                        dialect = sniffer.sniff(sample)
-                        detected_delimiter = dialect.delimiter
-                        logger.info(f"Detected delimiter: '{detected_delimiter}'")
-                    except:
-                        detected_delimiter = ','
-                        logger.warning("Failed to detect delimiter, defaulting to comma")
-                    
-                    try:
-                        has_header = sniffer.has_header(sample)
-                    except:
-                        has_header = True
-                    
-                    # Try with detected settings
-                    try:
-                        df = pd.read_csv(
-                            temp_file_path, 
-                            delimiter=detected_delimiter,
-                            header=0 if has_header else None,
-                            encoding='utf-8',
-                            low_memory=False,
-                            on_bad_lines='skip'
-                        )
-                    except Exception as e:
-                        logger.error(f"First attempt to read CSV failed: {e}")
-                        
-                        # Try with different encoding
-                        df = pd.read_csv(
-                            temp_file_path,
-                            delimiter=detected_delimiter,
-                            header=0 if has_header else None,
-                            encoding='latin1',
-                            low_memory=False,
-                            on_bad_lines='skip'
-                        )
-                    
-                    # Try alternative delimiters if needed
-                    if df.shape[1] == 1:
-                        for delimiter in [';', '\t', '|']:
-                            try:
-                                temp_df = pd.read_csv(
-                                    temp_file_path,
-                                    delimiter=delimiter,
-                                    header=0 if has_header else None,
-                                    encoding='utf-8',
-                                    low_memory=False,
-                                    on_bad_lines='skip'
-                                )
-                                if temp_df.shape[1] > 1:
-                                    df = temp_df
-                                    break
-                            except:
-                                pass
-                
-                elif file_extension in ['.xlsx', '.xls']:
-                    # Read Excel file
-                    try:
-                        df = pd.read_excel(temp_file_path, engine='openpyxl')
-                    except:
-                        # Fallback to xlrd for older Excel files
-                        df = pd.read_excel(temp_file_path, engine='xlrd')
+                def resolve_mapping(sample_df):
+                    if manual_column_mapping:
+                        return manual_column_mapping
+                    # Use AI or heuristic column identification, but don't pass platform type for consistent analysis
+                    return identify_columns_with_gemini(sample_df, platform_type=None)
                 
-                # Clean up the temp file
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    logger.warning(f"Failed to delete temporary file: {temp_file_path}")
+                # Identify the columns on a sample, then read only the mapped columns
+                with uploaded_file_path(file_obj) as temp_file_path:
+                    df, column_mapping, available_columns = load_mapped_sales_file(
+                        temp_file_path, file_extension, resolve_mapping
+                    )
                 
                 # Validate the DataFrame
                 if df is None or df.empty:
                     logger.error("File resulted in empty DataFrame")
                     return Response({"error": "File contains no data or is in an unsupported format."}, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Identify columns
-                if manual_column_mapping:
-                    column_mapping = manual_column_mapping
-                else:
-                    # Use AI or heuristic column identification, but don't pass platform type for consistent analysis
-                    column_mapping = identify_columns_with_gemini(df, platform_type=None)
+                # Normalize the mapped columns once and share them between both passes
+                typed = build_typed_frame(df, column_mapping)
                 
                 # Compute the sales metrics
-                metrics = compute_sales_metrics(df, column_mapping)
+                metrics = compute_sales_metrics(df, column_mapping, typed=typed)
                 
                 # Also run the full analysis to match what's done for Meesho files
-                analysis_results = analyze_sales_data(df, column_mapping, platform_type=None)
+                analysis_results = analyze_sales_data(df, column_mapping, platform_type=None, typed=typed)
+                
+                # Only the mapped columns were read; report the file's full header
+                analysis_results.setdefault('summary', {})['column_count'] = len(available_columns)
+                analysis_results['available_columns'] = available_columns
                 
                 # Combine metrics with analysis results
                 full_results = analysis_results.copy()
@@ -1087,9 +664,12 @@ class SalesMetricsView(APIView):
         
         This method processes both files, merges them, and then performs the analysis.
         The returns file should have the same columns as the sales file, plus an additional
-        'cancel_return_date' column.
+        'cancel_return_date' column. Files uploaded before are not parsed again; their
+        stored snapshot is reused, so only newly added files are ingested.
         """
         try:
+            custom_user, user_email, django_user = get_user_from_session(request)
+            
             debug_print("🟢 Meesho platform selected")
             
             # Debug request information
@@ -1132,7 +712,7 @@ class SalesMetricsView(APIView):
             try:
                 debug_print("🔄 Processing sales file...")
                 # Read sales file
-                df_sales = self._read_file_to_dataframe(sales_file)
+                df_sales = self._read_file_to_dataframe(sales_file, django_user, 'meesho_sales')
                 if df_sales is None or df_sales.empty:
                     debug_print("❌ Sales file contains no data")
                     return Response({
@@ -1141,7 +721,7 @@ class SalesMetricsView(APIView):
                 
                 debug_print("🔄 Processing returns file...")
                 # Read returns file
-                df_returns = self._read_file_to_dataframe(returns_file)
+                df_returns = self._read_file_to_dataframe(returns_file, django_user, 'meesho_returns')
                 if df_returns is None or df_returns.empty:
                     debug_print("❌ Returns file contains no data")
                     return Response({
@@ -1266,10 +846,11 @@ class SalesMetricsView(APIView):
                 
                 # Use analyze_sales_data to match the process for other datasets
                 debug_print("Running full sales analysis on merged data...")
-                analysis_results = analyze_sales_data(df_merged, merged_mapping, platform_type=None)  # Use None instead of "meesho"
+                typed = build_typed_frame(df_merged, merged_mapping)
+                analysis_results = analyze_sales_data(df_merged, merged_mapping, platform_type=None, typed=typed)  # Use None instead of "meesho"
                 
                 # Compute metrics on merged data (same as before for compatibility)
-                metrics = compute_sales_metrics(df_merged, merged_mapping)
+                metrics = compute_sales_metrics(df_merged, merged_mapping, typed=typed)
                 
                 # Prepare final response with debug information
                 debug_print(f"✅ Analysis complete")
@@ -1331,99 +912,23 @@ class SalesMetricsView(APIView):
                 "error": f"Unexpected error in Meesho handler: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _read_file_to_dataframe(self, file_obj):
-        """Helper method to read a file into a pandas DataFrame"""
+    def _read_file_to_dataframe(self, file_obj, user=None, file_type=None):
+        """
+        Helper method to read a file into a pandas DataFrame
+        
+        With a user, the upload is ingested once per content: a file already
+        uploaded before is read back from its Parquet snapshot.
+        """
         try:
-            file_name = file_obj.name
-            file_extension = os.path.splitext(file_name)[1].lower()
-            
-            # Save the file to a temporary location
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                for chunk in file_obj.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
-            
-            logger.info(f"Saved file temporarily to: {temp_file_path}")
-            
-            # Determine the file type and read accordingly
-            df = None
-            if file_extension == '.csv':
-                # Use the same CSV reading logic from the upload view
-                with open(temp_file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    sample = f.read(4096)
-                
-                sniffer = csv.Sniffer()
-                try:
-                    dialect = sniffer.sniff(sample)
-                    detected_delimiter = dialect.delimiter
-                    logger.info(f"Detected delimiter: '{detected_delimiter}'")
-                except:
-                    detected_delimiter = ','
-                    logger.warning("Failed to detect delimiter, defaulting to comma")
-                
-                try:
-                    has_header = sniffer.has_header(sample)
-                except:
-                    has_header = True
-                
-                # Try with detected settings
-                try:
-                    df = pd.read_csv(
-                        temp_file_path, 
-                        delimiter=detected_delimiter,
-                        header=0 if has_header else None,
-                        encoding='utf-8',
-                        low_memory=False,
-                        on_bad_lines='skip'
-                    )
-                except Exception as e:
-                    logger.error(f"First attempt to read CSV failed: {e}")
-                    
-                    # Try with different encoding
-                    df = pd.read_csv(
-                        temp_file_path,
-                        delimiter=detected_delimiter,
-                        header=0 if has_header else None,
-                        encoding='latin1',
-                        low_memory=False,
-                        on_bad_lines='skip'
-                    )
-                
-                # Try alternative delimiters if needed
-                if df.shape[1] == 1:
-                    for delimiter in [';', '\t', '|']:
-                        try:
-                            temp_df = pd.read_csv(
-                                temp_file_path,
-                                delimiter=delimiter,
-                                header=0 if has_header else None,
-                                encoding='utf-8',
-                                low_memory=False,
-                                on_bad_lines='skip'
-                            )
-                            if temp_df.shape[1] > 1:
-                                df = temp_df
-                                break
-                        except:
-                            pass
-            
-            elif file_extension in ['.xlsx', '.xls']:
-                # Read Excel file
-                try:
-                    df = pd.read_excel(temp_file_path, engine='openpyxl')
-                except:
-                    # Fallback to xlrd for older Excel files
-                    df = pd.read_excel(temp_file_path, engine='xlrd')
-            
-            # Clean up the temp file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                logger.warning(f"Failed to delete temporary file: {temp_file_path}")
+            if user is not None and file_type:
+                sales_data_file, df = ingest_upload(user, file_obj, file_type)
+                return df
             
-            return df
+            file_extension = os.path.splitext(file_obj.name)[1].lower()
+            with uploaded_file_path(file_obj) as temp_file_path:
+                return read_sales_file(temp_file_path, file_extension)
             
         except Exception as e:
             logger.error(f"Error reading file to DataFrame: {str(e)}")
             logger.error(traceback.format_exc())
-            return None
\ No newline at end of file
+            return None
@@ -7,7 +7,7 @@ from celery import shared_task
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-import pandas as pd
+from documents.exports import write_xlsx
 import traceback
 
 from .models import MiningHistory, BackgroundTask
@@ -276,8 +276,6 @@ def scrape_contacts(self, keyword, data_type, country, user_id, max_results=30,
             else:
                 cleaned_items.append(str(item))
         
-        # Create a proper DataFrame and save as Excel
-        df = pd.DataFrame({data_type.capitalize(): cleaned_items})
         
         # Generate unique filename
         filename = f"mining_results_{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -285,7 +283,7 @@ def scrape_contacts(self, keyword, data_type, country, user_id, max_results=30,
         
         # Save to Excel in memory
         excel_content = ContentFile(b'')
-        df.to_excel(excel_content, index=False)
+        write_xlsx(excel_content, [data_type.capitalize()], ([item] for item in cleaned_items))
         excel_content.seek(0)
         
         # Save to MiningHistory
@@ -462,8 +460,6 @@ def scrape_serpapi(self, keyword, data_type, country, user_id, max_results=50, m
         # Extract relevant data
         items = scraper_results.get('results', [])
         
-        # Create a proper DataFrame and save as Excel
-        df = pd.DataFrame({data_type.capitalize(): items})
         
         # Generate unique filename
         filename = f"mining_results_{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -471,7 +467,7 @@ def scrape_serpapi(self, keyword, data_type, country, user_id, max_results=50, m
         
         # Save to Excel in memory
         excel_content = ContentFile(b'')
-        df.to_excel(excel_content, index=False)
+        write_xlsx(excel_content, [data_type.capitalize()], ([item] for item in items))
         excel_content.seek(0)
         
         # Save to MiningHistory
@@ -17,7 +17,7 @@ from .web_scrapper import ContactScraper
 from .tasks import  test_redis_connection, test_task_status
 from .services import service_manager  # Original service manager
 from .direct_services import *
-import pandas as pd
+from documents.exports import write_xlsx
 import uuid
 import asyncio
 from django.db.utils import OperationalError as DjangoOperationalError
@@ -777,8 +777,7 @@ class DataMinerView(TemplateView):
         return context
 
     def generate_excel(self, results, keyword, data_type):
-        # Create a DataFrame
-        df = pd.DataFrame(results, columns=[data_type.capitalize()])
+        column = data_type.capitalize()
         
         # Generate unique filename
         filename = f"mining_results_{keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -787,8 +786,12 @@ class DataMinerView(TemplateView):
         # Ensure directory exists
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        # Save to Excel
-        df.to_excel(filepath, index=False)
+        # Write the rows straight to the file (openpyxl write-only mode)
+        write_xlsx(
+            filepath,
+            [column],
+            ([item.get(column) if isinstance(item, dict) else item] for item in results)
+        )
         
         # Return relative path from MEDIA_ROOT
         return os.path.join('mining_results', filename)
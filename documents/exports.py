@@ -0,0 +1,111 @@
+"""
+Shared spreadsheet exports.
+
+Exports are built from row iterables, normally iter_values() over a queryset,
+which reads plain tuples with values_list().iterator() instead of model
+instances, so an export holds one chunk of rows in memory however large it is.
+
+- csv_response() streams the CSV while the rows are read (first byte right
+  away).
+- write_xlsx() writes the rows with openpyxl's write-only mode, which flushes
+  each row to disk as it is appended instead of keeping the cells in memory;
+  xlsx_response() does that into a temporary file and streams it back.
+- export_response() picks one of them from a ?format= value.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+
+def iter_values(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Tuples of the given fields, read from the database chunk_size rows at a time"""
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """File-like object handing every written CSV line straight back"""
+    def write(self, value):
+        return value
+
+
+def csv_response(headers, rows, filename):
+    """StreamingHttpResponse writing the header and rows as CSV while they are read"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def write_xlsx(output, headers, rows, title='Sheet1', bold_header=False, column_width=None):
+    """
+    Write rows to an XLSX workbook in openpyxl's write-only mode
+
+    Args:
+        output: file path or binary file object
+        headers: header row
+        rows: iterable of rows
+        title: worksheet name
+        bold_header: write the header row in bold
+        column_width: width of every header column (default width when None)
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+
+    # Column widths have to be set before the first row is written
+    if column_width:
+        for column in range(1, len(headers) + 1):
+            sheet.column_dimensions[get_column_letter(column)].width = column_width
+
+    if bold_header:
+        header_row = []
+        for header in headers:
+            cell = WriteOnlyCell(sheet, value=header)
+            cell.font = Font(bold=True)
+            header_row.append(cell)
+        sheet.append(header_row)
+    else:
+        sheet.append(list(headers))
+
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+
+
+def xlsx_response(headers, rows, filename, **options):
+    """Streamed XLSX download of the rows (options as for write_xlsx)"""
+    output = tempfile.TemporaryFile()
+    write_xlsx(output, headers, rows, **options)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=f"{filename}.xlsx", content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(export_format, headers, rows, filename, **options):
+    """
+    Download of the rows as 'csv' or 'xlsx'
+
+    Raises:
+        ValueError: for any other format
+    """
+    export_format = (export_format or 'xlsx').lower()
+    if export_format == 'csv':
+        return csv_response(headers, rows, filename)
+    if export_format == 'xlsx':
+        return xlsx_response(headers, rows, filename, **options)
+    raise ValueError(f"Invalid format {export_format}, expected csv or xlsx")
@@ -0,0 +1,205 @@
+"""
+Shared PDF rendering for invoices and HR documents.
+
+A renderer is a module-level function taking a JSON-serializable spec and
+returning the PDF bytes, referenced by its dotted path so it can run in
+another process. Renders go through a process pool of PDF_RENDER_WORKERS
+processes, which keeps CPU-bound ReportLab/xhtml2pdf work off the request
+threads and lets batch runs draw several documents in parallel; when the pool
+is unavailable (PDF_RENDER_WORKERS = 0, or inside a daemonic Celery worker)
+the renderer runs in the calling process.
+
+Rendered PDFs are content addressed: render_document() stores each one as
+<folder>/<digest>.pdf, where the digest is the sha256 of the renderer path
+and its spec, and returns the stored file when it already exists. The digest
+covers the inputs rather than the output bytes because both libraries embed
+creation timestamps in every file they write. Specs that depend on files on
+disk (logos) include file_fingerprint() of them, so replacing the file gives
+a new digest. HR documents (offer letters, agreements) hold personal data and
+go through render(), which stores nothing.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from importlib import import_module
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def document_digest(renderer, spec):
+    """sha256 hex digest identifying the PDF a renderer draws from a spec"""
+    payload = json.dumps([renderer, spec], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """(path, mtime, size) of a file, or None when it cannot be read"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return [str(path), stat.st_mtime_ns, stat.st_size]
+
+
+@lru_cache(maxsize=64)
+def _load_image(path, mtime_ns, size):
+    from reportlab.lib.utils import ImageReader
+    return ImageReader(path)
+
+
+def load_image(fingerprint):
+    """
+    Parsed image for a file_fingerprint(), cached per process
+
+    Logos are shared by every invoice of a company, so each render process
+    decodes a logo once instead of on every invoice.
+    """
+    return _load_image(*fingerprint)
+
+
+def html_to_pdf(spec):
+    """Renderer converting spec['html'] to a PDF with xhtml2pdf"""
+    from xhtml2pdf import pisa
+
+    result = BytesIO()
+    pisa_status = pisa.CreatePDF(spec['html'], dest=result)
+    if pisa_status.err:
+        raise ValueError(f"PDF generation error: {pisa_status.err}")
+    return result.getvalue()
+
+
+@lru_cache(maxsize=None)
+def _resolve(renderer):
+    module_path, name = renderer.rsplit('.', 1)
+    return getattr(import_module(module_path), name)
+
+
+def _render(renderer, spec):
+    # Runs in the pool processes
+    return _resolve(renderer)(spec)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _get_pool():
+    global _pool
+    workers = getattr(settings, 'PDF_RENDER_WORKERS', 2)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            atexit.register(_pool.shutdown, wait=False)
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _submit(renderer, spec):
+    """Future of a render in the pool, or None when it has to run here"""
+    try:
+        pool = _get_pool()
+        return pool.submit(_render, renderer, spec) if pool else None
+    except BrokenProcessPool:
+        _reset_pool()
+    except Exception as e:
+        logger.warning(f"PDF render pool unavailable ({e}), rendering in process")
+    return None
+
+
+def _result(future, renderer, spec):
+    if future is None:
+        return _render(renderer, spec)
+    try:
+        return future.result(timeout=getattr(settings, 'PDF_RENDER_TIMEOUT', 120))
+    except BrokenProcessPool:
+        logger.warning("PDF render pool broke, rendering in process")
+        _reset_pool()
+        return _render(renderer, spec)
+
+
+def render(renderer, spec):
+    """Render a PDF through the pool and return its bytes"""
+    return _result(_submit(renderer, spec), renderer, spec)
+
+
+def _store(path, content):
+    saved = default_storage.save(path, ContentFile(content))
+    if saved != path:
+        # Another process stored the same document first
+        default_storage.delete(saved)
+    return path
+
+
+def render_document(renderer, spec, folder):
+    """
+    Render a PDF once per distinct input
+
+    Args:
+        renderer: dotted path of the renderer function
+        spec: JSON-serializable input of the renderer
+        folder: storage folder of the PDFs
+
+    Returns:
+        str: storage path of the PDF
+    """
+    path = f"{folder}/{document_digest(renderer, spec)}.pdf"
+    if default_storage.exists(path):
+        return path
+    return _store(path, render(renderer, spec))
+
+
+def render_documents(renderer, specs, folder):
+    """
+    Render many PDFs in parallel, skipping the ones already stored
+
+    Returns:
+        list: storage path of each spec's PDF (None where rendering failed)
+    """
+    paths = [f"{folder}/{document_digest(renderer, spec)}.pdf" for spec in specs]
+    pending = {}
+    for path, spec in zip(paths, specs):
+        if path not in pending and not default_storage.exists(path):
+            pending[path] = (spec, _submit(renderer, spec))
+
+    failed = set()
+    for path, (spec, future) in pending.items():
+        try:
+            _store(path, _result(future, renderer, spec))
+        except Exception as e:
+            logger.error(f"Error rendering {path}: {e}")
+            logger.error(traceback.format_exc())
+            failed.add(path)
+
+    logger.info(f"Rendered {len(pending) - len(failed)} of {len(specs)} documents into {folder} ({len(failed)} failed)")
+    return [None if path in failed else path for path in paths]
+
+
+def read_document(path):
+    """Bytes of a stored PDF"""
+    with default_storage.open(path, 'rb') as stored:
+        return stored.read()
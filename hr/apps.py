@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class HrConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hr'
+
+    def ready(self):
+        # Connect the signal handlers that invalidate cached attendance metrics
+        # and keep the monthly attendance/leave ledger up to date
+        from . import ledger, metrics  # noqa: F401
@@ -0,0 +1,312 @@
+"""
+Monthly attendance and leave ledger.
+
+EmployeeMonthlySummary holds one row per employee and month with the
+attendance counts by status, the approved leave days taken per leave type
+and the pending leave/reimbursement counts of that month. Whenever an
+EmployeeAttendance, LeaveApplication or ReimbursementRequest row is written
+or deleted, only the months it touches (before and after the change) are
+recomputed, after the commit, so the employee dashboard and the leave
+balance read a handful of ledger rows instead of scanning the history.
+
+rebuild_monthly_summaries() backfills the ledger in bulk
+(manage.py rebuild_leave_ledger).
+"""
+import calendar
+import logging
+import traceback
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import (
+    EmployeeAttendance,
+    EmployeeMonthlySummary,
+    LeaveApplication,
+    LeaveType,
+    ReimbursementRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+# Attendance status -> ledger field
+ATTENDANCE_FIELDS = {
+    'present': 'present_days',
+    'late': 'late_days',
+    'half_day': 'half_days',
+    'absent': 'absent_days',
+    'leave': 'leave_days',
+}
+
+COUNT_FIELDS = list(ATTENDANCE_FIELDS.values()) + ['pending_leaves', 'pending_reimbursements']
+
+# Leave policy categories, matched against the leave type name
+LEAVE_CATEGORIES = ('casual', 'sick', 'annual')
+
+BULK_BATCH_SIZE = 500
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return parse_date(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def month_bounds(year, month):
+    """First and last day of a month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def iter_months(start, end):
+    """(year, month) of every month between two dates, inclusive"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def leave_days_by_month(start, end):
+    """{(year, month): days} of a leave period, split at month boundaries"""
+    days = {}
+    for year, month in iter_months(start, end):
+        first, last = month_bounds(year, month)
+        days[(year, month)] = (min(end, last) - max(start, first)).days + 1
+    return days
+
+
+def affected_months(instance):
+    """(employee_id, year, month) ledger rows an attendance/leave/reimbursement row counts towards"""
+    if instance.employee_id is None:
+        return set()
+    if isinstance(instance, EmployeeAttendance):
+        days = [_as_date(instance.date)]
+    elif isinstance(instance, LeaveApplication):
+        start, end = _as_date(instance.start_date), _as_date(instance.end_date)
+        if start and end and end >= start:
+            return {(instance.employee_id, year, month) for year, month in iter_months(start, end)}
+        days = [start]
+    else:
+        days = [_as_date(instance.expense_date)]
+    return {(instance.employee_id, day.year, day.month) for day in days if day}
+
+
+def refresh_month(employee_id, year, month):
+    """
+    Recompute one ledger row from the source tables
+
+    The row is deleted when the month has nothing left to count.
+
+    Returns:
+        EmployeeMonthlySummary, or None when the month is empty
+    """
+    first, last = month_bounds(year, month)
+
+    values = EmployeeAttendance.objects.filter(
+        employee_id=employee_id, date__gte=first, date__lte=last
+    ).order_by().aggregate(**{
+        field: Count('pk', filter=Q(status=status))
+        for status, field in ATTENDANCE_FIELDS.items()
+    })
+
+    leave_taken = defaultdict(int)
+    values['pending_leaves'] = 0
+    leaves = LeaveApplication.objects.filter(
+        Q(status='approved', start_date__lte=last, end_date__gte=first) |
+        Q(status='pending', start_date__gte=first, start_date__lte=last),
+        employee_id=employee_id
+    ).values_list('status', 'leave_type_id', 'start_date', 'end_date')
+    for status, leave_type_id, start, end in leaves:
+        if status == 'pending':
+            values['pending_leaves'] += 1
+        elif leave_type_id:
+            leave_taken[str(leave_type_id)] += (min(end, last) - max(start, first)).days + 1
+    values['leave_taken'] = dict(leave_taken)
+
+    values['pending_reimbursements'] = ReimbursementRequest.objects.filter(
+        employee_id=employee_id,
+        status='pending',
+        expense_date__gte=first,
+        expense_date__lte=last
+    ).count()
+
+    if not values['leave_taken'] and not any(values[field] for field in COUNT_FIELDS):
+        EmployeeMonthlySummary.objects.filter(employee_id=employee_id, year=year, month=month).delete()
+        return None
+
+    summary, _ = EmployeeMonthlySummary.objects.update_or_create(
+        employee_id=employee_id, year=year, month=month, defaults=values
+    )
+    return summary
+
+
+def refresh_months(keys):
+    """Recompute the given (employee_id, year, month) ledger rows"""
+    for employee_id, year, month in sorted(keys, key=str):
+        try:
+            refresh_month(employee_id, year, month)
+        except Exception as e:
+            logger.error(f"Error updating ledger of employee {employee_id} for {month}/{year}: {e}")
+            logger.error(traceback.format_exc())
+
+
+def rebuild_monthly_summaries(employee_ids=None):
+    """
+    Rebuild the ledger from scratch with grouped queries
+
+    Args:
+        employee_ids: limit the rebuild to these employees (None for everyone)
+
+    Returns:
+        int: number of ledger rows written
+    """
+    def scoped(queryset):
+        return queryset.filter(employee_id__in=employee_ids) if employee_ids is not None else queryset
+
+    rows = defaultdict(lambda: {'leave_taken': defaultdict(int)})
+
+    attendance = (
+        scoped(EmployeeAttendance.objects.all()).order_by()
+        .values('employee_id', year=ExtractYear('date'), month=ExtractMonth('date'))
+        .annotate(**{
+            field: Count('pk', filter=Q(status=status))
+            for status, field in ATTENDANCE_FIELDS.items()
+        })
+    )
+    for group in attendance:
+        row = rows[(group['employee_id'], group['year'], group['month'])]
+        for field in ATTENDANCE_FIELDS.values():
+            row[field] = group[field]
+
+    leaves = scoped(LeaveApplication.objects.filter(status__in=['approved', 'pending'])).values_list(
+        'employee_id', 'status', 'leave_type_id', 'start_date', 'end_date'
+    )
+    for employee_id, status, leave_type_id, start, end in leaves.iterator(chunk_size=2000):
+        if status == 'pending':
+            row = rows[(employee_id, start.year, start.month)]
+            row['pending_leaves'] = row.get('pending_leaves', 0) + 1
+        elif leave_type_id and end >= start:
+            for (year, month), days in leave_days_by_month(start, end).items():
+                rows[(employee_id, year, month)]['leave_taken'][str(leave_type_id)] += days
+
+    reimbursements = (
+        scoped(ReimbursementRequest.objects.filter(status='pending')).order_by()
+        .values('employee_id', year=ExtractYear('expense_date'), month=ExtractMonth('expense_date'))
+        .annotate(pending=Count('pk'))
+    )
+    for group in reimbursements:
+        rows[(group['employee_id'], group['year'], group['month'])]['pending_reimbursements'] = group['pending']
+
+    summaries = []
+    for (employee_id, year, month), values in rows.items():
+        values['leave_taken'] = dict(values['leave_taken'])
+        summaries.append(EmployeeMonthlySummary(employee_id=employee_id, year=year, month=month, **values))
+
+    with transaction.atomic():
+        scoped(EmployeeMonthlySummary.objects.all()).delete()
+        EmployeeMonthlySummary.objects.bulk_create(summaries, batch_size=BULK_BATCH_SIZE)
+    logger.info(f"Rebuilt {len(summaries)} monthly ledger rows")
+    return len(summaries)
+
+
+def get_employee_ledger(employee_id, day=None):
+    """
+    Ledger figures of an employee for the dashboard and leave balance
+
+    Args:
+        employee_id: employee UUID
+        day: reference date (defaults to today)
+
+    Returns:
+        dict: month (EmployeeMonthlySummary of the day's month or None),
+            leave_taken ({leave_type_id: days} for the day's year),
+            pending_leaves, pending_reimbursements
+    """
+    day = day or timezone.now().date()
+    summaries = EmployeeMonthlySummary.objects.filter(employee_id=employee_id)
+
+    ledger = summaries.aggregate(
+        pending_leaves=Coalesce(Sum('pending_leaves'), 0),
+        pending_reimbursements=Coalesce(Sum('pending_reimbursements'), 0),
+    )
+    ledger['month'] = None
+    leave_taken = defaultdict(int)
+    for summary in summaries.filter(year=day.year):
+        if summary.month == day.month:
+            ledger['month'] = summary
+        for leave_type_id, days in summary.leave_taken.items():
+            leave_taken[leave_type_id] += days
+    ledger['leave_taken'] = dict(leave_taken)
+    return ledger
+
+
+def leave_category(name):
+    """'casual', 'sick', 'annual' or None for a leave type name"""
+    name = (name or '').lower()
+    for category in LEAVE_CATEGORIES:
+        if category in name:
+            return category
+    return None
+
+
+def leave_days_taken(leave_taken, leave_type_names):
+    """
+    Sum ledger leave days per policy category
+
+    Args:
+        leave_taken: {leave_type_id: days} from get_employee_ledger
+        leave_type_names: {leave_type_id: name} already known; other leave
+            types are looked up
+    """
+    names = {str(key): value for key, value in leave_type_names.items()}
+    unknown = [leave_type_id for leave_type_id in leave_taken if leave_type_id not in names]
+    if unknown:
+        names.update(
+            (str(pk), name) for pk, name in LeaveType.objects.filter(pk__in=unknown).values_list('pk', 'name')
+        )
+
+    days_taken = {category: 0 for category in LEAVE_CATEGORIES}
+    for leave_type_id, days in leave_taken.items():
+        category = leave_category(names.get(leave_type_id))
+        if category:
+            days_taken[category] += days
+    return days_taken
+
+
+def _schedule_refresh(keys):
+    if keys:
+        transaction.on_commit(lambda: refresh_months(keys))
+
+
+@receiver(pre_save, sender=EmployeeAttendance)
+@receiver(pre_save, sender=LeaveApplication)
+@receiver(pre_save, sender=ReimbursementRequest)
+def remember_previous_months(sender, instance, **kwargs):
+    # An update can move a row to another employee or month; the old one must be recounted too
+    instance._ledger_previous = set()
+    if not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._ledger_previous = affected_months(previous)
+
+
+@receiver(post_save, sender=EmployeeAttendance)
+@receiver(post_save, sender=LeaveApplication)
+@receiver(post_save, sender=ReimbursementRequest)
+def ledger_source_saved(sender, instance, **kwargs):
+    _schedule_refresh(affected_months(instance) | getattr(instance, '_ledger_previous', set()))
+
+
+@receiver(post_delete, sender=EmployeeAttendance)
+@receiver(post_delete, sender=LeaveApplication)
+@receiver(post_delete, sender=ReimbursementRequest)
+def ledger_source_deleted(sender, instance, **kwargs):
+    _schedule_refresh(affected_months(instance))
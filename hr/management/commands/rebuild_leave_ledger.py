@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from hr.ledger import rebuild_monthly_summaries
+import time
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly attendance and leave ledger from attendance, leave and reimbursement records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('employee_ids', nargs='*', type=str, help='UUIDs of employees to rebuild (leave empty for all)')
+
+    def handle(self, *args, **options):
+        employee_ids = options['employee_ids'] or None
+
+        started = time.monotonic()
+        rows = rebuild_monthly_summaries(employee_ids)
+        elapsed = time.monotonic() - started
+
+        scope = f"{len(employee_ids)} employees" if employee_ids else "all employees"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} ledger rows for {scope} in {elapsed:.2f}s"))
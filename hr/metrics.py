@@ -0,0 +1,135 @@
+"""
+Attendance dashboard metrics.
+
+All counters of the attendance dashboard (total, active today, on leave,
+unassigned) come from one conditional-aggregate query over the approved
+employees. Results are cached per (company, status filter, date) under a
+version counter that is bumped whenever an Employee, EmployeeAttendance or
+LeaveApplication row changes, so the dashboard's metrics poll is answered
+from the cache until something actually changes.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Employee, EmployeeAttendance, LeaveApplication
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'hr:attendance_metrics:version'
+
+# Safety net only: entries are normally replaced when the version moves
+METRICS_CACHE_TIMEOUT = 60 * 60
+
+
+def present_on(day):
+    """Exists() for employees marked present on a day (attendance rows match on the employee UUID)"""
+    return Exists(EmployeeAttendance.objects.filter(
+        employee_id=OuterRef('employee_id'),
+        date=day,
+        status='present'
+    ))
+
+
+def on_leave_on(day):
+    """Exists() for employees with an approved leave covering a day"""
+    return Exists(LeaveApplication.objects.filter(
+        employee_id=OuterRef('employee_id'),
+        status='approved',
+        start_date__lte=day,
+        end_date__gte=day
+    ))
+
+
+def compute_attendance_metrics(employees, day=None):
+    """
+    Attendance counters of an employee queryset in a single query
+
+    Args:
+        employees: Employee queryset (already filtered)
+        day: date to report on (defaults to today)
+
+    Returns:
+        dict: total_employees, active_employees, non_attendees,
+            employees_on_leave, unassigned_employees
+    """
+    day = day or timezone.now().date()
+    counts = employees.order_by().aggregate(
+        total_employees=Count('pk'),
+        active_employees=Count('pk', filter=Q(present_on(day))),
+        employees_on_leave=Count('pk', filter=Q(on_leave_on(day))),
+        unassigned_employees=Count('pk', filter=Q(location__isnull=True)),
+    )
+    counts['non_attendees'] = counts['total_employees'] - counts['active_employees']
+    return counts
+
+
+def filter_employees_by_status(employees, status_filter, day=None):
+    """Apply the dashboard's status filter to an Employee queryset"""
+    if status_filter == 'active':
+        return employees.filter(is_active=True)
+    if status_filter == 'inactive':
+        return employees.filter(is_active=False)
+    if status_filter == 'on_leave':
+        return employees.filter(on_leave_on(day or timezone.now().date()))
+    if status_filter == 'unassigned':
+        # Unassigned employees - employees without location data
+        return employees.filter(location__isnull=True)
+    return employees
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def get_attendance_metrics(company_id=None, status_filter=None, day=None):
+    """
+    Cached attendance counters of the approved employees of a company
+
+    Args:
+        company_id: Company UUID, or None for all companies
+        status_filter: optional dashboard status filter
+        day: date to report on (defaults to today)
+
+    Returns:
+        dict: see compute_attendance_metrics
+    """
+    day = day or timezone.now().date()
+    key = f"hr:attendance_metrics:{_version()}:{company_id or 'all'}:{status_filter or 'all'}:{day.isoformat()}"
+    metrics = cache.get(key)
+    if metrics is None:
+        employees = Employee.objects.filter(is_approved=True)
+        if company_id:
+            employees = employees.filter(company__company_id=company_id)
+        employees = filter_employees_by_status(employees, status_filter, day)
+        metrics = compute_attendance_metrics(employees, day)
+        cache.set(key, metrics, METRICS_CACHE_TIMEOUT)
+    return metrics
+
+
+def invalidate_attendance_metrics():
+    """Make every cached metrics entry stale"""
+    try:
+        if not cache.add(VERSION_KEY, 2, timeout=None):
+            cache.incr(VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not bump attendance metrics version: {e}")
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=EmployeeAttendance)
+@receiver(post_delete, sender=EmployeeAttendance)
+@receiver(post_save, sender=LeaveApplication)
+@receiver(post_delete, sender=LeaveApplication)
+def attendance_data_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_attendance_metrics)
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0002_employee_allowances_employee_salary_ctc'),
+        ('hr', '0063_alter_leaveapplication_leave_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeMonthlySummary',
+            fields=[
+                ('summary_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.IntegerField()),
+                ('year', models.IntegerField()),
+                ('present_days', models.IntegerField(default=0)),
+                ('late_days', models.IntegerField(default=0)),
+                ('half_days', models.IntegerField(default=0)),
+                ('absent_days', models.IntegerField(default=0)),
+                ('leave_days', models.IntegerField(default=0)),
+                ('leave_taken', models.JSONField(default=dict)),
+                ('pending_leaves', models.IntegerField(default=0)),
+                ('pending_reimbursements', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='employee.employee')),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+                'unique_together': {('employee', 'month', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.20 on 2026-10-18 00:00
+
+import calendar
+import uuid
+from collections import defaultdict
+from datetime import date
+
+from django.db import migrations
+from django.db.models import Count, Q
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+# Same grouped queries as hr.ledger.rebuild_monthly_summaries, on the historical models
+
+ATTENDANCE_FIELDS = {
+    'present': 'present_days',
+    'late': 'late_days',
+    'half_day': 'half_days',
+    'absent': 'absent_days',
+    'leave': 'leave_days',
+}
+
+
+def leave_days_by_month(start, end):
+    days = {}
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        first = date(year, month, 1)
+        last = date(year, month, calendar.monthrange(year, month)[1])
+        days[(year, month)] = (min(end, last) - max(start, first)).days + 1
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return days
+
+
+def backfill_monthly_summaries(apps, schema_editor):
+    EmployeeAttendance = apps.get_model('hr', 'EmployeeAttendance')
+    LeaveApplication = apps.get_model('hr', 'LeaveApplication')
+    ReimbursementRequest = apps.get_model('hr', 'ReimbursementRequest')
+    EmployeeMonthlySummary = apps.get_model('hr', 'EmployeeMonthlySummary')
+
+    rows = defaultdict(lambda: {'leave_taken': defaultdict(int)})
+
+    attendance = (
+        EmployeeAttendance.objects.order_by()
+        .values('employee_id', year=ExtractYear('date'), month=ExtractMonth('date'))
+        .annotate(**{
+            field: Count('pk', filter=Q(status=status))
+            for status, field in ATTENDANCE_FIELDS.items()
+        })
+    )
+    for group in attendance:
+        row = rows[(group['employee_id'], group['year'], group['month'])]
+        for field in ATTENDANCE_FIELDS.values():
+            row[field] = group[field]
+
+    leaves = LeaveApplication.objects.filter(status__in=['approved', 'pending']).values_list(
+        'employee_id', 'status', 'leave_type_id', 'start_date', 'end_date'
+    )
+    for employee_id, status, leave_type_id, start, end in leaves.iterator(chunk_size=2000):
+        if employee_id is None or start is None:
+            continue
+        if status == 'pending':
+            row = rows[(employee_id, start.year, start.month)]
+            row['pending_leaves'] = row.get('pending_leaves', 0) + 1
+        elif leave_type_id and end and end >= start:
+            for (year, month), days in leave_days_by_month(start, end).items():
+                rows[(employee_id, year, month)]['leave_taken'][str(leave_type_id)] += days
+
+    reimbursements = (
+        ReimbursementRequest.objects.filter(status='pending').order_by()
+        .values('employee_id', year=ExtractYear('expense_date'), month=ExtractMonth('expense_date'))
+        .annotate(pending=Count('pk'))
+    )
+    for group in reimbursements:
+        rows[(group['employee_id'], group['year'], group['month'])]['pending_reimbursements'] = group['pending']
+
+    summaries = []
+    for (employee_id, year, month), values in rows.items():
+        if employee_id is None or year is None:
+            continue
+        values['leave_taken'] = dict(values['leave_taken'])
+        summaries.append(EmployeeMonthlySummary(
+            summary_id=uuid.uuid4(), employee_id=employee_id, year=year, month=month, **values
+        ))
+
+    EmployeeMonthlySummary.objects.all().delete()
+    EmployeeMonthlySummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0064_employeemonthlysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_monthly_summaries, migrations.RunPython.noop),
+    ]
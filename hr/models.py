@@ -644,6 +644,29 @@ class LeaveGroupRule(models.Model):
     def __str__(self):
         return f"{self.leave_group.name} - {self.leave_type.name}"
 
+class EmployeeMonthlySummary(models.Model):
+    """Per-employee, per-month attendance and leave ledger, kept up to date by hr.ledger"""
+    summary_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    employee = models.ForeignKey('employee.Employee', on_delete=models.CASCADE, related_name='monthly_summaries')
+    month = models.IntegerField()  # 1-12 for Jan-Dec
+    year = models.IntegerField()
+    present_days = models.IntegerField(default=0)
+    late_days = models.IntegerField(default=0)
+    half_days = models.IntegerField(default=0)
+    absent_days = models.IntegerField(default=0)
+    leave_days = models.IntegerField(default=0)  # Attendance marked as leave
+    leave_taken = models.JSONField(default=dict)  # Approved leave days in the month per leave type id
+    pending_leaves = models.IntegerField(default=0)  # Pending applications starting in the month
+    pending_reimbursements = models.IntegerField(default=0)  # Pending requests for expenses of the month
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['employee', 'month', 'year']
+        ordering = ['-year', '-month']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.month}/{self.year}"
+
 @receiver(pre_save, sender='hr.OnboardingInvitation')
 def ensure_onboarding_data_saved(sender, instance, **kwargs):
     """Ensure form data is properly saved before saving the model to database"""
@@ -11,7 +11,7 @@ from User.models import UserSession
 import json
 import uuid
 from django.utils import timezone
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail
 from django.conf import settings
 import random
 from datetime import datetime, timedelta
@@ -33,12 +33,14 @@ from django.contrib import messages
 from django.contrib.auth.hashers import check_password
 from django.db.models.signals import pre_save
 import math
-from xhtml2pdf import pisa
 from django.template.loader import get_template, render_to_string
 from django.core.mail import EmailMessage
-import openpyxl
-from openpyxl.utils import get_column_letter
 from django.db import transaction
+from hr.metrics import compute_attendance_metrics, filter_employees_by_status, get_attendance_metrics
+from hr.ledger import get_employee_ledger, leave_category, leave_days_taken
+from documents.renderer import render as render_pdf
+from documents.exports import export_response, iter_values
+from outbox.delivery import queue_templated_email
 
 logger = logging.getLogger(__name__)
 
@@ -569,60 +571,13 @@ class AttendanceView(TemplateView):
                     employees = employees.filter(is_active=is_active)
         
         # Apply status filter if specified
-        if status_filter:
-            if status_filter == 'active':
-                employees = employees.filter(is_active=True)
-            elif status_filter == 'inactive':
-                employees = employees.filter(is_active=False)
-            elif status_filter == 'on_leave':
-                # Get employees currently on leave
-                today = timezone.now().date()
-                leave_employee_ids = LeaveApplication.objects.filter(
-                    status='approved',
-                    start_date__lte=today,
-                    end_date__gte=today
-                ).values_list('employee_id', flat=True)
-                employees = employees.filter(employee_id__in=leave_employee_ids)
-            elif status_filter == 'unassigned':
-                # Unassigned employees - filter based on what makes sense for your application
-                # For example, employees without location data
-                employees = employees.filter(location__isnull=True)
+        employees = filter_employees_by_status(employees, status_filter)
         
-        # Calculate metrics
-        today = timezone.now().date()
-        
-        # 1. Total approved employees
-        total_employees = employees.count()
-        
-        # 2. Active employees (with attendance today)
-        active_employee_ids = EmployeeAttendance.objects.filter(
-            date=today, 
-            status='present'
-        ).values_list('employee_id', flat=True)
-        active_employees = employees.filter(employee_id__in=active_employee_ids).count()
-        
-        # 3. Non-attendees (employees who should have attendance but don't)
-        non_attendees = total_employees - active_employees
-        
-        # 4. Employees on leave
-        employees_on_leave = LeaveApplication.objects.filter(
-            employee_id__in=employees.values_list('employee_id', flat=True),
-            status='approved',
-            start_date__lte=today,
-            end_date__gte=today
-        ).count()
-        
-        # 5. Unassigned employees (without department or designation)
-        unassigned_employees = employees.filter(location__isnull=True).count()
-        
-        # Store metrics in context
-        context['metrics'] = {
-            'total_employees': total_employees,
-            'active_employees': active_employees,
-            'non_attendees': non_attendees,
-            'employees_on_leave': employees_on_leave,
-            'unassigned_employees': unassigned_employees
-        }
+        # All counters come from one aggregate query; the unsearched dashboard is cached
+        if search_query:
+            context['metrics'] = compute_attendance_metrics(employees)
+        else:
+            context['metrics'] = get_attendance_metrics(company_filter, status_filter)
         
         # Get all employees for display
         context['employees'] = employees
@@ -642,8 +597,13 @@ class AttendanceView(TemplateView):
     def get(self, request, *args, **kwargs):
         # Check if this is an AJAX request for metrics only
         if request.GET.get('fetch_metrics', False) and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            context = self.get_context_data(**kwargs)
-            return JsonResponse({'metrics': context['metrics']})
+            # Answer the poll without building the rest of the page context
+            if request.GET.get('search_query'):
+                return JsonResponse({'metrics': self.get_context_data(**kwargs)['metrics']})
+            return JsonResponse({'metrics': get_attendance_metrics(
+                request.GET.get('company') or None,
+                request.GET.get('status') or None
+            )})
         return super().get(request, *args, **kwargs)
 
 
@@ -2189,25 +2149,17 @@ class OnboardingInvitationView(View):
 def generate_pdf_from_html(html_content):
     """
     Generates a PDF from HTML content.
+
+    The PDF is rendered in the documents render pool. It is not stored:
+    offer letters and agreements hold personal data.
     """
     try:
-        result = BytesIO()
         # The HTML content might be a template path or raw HTML
         template = get_template("hr_management/pdf_template.html")
         html = template.render({'content': html_content})
-        
+
         # Create PDF
-        pisa_status = pisa.CreatePDF(
-            html,                # the HTML to convert
-            dest=result           # file-like object to receive PDF
-        )
-        
-        if pisa_status.err:
-            logger.error(f"PDF generation error: {pisa_status.err}")
-            return None
-        
-        result.seek(0)
-        return result.getvalue()
+        return render_pdf('documents.renderer.html_to_pdf', {'html': html})
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}", exc_info=True)
         return None
@@ -2925,21 +2877,13 @@ class OnboardingInvitationRejectView(View):
             if company.company_logo:
                 context['company_logo'] = company.company_logo.url
             
-            # Check if template exists
-            template_path = 'hr_management/email_templates/rejection_notification.html'
-            
-            # Render email template
-            html_message = render_to_string(template_path, context)
-            plain_message = strip_tags(html_message)
-            
-            # Send email
-            subject = f"Update on Your Application at {company.company_name}"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            recipient_list = [invitation.email]
-            
-            email = EmailMultiAlternatives(subject, plain_message, from_email, recipient_list)
-            email.attach_alternative(html_message, "text/html")
-            email.send()
+            # Render the template once and queue it with a plain-text alternative
+            queue_templated_email(
+                f"Update on Your Application at {company.company_name}",
+                'hr_management/email_templates/rejection_notification.html',
+                context,
+                [invitation.email]
+            )
             
             logger.info(f"Rejection email sent to {invitation.email}")
             return True
@@ -2981,7 +2925,20 @@ class OnboardingInvitationDeleteView(View):
                 'message': str(e)
             }, status=500)
         
-def get_employee_leave_balance(employee):
+def get_employee_leave_balance(employee, ledger=None):
+    """
+    Leave balance of an employee for the current year
+
+    Days taken come from the monthly ledger (hr.ledger) instead of the
+    employee's leave applications.
+
+    Args:
+        employee: hr Employee
+        ledger: result of get_employee_ledger, when the caller already has it
+
+    Returns:
+        tuple: (leave_balance, leave_policy) dicts keyed by casual/sick/annual
+    """
     leave_balance = {
         'casual': 0, 'sick': 0, 'annual': 0,
     }
@@ -2992,35 +2949,16 @@ def get_employee_leave_balance(employee):
     if employee.leave_group:
         leave_group_rules = employee.leave_group.rules.all().select_related('leave_type')
         
+        leave_type_names = {}
         for rule in leave_group_rules:
-            leave_type_name = rule.leave_type.name.lower()
-            days_allowed = rule.days if rule.days is not None else 0
-            if 'casual' in leave_type_name:
-                leave_policy['casual'] = days_allowed
-            elif 'sick' in leave_type_name:
-                leave_policy['sick'] = days_allowed
-            elif 'annual' in leave_type_name:
-                leave_policy['annual'] = days_allowed
+            leave_type_names[rule.leave_type_id] = rule.leave_type.name
+            category = leave_category(rule.leave_type.name)
+            if category:
+                leave_policy[category] = rule.days if rule.days is not None else 0
         
-        current_year = timezone.now().year
-        approved_leaves = LeaveApplication.objects.filter(
-            employee=employee,
-            status='approved',
-            start_date__year=current_year
-        ).select_related('leave_type')
-        
-        days_taken = {'casual': 0, 'sick': 0, 'annual': 0}
-        
-        for leave in approved_leaves:
-            if leave.leave_type:
-                leave_type_name = leave.leave_type.name.lower()
-                duration = leave.duration if leave.duration is not None else 0
-                if 'casual' in leave_type_name:
-                    days_taken['casual'] += duration
-                elif 'sick' in leave_type_name:
-                    days_taken['sick'] += duration
-                elif 'annual' in leave_type_name:
-                    days_taken['annual'] += duration
+        if ledger is None:
+            ledger = get_employee_ledger(employee.employee_id)
+        days_taken = leave_days_taken(ledger['leave_taken'], leave_type_names)
 
         leave_balance['casual'] = leave_policy['casual'] - days_taken['casual']
         leave_balance['sick'] = leave_policy['sick'] - days_taken['sick']
@@ -3053,53 +2991,35 @@ class EmployeeDashboardView(TemplateView):
             context['today_date'] = today
             
             # Attendance statistics
-            month_start = today.replace(day=1)
             month_days = (today.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
             month_days = month_days.day
             
-            # Get attendance for current month
-            attendances = EmployeeAttendance.objects.filter(
-                employee=employee,
-                date__gte=month_start,
-                date__lte=today
-            )
-            
-            present_days = attendances.filter(status='present').count()
+            # Monthly attendance/leave ledger (attendance rows reference the employee UUID)
+            ledger = get_employee_ledger(employee.employee_id, today)
+            month_summary = ledger['month']
             
             context['attendance_stats'] = {
-                'present': present_days,
+                'present': month_summary.present_days if month_summary else 0,
+                'late': month_summary.late_days if month_summary else 0,
+                'half_day': month_summary.half_days if month_summary else 0,
                 'total': month_days,
             }
             
             # Check today's status
-            today_attendance = attendances.filter(date=today).first()
+            today_attendance = EmployeeAttendance.objects.filter(
+                employee_id=employee.employee_id,
+                date=today
+            ).first()
             context['today_status'] = today_attendance.status if today_attendance else 'not_marked'
             context['checked_out'] = today_attendance.check_out_time if today_attendance else False
             
-            # Leave balance (example values, should be calculated from policy)
-            context['leave_balance'] = {
-                'casual': 7,
-                'sick': 5,
-                'annual': 14,
-                'total': 26,
-            }
-            
-            context['leave_policy'] = {
-                'casual': 10,
-                'sick': 7,
-                'annual': 15,
-            }
+            leave_balance, leave_policy = get_employee_leave_balance(employee, ledger)
+            context['leave_balance'] = leave_balance
+            context['leave_policy'] = leave_policy
             
             # Pending requests
-            pending_leaves = LeaveApplication.objects.filter(
-                employee=employee, 
-                status='pending'
-            ).count()
-            
-            pending_reimbursements = ReimbursementRequest.objects.filter(
-                employee=employee, 
-                status='pending'
-            ).count()
+            pending_leaves = ledger['pending_leaves']
+            pending_reimbursements = ledger['pending_reimbursements']
             
             context['pending_counts'] = {
                 'leave': pending_leaves,
@@ -3109,7 +3029,7 @@ class EmployeeDashboardView(TemplateView):
             
             # Latest salary slip
             latest_slip = SalarySlip.objects.filter(
-                employee=employee
+                employee_id=employee.employee_id
             ).order_by('-year', '-month').first()
             
             context['last_salary'] = latest_slip
@@ -3120,7 +3040,7 @@ class EmployeeDashboardView(TemplateView):
             
             # Recent attendances
             recent_attendances = EmployeeAttendance.objects.filter(
-                employee=employee
+                employee_id=employee.employee_id
             ).order_by('-date', '-check_in_time')[:5]
             
             for attendance in recent_attendances:
@@ -3140,7 +3060,7 @@ class EmployeeDashboardView(TemplateView):
             
             # Recent leave applications
             recent_leaves = LeaveApplication.objects.filter(
-                employee=employee
+                employee_id=employee.employee_id
             ).order_by('-created_at')[:3]
             
             for leave in recent_leaves:
@@ -3163,7 +3083,7 @@ class EmployeeDashboardView(TemplateView):
             
             # Recent reimbursement requests
             recent_reimbursements = ReimbursementRequest.objects.filter(
-                employee=employee
+                employee_id=employee.employee_id
             ).order_by('-created_at')[:3]
             
             for reimbursement in recent_reimbursements:
@@ -4345,17 +4265,13 @@ class OfferResponseView(View):
                 'current_year': timezone.now().year,
             }
             
-            # Render email templates
-            html_content = render_to_string('hr_management/email_templates/rejection_notification.html', context)
-            text_content = strip_tags(html_content)
-            
-            # Create email message
-            subject = f"Offer Rejected by {invitation.name}"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            
-            msg = EmailMultiAlternatives(subject, text_content, from_email, [hr_email])
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            # Render the template once and queue it with a plain-text alternative
+            queue_templated_email(
+                f"Offer Rejected by {invitation.name}",
+                'hr_management/email_templates/rejection_notification.html',
+                context,
+                [hr_email]
+            )
             
             logger.info(f"Rejection notification sent to HR for {invitation.name}")
             return True
@@ -4390,17 +4306,13 @@ class OfferResponseView(View):
                 'current_year': timezone.now().year,
             }
             
-            # Render email templates
-            html_content = render_to_string('hr_management/email_templates/discussion_notification.html', context)
-            text_content = strip_tags(html_content)
-            
-            # Create email message
-            subject = f"Discussion Requested by {invitation.name}"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            
-            msg = EmailMultiAlternatives(subject, text_content, from_email, [hr_email])
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            # Render the template once and queue it with a plain-text alternative
+            queue_templated_email(
+                f"Discussion Requested by {invitation.name}",
+                'hr_management/email_templates/discussion_notification.html',
+                context,
+                [hr_email]
+            )
             
             logger.info(f"Discussion notification sent to HR for {invitation.name}")
             return True
@@ -5113,23 +5025,13 @@ class FormCompletedActionView(View):
             if company.company_logo:
                 context['company_logo'] = company.company_logo.url
             
-            # Check if template exists
-            template_path = 'hr_management/email_templates/rejection_notification.html'
-            
-            # Render email template
-            html_message = render_to_string(template_path, context)
-            plain_message = strip_tags(html_message)
-            
-            # Send email
-            subject = f"Update on Your Application at {company.company_name}"
-            from_email = settings.DEFAULT_FROM_EMAIL
-            recipient_list = [invitation.email]
-            
-            email = EmailMultiAlternatives(subject, plain_message, from_email, recipient_list)
-            email.attach_alternative(html_message, "text/html")
-            
-            # Send the email
-            email.send()
+            # Render the template once and queue it with a plain-text alternative
+            queue_templated_email(
+                f"Update on Your Application at {company.company_name}",
+                'hr_management/email_templates/rejection_notification.html',
+                context,
+                [invitation.email]
+            )
             
             logger.info(f"Rejection email sent to {invitation.email}")
             return True
@@ -5654,41 +5556,25 @@ class ExportIncentiveSheetView(View):
             return HttpResponse("Unauthorized", status=401)
 
         try:
-            companies = Company.objects.filter(user=user)
-            company_ids = [c.company_id for c in companies]
-            employees = Employee.objects.filter(company_id__in=company_ids)
-
-            workbook = openpyxl.Workbook()
-            sheet = workbook.active
-            sheet.title = "Incentive Sheet"
+            employees = Employee.objects.filter(company__user=user)
 
             headers = [
                 "Employee ID", "Employee Name", "Employee Mobile Number",
                 "Incentive Amount", "Incentive Reason"
             ]
-            for col_num, header in enumerate(headers, 1):
-                col_letter = get_column_letter(col_num)
-                cell = sheet[f"{col_letter}1"]
-                cell.value = header
-                cell.font = openpyxl.styles.Font(bold=True)
-
-            for row_num, employee in enumerate(employees, 2):
-                sheet[f"A{row_num}"] = str(employee.employee_id)
-                sheet[f"B{row_num}"] = employee.employee_name
-                sheet[f"C{row_num}"] = employee.phone_number if employee.phone_number else ""
-                sheet[f"D{row_num}"] = ""  # Incentive Amount (leave blank)
-                sheet[f"E{row_num}"] = ""  # Incentive Reason (leave blank)
-            
-            for i in range(1, sheet.max_column + 1):
-                sheet.column_dimensions[get_column_letter(i)].width = 20
-
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            # Incentive Amount and Reason are left blank to be filled in
+            rows = (
+                [str(employee_id), employee_name, phone_number or "", "", ""]
+                for employee_id, employee_name, phone_number
+                in iter_values(employees, ['employee_id', 'employee_name', 'phone_number'])
+            )
+            return export_response(
+                request.GET.get('format'), headers, rows, "incentive_sheet",
+                title="Incentive Sheet", bold_header=True, column_width=20
             )
-            response['Content-Disposition'] = 'attachment; filename="incentive_sheet.xlsx"'
-            workbook.save(response)
-            return response
 
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
         except Exception as e:
             logger.error(f"Error exporting incentive sheet: {e}", exc_info=True)
             return HttpResponse("An error occurred during export.", status=500)
@@ -5708,41 +5594,25 @@ class ExportDeductionSheetView(View):
             return HttpResponse("Unauthorized", status=401)
 
         try:
-            companies = Company.objects.filter(user=user)
-            company_ids = [c.company_id for c in companies]
-            employees = Employee.objects.filter(company_id__in=company_ids)
-
-            workbook = openpyxl.Workbook()
-            sheet = workbook.active
-            sheet.title = "Deductions Sheet"
+            employees = Employee.objects.filter(company__user=user)
 
             headers = [
                 "Employee ID", "Employee Name", "Employee Mobile Number",
                 "Deduction Amount", "Deduction Reason"
             ]
-            for col_num, header in enumerate(headers, 1):
-                col_letter = get_column_letter(col_num)
-                cell = sheet[f"{col_letter}1"]
-                cell.value = header
-                cell.font = openpyxl.styles.Font(bold=True)
-
-            for row_num, employee in enumerate(employees, 2):
-                sheet[f"A{row_num}"] = str(employee.employee_id)
-                sheet[f"B{row_num}"] = employee.employee_name
-                sheet[f"C{row_num}"] = employee.phone_number if employee.phone_number else ""
-                sheet[f"D{row_num}"] = ""  # Deduction Amount (leave blank)
-                sheet[f"E{row_num}"] = ""  # Deduction Reason (leave blank)
-            
-            for i in range(1, sheet.max_column + 1):
-                sheet.column_dimensions[get_column_letter(i)].width = 20
-
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            # Deduction Amount and Reason are left blank to be filled in
+            rows = (
+                [str(employee_id), employee_name, phone_number or "", "", ""]
+                for employee_id, employee_name, phone_number
+                in iter_values(employees, ['employee_id', 'employee_name', 'phone_number'])
+            )
+            return export_response(
+                request.GET.get('format'), headers, rows, "deductions_sheet",
+                title="Deductions Sheet", bold_header=True, column_width=20
             )
-            response['Content-Disposition'] = 'attachment; filename="deductions_sheet.xlsx"'
-            workbook.save(response)
-            return response
 
+        except ValueError as e:
+            return HttpResponse(str(e), status=400)
         except Exception as e:
             logger.error(f"Error exporting deductions sheet: {e}", exc_info=True)
             return HttpResponse("An error occurred during export.", status=500)
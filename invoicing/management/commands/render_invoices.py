@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from invoicing.pdf import monthly_invoices, render_invoices
+from datetime import datetime
+import time
+
+class Command(BaseCommand):
+    help = 'Render the PDFs of a month of invoices in parallel (unchanged invoices reuse their stored PDF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help='Month to render, as YYYY-MM')
+        parser.add_argument('--company', default=None, help='Only render invoices of this company UUID')
+        parser.add_argument('--base-url', default=None, help='Scheme and host of the UPI payment links (defaults to INVOICING_BASE_URL)')
+        parser.add_argument('--queue', action='store_true', help='Queue the run on the Celery workers instead of rendering here')
+
+    def handle(self, *args, **options):
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m')
+        except ValueError:
+            raise CommandError('--month must be given as YYYY-MM')
+
+        if options['queue']:
+            from invoicing.tasks import render_monthly_invoices
+            task = render_monthly_invoices.delay(month.year, month.month, options['company'], options['base_url'])
+            self.stdout.write(self.style.SUCCESS(f"Queued invoice rendering for {options['month']} (task {task.id})"))
+            return
+
+        started = time.monotonic()
+        result = render_invoices(monthly_invoices(month.year, month.month, options['company']), options['base_url'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {result['rendered']} invoices for {options['month']} "
+            f"({result['failed']} failed, {result['updated']} updated) in {elapsed:.2f}s"
+        ))
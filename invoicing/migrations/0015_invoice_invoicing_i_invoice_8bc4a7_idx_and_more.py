@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0014_company_company_pincode_alter_billing_billing_state_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_created_at', 'invoice_id'], name='invoicing_i_invoice_8bc4a7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'invoice_created_at'], name='invoicing_i_company_596dc1_idx'),
+        ),
+    ]
@@ -72,6 +72,13 @@ class Invoice(models.Model):
     shipping_pincode = models.CharField(max_length=6, null=True, blank=True)
     use_billing_address = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the invoice reports (invoicing.reports)
+            models.Index(fields=['invoice_created_at', 'invoice_id']),
+            models.Index(fields=['company', 'invoice_created_at']),
+        ]
+
     def __str__(self):
         return f"{self.invoice_title or 'Untitled'} - {self.invoice_created_at.strftime('%Y-%m-%d')}"
 
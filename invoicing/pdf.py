@@ -0,0 +1,635 @@
+"""
+Invoice PDFs.
+
+draw_invoice() draws an invoice from a plain spec (see invoice_spec()) so it
+can run in the documents.renderer process pool, with the company logo decoded
+once per render process. render_invoice_pdf() stores the PDF under
+invoices/<digest>.pdf and points Invoice.invoice_pdf at it, so downloading an
+unchanged invoice again reads the stored file. render_invoices() renders a
+batch (e.g. a month of invoices) in parallel: manage.py render_invoices or
+the invoicing.tasks.render_monthly_invoices task.
+"""
+import logging
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+from documents.renderer import file_fingerprint, load_image, render_document, render_documents
+
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+RENDERER = 'invoicing.pdf.draw_invoice'
+FOLDER = 'invoices'
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """ReportLab sample stylesheet, built once per process"""
+    return getSampleStyleSheet()
+
+
+def _logo_fingerprint(company):
+    if not company.company_logo:
+        return None
+    try:
+        return file_fingerprint(company.company_logo.path)
+    except NotImplementedError:
+        # Storage without local paths
+        return None
+
+
+def invoice_spec(invoice, base_url=None):
+    """
+    Everything draw_invoice() needs from an invoice, its company and billing
+
+    Args:
+        invoice: Invoice with company and billing
+        base_url: scheme and host of the UPI payment link (defaults to INVOICING_BASE_URL)
+
+    Returns:
+        dict
+    """
+    company = invoice.company
+    billing = invoice.billing
+    if company is None or billing is None:
+        raise ValueError(f"Invoice {invoice.invoice_id} has no company or billing details")
+    base_url = (base_url or settings.INVOICING_BASE_URL).rstrip('/')
+
+    return {
+        'bill_type': invoice.invoice_type,
+        'date': timezone.localtime(invoice.invoice_created_at).strftime('%B %d, %Y'),
+        'company': {
+            'name': company.company_name,
+            'logo': _logo_fingerprint(company),
+            'gst_number': company.company_gst_number or '',
+            'mobile_number': company.company_mobile_number or '',
+            'email': company.company_email or '',
+            'address': company.company_address or '',
+            'state': company.company_state or '',
+            'pincode': company.company_pincode or '',
+            'invoice_prefix': company.company_invoice_prefix or '',
+            'bank_name': company.company_bank_name or '',
+            'bank_account_number': company.company_bank_account_number or '',
+            'bank_ifsc_code': company.company_bank_ifsc_code or '',
+        },
+        'billing': {
+            'name': billing.billing_name,
+            'gstin': billing.billing_gst_number or '',
+            'address': billing.billing_address or '',
+            'mobile': billing.billing_phone or '',
+            'email': billing.billing_email or '',
+            'state': billing.billing_state or '',
+            'pincode': billing.billing_pincode or '',
+        },
+        'products': invoice.invoice_product or [],
+        'shipping': {
+            'use_billing_address': invoice.use_billing_address,
+            'address': invoice.shipping_address or '',
+            'pincode': invoice.shipping_pincode or '',
+        },
+        'payment_url': f"{base_url}/invoicing/upi-payment/{company.company_id}/",
+    }
+
+
+def draw_invoice(spec):
+    """
+    Draw an invoice PDF
+
+    Args:
+        spec: dict from invoice_spec()
+
+    Returns:
+        bytes: the PDF
+    """
+    company = spec['company']
+    bill_type = spec['bill_type']
+    billing_details = spec['billing']
+    shipping_details = spec['shipping']
+    products = spec['products']
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    styles = get_styles()
+
+    # Add company logo if exists - positioned at the left edge with no border
+    logo = company.get('logo')
+    if logo:
+        try:
+            pdf.saveState()
+            # Position logo at far left
+            pdf.drawImage(load_image(logo), 40, 780, width=60, height=40, preserveAspectRatio=True)
+            pdf.restoreState()
+        except Exception as e:
+            logger.warning(f"Could not add company logo: {str(e)}")
+            # Draw "LOGO" text as fallback - positioned at far left
+            pdf.setFont("Helvetica-Bold", 16)
+            pdf.drawString(40, 800, "LOGO")
+    else:
+        # Draw "LOGO" text as fallback - positioned at far left
+        pdf.setFont("Helvetica-Bold", 16)
+        pdf.drawString(40, 800, "LOGO")
+
+    # Invoice header with light blue color (as shown in the image)
+    pdf.setFont("Helvetica-Bold", 24)
+    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
+    header_text = "TAX INVOICE" if bill_type == "Invoice" else "PROFORMA INVOICE"
+    # Position the header at right side (as in image)
+    header_width = pdf.stringWidth(header_text, "Helvetica-Bold", 24)
+    x_position = 550 - header_width  # Right align
+    pdf.drawString(x_position, 800, header_text)
+
+    # Invoice details - right aligned
+    pdf.setFillColor(colors.black)
+    pdf.setFont("Helvetica", 10)
+
+    # Date and Invoice # right aligned (as in image)
+    pdf.drawRightString(550, 780, f"Date: {spec['date']}")
+    pdf.drawRightString(550, 765, f"Invoice #: {company['invoice_prefix']}")
+
+    # Added margin from top - moved the boxes down by 20 points
+    # Left side company details with border
+    pdf.setStrokeColor(colors.Color(0.9, 0.9, 0.9))
+    # pdf.rect(x, y, width, height, stroke, fill) draws a rectangle where:
+    # x=40: Distance from left edge of page in points
+    # y=640: Distance from bottom edge of page in points 
+    # width=220: Width of rectangle in points
+    # height=130: Height of rectangle in points
+    # stroke=1: Draw the outline of the rectangle
+    # fill=0: Don't fill the rectangle with color
+    pdf.roundRect(40, 600, 220, 150, 8, stroke=1, fill=0)
+
+    # Company name in bold at top left of box - also moved down
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.setFillColor(colors.black)
+    pdf.drawString(50, 730, company['name'])  # Y position changed from 750 to 730
+
+    # Company Details in gray with labels - all moved down by 20 points
+    pdf.setFont("Helvetica", 10)
+    pdf.setFillColor(colors.gray)
+    pdf.drawString(50, 710, f"GST:")  # 730 -> 710
+    pdf.drawString(50, 690, f"Phone:")  # 710 -> 690
+    pdf.drawString(50, 670, f"Email:")  # 690 -> 670
+    pdf.drawString(50, 650, f"Address:")  # 670 -> 650
+    pdf.drawString(50, 630, f"State:")  # 650 -> 630
+    pdf.drawString(50, 610, f"Pincode:")  # Added pincode label
+
+    # Company Details values in black - all moved down by 20 points
+    pdf.setFillColor(colors.black)
+    pdf.drawString(90, 710, company['gst_number'])  # 730 -> 710
+    pdf.drawString(90, 690, company['mobile_number'])  # 710 -> 690
+    pdf.drawString(90, 670, company['email'])  # 690 -> 670
+
+    # Handle multiline address - starting point moved down
+    address_words = company['address'].split()
+    address_line = ""
+    y_pos = 650  # 670 -> 650
+    for word in address_words:
+        if pdf.stringWidth(address_line + " " + word, "Helvetica", 10) < 160:
+            address_line += " " + word
+        else:
+            pdf.drawString(90, y_pos, address_line.strip())
+            y_pos -= 15
+            address_line = word
+    if address_line:
+        pdf.drawString(90, y_pos, address_line.strip())
+
+    pdf.drawString(90, 630, company['state'])  # 650 -> 630
+    # Safely handle company_pincode which might be None
+    pdf.drawString(90, 610, company['pincode'] or "")  # Added pincode value
+
+    # Right side billing details with border - also moved down
+    pdf.roundRect(270, 600, 280, 150, 8, stroke=1, fill=0)  # 640 -> 620
+
+    # "Billed To:" header in blue - moved down
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
+    pdf.drawString(280, 730, "Billed To:")  # 750 -> 730
+
+    # Billing company name in bold black - moved down
+    pdf.setFillColor(colors.black)
+    pdf.drawString(350, 730, billing_details['name'])  # 750 -> 730
+
+    # Billing Details in gray with labels - all moved down
+    pdf.setFillColor(colors.gray)
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(280, 710, f"GST:")  # 730 -> 710
+    pdf.drawString(280, 690, f"Address:")  # 710 -> 690
+    pdf.drawString(280, 670, f"Mobile:")  # 690 -> 670
+    pdf.drawString(280, 650, f"Email:")  # 670 -> 650
+    pdf.drawString(280, 630, f"State:")  # 650 -> 630
+
+    # Billing Details values in black - all moved down
+    pdf.setFillColor(colors.black)
+    pdf.drawString(320, 710, billing_details['gstin'])  # 730 -> 710
+
+    # Handle multiline address - starting point moved down
+    address_words = billing_details['address'].split()
+    address_line = ""
+    y_pos = 690  # 710 -> 690
+    for word in address_words:
+        if pdf.stringWidth(address_line + " " + word, "Helvetica", 10) < 220:
+            address_line += " " + word
+        else:
+            pdf.drawString(330, y_pos, address_line.strip())
+            y_pos -= 15
+            address_line = word
+    if address_line:
+        pdf.drawString(330, y_pos, address_line.strip())
+
+    pdf.drawString(330, 670, billing_details['mobile'])  # 690 -> 670
+    pdf.drawString(330, 650, billing_details['email'])  # 670 -> 650
+    pdf.drawString(330, 630, billing_details['state'])  # 650 -> 630
+    pdf.drawString(280, 610, f"Pincode:")  # 630 -> 610
+    # Get pincode safely with fallback to empty string
+    pdf.drawString(330, 610, billing_details.get('pincode', ''))  # 630 -> 610
+
+    # After getting company and billing details, add state comparison
+    company_state = company['state']
+    billing_state = billing_details.get('state')
+    is_same_state = company_state == billing_state
+
+    # Reduce the gap by moving the table up closer to the header sections - start table at 560 instead of 500
+    available_height = 560  
+
+    # Table header with all data but modified display - exactly as in image
+    table_data = [['Items Description', 'HSN', 'Unit Price', 'Unit', 'Qnt', 'Total']]
+
+    # Rest of the code remains unchanged
+    total_amount = Decimal('0.00')
+    total_cgst = Decimal('0.00')
+    total_sgst = Decimal('0.00')
+    total_igst = Decimal('0.00')
+
+    for product in products:
+        rate = Decimal(str(product['rate']))
+        quantity = Decimal(str(product['quantity']))
+        total = Decimal(str(product['total']))
+        unit_type = product.get('unit_type', '')
+        hsn = product.get('hsn', '')
+        gst_percentage = Decimal(str(product.get('gst_percentage', '0')))
+
+        # Calculate GST based on state (keep calculations but don't show in table)
+        if is_same_state:
+            cgst_percentage = gst_percentage / 2
+            sgst_percentage = gst_percentage / 2
+            cgst_amount = (total * cgst_percentage) / Decimal('100')
+            sgst_amount = (total * sgst_percentage) / Decimal('100')
+            total_cgst += cgst_amount
+            total_sgst += sgst_amount
+        else:
+            igst_amount = (total * gst_percentage) / Decimal('100')
+            total_igst += igst_amount
+
+        # Handle long HSN codes by wrapping if needed
+        if hsn and len(hsn) > 8:
+            hsn = Paragraph(hsn, styles['Normal'])
+
+        # Table row with visible columns
+        description = [
+            Paragraph(f"<b>{product['name']}</b>", styles['Normal']),
+            hsn,
+            f"₹ {rate:,.2f}",
+            unit_type,
+            str(quantity),
+            f"₹ {total:,.2f}"
+        ]
+
+        table_data.append(description)
+        total_amount += total
+
+    # Set table column widths for visible columns and center align
+    # Increase HSN column width to 80 (from 60) to better fit content
+    table = Table(table_data, colWidths=[200, 80, 80, 50, 50, 60], repeatRows=1)
+    page_width = A4[0]
+    table_width = sum([200, 80, 80, 50, 50, 60])
+    x_offset = (page_width - table_width) / 2
+
+    # Enhanced table styling (keeping original style)
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.4, 0.4, 0.8)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (2, 0), (-1, -1), 'CENTER'),  # Center align numeric columns
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),    # Left align description
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),  # Reduced from 12
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.9, 0.9, 0.9)),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.Color(0.95, 0.95, 0.95)]),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),  # Reduced from 15
+        ('TOPPADDING', (0, 1), (-1, -1), 8),     # Reduced from 15
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Vertical alignment
+        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.Color(0.2, 0.2, 0.7)), # Strong header line
+        # Removed BOX style to eliminate the outer border
+    ])
+    table.setStyle(table_style)
+
+    # Calculate the table height based on content - adjusted for tighter spacing
+    row_height = 16 + 10  # 16 for padding (8 top + 8 bottom) + 10 for text height
+    header_height = 8 + 11  # 8 for bottom padding + 11 for font size
+    table_height = (len(table_data) - 1) * row_height + header_height
+
+    # Calculate available space on page
+    available_height = 560  # Starting vertical position for table (reduced gap between header and table)
+
+    # Define column width for footer sections - needed for both single and multi-page layouts
+    col_width = 160
+
+    # Check if table will fit on current page
+    # Create fixed size table area for better layout consistency
+    fixed_table_area_height = 250  # Fixed height for table area
+    max_rows_in_main_area = int((fixed_table_area_height - header_height) / row_height)
+
+    if len(table_data) - 1 > max_rows_in_main_area:
+        # Too many rows for fixed area - use pagination
+        # Table is too large - we need to handle pagination
+        rows_per_page = max(1, max_rows_in_main_area)
+
+        # For first page - only show rows that fit in fixed area
+        first_page_data = [table_data[0]] + table_data[1:rows_per_page+1]
+        first_page_table = Table(first_page_data, colWidths=[200, 80, 80, 50, 50, 60])
+        first_page_table.setStyle(table_style)
+        actual_table_height = min(fixed_table_area_height, header_height + (len(first_page_data) - 1) * row_height)
+
+        # Draw first page table
+        first_page_table.wrapOn(pdf, 400, actual_table_height)
+        first_page_table.drawOn(pdf, x_offset, available_height - actual_table_height)
+
+        # Calculate bottom of first table
+        table_bottom = available_height - actual_table_height
+
+        # Add continuation message - using standard font instead of Helvetica-Italic
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica", 9)
+        pdf.drawCentredString(page_width/2, table_bottom - 15, "Continued on next page...")
+
+        # Process remaining rows on new pages
+        remaining_rows = table_data[rows_per_page+1:]
+        page_num = 1
+
+        while remaining_rows:
+            # Start a new page
+            pdf.showPage()
+            page_num += 1
+
+            # Add header to identify this is a continuation
+            pdf.setFont("Helvetica-Bold", 14)
+            pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
+            pdf.drawCentredString(page_width/2, 800, f"Invoice Continuation - Page {page_num}")
+
+            # Calculate how many rows fit on this page
+            continuation_page_height = 700  # More space on continuation pages
+            rows_this_page = min(len(remaining_rows), int(continuation_page_height / row_height))
+
+            # Create and draw table for this page
+            this_page_data = [table_data[0]] + remaining_rows[:rows_this_page]
+            this_page_table = Table(this_page_data, colWidths=[200, 80, 80, 50, 50, 60])
+            this_page_table.setStyle(table_style)
+            this_page_table_height = header_height + (len(this_page_data) - 1) * row_height
+
+            # Position table with proper spacing
+            top_margin = 750
+            this_page_table.wrapOn(pdf, 400, this_page_table_height)
+            this_page_table.drawOn(pdf, x_offset, top_margin - this_page_table_height)
+
+            # Update remaining rows
+            remaining_rows = remaining_rows[rows_this_page:]
+
+            # If there are more rows, add continuation message - using standard font
+            if remaining_rows:
+                pdf.setFont("Helvetica", 9)  # Changed from Helvetica-Italic to Helvetica
+                pdf.setFillColor(colors.black)
+                bottom_pos = top_margin - this_page_table_height - 15
+                pdf.drawCentredString(page_width/2, bottom_pos, "Continued on next page...")
+
+        # Start a new page for summary and footer
+        pdf.showPage()
+
+        # Add final page header
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
+        pdf.drawCentredString(page_width/2, 800, f"Invoice Summary - Page {page_num+1}")
+
+        # Position summary at top of this page
+        summary_top = 700
+        note_top = 550
+        footer_top = 380
+    else:
+        # Table fits in the fixed area - maintain table height within constraints
+        actual_table_height = header_height + (len(table_data) - 1) * row_height
+
+        # Draw the table at the calculated position, but ensure it stays within fixed area
+        table.wrapOn(pdf, 400, actual_table_height)
+        table.drawOn(pdf, x_offset, available_height - actual_table_height)
+
+        # Always position the summary section at consistent location
+        # This makes layout consistent regardless of number of rows
+        table_bottom = available_height - fixed_table_area_height
+        summary_top = table_bottom - 40  # Fixed position for summary
+        note_top = summary_top - 150     # Fixed position for notes
+        footer_top = note_top - 120      # Fixed position for footer
+
+    # Create summary table for better alignment with product table
+    summary_data = []
+    summary_data.append(["Subtotal:", f"₹ {total_amount:,.2f}"])
+
+    # Tax section based on state
+    if is_same_state:
+        summary_data.append(["CGST:", f"₹ {total_cgst:,.2f}"])
+        summary_data.append(["SGST:", f"₹ {total_sgst:,.2f}"])
+        total_tax = total_cgst + total_sgst
+    else:
+        summary_data.append(["IGST:", f"₹ {total_igst:,.2f}"])
+        total_tax = total_igst
+
+    # Final total calculation
+    final_total = total_amount + total_tax
+
+    # Create aligned summary table
+    summary_table = Table(summary_data, colWidths=[80, 115])
+    summary_style = TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (1, -1), 8),
+        ('TOPPADDING', (0, 0), (1, -1), 8),
+        ('GRID', (0, 0), (1, -1), 0.5, colors.Color(0.9, 0.9, 0.9)),
+    ])
+    summary_table.setStyle(summary_style)
+
+    # Position summary table at right side to align with product table
+    summary_x = x_offset + table_width - 195
+    summary_table.wrapOn(pdf, 195, 75)
+    summary_table.drawOn(pdf, summary_x, summary_top + 75)
+
+    # Total due with shadow effect - adjust position to align with summary table
+    pdf.saveState()
+    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
+    pdf.roundRect(summary_x+2, summary_top+35, 195, 30, 5, fill=1)
+    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
+    pdf.roundRect(summary_x, summary_top+33, 195, 30, 5, fill=1)
+    pdf.setFillColor(colors.white)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(summary_x+10, summary_top+45, "TOTAL DUE:")
+    pdf.drawRightString(summary_x+185, summary_top+45, f"₹ {final_total:,.2f}")
+    pdf.restoreState()
+
+    # Note section with border - adjust position
+    pdf.setStrokeColor(colors.Color(0.9, 0.9, 0.9))
+    pdf.rect(50, note_top, 500, 40, stroke=1)
+    pdf.setFillColor(colors.gray)
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(60, note_top + 25, "Note:")
+    pdf.setFont("Helvetica", 9)
+
+    # Generate appropriate tax note based on state comparison
+    if is_same_state:
+        # Ensure gst_percentage is defined and valid for the second instance
+        gst_percent_display = gst_percentage/2 if 'gst_percentage' in locals() else 0
+        tax_note = f"Note: GST is split equally as CGST ({gst_percent_display}%) and SGST ({gst_percent_display}%) as billing state matches company state."
+    else:
+        gst_percent_display = gst_percentage if 'gst_percentage' in locals() else 0
+        tax_note = f"Note: Full GST ({gst_percent_display}%) is charged as IGST for inter-state transaction."
+
+    pdf.drawString(60, note_top + 10, tax_note)
+
+    # Footer with three columns and borders - adjust position
+    pdf.rect(50, footer_top, col_width, 100, stroke=1)
+    pdf.setFillColor(colors.black)
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(60, footer_top + 80, "Questions?")
+    pdf.setFont("Helvetica", 9)
+    pdf.setFillColor(colors.gray)
+    pdf.drawString(60, footer_top + 65, f"Email: {company['email']}")
+    pdf.drawString(60, footer_top + 50, f"Phone: {company['mobile_number']}")
+
+    # Payment Info with clickable Pay Now button - adjust position
+    pdf.rect(220, footer_top, col_width, 100, stroke=1)
+    pdf.setFillColor(colors.black)
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(230, footer_top + 80, "Payment Info:")
+    pdf.setFont("Helvetica", 9)
+    pdf.setFillColor(colors.gray)
+    pdf.drawString(230, footer_top + 65, f"Bank: {company['bank_name']}")
+    pdf.drawString(230, footer_top + 50, f"A/C: {company['bank_account_number']}")
+    pdf.drawString(230, footer_top + 35, f"IFSC: {company['bank_ifsc_code']}")
+
+    # Draw UPI Pay Now button - adjust position
+    upi_button_y = footer_top + 5
+    pdf.setFillColor(colors.Color(0.13, 0.59, 0.95))  # Blue color
+    pdf.roundRect(230, upi_button_y, 100, 25, 8, fill=1)
+
+    # UPI Button text - adjust position
+    pdf.setFillColor(colors.white)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(250, upi_button_y + 8, "UPI Pay")
+
+    # Make UPI button clickable with redirect to UPI payment page
+    upi_payment_url = f"{spec['payment_url']}?amount={final_total}"
+    pdf.linkURL(
+        upi_payment_url,
+        (230, upi_button_y, 330, upi_button_y + 25),
+        relative=0
+    )
+
+    # Add shipping address to PDF if different from billing - adjust position
+    if not shipping_details.get('use_billing_address', True):
+        # Ship To section (third column)
+        pdf.rect(390, footer_top, col_width, 100, stroke=1)
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(400, footer_top + 80, "Ship To:")
+        pdf.setFont("Helvetica", 9)
+        pdf.setFillColor(colors.gray)
+        # Safely access shipping address and pincode
+        pdf.drawString(400, footer_top + 65, shipping_details.get('address', ''))
+        pdf.drawString(400, footer_top + 50, f"Pincode: {shipping_details.get('pincode', '')}")
+
+    # Thank you message with blue color - keep it at bottom of page
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
+    pdf.drawString(50, 40, "Thank you for your Business!")
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _assign(invoice, path):
+    changed = invoice.invoice_pdf.name != path
+    invoice.invoice_pdf.name = path
+    return changed
+
+
+def render_invoice_pdf(invoice, base_url=None):
+    """
+    Render (or reuse) the PDF of an invoice and store it on Invoice.invoice_pdf
+
+    Returns:
+        str: storage path of the PDF
+    """
+    path = render_document(RENDERER, invoice_spec(invoice, base_url), FOLDER)
+    if _assign(invoice, path):
+        invoice.save(update_fields=['invoice_pdf'])
+    return path
+
+
+def stored_invoice_pdf(invoice, base_url=None):
+    """Storage path of an invoice's PDF, rendering it when it is missing"""
+    if invoice.invoice_pdf and default_storage.exists(invoice.invoice_pdf.name):
+        return invoice.invoice_pdf.name
+    return render_invoice_pdf(invoice, base_url)
+
+
+def monthly_invoices(year, month, company_id=None):
+    """Invoices created in a month that have what a PDF needs"""
+    invoices = Invoice.objects.filter(
+        invoice_created_at__year=year,
+        invoice_created_at__month=month,
+        company__isnull=False,
+        billing__isnull=False,
+    )
+    if company_id:
+        invoices = invoices.filter(company_id=company_id)
+    return invoices.select_related('company', 'billing').order_by('invoice_created_at')
+
+
+def render_invoices(invoices, base_url=None):
+    """
+    Render a batch of invoices in parallel
+
+    Invoices whose PDF is already stored are only pointed at it.
+
+    Returns:
+        dict: counts of rendered, failed and updated invoices
+    """
+    batch = []
+    failed = 0
+    for invoice in invoices:
+        try:
+            batch.append((invoice, invoice_spec(invoice, base_url)))
+        except Exception as e:
+            logger.error(f"Error preparing PDF of invoice {invoice.invoice_id}: {e}")
+            failed += 1
+
+    paths = render_documents(RENDERER, [spec for _, spec in batch], FOLDER)
+    updated = [invoice for (invoice, _), path in zip(batch, paths) if path and _assign(invoice, path)]
+    Invoice.objects.bulk_update(updated, ['invoice_pdf'], batch_size=500)
+
+    failed += paths.count(None)
+    return {'rendered': len(paths) - paths.count(None), 'failed': failed, 'updated': len(updated)}
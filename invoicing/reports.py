@@ -0,0 +1,210 @@
+"""
+Invoice reports.
+
+parse_filters()/filter_invoices() apply the report filters (company, date
+range, paid/unpaid, invoice type) in the database. Pages are read with keyset
+pagination on (invoice_created_at, invoice_id): the cursor carries the last
+row of the previous page, so every page is one indexed range query no matter
+how deep it is. invoice_totals() computes totals per company, month and
+billing state with grouped aggregates, and iter_export_rows() feeds the
+documents.exports CSV/XLSX exports.
+"""
+import base64
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from documents.exports import iter_values
+
+from .models import BILLING_TYPE_CHOICES, Invoice
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ORDERING = ('-invoice_created_at', '-invoice_id')
+
+# ?type= values -> Invoice.invoice_type
+INVOICE_TYPES = {value.lower(): value for value, _ in BILLING_TYPE_CHOICES}
+INVOICE_TYPES['proforma'] = 'Proforma Invoice'
+
+# Columns of the API rows and exports: (header, values_list field)
+EXPORT_COLUMNS = [
+    ('Invoice ID', 'invoice_id'),
+    ('Title', 'invoice_title'),
+    ('Type', 'invoice_type'),
+    ('Date', 'invoice_created_at'),
+    ('Company', 'company__company_name'),
+    ('Billing Name', 'billing__billing_name'),
+    ('Mobile', 'billing__billing_phone'),
+    ('Email', 'billing__billing_email'),
+    ('State', 'billing__billing_state'),
+    ('GSTIN', 'billing__billing_gst_number'),
+    ('Amount', 'invoice_total'),
+    ('Paid', 'payment_status'),
+]
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+EXPORT_FIELDS = [field for _, field in EXPORT_COLUMNS]
+
+
+def parse_filters(params):
+    """
+    Validate the report filters of a query string
+
+    Args:
+        params: QueryDict with any of company, date_from, date_to
+            (YYYY-MM-DD), status (paid/unpaid) and type (invoice/proforma)
+
+    Returns:
+        dict: the given filters, cleaned
+
+    Raises:
+        ValueError: when a filter is malformed
+    """
+    filters = {}
+    if params.get('company') and params['company'] != 'all':
+        try:
+            filters['company'] = uuid.UUID(params['company'])
+        except ValueError:
+            raise ValueError('Invalid company')
+
+    for key in ('date_from', 'date_to'):
+        if params.get(key):
+            value = parse_date(params[key])
+            if value is None:
+                raise ValueError(f'Invalid {key}, expected YYYY-MM-DD')
+            filters[key] = value
+
+    status = (params.get('status') or '').lower()
+    if status:
+        if status not in ('paid', 'unpaid'):
+            raise ValueError('Invalid status, expected paid or unpaid')
+        filters['status'] = status
+
+    invoice_type = (params.get('type') or '').lower()
+    if invoice_type:
+        if invoice_type not in INVOICE_TYPES:
+            raise ValueError('Invalid type, expected invoice or proforma')
+        filters['type'] = INVOICE_TYPES[invoice_type]
+    return filters
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_invoices(filters, queryset=None):
+    """Invoices matching parse_filters() output, in report order"""
+    invoices = Invoice.objects.all() if queryset is None else queryset
+    if 'company' in filters:
+        invoices = invoices.filter(company_id=filters['company'])
+    # Whole days in the current timezone; date_to is inclusive
+    if 'date_from' in filters:
+        invoices = invoices.filter(invoice_created_at__gte=_day_start(filters['date_from']))
+    if 'date_to' in filters:
+        invoices = invoices.filter(invoice_created_at__lt=_day_start(filters['date_to'] + timedelta(days=1)))
+    if 'status' in filters:
+        invoices = invoices.filter(payment_status=filters['status'] == 'paid')
+    if 'type' in filters:
+        invoices = invoices.filter(invoice_type=filters['type'])
+    return invoices.order_by(*ORDERING)
+
+
+def encode_cursor(created_at, invoice_id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{invoice_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(invoice_created_at, invoice_id) of a cursor; raises ValueError when it is malformed"""
+    try:
+        created_at, invoice_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        invoice_id = uuid.UUID(invoice_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, invoice_id
+
+
+def _key(row):
+    if isinstance(row, dict):
+        return row['invoice_created_at'], row['invoice_id']
+    return row.invoice_created_at, row.invoice_id
+
+
+def invoice_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of a filter_invoices() queryset (model instances or values())
+
+    Args:
+        cursor: next_cursor of the previous page (None for the first page)
+        page_size: rows per page, capped at MAX_PAGE_SIZE
+
+    Returns:
+        tuple: (list of rows, next_cursor or None on the last page)
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    if cursor:
+        created_at, invoice_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(invoice_created_at__lt=created_at) |
+            Q(invoice_created_at=created_at, invoice_id__lt=invoice_id)
+        )
+    rows = list(queryset.order_by(*ORDERING)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(*_key(rows[-1]))
+
+
+def _amounts():
+    zero = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+    return {
+        'count': Count('pk'),
+        'total': Coalesce(Sum('invoice_total'), zero),
+        'paid': Coalesce(Sum('invoice_total', filter=Q(payment_status=True)), zero),
+        'unpaid': Coalesce(Sum('invoice_total', filter=Q(payment_status=False)), zero),
+    }
+
+
+def invoice_totals(queryset):
+    """
+    Totals of a filter_invoices() queryset, computed by the database
+
+    Returns:
+        dict: overall, by_company, by_month and by_state; each group has
+            count, total, paid and unpaid
+    """
+    queryset = queryset.order_by()
+    by_month = (
+        queryset.annotate(month=TruncMonth('invoice_created_at'))
+        .values('month').annotate(**_amounts()).order_by('month')
+    )
+    return {
+        'overall': queryset.aggregate(**_amounts()),
+        'by_company': list(
+            queryset.values('company_id', 'company__company_name').annotate(**_amounts()).order_by('-total')
+        ),
+        'by_month': [
+            dict(group, month=group['month'].strftime('%Y-%m') if group['month'] else None)
+            for group in by_month
+        ],
+        'by_state': list(
+            queryset.values('billing__billing_state').annotate(**_amounts()).order_by('-total')
+        ),
+    }
+
+
+def iter_export_rows(queryset):
+    """Export rows of a queryset, read from the database in chunks"""
+    for row in iter_values(queryset, EXPORT_FIELDS):
+        yield [
+            timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if isinstance(value, datetime)
+            else str(value) if isinstance(value, uuid.UUID)
+            else value
+            for value in row
+        ]
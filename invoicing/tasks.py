@@ -0,0 +1,48 @@
+import logging
+
+from celery import shared_task
+
+from .models import Invoice
+from .pdf import monthly_invoices, render_invoices
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Invoices rendered per render_invoice_batch task
+BATCH_SIZE = 50
+
+
+@shared_task(bind=True, name="invoicing.tasks.render_invoice_batch")
+def render_invoice_batch(self, invoice_ids, base_url=None):
+    """
+    Render the PDFs of a batch of invoices
+
+    Args:
+        invoice_ids: invoice UUIDs
+        base_url: scheme and host of the UPI payment links
+
+    Returns:
+        dict: counts of rendered, failed and updated invoices
+    """
+    invoices = Invoice.objects.filter(invoice_id__in=invoice_ids).select_related('company', 'billing')
+    result = render_invoices(invoices, base_url)
+    logger.info(f"Invoice batch {self.request.id}: {result}")
+    return result
+
+
+@shared_task(bind=True, name="invoicing.tasks.render_monthly_invoices")
+def render_monthly_invoices(self, year, month, company_id=None, base_url=None):
+    """
+    Fan the invoices of a month out to render_invoice_batch tasks so the
+    workers render them in parallel
+
+    Returns:
+        dict: number of invoices and batches queued
+    """
+    invoice_ids = [str(pk) for pk in monthly_invoices(year, month, company_id).values_list('invoice_id', flat=True)]
+    for start in range(0, len(invoice_ids), BATCH_SIZE):
+        render_invoice_batch.delay(invoice_ids[start:start + BATCH_SIZE], base_url)
+
+    batches = (len(invoice_ids) + BATCH_SIZE - 1) // BATCH_SIZE
+    logger.info(f"Queued {len(invoice_ids)} invoices of {month}/{year} in {batches} render batches")
+    return {'invoices': len(invoice_ids), 'batches': batches}
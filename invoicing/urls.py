@@ -9,6 +9,10 @@ urlpatterns = [
     path('create-invoice/', CreateInvoiceView.as_view(), name='create_invoice'),
     path('upi-payment/<str:company_id>/', UpiPaymentView.as_view(), name='upi_payment'),
     path('reports/', ReportsView.as_view(), name='reports'),
+    path('reports/data/invoices/', InvoiceReportsApiView.as_view(), name='invoice_reports_api'),
+    path('reports/data/totals/', InvoiceTotalsApiView.as_view(), name='invoice_totals_api'),
+    path('reports/export/', InvoiceExportView.as_view(), name='invoice_export'),
+    path('invoice-pdf/<str:invoice_id>/', InvoicePdfView.as_view(), name='invoice_pdf'),
     path('add-billing/', AddBillingView.as_view(), name='add_billing'),
     path('recipient-auth/', RecipientAuthView.as_view(), name='recipient_auth'),
     path('create-recipient/', CreateRecipientView.as_view(), name='create_recipient'),
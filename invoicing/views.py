@@ -7,15 +7,11 @@ from django.contrib import messages
 from django.http import JsonResponse, FileResponse
 from django.views import View
 import re
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle, Paragraph
 from io import BytesIO
 import json
 from decimal import Decimal
-from reportlab.lib.styles import getSampleStyleSheet
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from urllib.parse import quote
 import qrcode
 from django.shortcuts import redirect
@@ -24,6 +20,20 @@ import base64
 # Create your views here.
 
 import logging
+from .pdf import render_invoice_pdf, stored_invoice_pdf
+from .reports import (
+    EXPORT_FIELDS,
+    EXPORT_HEADERS,
+    PAGE_SIZE as REPORT_PAGE_SIZE,
+    filter_invoices,
+    invoice_page,
+    invoice_totals,
+    iter_export_rows,
+    parse_filters,
+)
+from documents.exports import export_response
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
 from django.contrib.auth.hashers import make_password, check_password
@@ -288,7 +298,8 @@ class CreateInvoiceView(TemplateView):
                     billing_phone=billing_details['mobile'],
                     billing_gst_number=billing_details['gstin'],
                     billing_address=billing_details['address'],
-                    billing_state=billing_details['state']
+                    billing_state=billing_details['state'],
+                    billing_pincode=billing_details.get('pincode')
                 )
             except Exception as e:
                 logger.error(f"Error creating billing: {str(e)}")
@@ -314,468 +325,12 @@ class CreateInvoiceView(TemplateView):
                 logger.error(f"Error creating invoice: {str(e)}")
                 return JsonResponse({'error': 'Error creating invoice record'}, status=400)
 
-            # Generate PDF
-            buffer = BytesIO()
+            # Generate PDF (reused from storage when this invoice was rendered before)
             try:
-                pdf = canvas.Canvas(buffer, pagesize=A4)
-                styles = getSampleStyleSheet()  # Add this line to define styles
-                
-                # Add company logo if exists - positioned at the left edge with no border
-                if company.company_logo and hasattr(company.company_logo, 'path'):
-                    try:
-                        pdf.saveState()
-                        # Position logo at far left
-                        pdf.drawImage(company.company_logo.path, 40, 780, width=60, height=40, preserveAspectRatio=True)
-                        pdf.restoreState()
-                    except Exception as e:
-                        logger.warning(f"Could not add company logo: {str(e)}")
-                        # Draw "LOGO" text as fallback - positioned at far left
-                        pdf.setFont("Helvetica-Bold", 16)
-                        pdf.drawString(40, 800, "LOGO")
-                else:
-                    # Draw "LOGO" text as fallback - positioned at far left
-                    pdf.setFont("Helvetica-Bold", 16)
-                    pdf.drawString(40, 800, "LOGO")
-
-                # Invoice header with light blue color (as shown in the image)
-                pdf.setFont("Helvetica-Bold", 24)
-                pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
-                header_text = "TAX INVOICE" if bill_type == "Invoice" else "PROFORMA INVOICE"
-                # Position the header at right side (as in image)
-                header_width = pdf.stringWidth(header_text, "Helvetica-Bold", 24)
-                x_position = 550 - header_width  # Right align
-                pdf.drawString(x_position, 800, header_text)
-                
-                # Invoice details - right aligned
-                pdf.setFillColor(colors.black)
-                pdf.setFont("Helvetica", 10)
-                from datetime import datetime
-                
-                # Date and Invoice # right aligned (as in image)
-                pdf.drawRightString(550, 780, f"Date: {datetime.now().strftime('%B %d, %Y')}")
-                pdf.drawRightString(550, 765, f"Invoice #: {company.company_invoice_prefix}")
-                
-                # Added margin from top - moved the boxes down by 20 points
-                # Left side company details with border
-                pdf.setStrokeColor(colors.Color(0.9, 0.9, 0.9))
-                # pdf.rect(x, y, width, height, stroke, fill) draws a rectangle where:
-                # x=40: Distance from left edge of page in points
-                # y=640: Distance from bottom edge of page in points 
-                # width=220: Width of rectangle in points
-                # height=130: Height of rectangle in points
-                # stroke=1: Draw the outline of the rectangle
-                # fill=0: Don't fill the rectangle with color
-                pdf.roundRect(40, 600, 220, 150, 8, stroke=1, fill=0)
-                
-                # Company name in bold at top left of box - also moved down
-                pdf.setFont("Helvetica-Bold", 12)
-                pdf.setFillColor(colors.black)
-                pdf.drawString(50, 730, company.company_name)  # Y position changed from 750 to 730
-                
-                # Company Details in gray with labels - all moved down by 20 points
-                pdf.setFont("Helvetica", 10)
-                pdf.setFillColor(colors.gray)
-                pdf.drawString(50, 710, f"GST:")  # 730 -> 710
-                pdf.drawString(50, 690, f"Phone:")  # 710 -> 690
-                pdf.drawString(50, 670, f"Email:")  # 690 -> 670
-                pdf.drawString(50, 650, f"Address:")  # 670 -> 650
-                pdf.drawString(50, 630, f"State:")  # 650 -> 630
-                pdf.drawString(50, 610, f"Pincode:")  # Added pincode label
-                
-                # Company Details values in black - all moved down by 20 points
-                pdf.setFillColor(colors.black)
-                pdf.drawString(90, 710, company.company_gst_number)  # 730 -> 710
-                pdf.drawString(90, 690, company.company_mobile_number)  # 710 -> 690
-                pdf.drawString(90, 670, company.company_email)  # 690 -> 670
-                
-                # Handle multiline address - starting point moved down
-                address_words = company.company_address.split()
-                address_line = ""
-                y_pos = 650  # 670 -> 650
-                for word in address_words:
-                    if pdf.stringWidth(address_line + " " + word, "Helvetica", 10) < 160:
-                        address_line += " " + word
-                    else:
-                        pdf.drawString(90, y_pos, address_line.strip())
-                        y_pos -= 15
-                        address_line = word
-                if address_line:
-                    pdf.drawString(90, y_pos, address_line.strip())
-                
-                pdf.drawString(90, 630, company.company_state)  # 650 -> 630
-                # Safely handle company_pincode which might be None
-                pdf.drawString(90, 610, company.company_pincode or "")  # Added pincode value
-                
-                # Right side billing details with border - also moved down
-                pdf.roundRect(270, 600, 280, 150, 8, stroke=1, fill=0)  # 640 -> 620
-                
-                # "Billed To:" header in blue - moved down
-                pdf.setFont("Helvetica-Bold", 12)
-                pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
-                pdf.drawString(280, 730, "Billed To:")  # 750 -> 730
-                
-                # Billing company name in bold black - moved down
-                pdf.setFillColor(colors.black)
-                pdf.drawString(350, 730, billing_details['name'])  # 750 -> 730
-                
-                # Billing Details in gray with labels - all moved down
-                pdf.setFillColor(colors.gray)
-                pdf.setFont("Helvetica", 10)
-                pdf.drawString(280, 710, f"GST:")  # 730 -> 710
-                pdf.drawString(280, 690, f"Address:")  # 710 -> 690
-                pdf.drawString(280, 670, f"Mobile:")  # 690 -> 670
-                pdf.drawString(280, 650, f"Email:")  # 670 -> 650
-                pdf.drawString(280, 630, f"State:")  # 650 -> 630
-                
-                # Billing Details values in black - all moved down
-                pdf.setFillColor(colors.black)
-                pdf.drawString(320, 710, billing_details['gstin'])  # 730 -> 710
-                
-                # Handle multiline address - starting point moved down
-                address_words = billing_details['address'].split()
-                address_line = ""
-                y_pos = 690  # 710 -> 690
-                for word in address_words:
-                    if pdf.stringWidth(address_line + " " + word, "Helvetica", 10) < 220:
-                        address_line += " " + word
-                    else:
-                        pdf.drawString(330, y_pos, address_line.strip())
-                        y_pos -= 15
-                        address_line = word
-                if address_line:
-                    pdf.drawString(330, y_pos, address_line.strip())
-                
-                pdf.drawString(330, 670, billing_details['mobile'])  # 690 -> 670
-                pdf.drawString(330, 650, billing_details['email'])  # 670 -> 650
-                pdf.drawString(330, 630, billing_details['state'])  # 650 -> 630
-                pdf.drawString(280, 610, f"Pincode:")  # 630 -> 610
-                # Get pincode safely with fallback to empty string
-                pdf.drawString(330, 610, billing_details.get('pincode', ''))  # 630 -> 610
-                
-                # After getting company and billing details, add state comparison
-                company_state = company.company_state
-                billing_state = billing_details.get('state')
-                is_same_state = company_state == billing_state
-
-                # Reduce the gap by moving the table up closer to the header sections - start table at 560 instead of 500
-                available_height = 560  
-                
-                # Table header with all data but modified display - exactly as in image
-                table_data = [['Items Description', 'HSN', 'Unit Price', 'Unit', 'Qnt', 'Total']]
-                
-                # Rest of the code remains unchanged
-                total_amount = Decimal('0.00')
-                total_cgst = Decimal('0.00')
-                total_sgst = Decimal('0.00')
-                total_igst = Decimal('0.00')
-
-                for product in products:
-                    rate = Decimal(str(product['rate']))
-                    quantity = Decimal(str(product['quantity']))
-                    total = Decimal(str(product['total']))
-                    unit_type = product.get('unit_type', '')
-                    hsn = product.get('hsn', '')
-                    gst_percentage = Decimal(str(product.get('gst_percentage', '0')))
-                    
-                    # Calculate GST based on state (keep calculations but don't show in table)
-                    if is_same_state:
-                        cgst_percentage = gst_percentage / 2
-                        sgst_percentage = gst_percentage / 2
-                        cgst_amount = (total * cgst_percentage) / Decimal('100')
-                        sgst_amount = (total * sgst_percentage) / Decimal('100')
-                        total_cgst += cgst_amount
-                        total_sgst += sgst_amount
-                    else:
-                        igst_amount = (total * gst_percentage) / Decimal('100')
-                        total_igst += igst_amount
-                    
-                    # Handle long HSN codes by wrapping if needed
-                    if hsn and len(hsn) > 8:
-                        hsn = Paragraph(hsn, styles['Normal'])
-                    
-                    # Table row with visible columns
-                    description = [
-                        Paragraph(f"<b>{product['name']}</b>", styles['Normal']),
-                        hsn,
-                        f"₹ {rate:,.2f}",
-                        unit_type,
-                        str(quantity),
-                        f"₹ {total:,.2f}"
-                    ]
-                    
-                    table_data.append(description)
-                    total_amount += total
-
-                # Set table column widths for visible columns and center align
-                # Increase HSN column width to 80 (from 60) to better fit content
-                table = Table(table_data, colWidths=[200, 80, 80, 50, 50, 60], repeatRows=1)
-                page_width = A4[0]
-                table_width = sum([200, 80, 80, 50, 50, 60])
-                x_offset = (page_width - table_width) / 2
-
-                # Enhanced table styling (keeping original style)
-                table_style = TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.4, 0.4, 0.8)),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (2, 0), (-1, -1), 'CENTER'),  # Center align numeric columns
-                    ('ALIGN', (0, 0), (0, -1), 'LEFT'),    # Left align description
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 11),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),  # Reduced from 12
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.9, 0.9, 0.9)),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.Color(0.95, 0.95, 0.95)]),
-                    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),  # Reduced from 15
-                    ('TOPPADDING', (0, 1), (-1, -1), 8),     # Reduced from 15
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Vertical alignment
-                    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.Color(0.2, 0.2, 0.7)), # Strong header line
-                    # Removed BOX style to eliminate the outer border
-                ])
-                table.setStyle(table_style)
-                
-                # Calculate the table height based on content - adjusted for tighter spacing
-                row_height = 16 + 10  # 16 for padding (8 top + 8 bottom) + 10 for text height
-                header_height = 8 + 11  # 8 for bottom padding + 11 for font size
-                table_height = (len(table_data) - 1) * row_height + header_height
-
-                # Calculate available space on page
-                available_height = 560  # Starting vertical position for table (reduced gap between header and table)
-
-                # Define column width for footer sections - needed for both single and multi-page layouts
-                col_width = 160
-
-                # Check if table will fit on current page
-                # Create fixed size table area for better layout consistency
-                fixed_table_area_height = 250  # Fixed height for table area
-                max_rows_in_main_area = int((fixed_table_area_height - header_height) / row_height)
-
-                if len(table_data) - 1 > max_rows_in_main_area:
-                    # Too many rows for fixed area - use pagination
-                    # Table is too large - we need to handle pagination
-                    rows_per_page = max(1, max_rows_in_main_area)
-                    
-                    # For first page - only show rows that fit in fixed area
-                    first_page_data = [table_data[0]] + table_data[1:rows_per_page+1]
-                    first_page_table = Table(first_page_data, colWidths=[200, 80, 80, 50, 50, 60])
-                    first_page_table.setStyle(table_style)
-                    actual_table_height = min(fixed_table_area_height, header_height + (len(first_page_data) - 1) * row_height)
-                    
-                    # Draw first page table
-                    first_page_table.wrapOn(pdf, 400, actual_table_height)
-                    first_page_table.drawOn(pdf, x_offset, available_height - actual_table_height)
-                    
-                    # Calculate bottom of first table
-                    table_bottom = available_height - actual_table_height
-                    
-                    # Add continuation message - using standard font instead of Helvetica-Italic
-                    pdf.setFillColor(colors.black)
-                    pdf.setFont("Helvetica", 9)
-                    pdf.drawCentredString(page_width/2, table_bottom - 15, "Continued on next page...")
-                    
-                    # Process remaining rows on new pages
-                    remaining_rows = table_data[rows_per_page+1:]
-                    page_num = 1
-                    
-                    while remaining_rows:
-                        # Start a new page
-                        pdf.showPage()
-                        page_num += 1
-                        
-                        # Add header to identify this is a continuation
-                        pdf.setFont("Helvetica-Bold", 14)
-                        pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
-                        pdf.drawCentredString(page_width/2, 800, f"Invoice Continuation - Page {page_num}")
-                        
-                        # Calculate how many rows fit on this page
-                        continuation_page_height = 700  # More space on continuation pages
-                        rows_this_page = min(len(remaining_rows), int(continuation_page_height / row_height))
-                        
-                        # Create and draw table for this page
-                        this_page_data = [table_data[0]] + remaining_rows[:rows_this_page]
-                        this_page_table = Table(this_page_data, colWidths=[200, 80, 80, 50, 50, 60])
-                        this_page_table.setStyle(table_style)
-                        this_page_table_height = header_height + (len(this_page_data) - 1) * row_height
-                        
-                        # Position table with proper spacing
-                        top_margin = 750
-                        this_page_table.wrapOn(pdf, 400, this_page_table_height)
-                        this_page_table.drawOn(pdf, x_offset, top_margin - this_page_table_height)
-                        
-                        # Update remaining rows
-                        remaining_rows = remaining_rows[rows_this_page:]
-                        
-                        # If there are more rows, add continuation message - using standard font
-                        if remaining_rows:
-                            pdf.setFont("Helvetica", 9)  # Changed from Helvetica-Italic to Helvetica
-                            pdf.setFillColor(colors.black)
-                            bottom_pos = top_margin - this_page_table_height - 15
-                            pdf.drawCentredString(page_width/2, bottom_pos, "Continued on next page...")
-                    
-                    # Start a new page for summary and footer
-                    pdf.showPage()
-                    
-                    # Add final page header
-                    pdf.setFont("Helvetica-Bold", 14)
-                    pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
-                    pdf.drawCentredString(page_width/2, 800, f"Invoice Summary - Page {page_num+1}")
-                    
-                    # Position summary at top of this page
-                    summary_top = 700
-                    note_top = 550
-                    footer_top = 380
-                else:
-                    # Table fits in the fixed area - maintain table height within constraints
-                    actual_table_height = header_height + (len(table_data) - 1) * row_height
-                    
-                    # Draw the table at the calculated position, but ensure it stays within fixed area
-                    table.wrapOn(pdf, 400, actual_table_height)
-                    table.drawOn(pdf, x_offset, available_height - actual_table_height)
-                    
-                    # Always position the summary section at consistent location
-                    # This makes layout consistent regardless of number of rows
-                    table_bottom = available_height - fixed_table_area_height
-                    summary_top = table_bottom - 40  # Fixed position for summary
-                    note_top = summary_top - 150     # Fixed position for notes
-                    footer_top = note_top - 120      # Fixed position for footer
-
-                # Create summary table for better alignment with product table
-                summary_data = []
-                summary_data.append(["Subtotal:", f"₹ {total_amount:,.2f}"])
-                
-                # Tax section based on state
-                if is_same_state:
-                    summary_data.append(["CGST:", f"₹ {total_cgst:,.2f}"])
-                    summary_data.append(["SGST:", f"₹ {total_sgst:,.2f}"])
-                    total_tax = total_cgst + total_sgst
-                else:
-                    summary_data.append(["IGST:", f"₹ {total_igst:,.2f}"])
-                    total_tax = total_igst
-
-                # Final total calculation
-                final_total = total_amount + total_tax
-                
-                # Create aligned summary table
-                summary_table = Table(summary_data, colWidths=[80, 115])
-                summary_style = TableStyle([
-                    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
-                    ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (1, -1), 8),
-                    ('TOPPADDING', (0, 0), (1, -1), 8),
-                    ('GRID', (0, 0), (1, -1), 0.5, colors.Color(0.9, 0.9, 0.9)),
-                ])
-                summary_table.setStyle(summary_style)
-                
-                # Position summary table at right side to align with product table
-                summary_x = x_offset + table_width - 195
-                summary_table.wrapOn(pdf, 195, 75)
-                summary_table.drawOn(pdf, summary_x, summary_top + 75)
-
-                # Total due with shadow effect - adjust position to align with summary table
-                pdf.saveState()
-                pdf.setFillColor(colors.Color(0.4, 0.4, 0.8, alpha=0.3))
-                pdf.roundRect(summary_x+2, summary_top+35, 195, 30, 5, fill=1)
-                pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
-                pdf.roundRect(summary_x, summary_top+33, 195, 30, 5, fill=1)
-                pdf.setFillColor(colors.white)
-                pdf.setFont("Helvetica-Bold", 12)
-                pdf.drawString(summary_x+10, summary_top+45, "TOTAL DUE:")
-                pdf.drawRightString(summary_x+185, summary_top+45, f"₹ {final_total:,.2f}")
-                pdf.restoreState()
-                
-                # Note section with border - adjust position
-                pdf.setStrokeColor(colors.Color(0.9, 0.9, 0.9))
-                pdf.rect(50, note_top, 500, 40, stroke=1)
-                pdf.setFillColor(colors.gray)
-                pdf.setFont("Helvetica-Bold", 10)
-                pdf.drawString(60, note_top + 25, "Note:")
-                pdf.setFont("Helvetica", 9)
-                
-                # Generate appropriate tax note based on state comparison
-                if is_same_state:
-                    # Ensure gst_percentage is defined and valid for the second instance
-                    gst_percent_display = gst_percentage/2 if 'gst_percentage' in locals() else 0
-                    tax_note = f"Note: GST is split equally as CGST ({gst_percent_display}%) and SGST ({gst_percent_display}%) as billing state matches company state."
-                else:
-                    gst_percent_display = gst_percentage if 'gst_percentage' in locals() else 0
-                    tax_note = f"Note: Full GST ({gst_percent_display}%) is charged as IGST for inter-state transaction."
-                
-                pdf.drawString(60, note_top + 10, tax_note)
-                
-                # Footer with three columns and borders - adjust position
-                pdf.rect(50, footer_top, col_width, 100, stroke=1)
-                pdf.setFillColor(colors.black)
-                pdf.setFont("Helvetica-Bold", 10)
-                pdf.drawString(60, footer_top + 80, "Questions?")
-                pdf.setFont("Helvetica", 9)
-                pdf.setFillColor(colors.gray)
-                pdf.drawString(60, footer_top + 65, f"Email: {company.company_email}")
-                pdf.drawString(60, footer_top + 50, f"Phone: {company.company_mobile_number}")
-                
-                # Payment Info with clickable Pay Now button - adjust position
-                pdf.rect(220, footer_top, col_width, 100, stroke=1)
-                pdf.setFillColor(colors.black)
-                pdf.setFont("Helvetica-Bold", 10)
-                pdf.drawString(230, footer_top + 80, "Payment Info:")
-                pdf.setFont("Helvetica", 9)
-                pdf.setFillColor(colors.gray)
-                pdf.drawString(230, footer_top + 65, f"Bank: {company.company_bank_name}")
-                pdf.drawString(230, footer_top + 50, f"A/C: {company.company_bank_account_number}")
-                pdf.drawString(230, footer_top + 35, f"IFSC: {company.company_bank_ifsc_code}")
-
-                # Draw UPI Pay Now button - adjust position
-                upi_button_y = footer_top + 5
-                pdf.setFillColor(colors.Color(0.13, 0.59, 0.95))  # Blue color
-                pdf.roundRect(230, upi_button_y, 100, 25, 8, fill=1)
-                
-                # UPI Button text - adjust position
-                pdf.setFillColor(colors.white)
-                pdf.setFont("Helvetica-Bold", 12)
-                pdf.drawString(250, upi_button_y + 8, "UPI Pay")
-                
-                # Make UPI button clickable with redirect to UPI payment page
-                upi_payment_url = f"http://{request.get_host()}/invoicing/upi-payment/{company.company_id}/?amount={final_total}"
-                pdf.linkURL(
-                    upi_payment_url,
-                    (230, upi_button_y, 330, upi_button_y + 25),
-                    relative=0
-                )
-
-                # Add shipping address to PDF if different from billing - adjust position
-                if not shipping_details.get('use_billing_address', True):
-                    # Ship To section (third column)
-                    pdf.rect(390, footer_top, col_width, 100, stroke=1)
-                    pdf.setFillColor(colors.black)
-                    pdf.setFont("Helvetica-Bold", 10)
-                    pdf.drawString(400, footer_top + 80, "Ship To:")
-                    pdf.setFont("Helvetica", 9)
-                    pdf.setFillColor(colors.gray)
-                    # Safely access shipping address and pincode
-                    pdf.drawString(400, footer_top + 65, shipping_details.get('address', ''))
-                    pdf.drawString(400, footer_top + 50, f"Pincode: {shipping_details.get('pincode', '')}")
-                
-                # Thank you message with blue color - keep it at bottom of page
-                pdf.setFont("Helvetica-Bold", 11)
-                pdf.setFillColor(colors.Color(0.4, 0.4, 0.8))
-                pdf.drawString(50, 40, "Thank you for your Business!")
-                
-                pdf.save()
-                buffer.seek(0)
-                
-                # Save PDF to invoice
-                invoice.invoice_pdf.save(
-                    f"{invoice.invoice_title}.pdf",
-                    ContentFile(buffer.getvalue()),
-                    save=True
-                )
+                render_invoice_pdf(invoice, f"http://{request.get_host()}")
 
                 # Return PDF response
-                response = FileResponse(buffer, content_type='application/pdf')
+                response = FileResponse(invoice.invoice_pdf.open('rb'), content_type='application/pdf')
                 response['Content-Disposition'] = f'attachment; filename="{invoice.invoice_title}.pdf"'
                 return response
 
@@ -1207,9 +762,31 @@ class ReportsView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['companies'] = Company.objects.all()
-        context['invoices'] = Invoice.objects.all()
-        context['billings'] = Billing.objects.all()
+        context['companies'] = Company.objects.only('company_id', 'company_name').order_by('company_name')
+
+        # Filters are applied and pages are cut in the database (see invoicing.reports)
+        try:
+            filters = parse_filters(self.request.GET)
+        except ValueError as e:
+            messages.error(self.request, str(e))
+            filters = {}
+        invoices = filter_invoices(filters)
+        try:
+            page, next_cursor = invoice_page(invoices.select_related('company', 'billing'), self.request.GET.get('cursor'))
+        except ValueError:
+            page, next_cursor = invoice_page(invoices.select_related('company', 'billing'))
+
+        query = self.request.GET.copy()
+        query.pop('cursor', None)
+        context['invoices'] = page
+        context['next_cursor'] = next_cursor
+        context['filters'] = self.request.GET
+        context['filter_query'] = query.urlencode()
+        context['summary'] = invoices.order_by().aggregate(
+            count=Count('pk'),
+            total=Sum('invoice_total'),
+            unpaid=Sum('invoice_total', filter=Q(payment_status=False))
+        )
         return context
 
     def mark_as_paid(self, request, invoice_id):
@@ -1223,6 +800,86 @@ class ReportsView(TemplateView):
         invoice.payment_status = False
         invoice.save()
         return redirect('/invoicing/reports/')
+
+def _session_user_error(request):
+    """401 response when the request has no valid user session, else None"""
+    user_session_id = request.session.get('user_session_id')
+    if not user_session_id:
+        return JsonResponse({'success': False, 'message': 'User not authenticated'}, status=401)
+    try:
+        UserSession.objects.get(id=user_session_id)
+    except (UserSession.DoesNotExist, ValidationError):
+        return JsonResponse({'success': False, 'message': 'Invalid session'}, status=401)
+    return None
+
+class InvoiceReportsApiView(View):
+    """Keyset-paginated invoice rows: ?company=&date_from=&date_to=&status=&type=&cursor=&page_size="""
+    def get(self, request):
+        error = _session_user_error(request)
+        if error:
+            return error
+        try:
+            filters = parse_filters(request.GET)
+            rows, next_cursor = invoice_page(
+                filter_invoices(filters).values(*EXPORT_FIELDS),
+                request.GET.get('cursor'),
+                request.GET.get('page_size') or REPORT_PAGE_SIZE
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse({
+            'invoices': rows,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+
+class InvoiceTotalsApiView(View):
+    """Invoice totals per company, month and billing state for the same filters as the rows API"""
+    def get(self, request):
+        error = _session_user_error(request)
+        if error:
+            return error
+        try:
+            filters = parse_filters(request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(invoice_totals(filter_invoices(filters)))
+
+class InvoiceExportView(View):
+    """Export the filtered invoices as ?format=csv (streamed) or ?format=xlsx"""
+    def get(self, request):
+        try:
+            filters = parse_filters(request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        export_format = request.GET.get('format', 'csv').lower()
+        rows = iter_export_rows(filter_invoices(filters))
+        filename = f"invoices_{timezone.now().strftime('%Y%m%d_%H%M')}"
+        try:
+            response = export_response(export_format, EXPORT_HEADERS, rows, filename, title='Invoices')
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        logger.info(f"Exporting invoices as {export_format} with filters {filters}")
+        return response
+
+class InvoicePdfView(View):
+    """Download an invoice PDF from storage, rendering it only when it is missing"""
+    def get(self, request, invoice_id):
+        invoice = get_object_or_404(Invoice.objects.select_related('company', 'billing'), invoice_id=invoice_id)
+        try:
+            path = stored_invoice_pdf(invoice, f"http://{request.get_host()}")
+        except Exception as e:
+            logger.error(f"Error generating PDF for invoice {invoice_id}: {str(e)}", exc_info=True)
+            return JsonResponse({'error': f'Error generating PDF: {str(e)}'}, status=500)
+
+        return FileResponse(
+            default_storage.open(path, 'rb'),
+            as_attachment=True,
+            filename=f"{invoice.invoice_title or invoice.invoice_id}.pdf",
+            content_type='application/pdf'
+        )
     
 STATE_CHOICES = [
     # States
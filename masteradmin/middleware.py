@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from app.models import Apps
+from app.registry import disabled_apps
 from django.utils.deprecation import MiddlewareMixin
 
 class AppMaintenanceMiddleware(MiddlewareMixin):
@@ -11,11 +11,10 @@ class AppMaintenanceMiddleware(MiddlewareMixin):
         if request.path.startswith('/admin/') or request.path.startswith('/masteradmin/'):
             return self.get_response(request)
 
-        disabled_apps = Apps.objects.filter(is_temporarily_disabled=True)
-        
-        for app in disabled_apps:
-            if app.url_keyword and f'/{app.url_keyword}/' in request.path:
-                return render(request, 'maintenance.html', {'app_name': app.name})
+        # Disabled apps are matched in memory (see app.registry)
+        app_name = disabled_apps.match(request.path, segment=True)
+        if app_name:
+            return render(request, 'maintenance.html', {'app_name': app_name})
                 
         response = self.get_response(request)
         return response 
\ No newline at end of file
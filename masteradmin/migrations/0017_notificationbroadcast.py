@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-17 22:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masteradmin', '0016_alter_useragreement_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationBroadcast',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('agent', 'Agents'), ('employee', 'Employees'), ('support', 'Support')], max_length=10)),
+                ('audience', models.CharField(choices=[('selected', 'Selected recipients'), ('all', 'Everyone')], default='selected', max_length=10)),
+                ('message', models.TextField()),
+                ('recipient_ids', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total', models.IntegerField(default=0)),
+                ('sent', models.IntegerField(default=0)),
+                ('failed_ids', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -157,6 +157,43 @@ class SupportNotification(models.Model):
     def __str__(self):
         return self.support_user.name
 
+class NotificationBroadcast(models.Model):
+    """A notification fan-out to agents, employees or support users, run by masteradmin.notifications"""
+    KIND_CHOICES = [
+        ('agent', 'Agents'),
+        ('employee', 'Employees'),
+        ('support', 'Support'),
+    ]
+    AUDIENCE_CHOICES = [
+        ('selected', 'Selected recipients'),
+        ('all', 'Everyone'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='selected')
+    message = models.TextField()
+    recipient_ids = models.JSONField(default=list, blank=True)  # Only for the 'selected' audience
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total = models.IntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    failed_ids = models.JSONField(default=list, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} broadcast ({self.status})"
+
+    @property
+    def progress(self):
+        return round(self.sent * 100 / self.total) if self.total else (100 if self.status == 'completed' else 0)
+
 
 
 class AI_Prompt(models.Model):
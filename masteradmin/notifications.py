@@ -0,0 +1,191 @@
+"""
+Notification fan-out for the masteradmin Send*NotificationView endpoints.
+
+Selected recipients are resolved with a single in_bulk() and notifications
+are inserted with bulk_create in batches of BATCH_SIZE. The 'all' audience
+(every agent, every active employee, every support user) is read from the
+database in chunks, so the browser never has to send id lists. Audiences
+larger than BACKGROUND_THRESHOLD are delivered by a background job
+(masteradmin.tasks.broadcast_notification) whose progress is stored on the
+NotificationBroadcast row.
+"""
+import logging
+import threading
+import traceback
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from agents.models import AgentUser
+from customersupport.models import SupportUser
+from employee.models import Employee
+
+from .models import AgentNotification, EmployeeNotification, NotificationBroadcast, SupportNotification
+
+logger = logging.getLogger(__name__)
+
+# Notifications inserted per query
+BATCH_SIZE = 1000
+
+# Audiences larger than this are delivered in the background
+BACKGROUND_THRESHOLD = 500
+
+# kind -> (recipient model, notification model, recipient FK attribute)
+AUDIENCES = {
+    'agent': (AgentUser, AgentNotification, 'agent_user_id'),
+    'employee': (Employee, EmployeeNotification, 'employee_user_id'),
+    'support': (SupportUser, SupportNotification, 'support_user_id'),
+}
+
+
+def audience_queryset(kind):
+    """Recipients of the 'all' audience of a kind (what the masteradmin pages list)"""
+    model = AUDIENCES[kind][0]
+    if kind == 'employee':
+        return model.objects.filter(is_active=True)
+    return model.objects.all()
+
+
+def resolve_recipients(kind, recipient_ids):
+    """
+    Look up selected recipients with one query
+
+    Returns:
+        tuple: (list of existing recipient pks, list of ids that are invalid or unknown)
+    """
+    model = AUDIENCES[kind][0]
+    valid = {}
+    failed = []
+    for recipient_id in recipient_ids:
+        try:
+            valid.setdefault(uuid.UUID(str(recipient_id)), recipient_id)
+        except (TypeError, ValueError, AttributeError):
+            failed.append(recipient_id)
+
+    found = model.objects.only('pk').in_bulk(list(valid))
+    failed.extend(original for pk, original in valid.items() if pk not in found)
+    return list(found), failed
+
+
+def _insert(kind, message, pks):
+    notification_model, field = AUDIENCES[kind][1], AUDIENCES[kind][2]
+    notification_model.objects.bulk_create(
+        [notification_model(message=message, **{field: pk}) for pk in pks],
+        batch_size=BATCH_SIZE
+    )
+    return len(pks)
+
+
+def _iter_batches(kind, pks=None):
+    """Recipient pk batches: the given pks, or the whole 'all' audience read in chunks"""
+    if pks is not None:
+        for start in range(0, len(pks), BATCH_SIZE):
+            yield pks[start:start + BATCH_SIZE]
+        return
+    batch = []
+    for pk in audience_queryset(kind).order_by('pk').values_list('pk', flat=True).iterator(chunk_size=BATCH_SIZE):
+        batch.append(pk)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_broadcast(broadcast_id):
+    """
+    Deliver a NotificationBroadcast, saving progress after every batch
+
+    Returns:
+        NotificationBroadcast
+    """
+    broadcast = NotificationBroadcast.objects.get(pk=broadcast_id)
+    if broadcast.status == 'completed':
+        return broadcast
+
+    broadcast.status = 'running'
+    broadcast.sent = 0
+    resolved = None
+    if broadcast.audience == 'all':
+        broadcast.total = audience_queryset(broadcast.kind).count()
+    else:
+        resolved, broadcast.failed_ids = resolve_recipients(broadcast.kind, broadcast.recipient_ids)
+        broadcast.total = len(resolved)
+    broadcast.save(update_fields=['status', 'sent', 'total', 'failed_ids'])
+
+    try:
+        for batch in _iter_batches(broadcast.kind, resolved):
+            with transaction.atomic():
+                broadcast.sent += _insert(broadcast.kind, broadcast.message, batch)
+                broadcast.total = max(broadcast.total, broadcast.sent)
+                broadcast.save(update_fields=['sent', 'total'])
+    except Exception as e:
+        logger.error(f"Error delivering notification broadcast {broadcast.id}: {e}")
+        logger.error(traceback.format_exc())
+        broadcast.status = 'failed'
+        broadcast.error = str(e)
+        broadcast.save(update_fields=['status', 'error'])
+        return broadcast
+
+    broadcast.status = 'completed'
+    broadcast.completed_at = timezone.now()
+    broadcast.save(update_fields=['status', 'completed_at'])
+    logger.info(f"Notification broadcast {broadcast.id} delivered to {broadcast.sent} {broadcast.kind} recipients")
+    return broadcast
+
+
+def _run_safely(broadcast_id):
+    try:
+        run_broadcast(broadcast_id)
+    except Exception as e:
+        logger.error(f"Error running notification broadcast {broadcast_id}: {e}")
+        logger.error(traceback.format_exc())
+
+
+def _dispatch(broadcast_id):
+    try:
+        from .tasks import broadcast_notification
+        broadcast_notification.delay(str(broadcast_id))
+    except Exception as e:
+        logger.warning(f"Could not queue notification broadcast {broadcast_id} ({e}), running in a background thread")
+        threading.Thread(target=_run_safely, args=(broadcast_id,), daemon=True).start()
+
+
+def send_notifications(kind, message, recipient_ids=None, audience='selected'):
+    """
+    Fan a notification out to an audience
+
+    Small audiences are delivered before returning; larger ones are queued.
+
+    Args:
+        kind: 'agent', 'employee' or 'support'
+        message: notification text
+        recipient_ids: ids of the selected recipients (ignored for audience 'all')
+        audience: 'selected' or 'all'
+
+    Returns:
+        NotificationBroadcast (status 'completed', or 'pending' when queued)
+    """
+    if kind not in AUDIENCES:
+        raise ValueError(f"Unknown notification kind: {kind}")
+
+    if audience == 'all':
+        size = audience_queryset(kind).count()
+        recipient_ids = []
+    else:
+        audience = 'selected'
+        recipient_ids = [str(recipient_id) for recipient_id in recipient_ids or []]
+        size = len(recipient_ids)
+
+    broadcast = NotificationBroadcast.objects.create(
+        kind=kind,
+        audience=audience,
+        message=message,
+        recipient_ids=recipient_ids,
+        total=size,
+    )
+    if size > BACKGROUND_THRESHOLD:
+        transaction.on_commit(lambda: _dispatch(broadcast.id))
+        return broadcast
+    return run_broadcast(broadcast.id)
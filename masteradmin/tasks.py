@@ -0,0 +1,24 @@
+import logging
+
+from celery import shared_task
+
+from .notifications import run_broadcast
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name="masteradmin.tasks.broadcast_notification")
+def broadcast_notification(self, broadcast_id):
+    """
+    Deliver a large notification broadcast in the background
+
+    Args:
+        broadcast_id (str): ID of the NotificationBroadcast created by the send view
+
+    Returns:
+        dict: Final status and counts of the broadcast
+    """
+    logger.info(f"Starting broadcast_notification task {self.request.id} for broadcast {broadcast_id}")
+    broadcast = run_broadcast(broadcast_id)
+    return {'status': broadcast.status, 'sent': broadcast.sent, 'failed': len(broadcast.failed_ids)}
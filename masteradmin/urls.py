@@ -57,6 +57,7 @@ urlpatterns = [
     path('send_agent_notification/', SendAgentNotificationView.as_view(), name='send_agent_notification'),
     path('send_support_notification/', SendSupportNotificationView.as_view(), name='send_support_notification'),
     path('send_employee_notification/', SendEmployeeNotificationView.as_view(), name='send_employee_notification'),
+    path('notification_broadcast/<uuid:broadcast_id>/', NotificationBroadcastStatusView.as_view(), name='notification_broadcast_status'),
     path('user_details/',UserDetailsView.as_view(), name='user_details'),
     path('approve_employee/<str:employee_id>/', approve_employee, name='approve_employee'),
     path('reject_employee/<str:employee_id>/', reject_employee, name='reject_employee'),
@@ -14,7 +14,7 @@ import json, logging, logging.handlers, random, re, zipfile
 from agents.models import *
 from app.models import *
 from django.contrib import messages
-from openpyxl import Workbook
+from documents.exports import export_response, iter_values
 from django.utils.translation import gettext_lazy as _
 from django.db import IntegrityError
 from employee.models import *  
@@ -31,6 +31,8 @@ from django.db.models import Q
 from django.db.models import Sum, Count, Avg
 from django.db.models.functions import TruncDay
 from beesuggest.models import ProductDetails, BeesuggestAgreement
+from .notifications import send_notifications
+from django.urls import reverse
 
 # register = template.Library()
 
@@ -1381,35 +1383,23 @@ class CreateCouponView(TemplateView):
 
 class ExportDataView(View):
     def get(self, request, *args, **kwargs):
-        # Create a new workbook and select the active sheet
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Coupons Data"
-
         # Define headers
         headers = ['Name', 'Code', 'Discount Type', 'Rate', 'Number of Uses', 'Expiry Date']
-        for col, header in enumerate(headers, start=1):
-            sheet.cell(row=1, column=col, value=header)
-
-        # Get all coupons data
-        coupons = Coupons.objects.all()
 
-        # Add data to sheet
-        for row, coupon in enumerate(coupons, start=2):
-            sheet.cell(row=row, column=1, value=coupon.name)
-            sheet.cell(row=row, column=2, value=coupon.code)
-            sheet.cell(row=row, column=3, value=coupon.discount_type)
-            sheet.cell(row=row, column=4, value=float(coupon.rate))
-            sheet.cell(row=row, column=5, value=coupon.number_of_uses)
-            sheet.cell(row=row, column=6, value=str(coupon.expiry_date) if coupon.expiry_date else "No expiry")
-
-        # Create response
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=coupons_data.xlsx'
+        # Coupon rows are read in chunks and written out as they come
+        coupons = iter_values(
+            Coupons.objects.all(),
+            ['name', 'code', 'discount_type', 'rate', 'number_of_uses', 'expiry_date']
+        )
+        rows = (
+            [name, code, discount_type, float(rate), number_of_uses, str(expiry_date) if expiry_date else "No expiry"]
+            for name, code, discount_type, rate, number_of_uses, expiry_date in coupons
+        )
 
-        # Save workbook to response
-        workbook.save(response)
-        return response
+        try:
+            return export_response(request.GET.get('format'), headers, rows, 'coupons_data', title="Coupons Data")
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class DeleteCouponView(View):
@@ -2604,239 +2594,96 @@ class WhatsOnMindView(View):
             }, status=500)
         
 
-class SendAgentNotificationView(View):
-    def post(self, request):
-        try:
-            print("Received request body:", request.body)
-            data = json.loads(request.body)
-            agent_ids = data.get('agent_ids', [])
-            message = data.get('message')
-            print("Parsed data:", data)
-            print("Agent IDs:", agent_ids)
-            print("Message:", message)
+def send_notification_response(request, kind, ids_key, label):
+    """
+    Shared body of the Send*NotificationView endpoints
 
-            if not agent_ids or not message:
-                print("Missing required fields - agents:", bool(agent_ids), "message:", bool(message))
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Agent IDs and message are required'
-                }, status=400)
+    Expects JSON with the message and either the selected ids under ids_key
+    or "audience": "all". Large audiences are delivered in the background;
+    the response then carries the broadcast id to poll for progress.
+    """
+    try:
+        data = json.loads(request.body)
+        message = data.get('message')
+        audience = 'all' if data.get('audience') == 'all' else 'selected'
+        recipient_ids = data.get(ids_key) or []
+        if not isinstance(recipient_ids, list):
+            recipient_ids = [recipient_ids]
 
-            notification_sent = False
-            failed_agents = []
-            
-            for agent_id in agent_ids:
-                print(f"Processing agent ID: {agent_id}")
-                try:
-                    agent = AgentUser.objects.get(id=agent_id)
-                    print(f"Found agent: {agent.id}")
-                    notification = AgentNotification.objects.create(
-                        agent_user=agent,
-                        message=message
-                    )
-                    print(f"Created notification: {notification.id}")
-                    notification_sent = True
-                    logger.info(f"Notification sent to agent {agent.id}")
-                except AgentUser.DoesNotExist:
-                    print(f"Agent {agent_id} not found in database")
-                    failed_agents.append(agent_id)
-                    logger.error(f"Agent {agent_id} not found")
-                except Exception as e:
-                    print(f"Error sending notification to {agent_id}: {str(e)}")
-                    failed_agents.append(agent_id)
-                    logger.error(f"Failed to send notification to agent {agent_id}: {str(e)}")
+        if not message or (audience == 'selected' and not recipient_ids):
+            return JsonResponse({
+                'status': 'error',
+                'message': f'{label.capitalize()} IDs and message are required'
+            }, status=400)
 
-            if not notification_sent:
-                print("No notifications were sent successfully")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Failed to send notifications to any agents',
-                    'failed_agents': failed_agents
-                }, status=500)
+        broadcast = send_notifications(kind, message, recipient_ids, audience)
 
-            response_data = {
+        if broadcast.status == 'pending':
+            return JsonResponse({
                 'status': 'success',
-                'message': 'Notifications sent successfully'
-            }
-            
-            if failed_agents:
-                print(f"Some notifications failed. Failed agents: {failed_agents}")
-                response_data['warning'] = 'Some notifications failed to send'
-                response_data['failed_agents'] = failed_agents
-
-            print("Returning response:", response_data)
-            return JsonResponse(response_data)
+                'message': f'Notifications are being sent to {broadcast.total} {label}s',
+                'queued': True,
+                'broadcast_id': str(broadcast.id),
+                'status_url': reverse('notification_broadcast_status', args=[broadcast.id]),
+            })
 
-        except json.JSONDecodeError:
-            print("Failed to decode JSON data")
-            logger.error("Invalid JSON data received")
+        if broadcast.status == 'failed' or not broadcast.sent:
             return JsonResponse({
                 'status': 'error',
-                'message': 'Invalid JSON data'
-            }, status=400)
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            logger.error(f"Error occurred: {str(e)}", exc_info=True)
-            return JsonResponse({
-                'status': 'error', 
-                'message': 'An error occurred while sending notifications'
+                'message': f'Failed to send notifications to any {label}s',
+                f'failed_{label}s': broadcast.failed_ids
             }, status=500)
+
+        response_data = {
+            'status': 'success',
+            'message': 'Notifications sent successfully',
+            'sent': broadcast.sent,
+        }
+        if broadcast.failed_ids:
+            response_data['warning'] = 'Some notifications failed to send'
+            response_data[f'failed_{label}s'] = broadcast.failed_ids
+        logger.info(f"Sent {broadcast.sent} {label} notifications ({len(broadcast.failed_ids)} failed)")
+        return JsonResponse(response_data)
+
+    except json.JSONDecodeError:
+        logger.error("Invalid JSON data received")
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON data'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error occurred: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'status': 'error', 
+            'message': 'An error occurred while sending notifications'
+        }, status=500)
+
+class SendAgentNotificationView(View):
+    def post(self, request):
+        return send_notification_response(request, 'agent', 'agent_ids', 'agent')
         
 class SendEmployeeNotificationView(View):
     def post(self, request):
-        try:
-            print("Received request body:", request.body)
-            data = json.loads(request.body)
-            employee_ids = data.get('employee_ids', [])
-            message = data.get('message')
-            print("Parsed data:", data)
-            print("Employee IDs:", employee_ids)
-            print("Message:", message)
-
-            if not employee_ids or not message:
-                print("Missing required fields - employees:", bool(employee_ids), "message:", bool(message))
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Employee IDs and message are required'
-                }, status=400)
-
-            notification_sent = False
-            failed_employees = []
-            
-            for employee_id in employee_ids:
-                print(f"Processing employee ID: {employee_id}")
-                try:
-                    employee = Employee.objects.get(id=employee_id)
-                    print(f"Found employee: {employee.id}")
-                    notification = EmployeeNotification.objects.create(
-                        employee_user=employee,
-                        message=message
-                    )
-                    print(f"Created notification: {notification.id}")
-                    notification_sent = True
-                    logger.info(f"Notification sent to employee {employee.id}")
-                except Employee.DoesNotExist:
-                    print(f"Employee {employee_id} not found in database")
-                    failed_employees.append(employee_id)
-                    logger.error(f"Employee {employee_id} not found")
-                except Exception as e:
-                    print(f"Error sending notification to {employee_id}: {str(e)}")
-                    failed_employees.append(employee_id)
-                    logger.error(f"Failed to send notification to employee {employee_id}: {str(e)}")
-
-            if not notification_sent:
-                print("No notifications were sent successfully")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Failed to send notifications to any employees',
-                    'failed_employees': failed_employees
-                }, status=500)
+        return send_notification_response(request, 'employee', 'employee_ids', 'employee')
 
-            response_data = {
-                'status': 'success',
-                'message': 'Notifications sent successfully'
-            }
-            
-            if failed_employees:
-                print(f"Some notifications failed. Failed employees: {failed_employees}")
-                response_data['warning'] = 'Some notifications failed to send'
-                response_data['failed_employees'] = failed_employees
-
-            print("Returning response:", response_data)
-            return JsonResponse(response_data)
-
-        except json.JSONDecodeError:
-            print("Failed to decode JSON data")
-            logger.error("Invalid JSON data received")
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Invalid JSON data'
-            }, status=400)
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            logger.error(f"Error occurred: {str(e)}", exc_info=True)
-            return JsonResponse({
-                'status': 'error', 
-                'message': 'An error occurred while sending notifications'
-            }, status=500)        
 class SendSupportNotificationView(View):
     def post(self, request):
-        try:
-            print("Received request body:", request.body)
-            data = json.loads(request.body)
-            support_ids = data.get('support_ids', []) if isinstance(data.get('support_ids'), list) else [data.get('support_ids')] if data.get('support_ids') else []
-            message = data.get('message')
-            print("Parsed data:", data)
-            print("Support IDs:", support_ids)
-            print("Message:", message)
-
-            if not support_ids or not message:
-                print("Missing required fields - support:", bool(support_ids), "message:", bool(message))
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Support IDs and message are required'
-                }, status=400)
-
-            notification_sent = False
-            failed_supports = []
-            
-            for support_id in support_ids:
-                print(f"Processing support ID: {support_id}")
-                try:
-                    support = SupportUser.objects.get(id=support_id)
-                    print(f"Found support: {support.id}")
-                    notification = SupportNotification.objects.create(
-                        support_user=support,
-                        message=message
-                    )
-                    print(f"Created notification: {notification.id}")
-                    notification_sent = True
-                    logger.info(f"Notification sent to support {support.id}")
-                except SupportUser.DoesNotExist:
-                    print(f"Support {support_id} not found in database")
-                    failed_supports.append(support_id)
-                    logger.error(f"Support {support_id} not found")
-                except Exception as e:
-                    print(f"Error sending notification to {support_id}: {str(e)}")
-                    failed_supports.append(support_id)
-                    logger.error(f"Failed to send notification to support {support_id}: {str(e)}")
-
-            if not notification_sent:
-                print("No notifications were sent successfully")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Failed to send notifications to any supports',
-                    'failed_supports': failed_supports
-                }, status=500)
-
-            response_data = {
-                'status': 'success',
-                'message': 'Notifications sent successfully'
-            }
-            
-            if failed_supports:
-                print(f"Some notifications failed. Failed supports: {failed_supports}")
-                response_data['warning'] = 'Some notifications failed to send'
-                response_data['failed_supports'] = failed_supports
-
-            print("Returning response:", response_data)
-            return JsonResponse(response_data)
-
-        except json.JSONDecodeError:
-            print("Failed to decode JSON data")
-            logger.error("Invalid JSON data received")
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Invalid JSON data'
-            }, status=400)
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            logger.error(f"Error occurred: {str(e)}", exc_info=True)
-            return JsonResponse({
-                'status': 'error', 
-                'message': 'An error occurred while sending notifications'
-            }, status=500)
-        
+        return send_notification_response(request, 'support', 'support_ids', 'support')
+
+class NotificationBroadcastStatusView(View):
+    def get(self, request, broadcast_id):
+        broadcast = NotificationBroadcast.objects.filter(pk=broadcast_id).first()
+        if broadcast is None:
+            return JsonResponse({'status': 'error', 'message': 'Broadcast not found'}, status=404)
+        return JsonResponse({
+            'status': 'success',
+            'broadcast_status': broadcast.status,
+            'total': broadcast.total,
+            'sent': broadcast.sent,
+            'progress': broadcast.progress,
+            'failed_ids': broadcast.failed_ids,
+            'error': broadcast.error,
+        })
 
 class UserDetailsView(TemplateView):
     template_name = 'masteradmin/user_details.html'
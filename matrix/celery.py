@@ -23,6 +23,22 @@ app.conf.update(
         'data_miner.tasks.*': {'queue': 'data_mining'},
         # Specific routing for the scrape_contacts task
         'data_miner.tasks.scrape_contacts': {'queue': 'high_priority'},
+        # Sales file analysis for the business analytics dashboard
+        'business_analytics.tasks.*': {'queue': 'analytics'},
+        # Website image derivatives, sitemap regeneration and catalog imports
+        'website.tasks.*': {'queue': 'media'},
+        # Invoice PDF batch rendering
+        'invoicing.tasks.*': {'queue': 'media'},
+        # Outbound email delivery and notification fan-out
+        'outbox.tasks.*': {'queue': 'email'},
+        'masteradmin.tasks.*': {'queue': 'email'},
+    },
+    beat_schedule={
+        # Backstop for queued emails whose delivery run was never queued
+        'outbox-send-queued-emails': {
+            'task': 'outbox.tasks.send_queued_emails',
+            'schedule': 60.0,
+        },
     },
     task_time_limit=3600,  # 1 hour time limit per task
     worker_max_tasks_per_child=500,  # Restart worker after 500 tasks to prevent memory leaks
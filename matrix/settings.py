@@ -69,6 +69,8 @@ INSTALLED_APPS = [
     'pwa',  # Django PWA package
     'business_analytics',  # Business Analytics app
     'beesuggest',
+    'outbox',  # Queued outbound email
+    'documents',  # Shared PDF rendering and spreadsheet exports
     'storages',
     'django_extensions',
     # 'apps',
@@ -264,7 +266,16 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Emails are queued in the outbox and delivered by outbox.tasks over one SMTP connection
+EMAIL_BACKEND = 'outbox.backends.OutboxBackend'
+OUTBOX_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+
+# Invoice and HR document PDFs are rendered in a process pool and stored once per distinct input
+PDF_RENDER_WORKERS = 2  # 0 renders in the calling process
+PDF_RENDER_TIMEOUT = 120
+INVOICING_BASE_URL = 'https://1matrix.io'  # Host of the UPI links in invoices rendered outside a request
 EMAIL_HOST = 'smtp.hostinger.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -46,6 +46,7 @@ urlpatterns = [
     path('business_analytics/', include('business_analytics.urls')),
     path('accounts/', include('allauth.urls')),
     path('beesuggest/', include('beesuggest.urls')),
+    path('outbox/', include('outbox.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,6 +1,6 @@
 from django.shortcuts import render
 from django.utils.deprecation import MiddlewareMixin
-from app.models import Apps
+from app.registry import disabled_apps
 from django.http import HttpResponseForbidden
 
 class AppAccessMiddleware(MiddlewareMixin):
@@ -10,17 +10,15 @@ class AppAccessMiddleware(MiddlewareMixin):
         if request.path.startswith('/admin/'):
             return None
 
-        disabled_apps = Apps.objects.filter(is_temporarily_disabled=True)
-
-        for app in disabled_apps:
-            # Ensure the app has a URL keyword and it's not empty
-            if app.url_keyword and app.url_keyword in request.path:
-                # The path contains a keyword for a disabled app.
-                # Render a page indicating the app is disabled.
-                context = {
-                    'app_name': app.name,
-                    'page_title': f"{app.name} Temporarily Disabled",
-                }
-                return render(request, 'onematrix/app_disabled.html', context, status=403)
+        # Disabled apps are matched in memory (see app.registry)
+        app_name = disabled_apps.match(request.path)
+        if app_name:
+            # The path contains a keyword for a disabled app.
+            # Render a page indicating the app is disabled.
+            context = {
+                'app_name': app_name,
+                'page_title': f"{app_name} Temporarily Disabled",
+            }
+            return render(request, 'onematrix/app_disabled.html', context, status=403)
                 
         return None 
\ No newline at end of file
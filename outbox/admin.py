@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import OutboundEmail
+# Register your models here.
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'created_at', 'sent_at', 'latency_ms']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to', 'last_error']
+    readonly_fields = ['created_at', 'sent_at', 'latency_ms', 'claim_token', 'claimed_at']
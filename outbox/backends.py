@@ -0,0 +1,25 @@
+import logging
+
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .delivery import enqueue_messages
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    Email backend that queues messages in the outbox instead of sending them
+
+    Delivery happens in outbox.delivery.send_queued_emails, outside the request.
+    """
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        try:
+            return len(enqueue_messages(email_messages))
+        except Exception as e:
+            logger.error(f"Error queueing {len(email_messages)} emails: {e}")
+            if not self.fail_silently:
+                raise
+            return 0
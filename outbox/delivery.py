@@ -0,0 +1,385 @@
+"""
+Outbound email queue.
+
+With EMAIL_BACKEND = 'outbox.backends.OutboxBackend', send_mail() and
+EmailMessage.send() calls only store the fully rendered message (subject,
+bodies, alternatives, attachments) as an OutboundEmail row, and a delivery
+run is queued after the commit (outbox.tasks.send_queued_emails, or a
+background thread when Celery is unavailable). Request handlers no longer
+wait for the SMTP relay. The run starts DISPATCH_DELAY seconds later so that a
+burst of messages shares one run; the beat schedule in matrix/celery.py also
+runs it every minute as a backstop for runs that were never queued.
+
+A delivery run claims due messages in batches and sends all of them over one
+connection of OUTBOX_DELIVERY_BACKEND, reopened only after a failure. Failed
+messages are retried with exponential backoff up to OUTBOX_MAX_ATTEMPTS
+times. get_outbox_stats() reports queue depth and send latency.
+
+For local testing, point the delivery backend at a dummy SMTP server, e.g.
+    python -m smtpd -n -c DebuggingServer localhost:1025
+with EMAIL_HOST='localhost', EMAIL_PORT=1025, EMAIL_USE_TLS=False.
+"""
+import base64
+import logging
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from email.mime.base import MIMEBase
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_BACKEND = getattr(settings, 'OUTBOX_DELIVERY_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
+# Messages claimed and sent per batch
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+
+# Delay before the first retry, doubled for every further attempt
+RETRY_BASE_DELAY = 60
+
+# Messages left in 'sending' for this long (crashed worker) are claimed again
+CLAIM_TIMEOUT = 15 * 60
+
+# Seconds between queueing a delivery run and running it; further messages
+# queued by the same process in that window are picked up by the same run
+DISPATCH_DELAY = 2
+
+INTERRUPTED_ERROR = 'Delivery run interrupted'
+
+DISPATCH_PENDING_KEY = 'outbox:dispatch_pending'
+RETRY_PENDING_KEY = 'outbox:retry_pending'
+
+# Window of the send latency metrics
+STATS_WINDOW = timedelta(hours=1)
+
+
+def _encode_attachment(attachment):
+    if isinstance(attachment, MIMEBase):
+        filename = attachment.get_filename()
+        content = attachment.get_payload(decode=True) or b''
+        mimetype = attachment.get_content_type()
+    else:
+        filename, content, mimetype = attachment
+    is_text = isinstance(content, str)
+    if is_text:
+        content = content.encode('utf-8')
+    return {
+        'filename': filename,
+        'content': base64.b64encode(content).decode('ascii'),
+        'mimetype': mimetype,
+        'text': is_text,
+    }
+
+
+def serialize_message(message):
+    """OutboundEmail (unsaved) holding everything needed to rebuild an EmailMessage"""
+    return OutboundEmail(
+        subject=str(message.subject or ''),
+        from_email=str(message.from_email or settings.DEFAULT_FROM_EMAIL),
+        to=[str(address) for address in message.to],
+        cc=[str(address) for address in message.cc],
+        bcc=[str(address) for address in message.bcc],
+        reply_to=[str(address) for address in message.reply_to],
+        body=str(message.body or ''),
+        content_subtype=message.content_subtype,
+        alternatives=[[str(content), mimetype] for content, mimetype in getattr(message, 'alternatives', [])],
+        attachments=[_encode_attachment(attachment) for attachment in message.attachments],
+        headers={str(key): str(value) for key, value in message.extra_headers.items()},
+    )
+
+
+def build_message(email, connection=None):
+    """EmailMultiAlternatives equivalent to the message stored in an OutboundEmail"""
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        alternatives=[tuple(alternative) for alternative in email.alternatives],
+        connection=connection,
+    )
+    message.content_subtype = email.content_subtype
+    for attachment in email.attachments:
+        content = base64.b64decode(attachment['content'])
+        if attachment.get('text'):
+            content = content.decode('utf-8')
+        message.attach(attachment['filename'], content, attachment['mimetype'])
+    return message
+
+
+def enqueue_messages(messages):
+    """
+    Store messages in the outbox and queue a delivery run after the commit
+
+    Returns:
+        list: the created OutboundEmail rows (messages without recipients are skipped)
+    """
+    emails = [serialize_message(message) for message in messages if message.recipients()]
+    if not emails:
+        return []
+    emails = OutboundEmail.objects.bulk_create(emails)
+    schedule_delivery()
+    return emails
+
+
+def queue_templated_email(subject, template_name, context, to, from_email=None):
+    """
+    Render an HTML template once and queue it with a plain-text alternative
+
+    Args:
+        subject: email subject
+        template_name: HTML template rendered with context
+        context: template context
+        to: list of recipient addresses
+        from_email: sender (defaults to DEFAULT_FROM_EMAIL)
+
+    Returns:
+        OutboundEmail, or None when there is no recipient
+    """
+    html_content = render_to_string(template_name, context)
+    message = EmailMultiAlternatives(subject, strip_tags(html_content), from_email or settings.DEFAULT_FROM_EMAIL, to)
+    message.attach_alternative(html_content, "text/html")
+    emails = enqueue_messages([message])
+    return emails[0] if emails else None
+
+
+def _run_safely():
+    try:
+        send_queued_emails()
+    except Exception as e:
+        logger.error(f"Error delivering queued emails: {e}")
+        logger.error(traceback.format_exc())
+
+
+def schedule_delivery(countdown=None):
+    """
+    Queue one delivery run after the commit
+
+    Args:
+        countdown: seconds until the run (DISPATCH_DELAY when None)
+
+    The pending flag is only set once the run is actually queued and expires
+    when the run starts, so a rolled back transaction or a run in another
+    process never holds back later deliveries.
+    """
+    key = DISPATCH_PENDING_KEY if countdown is None else RETRY_PENDING_KEY
+    delay = max(1, int(DISPATCH_DELAY if countdown is None else countdown))
+
+    def queue():
+        # A run queued by this process starts after this one would: it picks these messages up
+        if not cache.add(key, True, delay):
+            return
+        try:
+            from .tasks import send_queued_emails as send_queued_emails_task
+            send_queued_emails_task.apply_async(countdown=delay)
+        except Exception as e:
+            logger.warning(f"Could not queue email delivery ({e}), sending in a background thread")
+            timer = threading.Timer(delay, _run_safely)
+            timer.daemon = True
+            timer.start()
+
+    transaction.on_commit(queue)
+
+
+def _stale_filter(now):
+    return Q(status=OutboundEmail.SENDING, claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT))
+
+
+def _due_filter(now):
+    return Q(status=OutboundEmail.QUEUED, next_attempt_at__lte=now) | _stale_filter(now)
+
+
+def claim_batch(size=BATCH_SIZE):
+    """
+    Mark up to size due messages as sending for this run and return them
+
+    Every claim counts as an attempt, so a message whose run crashed (possibly
+    because of the message itself) has already used one when it is left in
+    'sending' past CLAIM_TIMEOUT; it is claimed again only while it has
+    attempts left, and fails otherwise.
+    """
+    now = timezone.now()
+    OutboundEmail.objects.filter(_stale_filter(now), attempts__gte=MAX_ATTEMPTS).update(
+        status=OutboundEmail.FAILED, claim_token='', last_error=INTERRUPTED_ERROR
+    )
+    ids = list(
+        OutboundEmail.objects.filter(_due_filter(now))
+        .order_by('next_attempt_at', 'pk')
+        .values_list('pk', flat=True)[:size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # Another run may have claimed some of them in the meantime
+    OutboundEmail.objects.filter(_stale_filter(now), pk__in=ids).update(
+        status=OutboundEmail.SENDING, claim_token=token, claimed_at=now,
+        attempts=F('attempts') + 1, last_error=INTERRUPTED_ERROR
+    )
+    OutboundEmail.objects.filter(status=OutboundEmail.QUEUED, next_attempt_at__lte=now, pk__in=ids).update(
+        status=OutboundEmail.SENDING, claim_token=token, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(OutboundEmail.objects.filter(pk__in=ids, claim_token=token).order_by('next_attempt_at', 'pk'))
+
+
+def _record_failure(email, error, now):
+    # The attempt was counted when the message was claimed
+    email.last_error = error
+    email.claim_token = ''
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.status = OutboundEmail.QUEUED
+        email.next_attempt_at = now + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (email.attempts - 1))
+
+
+def _reconnect(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"Could not reopen email connection: {e}")
+
+
+UPDATE_FIELDS = ['status', 'attempts', 'last_error', 'next_attempt_at', 'claim_token', 'sent_at', 'latency_ms']
+
+
+def send_queued_emails(batch_size=BATCH_SIZE, max_messages=None):
+    """
+    Deliver due messages over a single connection
+
+    Args:
+        batch_size: messages claimed per batch
+        max_messages: stop after this many messages (None to drain the queue)
+
+    Returns:
+        dict: sent, retried, failed, batches and seconds of the run
+    """
+    started = time.monotonic()
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+    connection = None
+    processed = 0
+    try:
+        while max_messages is None or processed < max_messages:
+            size = batch_size if max_messages is None else min(batch_size, max_messages - processed)
+            batch = claim_batch(size)
+            if not batch:
+                break
+            stats['batches'] += 1
+            processed += len(batch)
+
+            if connection is None:
+                connection = get_connection(DELIVERY_BACKEND, fail_silently=False)
+                try:
+                    connection.open()
+                except Exception as e:
+                    # Relay unreachable: every message of the batch is retried later
+                    logger.error(f"Could not connect to the email relay: {e}")
+                    now = timezone.now()
+                    for email in batch:
+                        _record_failure(email, f"Connection failed: {e}", now)
+                        stats['failed' if email.status == OutboundEmail.FAILED else 'retried'] += 1
+                    OutboundEmail.objects.bulk_update(batch, UPDATE_FIELDS)
+                    connection = None
+                    break
+
+            for email in batch:
+                try:
+                    connection.send_messages([build_message(email, connection)])
+                except Exception as e:
+                    logger.warning(f"Error sending queued email {email.pk} to {email.to}: {e}")
+                    _record_failure(email, str(e), timezone.now())
+                    stats['failed' if email.status == OutboundEmail.FAILED else 'retried'] += 1
+                    _reconnect(connection)
+                    continue
+                now = timezone.now()
+                email.status = OutboundEmail.SENT
+                email.sent_at = now
+                email.latency_ms = int((now - email.created_at).total_seconds() * 1000)
+                email.last_error = ''
+                email.claim_token = ''
+                stats['sent'] += 1
+            OutboundEmail.objects.bulk_update(batch, UPDATE_FIELDS)
+    finally:
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    if stats['batches']:
+        logger.info(f"Email delivery run: {stats}")
+    return stats
+
+
+def next_retry_delay():
+    """Seconds until the next queued retry is due, or None when nothing is waiting"""
+    next_attempt = OutboundEmail.objects.filter(status=OutboundEmail.QUEUED).aggregate(
+        next_attempt=Min('next_attempt_at')
+    )['next_attempt']
+    if next_attempt is None:
+        return None
+    return max(0, (next_attempt - timezone.now()).total_seconds())
+
+
+def get_outbox_stats():
+    """
+    Queue depth and send latency metrics
+
+    Returns:
+        dict: queued, due, sending, failed, oldest_queued_seconds and, for the
+            last STATS_WINDOW, sent plus average/p95/max latency in milliseconds
+    """
+    now = timezone.now()
+    stats = OutboundEmail.objects.exclude(status=OutboundEmail.SENT).aggregate(
+        queued=Count('pk', filter=Q(status=OutboundEmail.QUEUED)),
+        due=Count('pk', filter=Q(status=OutboundEmail.QUEUED, next_attempt_at__lte=now)),
+        sending=Count('pk', filter=Q(status=OutboundEmail.SENDING)),
+        failed=Count('pk', filter=Q(status=OutboundEmail.FAILED)),
+        oldest_queued=Min('created_at', filter=Q(status=OutboundEmail.QUEUED)),
+    )
+    oldest_queued = stats.pop('oldest_queued')
+    stats['oldest_queued_seconds'] = round((now - oldest_queued).total_seconds(), 1) if oldest_queued else 0
+
+    recent = OutboundEmail.objects.filter(status=OutboundEmail.SENT, sent_at__gte=now - STATS_WINDOW)
+    latency = recent.aggregate(sent=Count('pk'), average=Avg('latency_ms'), maximum=Max('latency_ms'))
+    p95 = latency['maximum']
+    if latency['sent'] > 1:
+        p95 = recent.order_by('latency_ms').values_list('latency_ms', flat=True)[int(latency['sent'] * 0.95)]
+    stats.update({
+        'window_seconds': int(STATS_WINDOW.total_seconds()),
+        'sent': latency['sent'],
+        'latency_avg_ms': round(latency['average']) if latency['average'] is not None else None,
+        'latency_p95_ms': p95,
+        'latency_max_ms': latency['maximum'],
+    })
+    return stats
+
+
+def purge_sent(days=30):
+    """Delete messages delivered more than days ago"""
+    deleted, _ = OutboundEmail.objects.filter(
+        status=OutboundEmail.SENT, sent_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
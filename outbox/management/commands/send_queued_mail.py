@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from outbox.delivery import BATCH_SIZE, get_outbox_stats, purge_sent, send_queued_emails
+import json
+
+class Command(BaseCommand):
+    help = 'Deliver the queued outbound emails (without a Celery worker) and report queue metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Messages claimed per batch')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many messages')
+        parser.add_argument('--stats', action='store_true', help='Only print queue depth and send latency')
+        parser.add_argument('--purge-days', type=int, default=None, help='Also delete messages sent more than this many days ago')
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            result = send_queued_emails(batch_size=options['batch_size'], max_messages=options['limit'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {result['sent']}, retrying {result['retried']}, failed {result['failed']} "
+                f"in {result['batches']} batches ({result['seconds']}s)"
+            ))
+            if options['purge_days'] is not None:
+                self.stdout.write(f"Purged {purge_sent(options['purge_days'])} sent messages")
+
+        self.stdout.write(json.dumps(get_outbox_stats(), indent=2))
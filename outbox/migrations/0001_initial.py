@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2026-10-17 21:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('subject', models.TextField(blank=True)),
+                ('from_email', models.CharField(max_length=255)),
+                ('to', models.JSONField(default=list)),
+                ('cc', models.JSONField(default=list)),
+                ('bcc', models.JSONField(default=list)),
+                ('reply_to', models.JSONField(default=list)),
+                ('body', models.TextField(blank=True)),
+                ('content_subtype', models.CharField(default='plain', max_length=20)),
+                ('alternatives', models.JSONField(default=list)),
+                ('attachments', models.JSONField(default=list)),
+                ('headers', models.JSONField(default=dict)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('latency_ms', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_outb_status_7ae9e9_idx'), models.Index(fields=['status', 'sent_at'], name='outbox_outb_status_2e880f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+
+# Create your models here.
+class OutboundEmail(models.Model):
+    """A fully rendered email waiting to be (or already) delivered by outbox.delivery"""
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    subject = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    body = models.TextField(blank=True)
+    content_subtype = models.CharField(max_length=20, default='plain')
+    alternatives = models.JSONField(default=list)  # [content, mimetype] pairs
+    attachments = models.JSONField(default=list)  # {'filename', 'content' (base64), 'mimetype'}
+    headers = models.JSONField(default=dict)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    latency_ms = models.IntegerField(null=True, blank=True)  # From queueing to delivery
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from .delivery import next_retry_delay, schedule_delivery, send_queued_emails as deliver_queued_emails
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name="outbox.tasks.send_queued_emails")
+def send_queued_emails(self):
+    """
+    Deliver the queued emails in batches over one SMTP connection
+
+    Returns:
+        dict: Counts and duration of the delivery run
+    """
+    logger.info(f"Starting send_queued_emails task {self.request.id}")
+    stats = deliver_queued_emails()
+    # Come back when the next retry is due
+    delay = next_retry_delay()
+    if delay is not None:
+        schedule_delivery(countdown=max(delay, 1))
+    return stats
@@ -0,0 +1,192 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import delivery
+from .models import OutboundEmail
+
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class CountingBackend(LocmemBackend):
+    """locmem backend counting connections and refusing addresses in FAILING"""
+    FAILING = set()
+    opened = 0
+    closed = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def close(self):
+        CountingBackend.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.FAILING:
+                raise ConnectionResetError('Connection reset by relay')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='outbox.backends.OutboxBackend')
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        CountingBackend.FAILING = set()
+        CountingBackend.opened = CountingBackend.closed = 0
+        patcher = mock.patch('outbox.tasks.send_queued_emails.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        backend = mock.patch.object(delivery, 'DELIVERY_BACKEND', 'outbox.tests.CountingBackend')
+        backend.start()
+        self.addCleanup(backend.stop)
+
+    def queue(self, count, prefix='user'):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(count):
+                send_mail(f'Hello {number}', 'Body', 'noreply@1matrix.io', [f'{prefix}{number}@example.com'])
+
+
+class QueueTest(OutboxTestCase):
+    def test_send_mail_is_queued_not_sent(self):
+        """send_mail() stores the message and queues one delivery run"""
+        self.queue(3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.QUEUED).count(), 3)
+        self.apply_async.assert_called_once_with(countdown=delivery.DISPATCH_DELAY)
+
+    def test_message_round_trip(self):
+        """The delivered message matches the one passed to the backend"""
+        from django.core.mail import EmailMultiAlternatives
+        message = EmailMultiAlternatives('Invoice', 'Plain', 'billing@1matrix.io', ['a@example.com'], cc=['b@example.com'])
+        message.attach_alternative('<p>Html</p>', 'text/html')
+        message.attach('invoice.txt', 'Total: 10', 'text/plain')
+        with self.captureOnCommitCallbacks(execute=True):
+            message.send()
+        delivery.send_queued_emails()
+
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.subject, 'Invoice')
+        self.assertEqual(sent.cc, ['b@example.com'])
+        self.assertEqual(sent.alternatives, [('<p>Html</p>', 'text/html')])
+        self.assertEqual(sent.attachments[0][:2], ('invoice.txt', 'Total: 10'))
+
+    def test_rolled_back_queue_does_not_block_delivery(self):
+        """A rolled back transaction neither queues a run nor holds back the next one"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    send_mail('Lost', 'Body', 'noreply@1matrix.io', ['lost@example.com'])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.apply_async.assert_not_called()
+
+        self.queue(1)
+        self.apply_async.assert_called_once()
+
+
+class BatchDeliveryTest(OutboxTestCase):
+    def test_batches_share_one_connection(self):
+        """All batches of a run go over a single connection"""
+        self.queue(25)
+        stats = delivery.send_queued_emails(batch_size=10)
+
+        self.assertEqual(stats['sent'], 25)
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(CountingBackend.closed, 1)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_max_messages(self):
+        self.queue(5)
+        stats = delivery.send_queued_emails(batch_size=2, max_messages=3)
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.QUEUED).count(), 2)
+
+
+class RetryTest(OutboxTestCase):
+    def test_failed_message_backs_off_and_reconnects(self):
+        """A failure reopens the connection, the rest of the batch is sent and the message retried later"""
+        self.queue(3)
+        CountingBackend.FAILING = {'user1@example.com'}
+        stats = delivery.send_queued_emails()
+
+        self.assertEqual((stats['sent'], stats['retried'], stats['failed']), (2, 1, 0))
+        self.assertEqual(CountingBackend.opened, 2)
+        email = OutboundEmail.objects.get(status=OutboundEmail.QUEUED)
+        self.assertEqual(email.to, ['user1@example.com'])
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('Connection reset', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=delivery.RETRY_BASE_DELAY - 5))
+
+        # Not due yet
+        self.assertEqual(delivery.send_queued_emails()['batches'], 0)
+
+        CountingBackend.FAILING = set()
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(delivery.send_queued_emails()['sent'], 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), (OutboundEmail.SENT, 2, ''))
+
+    def test_gives_up_after_max_attempts(self):
+        self.queue(1)
+        CountingBackend.FAILING = {'user0@example.com'}
+        for _ in range(delivery.MAX_ATTEMPTS):
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            delivery.send_queued_emails()
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.FAILED, delivery.MAX_ATTEMPTS))
+
+    def test_unreachable_relay_retries_the_batch(self):
+        self.queue(2)
+        with mock.patch.object(CountingBackend, 'open', side_effect=OSError('Connection refused')):
+            stats = delivery.send_queued_emails()
+        self.assertEqual(stats['retried'], 2)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.QUEUED, attempts=1).count(), 2)
+
+    def test_interrupted_claims_count_as_attempts(self):
+        """A message whose run died in 'sending' is claimed again as one new attempt, then failed"""
+        self.queue(2)
+        first, second = OutboundEmail.objects.order_by('pk')
+        stale = timezone.now() - timedelta(seconds=delivery.CLAIM_TIMEOUT + 1)
+
+        # The run that claimed the first message died before recording anything
+        self.assertEqual(len(delivery.claim_batch(size=1)), 1)
+        OutboundEmail.objects.filter(pk=first.pk).update(claimed_at=stale)
+        self.assertEqual(delivery.send_queued_emails()['sent'], 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboundEmail.SENT, 2))
+        self.assertEqual((second.status, second.attempts), (OutboundEmail.SENT, 1))
+
+        # Out of attempts: failed instead of claimed
+        OutboundEmail.objects.filter(pk=first.pk).update(
+            status=OutboundEmail.SENDING, claimed_at=stale, attempts=delivery.MAX_ATTEMPTS
+        )
+        self.assertEqual(delivery.claim_batch(), [])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboundEmail.FAILED, delivery.MAX_ATTEMPTS))
+        self.assertEqual(first.last_error, delivery.INTERRUPTED_ERROR)
+
+
+class TemplatedEmailTest(OutboxTestCase):
+    def test_template_rendered_once_with_text_alternative(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            email = delivery.queue_templated_email(
+                'Discussion Requested', 'hr_management/email_templates/discussion_notification.html',
+                {'name': 'Asha', 'discussion_message': 'Salary'}, ['hr@example.com']
+            )
+        self.assertEqual(email.alternatives[0][1], 'text/html')
+        self.assertNotIn('<', email.body)
+        self.assertIsNone(delivery.queue_templated_email('Nobody', 'hr_management/email_templates/discussion_notification.html', {}, []))
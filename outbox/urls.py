@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import OutboxMetricsView
+
+app_name = 'outbox'
+
+urlpatterns = [
+    path('api/metrics/', OutboxMetricsView.as_view(), name='metrics'),
+]
@@ -0,0 +1,26 @@
+import logging
+import traceback
+
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .delivery import get_outbox_stats
+
+logger = logging.getLogger(__name__)
+
+# Create your views here.
+class OutboxMetricsView(APIView):
+    """
+    API view exposing queue depth and send latency of the email outbox
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        try:
+            return Response(get_outbox_stats())
+        except Exception as e:
+            logger.error(f"Error reading outbox stats: {e}")
+            logger.error(traceback.format_exc())
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -2,6 +2,10 @@
 echo Activating virtual environment...
 call C:\Users\hp5cd\Envs\one\Scripts\activate.bat
 
-echo Starting Celery worker...
 cd /d C:\Users\hp5cd\OneDrive\Desktop\1matrix\1matrix
-celery -A matrix worker -l info -Q data_mining 
\ No newline at end of file
+
+echo Starting Celery beat (periodic tasks such as the email delivery backstop)...
+start "Celery beat" celery -A matrix beat -l info
+
+echo Starting Celery worker...
+celery -A matrix worker -l info -Q data_mining,analytics,media,email 
\ No newline at end of file
@@ -2219,6 +2219,25 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 return response.json();
             })
+            .then(data => {
+                // The upload returns immediately; wait for the background analysis to finish
+                if (data.success && data.status === 'processing') {
+                    showUploadStatus('File uploaded. Analyzing data...', 'info');
+                    return pollAnalysisResult(data.analysis_id).then(result => ({
+                        success: result.status === 'completed',
+                        error: result.error_message,
+                        file_id: data.file_id,
+                        analysis_id: data.analysis_id,
+                        platform_type: data.platform_type,
+                        analysis: result.analysis_data,
+                        column_mapping: result.column_mappings,
+                        column_mapping_issues: result.analysis_data && result.analysis_data.summary
+                            ? result.analysis_data.summary.column_mapping_issues : null,
+                        available_columns: result.analysis_data ? result.analysis_data.available_columns : []
+                    }));
+                }
+                return data;
+            })
             .then(data => {
                 // Update debug info
                 if (requestStatus) {
@@ -2292,6 +2311,36 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Delay between two status requests while the background analysis is running
+    const ANALYSIS_POLL_INTERVAL_MS = 2000;
+
+    // Poll the analysis endpoint until the background analysis has finished
+    function pollAnalysisResult(analysisId) {
+        return fetch(`/business_analytics/api/analysis/${analysisId}/`, {
+            credentials: 'same-origin'
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+            }
+            return response.json();
+        })
+        .then(result => {
+            if (result.status === 'completed' || result.status === 'failed') {
+                return result;
+            }
+            
+            showUploadStatus(`Analyzing data... ${result.progress || 0}% (${result.rows_processed || 0} rows read)`, 'info');
+            
+            // Show the partial analysis from the first chunk while the rest is processed
+            if (result.analysis_data && result.analysis_data.summary && result.analysis_data.summary.is_partial) {
+                updateDashboard(result.analysis_data);
+            }
+            return new Promise(resolve => setTimeout(resolve, ANALYSIS_POLL_INTERVAL_MS))
+                .then(() => pollAnalysisResult(analysisId));
+        });
+    }
+
     // Function to calculate and display sales metrics
     function calculateSalesMetrics(file, columnMapping = null, platformType = null) {
         // Create form data for API request
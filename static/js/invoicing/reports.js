@@ -124,31 +124,30 @@ function closeDatePicker() {
     customDateRange.classList.add('hidden');
     customDateRange.classList.remove('flex');
 }
-function applyDateFilter() {
-    const dateFrom = new Date(document.getElementById('dateFrom').value);
-    const dateTo = new Date(document.getElementById('dateTo').value);
-    dateTo.setHours(23, 59, 59); // Include the entire "to" date
-
-    const invoiceRows = document.querySelectorAll('tbody tr[data-company-id]');
-    const noInvoicesRow = document.querySelector('tbody tr:not([data-company-id])');
-    let visibleCount = 0;
-
-    invoiceRows.forEach(row => {
-        const dateCell = row.querySelector('td:nth-child(2)').textContent;
-        const invoiceDate = new Date(dateCell);
 
-        if (invoiceDate >= dateFrom && invoiceDate <= dateTo) {
-            row.style.display = '';
-            visibleCount++;
+// Filters are applied by the server; the page is reloaded with them in the query string
+function applyReportFilters(changes) {
+    const params = new URLSearchParams(window.location.search);
+    params.delete('cursor');
+    Object.entries(changes).forEach(([key, value]) => {
+        if (value) {
+            params.set(key, value);
         } else {
-            row.style.display = 'none';
+            params.delete(key);
         }
     });
+    window.location.search = params.toString();
+}
 
-    // Show/hide "No invoices found" message
-    if (noInvoicesRow) {
-        noInvoicesRow.style.display = visibleCount === 0 ? '' : 'none';
-    }
+function formatDate(date) {
+    return date.toISOString().slice(0, 10);
+}
+
+function applyDateFilter() {
+    applyReportFilters({
+        date_from: document.getElementById('dateFrom').value,
+        date_to: document.getElementById('dateTo').value
+    });
 }
 
 function applyLast7DaysFilter() {
@@ -156,88 +155,24 @@ function applyLast7DaysFilter() {
     const sevenDaysAgo = new Date(today);
     sevenDaysAgo.setDate(today.getDate() - 7);
 
-    const invoiceRows = document.querySelectorAll('tbody tr[data-company-id]');
-    const noInvoicesRow = document.querySelector('tbody tr:not([data-company-id])');
-    let visibleCount = 0;
-
-    invoiceRows.forEach(row => {
-        const dateCell = row.querySelector('td:nth-child(2)').textContent;
-        const invoiceDate = new Date(dateCell);
-
-        if (invoiceDate >= sevenDaysAgo && invoiceDate <= today) {
-            row.style.display = '';
-            visibleCount++;
-        } else {
-            row.style.display = 'none';
-        }
-    });
-
-    // Show/hide "No invoices found" message
-    if (noInvoicesRow) {
-        noInvoicesRow.style.display = visibleCount === 0 ? '' : 'none';
-    }
+    applyReportFilters({date_from: formatDate(sevenDaysAgo), date_to: formatDate(today)});
 }
 
 function showAllInvoices() {
-    const invoiceRows = document.querySelectorAll('tbody tr[data-company-id]');
-    const noInvoicesRow = document.querySelector('tbody tr:not([data-company-id])');
-    let visibleCount = 0;
-
-    invoiceRows.forEach(row => {
-        row.style.display = '';
-        visibleCount++;
-    });
-
-    // Show/hide "No invoices found" message
-    if (noInvoicesRow) {
-        noInvoicesRow.style.display = visibleCount === 0 ? '' : 'none';
-    }
+    applyReportFilters({date_from: '', date_to: ''});
 }
 
 function filterInvoicesByCompany() {
     const selectedCompanyId = document.getElementById('companySelect').value;
-    const invoiceRows = document.querySelectorAll('tbody tr[data-company-id]');
-    const noInvoicesRow = document.querySelector('tbody tr:not([data-company-id])');
-    let visibleCount = 0;
-    
-    invoiceRows.forEach(row => {
-        const rowCompanyId = row.getAttribute('data-company-id');
-        if (selectedCompanyId === 'all' || rowCompanyId === selectedCompanyId) {
-            row.style.display = '';
-            visibleCount++;
-        } else {
-            row.style.display = 'none';
-        }
-    });
-    
-    // Show/hide "No invoices found" message
-    if (noInvoicesRow) {
-        noInvoicesRow.style.display = visibleCount === 0 ? '' : 'none';
-    }
+    applyReportFilters({company: selectedCompanyId === 'all' ? '' : selectedCompanyId});
 }
 
-// Initialize filtering on page load
-document.addEventListener('DOMContentLoaded', filterInvoicesByCompany);
-
 function viewScreenshot(url) {
     if(url) {
         window.open(url, '_blank');
     }
 }
 
-// #4
-function toggleDatePicker() {
-    const select = document.getElementById('dateRangeSelect');
-    const customDateRange = document.getElementById('customDateRange');
-    
-    if (select.value === 'custom') {
-        customDateRange.classList.remove('hidden');
-        customDateRange.classList.add('flex');
-    } else {
-        customDateRange.classList.add('hidden');
-        customDateRange.classList.remove('flex');
-    }
-}
 function updatePaymentStatus(invoiceId, newStatus) {
     const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
     if (!csrfToken) {
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WebsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'website'
+
+    def ready(self):
+        # Connect the signal handlers that invalidate cached storefront pages, domain routes and sitemaps
+        from . import domains, page_cache, sitemaps  # noqa: F401
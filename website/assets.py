@@ -0,0 +1,226 @@
+"""
+Image derivative pipeline for website media.
+
+After an image is uploaded through process_media_upload, a background task
+(website.tasks.generate_image_derivatives) writes resized 1x/2x copies in the
+original format and as WebP, named after the content hash of the upload, and
+records them in WebsiteImageDerivative. LazyLoadingMiddleware looks the sets
+up by image URL so srcset/<picture> markup only references files that exist.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import WebsiteImageDerivative
+
+logger = logging.getLogger(__name__)
+
+# Maximum width of each density; images are never upscaled
+DERIVATIVE_WIDTHS = {'1x': 1200, '2x': 2400}
+
+# Formats Pillow re-encodes for the "original" derivative
+RESIZABLE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP'}
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+DERIVATIVES_FOLDER = 'derivatives'
+
+# Seconds a derivative lookup (including "none yet") is cached
+LOOKUP_CACHE_TIMEOUT = 60 * 10
+
+
+def _lookup_key(url):
+    return f"website:image_derivatives:{hashlib.md5(url.encode('utf-8')).hexdigest()}"
+
+
+def is_resizable_image(path):
+    return os.path.splitext(path)[1].lower() in RESIZABLE_FORMATS
+
+
+def media_url_for_path(path):
+    """Public URL of a storage path, in the same form process_media_upload returns"""
+    web_path = path.replace('\\', '/')
+    if web_path.startswith('media/'):
+        return f"/{web_path}"
+    return f"{settings.MEDIA_URL}{web_path}".replace('//', '/')
+
+
+def storage_path_for_url(url):
+    """Storage path of a local media URL, or None for other URLs"""
+    media_url = settings.MEDIA_URL if settings.MEDIA_URL.startswith('/') else f"/{settings.MEDIA_URL}"
+    if not url.startswith(media_url):
+        return None
+    return url[len(media_url):]
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with default_storage.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_derivatives(original_path, website_id=None):
+    """
+    Generate the 1x/2x and WebP derivatives of an uploaded image
+
+    Args:
+        original_path: storage path of the uploaded image
+        website_id: website that owns the image (its pages are invalidated)
+
+    Returns:
+        WebsiteImageDerivative, or None when the file is not a resizable image
+    """
+    from PIL import Image, ImageOps
+
+    ext = os.path.splitext(original_path)[1].lower()
+    if ext not in RESIZABLE_FORMATS:
+        return None
+
+    original_url = media_url_for_path(original_path)
+    content_hash = _hash_file(original_path)
+
+    existing = WebsiteImageDerivative.objects.filter(original_url=original_url).first()
+    if existing and existing.content_hash == content_hash and existing.derivatives:
+        return existing
+
+    with default_storage.open(original_path, 'rb') as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    width, height = image.size
+
+    stem = os.path.splitext(os.path.basename(original_path))[0]
+    folder = os.path.join(os.path.dirname(original_path), DERIVATIVES_FOLDER)
+    derivatives = {}
+    previous_width = 0
+    for density, max_width in DERIVATIVE_WIDTHS.items():
+        target_width = min(width, max_width)
+        if target_width <= previous_width:
+            # The upload is too small for this density
+            break
+        previous_width = target_width
+
+        resized = image
+        if target_width < width:
+            resized = image.resize((target_width, round(height * target_width / width)), Image.LANCZOS)
+
+        files = {}
+        for kind, image_format, suffix in (('original', RESIZABLE_FORMATS[ext], ext), ('webp', 'WEBP', '.webp')):
+            name = f"{stem}.{content_hash[:12]}.{density}{suffix}"
+            path = os.path.join(folder, name)
+            if not default_storage.exists(path):
+                path = default_storage.save(path, ContentFile(_encode(resized, image_format)))
+            files[kind] = media_url_for_path(path)
+        derivatives[density] = files
+
+    record, _ = WebsiteImageDerivative.objects.update_or_create(
+        original_url=original_url,
+        defaults={
+            'original_path': original_path,
+            'website_id': website_id,
+            'content_hash': content_hash,
+            'width': width,
+            'height': height,
+            'derivatives': derivatives,
+        }
+    )
+    cache.delete(_lookup_key(original_url))
+
+    if website_id:
+        # Published pages must pick up the new srcset
+        from .conditional import bump_content_version
+        bump_content_version(website_id)
+
+    logger.info(f"Generated {len(derivatives)} derivative densities for {original_path}")
+    return record
+
+
+def queue_image_derivatives(original_path, website_id=None):
+    """
+    Queue derivative generation for an uploaded image
+
+    Falls back to a daemon thread when the Celery broker cannot be reached.
+    """
+    if not is_resizable_image(original_path):
+        return
+    try:
+        from .tasks import generate_image_derivatives
+        generate_image_derivatives.delay(original_path, website_id)
+    except Exception as e:
+        logger.warning(f"Could not queue derivative generation for {original_path} ({e}), running in a background thread")
+        thread = threading.Thread(target=_generate_safely, args=(original_path, website_id), daemon=True)
+        thread.start()
+
+
+def _generate_safely(original_path, website_id=None):
+    try:
+        generate_derivatives(original_path, website_id)
+    except Exception as e:
+        logger.error(f"Error generating derivatives for {original_path}: {e}")
+        logger.error(traceback.format_exc())
+
+
+def get_derivative_sets(urls):
+    """
+    Derivative sets of the given image URLs
+
+    Returns:
+        dict: url -> derivatives dict, for the URLs that have derivatives
+    """
+    urls = set(urls)
+    if not urls:
+        return {}
+
+    keys = {_lookup_key(url): url for url in urls}
+    cached = cache.get_many(list(keys))
+    found = {keys[key]: value for key, value in cached.items() if value}
+
+    missing = [url for key, url in keys.items() if key not in cached]
+    if missing:
+        rows = dict(
+            WebsiteImageDerivative.objects.filter(original_url__in=missing)
+            .values_list('original_url', 'derivatives')
+        )
+        # Cache misses too ({}), so pages without derivatives don't query every time
+        cache.set_many({_lookup_key(url): rows.get(url) or {} for url in missing}, LOOKUP_CACHE_TIMEOUT)
+        found.update({url: derivatives for url, derivatives in rows.items() if derivatives})
+    return found
+
+
+def collect_media_urls(content):
+    """Local image URLs referenced anywhere in a (nested) content structure"""
+    urls = set()
+    stack = [content]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, str) and storage_path_for_url(value) and is_resizable_image(value):
+            urls.add(value)
+    return urls
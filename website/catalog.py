@@ -0,0 +1,456 @@
+"""
+Bulk catalog operations for website products.
+
+A CSV or JSON catalog upload is stored, then imported in the background
+(website.tasks.import_catalog): rows are validated and written in batches of
+IMPORT_BATCH_SIZE, one transaction per batch, with bulk_create for new
+products/categories and bulk_update for products whose slug already exists
+(only the rows and fields that differ), so re-importing a catalog updates it
+in place. Progress and the first
+validation errors are kept on the WebsiteCatalogImport row for polling.
+
+Bulk writes skip model signals, so the storefront page cache and sitemaps are
+invalidated explicitly once an import or bulk action is done.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import traceback
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .conditional import bump_content_version
+from .models import WebsiteCatalogImport, WebsiteCategory, WebsiteProduct
+from .sitemaps import schedule_sitemap_regeneration
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+
+# bulk_update builds one CASE per field with a WHEN per row, which gets
+# quadratically slower with the batch size; small statements are faster
+UPDATE_BATCH_SIZE = 50
+
+# Validation errors kept on the import row (all of them are counted)
+MAX_REPORTED_ERRORS = 100
+
+CATALOG_FORMATS = {'.csv': 'csv', '.json': 'json'}
+
+# Alternative column names accepted in catalogs
+FIELD_ALIASES = {
+    'name': 'title',
+    'product_name': 'title',
+    'product_title': 'title',
+    'selling_price': 'price',
+    'mrp': 'price',
+    'category_name': 'category',
+    'image': 'image1',
+    'image_url': 'image1',
+    'active': 'is_active',
+    'featured': 'is_featured',
+    'youtube_link': 'video_link',
+    'gst': 'gst_percentage',
+}
+
+PRODUCT_FIELDS = [
+    'title', 'slug', 'description', 'price', 'category_id', 'hsn_code', 'gst_percentage',
+    'image1', 'image2', 'image3', 'image4', 'variants', 'specifications',
+    'video_link', 'is_active', 'is_featured',
+]
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+_validate_url = URLValidator()
+
+
+class CatalogRowError(ValueError):
+    """A catalog row that cannot be imported"""
+
+
+def catalog_format(filename):
+    """'csv' or 'json' for a catalog file name, or None when unsupported"""
+    return CATALOG_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def _normalize_keys(row):
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower().replace(' ', '_').replace('-', '_')
+        key = FIELD_ALIASES.get(key, key)
+        if isinstance(value, str):
+            value = value.strip()
+        normalized.setdefault(key, value)
+    return normalized
+
+
+def _read_rows(catalog_import):
+    """Rows of the stored catalog as dicts with normalized keys"""
+    with default_storage.open(catalog_import.file_path, 'rb') as f:
+        if catalog_import.file_format == 'json':
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = data.get('products', [])
+            if not isinstance(data, list):
+                raise ValueError("JSON catalog must be a list of products or {\"products\": [...]}")
+            for row in data:
+                yield _normalize_keys(row) if isinstance(row, dict) else row
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(f, encoding='utf-8-sig', newline=''))
+            for row in reader:
+                yield _normalize_keys(row)
+
+
+def _count_rows(catalog_import):
+    with default_storage.open(catalog_import.file_path, 'rb') as f:
+        if catalog_import.file_format == 'json':
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = data.get('products', [])
+            return len(data) if isinstance(data, list) else 0
+        # Lines minus the header (quoted newlines make this an upper bound)
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def _decimal(value, field, maximum=None):
+    try:
+        number = Decimal(str(value).replace(',', '')).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise CatalogRowError(f"Invalid {field}: {value}")
+    if number < 0 or (maximum is not None and number > maximum):
+        raise CatalogRowError(f"{field} out of range: {value}")
+    return number
+
+
+def _json_field(value, field):
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            raise CatalogRowError(f"Invalid JSON in {field}")
+    return value
+
+
+def _flag(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def clean_row(row):
+    """
+    Validate a catalog row
+
+    Args:
+        row: dict with normalized keys
+
+    Returns:
+        dict: WebsiteProduct field values plus 'category' (name or None)
+
+    Raises:
+        CatalogRowError: when the row is invalid
+    """
+    if not isinstance(row, dict):
+        raise CatalogRowError("Row is not an object")
+
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise CatalogRowError("Missing title")
+    if len(title) > 255:
+        raise CatalogRowError("Title is longer than 255 characters")
+
+    slug = slugify(row.get('slug') or title)[:255]
+    if not slug:
+        raise CatalogRowError(f"Cannot build a slug from title: {title}")
+
+    if row.get('price') in (None, ''):
+        raise CatalogRowError("Missing price")
+    price = _decimal(row['price'], 'price', maximum=Decimal('99999999.99'))
+
+    gst_percentage = None
+    if row.get('gst_percentage') not in (None, ''):
+        gst_percentage = _decimal(row['gst_percentage'], 'gst_percentage', maximum=Decimal('100'))
+
+    video_link = row.get('video_link') or None
+    if video_link:
+        try:
+            _validate_url(video_link)
+        except ValidationError:
+            raise CatalogRowError(f"Invalid video link: {video_link}")
+
+    return {
+        'title': title,
+        'slug': slug,
+        'description': str(row.get('description') or ''),
+        'price': price,
+        'category': str(row.get('category') or '').strip() or None,
+        'hsn_code': str(row['hsn_code']) if row.get('hsn_code') not in (None, '') else None,
+        'gst_percentage': gst_percentage,
+        'image1': str(row.get('image1') or ''),
+        'image2': str(row.get('image2') or ''),
+        'image3': str(row.get('image3') or ''),
+        'image4': str(row.get('image4') or ''),
+        'variants': _json_field(row.get('variants'), 'variants'),
+        'specifications': _json_field(row.get('specifications'), 'specifications'),
+        'video_link': video_link,
+        'is_active': _flag(row.get('is_active'), True),
+        'is_featured': _flag(row.get('is_featured'), False),
+    }
+
+
+def _batches(rows, size):
+    batch = []
+    for row_number, row in enumerate(rows, start=1):
+        batch.append((row_number, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _CatalogWriter:
+    """Writes validated rows of one website in batches"""
+
+    def __init__(self, website_id):
+        self.website_id = website_id
+        self.category_ids = dict(
+            WebsiteCategory.objects.filter(website_id=website_id).values_list('slug', 'id')
+        )
+        self.categories_created = 0
+
+    def _category_ids_for(self, names):
+        """Ids of the named categories, creating the missing ones in one insert"""
+        missing = {}
+        for name in names:
+            slug = slugify(name)[:255]
+            if slug and slug not in self.category_ids:
+                missing.setdefault(slug, name)
+        if missing:
+            WebsiteCategory.objects.bulk_create([
+                WebsiteCategory(website_id=self.website_id, name=name[:255], slug=slug)
+                for slug, name in missing.items()
+            ])
+            self.category_ids.update(
+                WebsiteCategory.objects.filter(website_id=self.website_id, slug__in=list(missing))
+                .values_list('slug', 'id')
+            )
+            self.categories_created += len(missing)
+        return {name: self.category_ids.get(slugify(name)[:255]) for name in names}
+
+    def write(self, cleaned_rows):
+        """
+        Insert or update one batch of cleaned rows
+
+        Returns:
+            tuple: (created, updated)
+        """
+        category_ids = self._category_ids_for({row['category'] for row in cleaned_rows if row['category']})
+
+        # Later rows with the same slug win
+        by_slug = {}
+        for row in cleaned_rows:
+            row = dict(row)
+            row['category_id'] = category_ids.get(row.pop('category'))
+            by_slug[row['slug']] = row
+
+        existing = {
+            values['slug']: values
+            for values in WebsiteProduct.objects.filter(website_id=self.website_id, slug__in=list(by_slug))
+            .values('product_id', *PRODUCT_FIELDS)
+        }
+
+        new_products = []
+        changed_products = []
+        changed_fields = set()
+        for slug, row in by_slug.items():
+            current = existing.get(slug)
+            if current is None:
+                new_products.append(WebsiteProduct(website_id=self.website_id, **row))
+                continue
+            # Only write rows and fields that actually change
+            fields = {field for field in PRODUCT_FIELDS if row[field] != current[field]}
+            if fields:
+                changed_fields |= fields
+                changed_products.append(WebsiteProduct(product_id=current['product_id'], website_id=self.website_id, **row))
+
+        WebsiteProduct.objects.bulk_create(new_products, batch_size=IMPORT_BATCH_SIZE)
+        if changed_products:
+            WebsiteProduct.objects.bulk_update(
+                changed_products, sorted(changed_fields) + ['updated_at'], batch_size=UPDATE_BATCH_SIZE
+            )
+        return len(new_products), len(changed_products)
+
+
+def run_catalog_import(import_id, task_id=None):
+    """
+    Import a stored catalog into its website
+
+    Args:
+        import_id: WebsiteCatalogImport id
+        task_id: Celery task id, when run by a worker
+
+    Returns:
+        dict: counts of the import
+    """
+    catalog_import = WebsiteCatalogImport.objects.get(pk=import_id)
+    imports = WebsiteCatalogImport.objects.filter(pk=import_id)
+    try:
+        total_rows = _count_rows(catalog_import)
+        imports.update(status='processing', total_rows=total_rows, task_id=task_id or catalog_import.task_id)
+
+        writer = _CatalogWriter(catalog_import.website_id)
+        processed = created = updated = error_count = 0
+        errors = []
+        now = timezone.now()
+
+        for batch in _batches(_read_rows(catalog_import), IMPORT_BATCH_SIZE):
+            cleaned_rows = []
+            for row_number, row in batch:
+                try:
+                    cleaned = clean_row(row)
+                except CatalogRowError as e:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({'row': row_number, 'error': str(e)})
+                    continue
+                # bulk_update does not run auto_now
+                cleaned['updated_at'] = now
+                cleaned_rows.append(cleaned)
+
+            with transaction.atomic():
+                batch_created, batch_updated = writer.write(cleaned_rows)
+            created += batch_created
+            updated += batch_updated
+            processed += len(batch)
+
+            imports.update(
+                rows_processed=processed,
+                total_rows=max(total_rows, processed),
+                created_count=created,
+                updated_count=updated,
+                error_count=error_count,
+                errors=errors,
+            )
+
+        imports.update(status='completed', total_rows=processed, completed_at=timezone.now())
+        logger.info(
+            f"Catalog import {import_id}: {processed} rows, {created} created, {updated} updated, "
+            f"{error_count} invalid, {writer.categories_created} categories created"
+        )
+    except Exception as e:
+        logger.error(f"Error importing catalog {import_id}: {e}")
+        logger.error(traceback.format_exc())
+        imports.update(status='failed', error_message=str(e), completed_at=timezone.now())
+        raise
+    finally:
+        _catalog_changed(catalog_import.website_id)
+
+    return {
+        'rows_processed': processed,
+        'created': created,
+        'updated': updated,
+        'errors': error_count,
+        'categories_created': writer.categories_created,
+    }
+
+
+def _catalog_changed(website_id):
+    """Invalidate what the model signals would have for bulk writes"""
+    bump_content_version(website_id)
+    schedule_sitemap_regeneration(website_id, 'products')
+    schedule_sitemap_regeneration(website_id, 'categories')
+
+
+def _run_safely(import_id):
+    try:
+        run_catalog_import(import_id)
+    except Exception:
+        # Already logged and recorded on the import
+        pass
+
+
+def start_catalog_import(website, uploaded_file):
+    """
+    Store an uploaded catalog and queue its import
+
+    Args:
+        website: Website the products are imported into
+        uploaded_file: CSV or JSON upload
+
+    Returns:
+        WebsiteCatalogImport
+
+    Raises:
+        ValueError: when the file is not a CSV or JSON catalog
+    """
+    file_format = catalog_format(uploaded_file.name)
+    if file_format is None:
+        raise ValueError("Catalog must be a .csv or .json file")
+
+    catalog_import = WebsiteCatalogImport(website=website, file_format=file_format)
+    path = f"catalog_imports/website_{website.id}/{catalog_import.id}.{file_format}"
+    catalog_import.file_path = default_storage.save(path, uploaded_file)
+    catalog_import.save()
+
+    import_id = str(catalog_import.id)
+    try:
+        from .tasks import import_catalog
+        task = import_catalog.delay(import_id)
+        WebsiteCatalogImport.objects.filter(pk=catalog_import.pk).update(task_id=task.id)
+        catalog_import.task_id = task.id
+        logger.info(f"Queued import_catalog task {task.id} for import {import_id}")
+    except Exception as e:
+        logger.warning(f"Could not queue Celery task for catalog import {import_id} ({e}), running in a background thread")
+        thread = threading.Thread(target=_run_safely, args=(import_id,), daemon=True)
+        thread.start()
+    return catalog_import
+
+
+def bulk_product_action(website, action, product_ids):
+    """
+    Apply an action to many products of a website with one query
+
+    Args:
+        website: Website owning the products
+        action: 'delete', 'activate', 'deactivate', 'feature' or 'unfeature'
+        product_ids: product UUIDs
+
+    Returns:
+        int: number of products affected
+
+    Raises:
+        ValueError: for an unknown action
+    """
+    products = WebsiteProduct.objects.filter(website=website, product_id__in=product_ids)
+    updates = {
+        'activate': {'is_active': True},
+        'deactivate': {'is_active': False},
+        'feature': {'is_featured': True},
+        'unfeature': {'is_featured': False},
+    }
+    if action == 'delete':
+        _, deleted = products.delete()
+        count = deleted.get(WebsiteProduct._meta.label, 0)
+    elif action in updates:
+        count = products.update(updated_at=timezone.now(), **updates[action])
+    else:
+        raise ValueError(f"Unknown action: {action}")
+
+    if count:
+        _catalog_changed(website.id)
+    return count
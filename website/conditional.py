@@ -0,0 +1,172 @@
+"""
+Conditional responses for public website traffic.
+
+Every website has a content version in the shared cache, bumped by signals
+(see page_cache) whenever the website, its pages, products, categories or
+domains change. The version is a nanosecond timestamp, so it gives both the
+ETag and the Last-Modified of every public page of the website without
+hashing response bodies.
+
+PerformanceOptimizationMiddleware and CustomDomainMiddleware evaluate
+If-None-Match / If-Modified-Since against it before the view runs, so a
+revalidation of an unchanged page is answered with a 304 without rendering.
+Hit/miss counters and the bytes not re-sent are kept in the cache.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Website
+
+logger = logging.getLogger(__name__)
+
+# Changing this (e.g. on a template deploy) invalidates every ETag handed out so far
+ETAG_SALT = getattr(settings, 'WEBSITE_ETAG_SALT', '1')
+
+# Public pages may be stored by browsers but must be revalidated
+CACHE_CONTROL = 'no-cache, must-revalidate, max-age=0'
+
+NOT_MODIFIED_KEY = 'website:conditional:not_modified'
+FULL_RESPONSES_KEY = 'website:conditional:full'
+BYTES_SAVED_KEY = 'website:conditional:bytes_saved'
+
+SLUG_MAP_TIMEOUT = 60 * 60
+
+# Stored sitemaps/robots.txt lag the content version (they are rewritten by a
+# debounced task), so they must not be validated against it
+ARTIFACT_ROUTES = frozenset(['website_sitemap', 'website_robots_txt'])
+
+
+def _version_key(website_id):
+    return f'website:content_version:{website_id}'
+
+
+def get_content_version(website_id):
+    """Current content version of a website (nanoseconds since the epoch of its last change)"""
+    key = _version_key(website_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version evicted from the cache never repeats
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_content_version(website_id):
+    """Mark every page of a website as changed"""
+    key = _version_key(website_id)
+    current = cache.get(key) or 0
+    cache.set(key, max(time.time_ns(), current + 1), timeout=None)
+
+
+def content_etag(website_id, version):
+    return f'"{website_id}-{version}-{ETAG_SALT}"'
+
+
+def content_last_modified(version):
+    return version // 1_000_000_000
+
+
+def is_conditional_request(request):
+    """Only anonymous GET/HEAD requests without a query string get version-based validators"""
+    if request.method not in ('GET', 'HEAD') or request.GET:
+        return False
+    session = getattr(request, 'session', None)
+    return not (session and session.get('user_session_id'))
+
+
+def website_id_for_slug(public_slug):
+    """Website id for a public slug, remembered in the cache"""
+    key = f'website:public_slug:{public_slug}'
+    website_id = cache.get(key)
+    if website_id is None:
+        website_id = Website.objects.filter(public_slug=public_slug).values_list('id', flat=True).first()
+        if website_id is not None:
+            cache.set(key, website_id, SLUG_MAP_TIMEOUT)
+    return website_id
+
+
+def website_id_for_request(request):
+    """Website id of a public storefront route (one taking a public_slug), or None"""
+    if not is_conditional_request(request):
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if match.url_name in ARTIFACT_ROUTES:
+        return None
+    public_slug = match.kwargs.get('public_slug')
+    if not public_slug or public_slug == 'None':
+        return None
+    return website_id_for_slug(public_slug)
+
+
+def _increment(key, delta=1):
+    try:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+    except Exception as e:
+        logger.warning(f"Could not update conditional response counter {key}: {e}")
+
+
+def _size_key(request):
+    digest = hashlib.md5(f'{request.get_host()}{request.path}'.encode('utf-8')).hexdigest()
+    return f'website:body_size:{digest}'
+
+
+def not_modified_response(request, website_id):
+    """
+    Answer a revalidation before the view runs
+
+    Returns:
+        HttpResponseNotModified when the client's copy is current, else None
+    """
+    version = get_content_version(website_id)
+    response = get_conditional_response(
+        request,
+        etag=content_etag(website_id, version),
+        last_modified=content_last_modified(version)
+    )
+    if response is None:
+        return None
+    _increment(NOT_MODIFIED_KEY)
+    _increment(BYTES_SAVED_KEY, cache.get(_size_key(request), 0))
+    set_validators(response, website_id, version)
+    return response
+
+
+def set_validators(response, website_id, version=None):
+    """Add version-based ETag, Last-Modified and Cache-Control headers to a response"""
+    if version is None:
+        version = get_content_version(website_id)
+    response['ETag'] = content_etag(website_id, version)
+    response['Last-Modified'] = http_date(content_last_modified(version))
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def record_full_response(request, response):
+    """Count a full 200 response and remember its size for the bandwidth estimate"""
+    _increment(FULL_RESPONSES_KEY)
+    if not response.streaming:
+        cache.set(_size_key(request), len(response.content), SLUG_MAP_TIMEOUT)
+
+
+def get_conditional_stats():
+    """304 vs full response counters and the body bytes not re-sent"""
+    not_modified = cache.get(NOT_MODIFIED_KEY, 0)
+    full = cache.get(FULL_RESPONSES_KEY, 0)
+    total = not_modified + full
+    return {
+        'not_modified': not_modified,
+        'full_responses': full,
+        'not_modified_rate': round((not_modified / total) * 100, 2) if total else 0,
+        'bytes_saved': cache.get(BYTES_SAVED_KEY, 0),
+    }
@@ -0,0 +1,167 @@
+"""
+Content normalization for Website and WebsitePage.
+
+Storefront templates expect a fixed set of fields (hero_button, features,
+about_image, ...) to be present in website.content and page.content. Those
+defaults are applied once, when the model is saved, and the content is marked
+with CONTENT_VERSION_KEY. Renderers call website_render_content /
+page_render_content, which return the stored dicts as-is for normalized rows
+and only fall back to normalizing in memory for rows written before the
+marker existed (see the normalize_website_content management command).
+
+Pages do not store default features: page_render_content fills them in at
+render time, from the website's features for the about-us page and from
+DEFAULT_FEATURES elsewhere, so pages keep following the website's features
+until they define their own.
+
+The returned dicts are shared with the model instance; renderers must treat
+them as read-only.
+"""
+import copy
+
+# Bump when REQUIRED_FIELD_DEFAULTS change so the management command re-normalizes rows
+# (version 2: default features are no longer stored in page content)
+CONTENT_VERSION = 2
+CONTENT_VERSION_KEY = '_content_version'
+
+DEFAULT_BUTTON = {'url': '#', 'label': 'Learn More'}
+
+DEFAULT_FEATURES = [
+    {
+        'icon': 'palette',
+        'title': 'Beautiful Design',
+        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
+    },
+    {
+        'icon': 'mobile-alt',
+        'title': 'Responsive Layout',
+        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
+    },
+    {
+        'icon': 'bolt',
+        'title': 'Performance Optimized',
+        'description': 'Fast loading times and smooth performance for the best user experience.'
+    }
+]
+
+DEFAULT_ABOUT_IMAGE = 'https://via.placeholder.com/600x400'
+
+# Fields every storefront template can rely on, with their defaults
+REQUIRED_FIELD_DEFAULTS = {
+    'meta_description': '',
+    'meta_keywords': '',
+    'site_name': '',
+    'hero_title': '',
+    'hero_subtitle': '',
+    'hero_button': DEFAULT_BUTTON,
+    'features_title': '',
+    'features_subtitle': '',
+    'features': DEFAULT_FEATURES,
+    'about_title': '',
+    'about_content': '',
+    'about_image': DEFAULT_ABOUT_IMAGE,
+    'about_button': DEFAULT_BUTTON,
+    'cta_title': '',
+    'cta_subtitle': '',
+    'cta_main_button': DEFAULT_BUTTON,
+}
+
+# Page content gets its features when rendered (see page_render_content)
+PAGE_FIELD_DEFAULTS = {field: default for field, default in REQUIRED_FIELD_DEFAULTS.items() if field != 'features'}
+
+# Australian Lifestyle Brand section fields, shown on pages from the website content
+AUS_BRAND_FIELDS = (
+    'aus_brand_heading',
+    'aus_brand_subheading',
+    'aus_brand_description',
+    'aus_brand_section_label',
+    'aus_brand_section_title',
+    'aus_brand_section_description',
+    'aus_brand_main_image',
+    'aus_brand_secondary_image',
+)
+
+
+def is_normalized(content):
+    return bool(content) and content.get(CONTENT_VERSION_KEY) == CONTENT_VERSION
+
+
+def _apply_required_defaults(content, defaults=REQUIRED_FIELD_DEFAULTS):
+    for field, default in defaults.items():
+        if field not in content:
+            # Copy mutable defaults so rows never share nested objects
+            content[field] = copy.deepcopy(default) if isinstance(default, (dict, list)) else default
+
+
+def normalize_website_content(content):
+    """
+    Apply the storefront defaults to website content (in place)
+
+    Args:
+        content: Website.content dict (None is treated as empty)
+
+    Returns:
+        dict: the normalized content
+    """
+    if content is None:
+        content = {}
+
+    # Copy description to meta_description if available
+    if 'meta_description' not in content and 'description' in content:
+        content['meta_description'] = content['description']
+
+    # Ensure websiteName is copied to site_name if needed
+    if 'site_name' not in content and 'websiteName' in content:
+        content['site_name'] = content['websiteName']
+
+    _apply_required_defaults(content)
+    content[CONTENT_VERSION_KEY] = CONTENT_VERSION
+    return content
+
+
+def normalize_page_content(content):
+    """Apply the storefront defaults, except features, to page content (in place)"""
+    if content is None:
+        content = {}
+    # Version 1 stored DEFAULT_FEATURES in pages without features
+    if content.get(CONTENT_VERSION_KEY) == 1 and content.get('features') == DEFAULT_FEATURES:
+        del content['features']
+    _apply_required_defaults(content, PAGE_FIELD_DEFAULTS)
+    content[CONTENT_VERSION_KEY] = CONTENT_VERSION
+    return content
+
+
+def website_render_content(website):
+    """Normalized content of a website for rendering (no work for normalized rows)"""
+    if not is_normalized(website.content):
+        website.content = normalize_website_content(website.content)
+    return website.content
+
+
+def page_render_content(page, website=None, website_features=False):
+    """
+    Normalized content of a page for rendering
+
+    Args:
+        page: WebsitePage to render
+        website: its Website, whose Australian Lifestyle Brand section fields
+            are overlaid on the page
+        website_features: use the website's features when the page has none
+            (about-us), instead of DEFAULT_FEATURES
+
+    Overrides are applied to a shallow copy of the page content, which
+    replaces page.content on the (unsaved) instance so templates see them too.
+    """
+    if not is_normalized(page.content):
+        page.content = normalize_page_content(page.content)
+    website_content = website.content if website is not None and website.content else {}
+
+    overrides = {field: website_content[field] for field in AUS_BRAND_FIELDS if field in website_content}
+    if 'features' not in page.content:
+        if website_features:
+            overrides['features'] = website_content.get('features', [])
+        else:
+            overrides['features'] = DEFAULT_FEATURES
+    if overrides:
+        page.content = {**page.content, **overrides}
+    return page.content
@@ -0,0 +1,169 @@
+"""
+Host routing and 404 logging for custom domains.
+
+DomainRoutingTable keeps every verified CustomDomain in process memory as a
+host -> website id map, so CustomDomainMiddleware resolves a request's host
+without a query; hosts missing from the map are unknown (the map doubles as
+the negative cache). The table is reloaded when a CustomDomain is saved or
+deleted, using a version counter in the shared cache so every process picks
+the change up within VERSION_CHECK_INTERVAL seconds.
+
+DomainLogBuffer batches DomainLog rows for unknown hosts/pages and samples
+them per host, so a crawler flood costs dictionary updates instead of one
+INSERT per request. Queued rows are written by a timer thread at most
+LOG_FLUSH_INTERVAL seconds later, whether or not another request comes in.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomDomain, DomainLog
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'website:domain_routes:version'
+
+# Seconds between two reads of the shared version counter in one process
+VERSION_CHECK_INTERVAL = 5
+
+# DomainLog buffering: rows are written in batches of up to LOG_BATCH_SIZE, at
+# least every LOG_FLUSH_INTERVAL seconds, and each host logs at most one row
+# per LOG_SAMPLE_WINDOW seconds (suppressed hits are counted in the next row)
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_INTERVAL = 10
+LOG_SAMPLE_WINDOW = 60
+
+
+class DomainRoutingTable:
+    """In-memory map of verified custom domains to website ids"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._routes = {}
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 1, timeout=None)
+            version = cache.get(VERSION_KEY, 1)
+        return version
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if self._version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return
+            version = self._current_version()
+            if version != self._version:
+                self._routes = {
+                    domain.lower(): website_id
+                    for domain, website_id in CustomDomain.objects.filter(
+                        verification_status='verified'
+                    ).values_list('domain', 'website_id')
+                }
+                self._version = version
+                logger.info(f"Loaded {len(self._routes)} verified custom domains (version {version})")
+            self._checked_at = now
+
+    def website_for_host(self, host):
+        """Website id served on a host, or None when the host is not a verified custom domain"""
+        self._refresh()
+        return self._routes.get(host)
+
+    def invalidate(self):
+        """Force every process to reload on its next version check"""
+        try:
+            if not cache.add(VERSION_KEY, 2, timeout=None):
+                cache.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not bump domain routes version: {e}")
+        # Reload in this process right away
+        self._version = None
+
+
+class DomainLogBuffer:
+    """Sampled, batched writer for DomainLog rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._sampled_at = {}
+        self._suppressed = {}
+        self._flushed_at = time.monotonic()
+        self._timer = None
+
+    def _schedule_flush(self):
+        # Called with the lock held; a timer inherited through fork() is not alive
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Timer(LOG_FLUSH_INTERVAL, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own database connection
+            connection.close()
+
+    def record(self, domain, status_code, message):
+        """Queue a DomainLog row, dropping repeats for the same host within the sample window"""
+        now = time.monotonic()
+        flush = False
+        with self._lock:
+            if now - self._sampled_at.get(domain, -LOG_SAMPLE_WINDOW) < LOG_SAMPLE_WINDOW:
+                self._suppressed[domain] = self._suppressed.get(domain, 0) + 1
+            else:
+                suppressed = self._suppressed.pop(domain, 0)
+                if suppressed:
+                    message = f"{message} (+{suppressed} similar requests)"
+                self._sampled_at[domain] = now
+                self._pending.append(DomainLog(domain=domain, status_code=status_code, message=message))
+
+            if len(self._sampled_at) > 10 * LOG_BATCH_SIZE:
+                # Forget hosts whose sample window is over so the map stays bounded
+                self._sampled_at = {
+                    host: sampled_at for host, sampled_at in self._sampled_at.items()
+                    if now - sampled_at < LOG_SAMPLE_WINDOW
+                }
+            flush = len(self._pending) >= LOG_BATCH_SIZE or now - self._flushed_at >= LOG_FLUSH_INTERVAL
+            if self._pending and not flush:
+                self._schedule_flush()
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write all queued rows in one bulk insert"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            DomainLog.objects.bulk_create(pending, batch_size=LOG_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error writing {len(pending)} domain log entries: {e}")
+
+
+domain_routes = DomainRoutingTable()
+domain_logs = DomainLogBuffer()
+
+# Don't lose buffered rows when the worker shuts down
+atexit.register(domain_logs.flush)
+
+
+@receiver(post_save, sender=CustomDomain)
+@receiver(post_delete, sender=CustomDomain)
+def custom_domain_changed(sender, **kwargs):
+    # Wait for the commit so other processes reload the new state
+    transaction.on_commit(domain_routes.invalidate)
@@ -0,0 +1,211 @@
+"""
+Batched health/SEO scanning for check_website_health --batch.
+
+Websites are first fingerprinted with a single aggregate query (their own
+updated_at plus page/domain/product counts and last changes); only those
+whose fingerprint differs from the stored WebsiteHealthScore are re-scored.
+Changed websites are scored in chunks, each loaded with its pages and
+custom domains prefetched, optionally spread over worker processes, and
+every chunk's scores are written with one bulk upsert as soon as it is done,
+so an interrupted scan keeps its progress.
+"""
+import hashlib
+import logging
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import health_pool
+from .models import CustomDomain, Website, WebsiteHealthScore, WebsitePage, WebsiteProduct
+from .utils import check_website_health
+
+logger = logging.getLogger(__name__)
+
+# Bump when check_website_health changes so every website is re-scored once
+SCORING_VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+def _related(model, field='website'):
+    return model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+
+
+def _count(model):
+    return Coalesce(
+        Subquery(_related(model).annotate(n=Count('pk')).values('n'), output_field=IntegerField()),
+        Value(0)
+    )
+
+
+def _last_change(model):
+    return Subquery(_related(model).annotate(m=Max('updated_at')).values('m'))
+
+
+def fingerprint_queryset(websites):
+    """Websites annotated with everything a health score depends on"""
+    return websites.order_by('pk').annotate(
+        page_count=_count(WebsitePage),
+        pages_changed_at=_last_change(WebsitePage),
+        domain_count=_count(CustomDomain),
+        domains_changed_at=_last_change(CustomDomain),
+        product_count=_count(WebsiteProduct),
+    ).values_list(
+        'pk', 'updated_at', 'page_count', 'pages_changed_at',
+        'domain_count', 'domains_changed_at', 'product_count'
+    )
+
+
+def compute_fingerprint(row):
+    """Digest of one fingerprint_queryset row (excluding the pk)"""
+    parts = [str(SCORING_VERSION)] + [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in row[1:]]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def find_changed_websites(websites, force=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split websites into those that need scoring and those that are unchanged
+
+    Args:
+        websites: Website queryset to scan
+        force: re-score every website regardless of its fingerprint
+
+    Returns:
+        tuple: ({website_id: fingerprint} to score, number of unchanged websites)
+    """
+    stored = dict(
+        WebsiteHealthScore.objects.filter(website__in=websites.values('pk'))
+        .values_list('website_id', 'fingerprint')
+    )
+    changed = {}
+    unchanged = 0
+    for row in fingerprint_queryset(websites).iterator(chunk_size=chunk_size):
+        fingerprint = compute_fingerprint(row)
+        if not force and stored.get(row[0]) == fingerprint:
+            unchanged += 1
+        else:
+            changed[row[0]] = fingerprint
+    return changed, unchanged
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def scan_chunk(fingerprints):
+    """
+    Score one chunk of websites and persist the results
+
+    Args:
+        fingerprints: {website_id: fingerprint} of the websites in the chunk
+
+    Returns:
+        list: (website_id, website_name, report or None, error or None) per website
+    """
+    websites = (
+        Website.objects.filter(pk__in=list(fingerprints))
+        .annotate(product_count=_count(WebsiteProduct))
+        .prefetch_related('pages', 'customdomain_set')
+    )
+    results = []
+    scores = []
+    for website in websites:
+        try:
+            report = check_website_health(website)
+        except Exception as e:
+            logger.error(f"Error checking website {website.id}: {e}")
+            logger.error(traceback.format_exc())
+            results.append((website.id, website.name, None, str(e)))
+            continue
+        results.append((website.id, website.name, report, None))
+        scores.append(WebsiteHealthScore(
+            website_id=website.id,
+            health_score=report['metrics'].get('health_score', 0),
+            seo_score=report['metrics'].get('seo_score'),
+            status=report['status'],
+            report=report,
+            fingerprint=fingerprints[website.id],
+        ))
+
+    WebsiteHealthScore.objects.bulk_create(
+        scores,
+        update_conflicts=True,
+        unique_fields=['website'],
+        update_fields=['health_score', 'seo_score', 'status', 'report', 'fingerprint', 'scanned_at'],
+    )
+    return results
+
+
+def scan_websites(websites, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, force=False, on_result=None):
+    """
+    Re-score the websites whose inputs changed since the last scan
+
+    Args:
+        websites: Website queryset to scan
+        workers: number of worker processes (1 scores in this process)
+        chunk_size: websites loaded and persisted per chunk
+        force: re-score unchanged websites too
+        on_result: called with each (website_id, name, report, error) tuple
+
+    Returns:
+        dict: counts and timings of the scan
+    """
+    started = time.monotonic()
+    changed, unchanged = find_changed_websites(websites, force=force, chunk_size=chunk_size)
+    fingerprinted = time.monotonic()
+
+    chunks = [
+        {website_id: changed[website_id] for website_id in ids}
+        for ids in _chunks(sorted(changed), chunk_size)
+    ]
+    scored = errors = 0
+    chunk_durations = []
+
+    def collect(results, duration):
+        nonlocal scored, errors
+        chunk_durations.append(duration)
+        for result in results:
+            if result[3] is None:
+                scored += 1
+            else:
+                errors += 1
+            if on_result:
+                on_result(result)
+
+    if workers > 1 and len(chunks) > 1:
+        # Don't hand open connections to the forked workers
+        connections.close_all()
+        # The entry points live in health_pool, which spawned workers can import before Django is set up
+        with ProcessPoolExecutor(max_workers=workers, initializer=health_pool.init_worker) as executor:
+            futures = {executor.submit(health_pool.timed_scan_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                collect(*future.result())
+    else:
+        for chunk in chunks:
+            collect(*_timed_scan_chunk(chunk))
+
+    finished = time.monotonic()
+    return {
+        'total': len(changed) + unchanged,
+        'scored': scored,
+        'unchanged': unchanged,
+        'errors': errors,
+        'chunks': len(chunks),
+        'workers': workers if len(chunks) > 1 else 1,
+        'fingerprint_seconds': round(fingerprinted - started, 3),
+        'scoring_seconds': round(finished - fingerprinted, 3),
+        'total_seconds': round(finished - started, 3),
+        'slowest_chunk_seconds': round(max(chunk_durations), 3) if chunk_durations else 0,
+        'websites_per_second': round(scored / (finished - fingerprinted), 1) if scored and finished > fingerprinted else 0,
+    }
+
+
+def _timed_scan_chunk(chunk):
+    started = time.monotonic()
+    results = scan_chunk(chunk)
+    return results, time.monotonic() - started
@@ -0,0 +1,23 @@
+"""
+Worker process entry points of website.health.scan_websites.
+
+This module does not import the models, so worker processes can import it
+before Django is set up. With the spawn start method (Windows, macOS), each
+worker starts a fresh interpreter and imports the pool's initializer and
+tasks by name. The models are only imported once init_worker has called
+django.setup().
+"""
+
+
+def init_worker():
+    import django
+    from django.db import connections
+
+    django.setup()
+    # Connections inherited from a forked parent process must not be shared
+    connections.close_all()
+
+
+def timed_scan_chunk(fingerprints):
+    from .health import _timed_scan_chunk
+    return _timed_scan_chunk(fingerprints)
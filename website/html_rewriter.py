@@ -0,0 +1,183 @@
+"""
+Single-pass HTML tag rewriter used by LazyLoadingMiddleware.
+
+The page is scanned once with a regular expression that only stops on <img>
+and <iframe> start tags (skipping comments, <script>, <style> and <textarea>
+bodies); those tags get loading/srcset/width attributes appended in place and
+every other byte of the document is left untouched. No DOM is built.
+
+srcset only lists derivatives recorded by the image pipeline (see assets);
+images with a WebP derivative are wrapped in a <picture> element offering it.
+
+Pages held by the rendered-page cache (page_cache) are rewritten once per
+content version and set of derivatives they reference. Other responses may
+vary per request (CSRF tokens, per-user fragments) and are rewritten without
+caching.
+"""
+import hashlib
+import json
+import logging
+import re
+
+from django.core.cache import cache
+
+from .assets import get_derivative_sets
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rewriting rules change so stale cached output is not served
+REWRITER_VERSION = 2
+
+# Seconds a rewritten page is kept in the cache
+REWRITE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Images with one of these classes are never lazy-loaded or made responsive
+EXCLUDED_IMAGE_CLASSES = frozenset(['logo', 'icon', 'avatar'])
+
+_TAG_PATTERN = re.compile(
+    r'<!--.*?-->'
+    r'|<(script|style|textarea|picture)\b.*?</\1\s*>'
+    r'|<(img|iframe)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(\s*/?)>',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Local image sources, looked up in the derivative table before rewriting
+_MEDIA_SRC_PATTERN = re.compile(r'\bsrc\s*=\s*["\']?(/media/[^"\'\s>]+)', re.IGNORECASE)
+
+_ATTR_PATTERN = re.compile(
+    r'([^\s=/>"\']+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+)))?'
+)
+
+
+def _parse_attributes(attr_text):
+    """Attributes of a start tag as a dict of lower-cased name -> value"""
+    attrs = {}
+    for match in _ATTR_PATTERN.finditer(attr_text):
+        name = match.group(1).lower()
+        if name not in attrs:
+            value = match.group(2)
+            if value is None:
+                value = match.group(3)
+            if value is None:
+                value = match.group(4) or ''
+            attrs[name] = value
+    return attrs
+
+
+def _quote(value):
+    return '"' + value.replace('"', '&quot;') + '"'
+
+
+def _srcset(derivative_set, kind):
+    """srcset of one kind ('original' or 'webp') of a derivative set, or None"""
+    entries = [
+        f"{files[kind]} {density}"
+        for density, files in sorted(derivative_set.items())
+        if files.get(kind)
+    ]
+    return ', '.join(entries) or None
+
+
+def _image_additions(attrs, derivatives):
+    if EXCLUDED_IMAGE_CLASSES.intersection(attrs.get('class', '').split()):
+        return []
+
+    additions = []
+    if 'loading' not in attrs:
+        additions.append(('loading', 'lazy'))
+
+    # Add srcset for local images that have generated derivatives
+    derivative_set = derivatives.get(attrs.get('src', ''))
+    if derivative_set and 'srcset' not in attrs:
+        srcset = _srcset(derivative_set, 'original')
+        if srcset:
+            additions.append(('srcset', srcset))
+
+    # Add responsive width attributes
+    if 'width' not in attrs and 'height' not in attrs:
+        additions.append(('width', '100%'))
+        # Keep any inline style the author already set
+        style = attrs.get('style', '').strip().rstrip(';')
+        additions.append(('style', f"{style}; max-width: 100%; height: auto;" if style else 'max-width: 100%; height: auto;'))
+    return additions
+
+
+def _rewrite_tag(match, derivatives, in_picture=False):
+    tag = match.group(2)
+    if tag is None:
+        if (match.group(1) or '').lower() == 'picture':
+            # Author-built <picture>: rewrite its images but don't wrap them again
+            opening, body = match.group(0)[:len('<picture')], match.group(0)[len('<picture'):]
+            return opening + _TAG_PATTERN.sub(
+                lambda inner: _rewrite_tag(inner, derivatives, in_picture=True), body
+            )
+        # Comment or raw-text element, copied as-is
+        return match.group(0)
+
+    attr_text = match.group(3)
+    attrs = _parse_attributes(attr_text)
+    if tag.lower() == 'img':
+        additions = _image_additions(attrs, derivatives)
+    else:
+        additions = [('loading', 'lazy')] if 'loading' not in attrs else []
+    if not additions:
+        return match.group(0)
+
+    replaced = {name for name, _ in additions if name in attrs}
+    if replaced:
+        # Drop attributes that are being rewritten (only style for now)
+        attr_text = _ATTR_PATTERN.sub(
+            lambda m: '' if m.group(1).lower() in replaced else m.group(0),
+            attr_text
+        ).rstrip()
+
+    extra = ''.join(f' {name}={_quote(value)}' for name, value in additions)
+    rewritten = f"<{tag}{attr_text}{extra}{match.group(4)}>"
+
+    derivative_set = derivatives.get(attrs.get('src', '')) if tag.lower() == 'img' else None
+    webp_srcset = _srcset(derivative_set, 'webp') if derivative_set and not in_picture else None
+    if webp_srcset and 'srcset' not in attrs:
+        rewritten = f'<picture><source type="image/webp" srcset={_quote(webp_srcset)}>{rewritten}</picture>'
+    return rewritten
+
+
+def rewrite_html(html, derivatives=None):
+    """
+    Add lazy loading and responsive image attributes to an HTML document
+
+    Args:
+        html: document as str
+        derivatives: image URL -> derivative set (see assets.get_derivative_sets)
+
+    Returns:
+        str: rewritten document
+    """
+    derivatives = derivatives or {}
+    return _TAG_PATTERN.sub(lambda match: _rewrite_tag(match, derivatives), html)
+
+
+def rewrite_html_cached(content, page_key=None):
+    """
+    Rewrite an encoded HTML document, reusing earlier output for the same page
+
+    Args:
+        content: response body as UTF-8 bytes
+        page_key: page_cache_key of a response served or stored by page_cache;
+            without one the body is rewritten but not cached
+
+    Returns:
+        bytes: rewritten body
+    """
+    html = content.decode('utf-8')
+    derivatives = get_derivative_sets(_MEDIA_SRC_PATTERN.findall(html))
+    if page_key is None:
+        return rewrite_html(html, derivatives).encode('utf-8')
+
+    # New derivatives change the output of an otherwise identical page
+    digest = hashlib.sha1(json.dumps(derivatives, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f"website:lazy_html:{REWRITER_VERSION}:{page_key}:{digest}"
+    rewritten = cache.get(key)
+    if rewritten is None:
+        rewritten = rewrite_html(html, derivatives).encode('utf-8')
+        cache.set(key, rewritten, REWRITE_CACHE_TIMEOUT)
+    return rewritten
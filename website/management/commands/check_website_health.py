@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
-from website.models import Website
+from website.models import Website, WebsiteHealthScore
 from website.utils import check_website_health
+from website.health import DEFAULT_CHUNK_SIZE, scan_websites
 import json
 from django.utils import timezone
 
@@ -13,6 +14,10 @@ class Command(BaseCommand):
         parser.add_argument('--format', type=str, default='text', choices=['text', 'json'], help='Output format')
         parser.add_argument('--save', action='store_true', help='Save reports to files')
         parser.add_argument('--threshold', type=int, default=70, help='Health score threshold to consider healthy (0-100)')
+        parser.add_argument('--batch', action='store_true', help='Scan in chunks, store scores and skip websites unchanged since the last scan')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes for --batch')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Websites per chunk for --batch')
+        parser.add_argument('--force', action='store_true', help='With --batch, re-score websites even if they did not change')
 
     def handle(self, *args, **options):
         website_ids = options['website_ids']
@@ -41,6 +46,10 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR('Error: No websites found with the provided IDs'))
                 return
                 
+        if options['batch']:
+            self._handle_batch(websites, options)
+            return
+            
         # Process each website
         reports = {}
         
@@ -84,6 +93,47 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f"Critical: {critical_count}")
             
+    def _handle_batch(self, websites, options):
+        """Batched scan: only changed websites are scored, results are stored per chunk"""
+        threshold = options['threshold']
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1')
+            
+        def on_result(result):
+            website_id, name, report, error = result
+            if error:
+                self.stdout.write(self.style.ERROR(f"Error checking website {website_id}: {error}"))
+                return
+            if options['format'] == 'json':
+                self.stdout.write(json.dumps({'website_id': website_id, 'website_name': name, 'report': report}))
+            else:
+                score = report['metrics'].get('health_score', 0)
+                style = self.style.SUCCESS if score >= threshold else self.style.WARNING
+                self.stdout.write(style(f"{name} (ID: {website_id}): {score}/100 {report['status'].upper()}"))
+            if options['save']:
+                self._save_report(Website(id=website_id, name=name), report)
+                
+        stats = scan_websites(
+            websites,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            force=options['force'],
+            on_result=on_result,
+        )
+        
+        # Summary over the stored scores, including websites that were skipped
+        scores = WebsiteHealthScore.objects.filter(website__in=websites.values('pk'))
+        self.stdout.write("\nHealth Check Summary:")
+        self.stdout.write(f"Total: {stats['total']} (scored: {stats['scored']}, unchanged: {stats['unchanged']}, errors: {stats['errors']})")
+        self.stdout.write(self.style.SUCCESS(f"Healthy: {scores.filter(health_score__gte=threshold).count()}"))
+        self.stdout.write(f"Warning: {scores.filter(status='warning').count()}")
+        self.stdout.write(f"Critical: {scores.filter(status='critical').count()}")
+        
+        self.stdout.write("\nTiming:")
+        self.stdout.write(f"Change detection: {stats['fingerprint_seconds']}s")
+        self.stdout.write(f"Scoring: {stats['scoring_seconds']}s ({stats['chunks']} chunks, {stats['workers']} workers, slowest chunk {stats['slowest_chunk_seconds']}s)")
+        self.stdout.write(f"Total: {stats['total_seconds']}s ({stats['websites_per_second']} websites/s)")
+        
     def _display_text_report(self, website, report, threshold):
         """Display health report in text format"""
         # Display header
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-17 14:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0009_website_is_deployed_website_last_deployed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_url', models.CharField(help_text='URL of the uploaded image as used in content', max_length=500, unique=True)),
+                ('original_path', models.CharField(help_text='Storage path of the uploaded image', max_length=500)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('derivatives', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('website', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='image_derivatives', to='website.website')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.20 on 2026-10-17 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0010_websiteimagederivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteHealthScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('health_score', models.PositiveIntegerField(default=0)),
+                ('seo_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('status', models.CharField(default='healthy', max_length=10)),
+                ('report', models.JSONField(default=dict)),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('scanned_at', models.DateTimeField(auto_now=True)),
+                ('website', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='health_score', to='website.website')),
+            ],
+        ),
+    ]
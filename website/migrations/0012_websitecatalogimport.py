@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-17 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_websitehealthscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteCatalogImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_path', models.CharField(help_text='Storage path of the uploaded catalog', max_length=500)),
+                ('file_format', models.CharField(default='csv', max_length=10)),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('task_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to='website.website')),
+            ],
+        ),
+    ]
@@ -8,6 +8,7 @@ from django.utils.text import slugify
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import json
+from .content import normalize_page_content, normalize_website_content
 
 # Create your models here.
 
@@ -191,6 +192,9 @@ class Website(models.Model):
                 }
             }
         
+        # Apply the storefront defaults once here instead of on every render
+        normalize_website_content(self.content)
+        
         # Make sure content is a new dictionary to avoid reference issues
         self.content = dict(self.content)
         
@@ -321,9 +325,8 @@ class WebsitePage(models.Model):
         if self.is_homepage:
             WebsitePage.objects.filter(website=self.website, is_homepage=True).exclude(pk=self.pk).update(is_homepage=False)
         
-        # Ensure content is a dictionary
-        if self.content is None:
-            self.content = {}
+        # Ensure content is a dictionary and apply the storefront defaults
+        self.content = normalize_page_content(self.content)
             
         super().save(*args, **kwargs)
 
@@ -663,3 +666,62 @@ class WebsiteAsset(models.Model):
         """Get the asset URL"""
         return self.file.url
 
+
+class WebsiteImageDerivative(models.Model):
+    """Resized and WebP versions generated for an uploaded website image"""
+    original_url = models.CharField(max_length=500, unique=True, help_text="URL of the uploaded image as used in content")
+    original_path = models.CharField(max_length=500, help_text="Storage path of the uploaded image")
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='image_derivatives', null=True, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    # {"1x": {"original": url, "webp": url}, "2x": {...}}
+    derivatives = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Derivatives of {self.original_url}"
+
+
+class WebsiteHealthScore(models.Model):
+    """Last health check result of a website, kept by check_website_health --batch"""
+    website = models.OneToOneField(Website, on_delete=models.CASCADE, related_name='health_score')
+    health_score = models.PositiveIntegerField(default=0)
+    seo_score = models.PositiveIntegerField(blank=True, null=True)
+    status = models.CharField(max_length=10, default='healthy')
+    report = models.JSONField(default=dict)
+    # Digest of the inputs the score was computed from; unchanged websites are skipped
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    scanned_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.website} - {self.health_score}/100"
+
+
+class WebsiteCatalogImport(models.Model):
+    """A CSV/JSON product catalog import and its progress"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='catalog_imports')
+    file_path = models.CharField(max_length=500, help_text="Storage path of the uploaded catalog")
+    file_format = models.CharField(max_length=10, default='csv')  # csv, json
+    status = models.CharField(max_length=20, default='pending')  # pending, processing, completed, failed
+    total_rows = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # First validation errors as {"row": n, "error": "..."}
+    error_message = models.TextField(blank=True, null=True)
+    task_id = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Catalog import for {self.website} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of rows processed (0-100)"""
+        if not self.total_rows:
+            return 100 if self.status == 'completed' else 0
+        return int(self.rows_processed * 100 / self.total_rows)
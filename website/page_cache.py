@@ -0,0 +1,146 @@
+"""
+Rendered-page cache for published storefronts.
+
+Anonymous GET traffic to a custom domain (CustomDomainMiddleware) or a public
+link (/website/s/<slug>/...) is served from fully rendered responses kept in
+the Django cache, keyed by (host or public_slug, page slug). Every entry
+records the content version of its website; the version is bumped by signals
+whenever the Website, its pages, products, categories or domains change, so a
+stale entry is simply ignored on the next lookup.
+
+Hits are answered with two cache reads and no ORM or template work, and
+honour If-None-Match / If-Modified-Since with a 304 (validators come from the
+content version, see conditional).
+"""
+import hashlib
+import logging
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .conditional import (
+    bump_content_version, content_etag, content_last_modified, get_content_version,
+    is_conditional_request, record_full_response, set_validators
+)
+from .models import CustomDomain, Website, WebsiteCategory, WebsitePage, WebsiteProduct
+
+logger = logging.getLogger(__name__)
+
+# Seconds a rendered page is kept; entries are also dropped as soon as the version moves
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _page_key(scope, page_slug):
+    digest = hashlib.md5(f'{scope}|{page_slug}'.encode('utf-8')).hexdigest()
+    return f'website:page:{digest}'
+
+
+def _respond(request, entry, key):
+    response = get_conditional_response(
+        request,
+        etag=content_etag(entry['website_id'], entry['version']),
+        last_modified=content_last_modified(entry['version'])
+    )
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        record_full_response(request, response)
+    # Lets LazyLoadingMiddleware cache its rewrite of this exact page version
+    response.page_cache_key = f"{entry['website_id']}:{entry['version']}:{key}"
+    return set_validators(response, entry['website_id'], entry['version'])
+
+
+def get_cached_page(request, scope, page_slug):
+    """
+    Serve a page from the cache
+
+    Args:
+        request: current request
+        scope: host of a custom domain or public_slug of a website
+        page_slug: page slug ('' for the homepage)
+
+    Returns:
+        HttpResponse (200 or 304), or None on a miss
+    """
+    if not is_conditional_request(request):
+        return None
+    key = _page_key(scope, page_slug)
+    entry = cache.get(key)
+    if entry is None or entry['version'] != get_content_version(entry['website_id']):
+        return None
+    return _respond(request, entry, key)
+
+
+def store_page(request, response, website_id, scope, page_slug):
+    """
+    Cache a freshly rendered page and make the response conditional
+
+    Responses that set cookies (e.g. a CSRF token) or are not plain 200 HTML
+    responses are returned untouched.
+    """
+    if (
+        not is_conditional_request(request) or
+        response.status_code != 200 or
+        response.streaming or
+        response.cookies or
+        request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        return response
+
+    content = response.content
+    version = get_content_version(website_id)
+    entry = {
+        'website_id': website_id,
+        'version': version,
+        'content': content,
+        'content_type': response.get('Content-Type', 'text/html; charset=utf-8'),
+    }
+    key = _page_key(scope, page_slug)
+    cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+    return _respond(request, entry, key)
+
+
+def cache_public_page(view_func):
+    """
+    Cache a public website view keyed by its public_slug/page_slug arguments
+
+    The view must set request.website to the Website it rendered.
+    """
+    @wraps(view_func)
+    def wrapper(request, public_slug, page_slug='', *args, **kwargs):
+        cached = get_cached_page(request, public_slug, page_slug)
+        if cached is not None:
+            return cached
+
+        if page_slug:
+            response = view_func(request, public_slug, page_slug, *args, **kwargs)
+        else:
+            response = view_func(request, public_slug, *args, **kwargs)
+
+        website = getattr(request, 'website', None)
+        if website is None:
+            return response
+        return store_page(request, response, website.pk, public_slug, page_slug)
+    return wrapper
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_delete, sender=Website)
+def website_changed(sender, instance, **kwargs):
+    bump_content_version(instance.pk)
+
+
+@receiver(post_save, sender=WebsitePage)
+@receiver(post_delete, sender=WebsitePage)
+@receiver(post_save, sender=WebsiteProduct)
+@receiver(post_delete, sender=WebsiteProduct)
+@receiver(post_save, sender=WebsiteCategory)
+@receiver(post_delete, sender=WebsiteCategory)
+@receiver(post_save, sender=CustomDomain)
+@receiver(post_delete, sender=CustomDomain)
+def website_content_changed(sender, instance, **kwargs):
+    if instance.website_id:
+        bump_content_version(instance.website_id)
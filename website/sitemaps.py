@@ -0,0 +1,350 @@
+"""
+Stored sitemaps and robots.txt for published websites.
+
+Every website gets a sitemap index (sitemap.xml) pointing at one or more
+urlset files per section (pages, products, categories) of at most
+MAX_URLS_PER_FILE URLs each, plus robots.txt, all written to storage under
+website_files/<website id>/. Files are streamed to a temporary file row by
+row from chunked queries, so memory stays flat for stores with tens of
+thousands of products.
+
+A change to a page, product or category only rewrites that section's files
+and the index (debounced through website.tasks.regenerate_sitemap); a change
+of custom domain or public slug rewrites everything. Requests for
+sitemap*.xml and robots.txt are served straight from storage.
+"""
+import json
+import logging
+import re
+import tempfile
+import threading
+import traceback
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import FileResponse
+from django.utils import timezone
+
+from .models import CustomDomain, Website, WebsiteCategory, WebsitePage, WebsiteProduct
+from .utils import generate_robots_txt, get_website_base_url
+
+logger = logging.getLogger(__name__)
+
+# Limit of the sitemap protocol per urlset file
+MAX_URLS_PER_FILE = 50000
+
+# Rows fetched per query while streaming a section
+QUERY_CHUNK_SIZE = 2000
+
+SECTIONS = ('pages', 'products', 'categories')
+
+# Seconds changes are collected before a section is regenerated
+REGENERATE_DELAY = 30
+
+MANIFEST_NAME = 'sitemap.json'
+ROBOTS_NAME = 'robots.txt'
+INDEX_NAME = 'sitemap.xml'
+
+# sitemap.xml, sitemap-products-3.xml, robots.txt
+ARTIFACT_PATTERN = re.compile(r'^(?:sitemap(?:-[a-z]+-\d+)?\.xml|robots\.txt)$')
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+URLSET_HEADER = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+URLSET_FOOTER = '</urlset>'
+
+
+def sitemap_storage_path(website_id, name):
+    return f"website_files/{website_id}/{name}"
+
+
+def _lastmod(value):
+    return f"    <lastmod>{value.date().isoformat()}</lastmod>\n" if value else ''
+
+
+def _url_element(entry):
+    loc, lastmod, changefreq, priority = entry
+    return (
+        '  <url>\n'
+        f'    <loc>{escape(loc)}</loc>\n'
+        f'{_lastmod(lastmod)}'
+        f'    <changefreq>{changefreq}</changefreq>\n'
+        f'    <priority>{priority}</priority>\n'
+        '  </url>\n'
+    )
+
+
+def urlset_lines(entries):
+    """
+    Lines of a urlset document
+
+    Args:
+        entries: iterable of (loc, lastmod, changefreq, priority)
+    """
+    yield URLSET_HEADER
+    for entry in entries:
+        yield _url_element(entry)
+    yield URLSET_FOOTER
+
+
+def iter_sitemap_entries(website, base_url, section):
+    """(loc, lastmod, changefreq, priority) of every URL of a section, read in chunks"""
+    if section == 'pages':
+        pages = (
+            WebsitePage.objects.filter(website=website)
+            .order_by('order', 'title')
+            .values_list('slug', 'is_homepage', 'updated_at')
+        )
+        homepage_lastmod = None
+        others = []
+        for slug, is_homepage, updated_at in pages.iterator(chunk_size=QUERY_CHUNK_SIZE):
+            if is_homepage:
+                homepage_lastmod = updated_at
+            else:
+                others.append((f"{base_url}/{slug}/", updated_at, 'monthly', '0.8'))
+        yield (f"{base_url}/", homepage_lastmod, 'weekly', '1.0')
+        yield from others
+    elif section == 'products':
+        products = (
+            WebsiteProduct.objects.filter(website=website, is_active=True)
+            .order_by('created_at', 'pk')
+            .values_list('slug', 'updated_at')
+        )
+        for slug, updated_at in products.iterator(chunk_size=QUERY_CHUNK_SIZE):
+            yield (f"{base_url}/product/{slug}/", updated_at, 'weekly', '0.9')
+    elif section == 'categories':
+        categories = (
+            WebsiteCategory.objects.filter(website=website, is_active=True)
+            .order_by('order', 'name')
+            .values_list('slug', 'updated_at')
+        )
+        for slug, updated_at in categories.iterator(chunk_size=QUERY_CHUNK_SIZE):
+            yield (f"{base_url}/category/{slug}/", updated_at, 'weekly', '0.7')
+
+
+def _store(path, fileobj):
+    """Replace a stored artifact with the content of fileobj"""
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, fileobj)
+
+
+def _write_section(website, base_url, section):
+    """
+    Stream a section into urlset files of at most MAX_URLS_PER_FILE URLs
+
+    Returns:
+        list: {'name', 'urls', 'lastmod'} of each written file
+    """
+    files = []
+    entries = iter_sitemap_entries(website, base_url, section)
+    exhausted = False
+    while not exhausted:
+        count = 0
+        lastmod = None
+        with tempfile.TemporaryFile('w+b') as tmp:
+            tmp.write(URLSET_HEADER.encode('utf-8'))
+            for entry in entries:
+                tmp.write(_url_element(entry).encode('utf-8'))
+                count += 1
+                if entry[1] and (lastmod is None or entry[1] > lastmod):
+                    lastmod = entry[1]
+                if count >= MAX_URLS_PER_FILE:
+                    break
+            else:
+                exhausted = True
+            tmp.write(URLSET_FOOTER.encode('utf-8'))
+
+            if count:
+                name = f"sitemap-{section}-{len(files) + 1}.xml"
+                tmp.seek(0)
+                _store(sitemap_storage_path(website.id, name), File(tmp, name=name))
+                files.append({
+                    'name': name,
+                    'urls': count,
+                    'lastmod': (lastmod or timezone.now()).isoformat(),
+                })
+    return files
+
+
+def _write_index(website_id, base_url, manifest):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>\n', f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n']
+    for section in SECTIONS:
+        for item in manifest['sections'].get(section, []):
+            lines.append(
+                '  <sitemap>\n'
+                f'    <loc>{escape(base_url)}/{item["name"]}</loc>\n'
+                f'    <lastmod>{item["lastmod"][:10]}</lastmod>\n'
+                '  </sitemap>\n'
+            )
+    lines.append('</sitemapindex>')
+    _store(sitemap_storage_path(website_id, INDEX_NAME), ContentFile(''.join(lines).encode('utf-8')))
+
+
+def load_manifest(website_id):
+    path = sitemap_storage_path(website_id, MANIFEST_NAME)
+    if not default_storage.exists(path):
+        return None
+    try:
+        with default_storage.open(path, 'rb') as f:
+            return json.loads(f.read().decode('utf-8'))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Unreadable sitemap manifest for website {website_id}: {e}")
+        return None
+
+
+def regenerate_sitemaps(website, sections=None):
+    """
+    Write the sitemap files of a website to storage
+
+    Args:
+        website: Website instance
+        sections: sections to rewrite (None for all); everything is rewritten
+            when the base URL changed since the last run
+
+    Returns:
+        dict: the manifest ({'base_url', 'sections': {section: [files]}, 'generated_at'})
+    """
+    base_url = get_website_base_url(website)
+    manifest = load_manifest(website.id)
+    if manifest is None or manifest.get('base_url') != base_url:
+        manifest = {'base_url': base_url, 'sections': {}}
+        sections = None
+
+    for section in sections or SECTIONS:
+        previous = {item['name'] for item in manifest['sections'].get(section, [])}
+        files = _write_section(website, base_url, section)
+        manifest['sections'][section] = files
+        # Drop files left over from a section that shrank
+        for name in previous - {item['name'] for item in files}:
+            default_storage.delete(sitemap_storage_path(website.id, name))
+
+    _write_index(website.id, base_url, manifest)
+    if sections is None:
+        robots = generate_robots_txt(website, allow_indexing=True, base_url=base_url)
+        _store(sitemap_storage_path(website.id, ROBOTS_NAME), ContentFile(robots.encode('utf-8')))
+
+    manifest['generated_at'] = timezone.now().isoformat()
+    _store(
+        sitemap_storage_path(website.id, MANIFEST_NAME),
+        ContentFile(json.dumps(manifest).encode('utf-8'))
+    )
+    logger.info(f"Regenerated sitemap sections {sections or 'all'} for website {website.id}")
+    return manifest
+
+
+def _pending_key(website_id, section):
+    return f"website:sitemap:pending:{website_id}:{section or 'all'}"
+
+
+def run_scheduled_regeneration(website_id, section=None):
+    """
+    Regenerate a section queued by schedule_sitemap_regeneration
+
+    section is one of SECTIONS, None for everything, or 'website' to rewrite
+    everything only if the base URL (public slug) changed.
+    """
+    cache.delete(_pending_key(website_id, section))
+    website = Website.objects.filter(pk=website_id).first()
+    manifest = load_manifest(website_id)
+    if website is None or manifest is None:
+        # Deleted, or never published: the first request generates everything
+        return None
+    if section == 'website':
+        if manifest.get('base_url') == get_website_base_url(website):
+            return manifest
+        section = None
+    return regenerate_sitemaps(website, [section] if section else None)
+
+
+def _run_safely(website_id, section=None):
+    try:
+        run_scheduled_regeneration(website_id, section)
+    except Exception as e:
+        logger.error(f"Error regenerating sitemap for website {website_id}: {e}")
+        logger.error(traceback.format_exc())
+
+
+def schedule_sitemap_regeneration(website_id, section=None):
+    """
+    Queue a (debounced) rewrite of one section, or all of them, after the commit
+
+    Changes arriving while a rewrite is pending are picked up by that rewrite.
+    """
+    if not cache.add(_pending_key(website_id, section), True, REGENERATE_DELAY * 10):
+        return
+
+    def queue():
+        try:
+            from .tasks import regenerate_sitemap
+            regenerate_sitemap.apply_async((website_id, section), countdown=REGENERATE_DELAY)
+        except Exception as e:
+            logger.warning(f"Could not queue sitemap regeneration for website {website_id} ({e}), running in a background thread")
+            threading.Thread(target=_run_safely, args=(website_id, section), daemon=True).start()
+
+    transaction.on_commit(queue)
+
+
+def serve_artifact(website_id, name):
+    """
+    Response for a stored sitemap/robots.txt file of a website
+
+    Returns:
+        FileResponse, or None when the name is not an artifact or does not exist
+    """
+    if not ARTIFACT_PATTERN.match(name):
+        return None
+    path = sitemap_storage_path(website_id, name)
+    if not default_storage.exists(path):
+        if load_manifest(website_id) is not None:
+            # Stale name (e.g. a section that shrank)
+            return None
+        website = Website.objects.filter(pk=website_id).first()
+        if website is None:
+            return None
+        regenerate_sitemaps(website)
+        if not default_storage.exists(path):
+            return None
+
+    content_type = 'text/plain; charset=utf-8' if name == ROBOTS_NAME else 'application/xml; charset=utf-8'
+    response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@receiver(post_save, sender=Website)
+def website_changed(sender, instance, created, **kwargs):
+    # Only a new public slug matters; checked when the task runs
+    if not created:
+        schedule_sitemap_regeneration(instance.pk, 'website')
+
+
+@receiver(post_save, sender=WebsitePage)
+@receiver(post_delete, sender=WebsitePage)
+def page_changed(sender, instance, **kwargs):
+    schedule_sitemap_regeneration(instance.website_id, 'pages')
+
+
+@receiver(post_save, sender=WebsiteProduct)
+@receiver(post_delete, sender=WebsiteProduct)
+def product_changed(sender, instance, **kwargs):
+    schedule_sitemap_regeneration(instance.website_id, 'products')
+
+
+@receiver(post_save, sender=WebsiteCategory)
+@receiver(post_delete, sender=WebsiteCategory)
+def category_changed(sender, instance, **kwargs):
+    schedule_sitemap_regeneration(instance.website_id, 'categories')
+
+
+@receiver(post_save, sender=CustomDomain)
+@receiver(post_delete, sender=CustomDomain)
+def domain_changed(sender, instance, **kwargs):
+    # Every URL changes with the base URL
+    schedule_sitemap_regeneration(instance.website_id)
@@ -0,0 +1,60 @@
+import logging
+
+from celery import shared_task
+
+from .assets import generate_derivatives
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name="website.tasks.generate_image_derivatives")
+def generate_image_derivatives(self, original_path, website_id=None):
+    """
+    Generate the resized and WebP derivatives of an uploaded website image
+
+    Args:
+        original_path (str): Storage path of the uploaded image
+        website_id (int): Website the image belongs to
+
+    Returns:
+        dict: Derivative URLs by density
+    """
+    logger.info(f"Starting generate_image_derivatives task {self.request.id} for {original_path}")
+    record = generate_derivatives(original_path, website_id)
+    return record.derivatives if record else {}
+
+
+@shared_task(bind=True, name="website.tasks.regenerate_sitemap")
+def regenerate_sitemap(self, website_id, section=None):
+    """
+    Rewrite the stored sitemap files of a website after a content change
+
+    Args:
+        website_id (int): Website to regenerate
+        section (str): Section that changed (None for all)
+
+    Returns:
+        dict: Sitemap manifest, or None when the website has no stored sitemap
+    """
+    from .sitemaps import run_scheduled_regeneration
+
+    logger.info(f"Starting regenerate_sitemap task {self.request.id} for website {website_id} ({section or 'all'})")
+    return run_scheduled_regeneration(website_id, section)
+
+
+@shared_task(bind=True, name="website.tasks.import_catalog")
+def import_catalog(self, import_id):
+    """
+    Import an uploaded CSV/JSON product catalog in batches
+
+    Args:
+        import_id (str): ID of the WebsiteCatalogImport created by the upload view
+
+    Returns:
+        dict: Counts of created, updated and invalid rows
+    """
+    from .catalog import run_catalog_import
+
+    logger.info(f"Starting import_catalog task {self.request.id} for import {import_id}")
+    return run_catalog_import(import_id, task_id=self.request.id)
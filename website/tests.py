@@ -365,3 +365,452 @@ class Template1FunctionalityTest(TestCase):
         response = self.client.get(reverse('preview_website', args=[self.website.id]))
         # It should either load or redirect
         self.assertIn(response.status_code, [200, 301, 302])
+
+class PublicPageCacheTest(TestCase):
+    """Test the rendered-page cache for public storefront pages"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='password123'
+        )
+        self.template = WebsiteTemplate.objects.create(
+            name="Test Template",
+            description="A test template",
+            template_path="website/template1",
+            content_schema={"type": "object"}
+        )
+        self.website = Website.objects.create(
+            user=self.user,
+            template=self.template,
+            name="Cached Website",
+            content={"site_name": "Cached Website"}
+        )
+        
+        # Minimal public view that counts how often it actually renders
+        from django.http import HttpResponse
+        from .page_cache import cache_public_page
+        self.render_count = 0
+        
+        @cache_public_page
+        def view(request, public_slug, page_slug=''):
+            self.render_count += 1
+            request.website = self.website
+            return HttpResponse(f"<html>{page_slug} {self.render_count}</html>")
+        
+        self.view = view
+        
+    def get(self, **headers):
+        from django.test import RequestFactory
+        request = RequestFactory().get(f"/website/s/{self.website.public_slug}/", **headers)
+        return self.view(request, self.website.public_slug)
+        
+    def test_repeat_requests_are_served_from_cache(self):
+        """Test that an unchanged page is rendered once and carries an ETag"""
+        first = self.get()
+        second = self.get()
+        self.assertEqual(self.render_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertTrue(second.has_header('ETag'))
+        
+    def test_conditional_get_returns_not_modified(self):
+        """Test that a matching If-None-Match is answered with a 304"""
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.render_count, 1)
+        
+    def test_content_change_invalidates_cache(self):
+        """Test that saving a page of the website re-renders it"""
+        first = self.get()
+        WebsitePage.objects.create(website=self.website, title="About", slug="about")
+        second = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(self.render_count, 2)
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        
+    def test_revalidation_skips_the_view(self):
+        """Test that PerformanceOptimizationMiddleware answers a current ETag before the view runs"""
+        from django.test import RequestFactory
+        from .middleware import PerformanceOptimizationMiddleware
+        
+        etag = self.get()['ETag']
+        middleware = PerformanceOptimizationMiddleware(lambda request: self.fail("view should not run"))
+        request = RequestFactory().get(f"/website/s/{self.website.public_slug}/", HTTP_IF_NONE_MATCH=etag)
+        response = middleware(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        
+    def test_lazy_loading_caches_only_cached_pages(self):
+        """Test that the image rewrite is cached per cached page and skipped for per-request bodies"""
+        from unittest import mock
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from . import html_rewriter
+        from .middleware import LazyLoadingMiddleware
+        
+        path = f"/website/s/{self.website.public_slug}/"
+        cached_page = LazyLoadingMiddleware(lambda request: self.view(request, self.website.public_slug))
+        with mock.patch.object(html_rewriter, 'rewrite_html', wraps=html_rewriter.rewrite_html) as rewrite:
+            cached_page(RequestFactory().get(path))
+            cached_page(RequestFactory().get(path))
+        self.assertEqual(self.render_count, 1)
+        self.assertEqual(rewrite.call_count, 1)
+        
+        # A body carrying a per-request token never reaches the cache
+        tokens = iter(range(2))
+        dynamic_page = LazyLoadingMiddleware(lambda request: HttpResponse(f'<img src="/a.jpg"><input value="{next(tokens)}">'))
+        with mock.patch.object(html_rewriter, 'cache') as rewrite_cache:
+            first = dynamic_page(RequestFactory().post(path))
+            second = dynamic_page(RequestFactory().post(path))
+        rewrite_cache.set.assert_not_called()
+        self.assertIn(b'loading="lazy"', first.content)
+        self.assertNotEqual(first.content, second.content)
+
+class ContentNormalizationTest(TestCase):
+    """Test write-time content defaults and the bulk normalization command"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='contentuser',
+            email='content@example.com',
+            password='password123'
+        )
+        self.template = WebsiteTemplate.objects.create(
+            name="Test Template",
+            description="A test template",
+            template_path="website/template1",
+            content_schema={"type": "object"}
+        )
+        self.website = Website.objects.create(
+            user=self.user,
+            template=self.template,
+            name="Content Website",
+            content={"websiteName": "Content Website", "description": "Hello"}
+        )
+        
+    def test_defaults_applied_on_save(self):
+        """Test that saving a website stores the storefront defaults"""
+        from .content import is_normalized
+        self.assertTrue(is_normalized(self.website.content))
+        self.assertEqual(self.website.content['meta_description'], "Hello")
+        self.assertEqual(self.website.content['hero_button'], {'url': '#', 'label': 'Learn More'})
+        self.assertEqual(len(self.website.content['features']), 3)
+        
+    def test_command_normalizes_existing_rows(self):
+        """Test that the management command normalizes rows written before the marker existed"""
+        from django.core.management import call_command
+        from io import StringIO
+        from .content import is_normalized
+        
+        # Simulate a legacy row that bypassed save()
+        Website.objects.filter(pk=self.website.pk).update(content={"site_name": "Legacy"})
+        call_command('normalize_website_content', stdout=StringIO())
+        
+        self.website.refresh_from_db()
+        self.assertTrue(is_normalized(self.website.content))
+        self.assertEqual(self.website.content['site_name'], "Legacy")
+        self.assertEqual(self.website.content['about_image'], 'https://via.placeholder.com/600x400')
+
+    def test_about_page_uses_website_features(self):
+        """Test that pages without features show the website's features on about-us and the defaults elsewhere"""
+        from .content import CONTENT_VERSION_KEY, DEFAULT_FEATURES, page_render_content
+
+        features = [{'icon': 'leaf', 'title': 'Organic', 'description': 'Grown locally'}]
+        self.website.content['features'] = features
+        self.website.save()
+        page = WebsitePage.objects.create(website=self.website, title="About", slug="about-us", template_file="about-us.html")
+        self.assertNotIn('features', page.content)
+
+        self.assertEqual(page_render_content(page, self.website, website_features=True)['features'], features)
+        page.refresh_from_db()
+        self.assertEqual(page_render_content(page, self.website)['features'], DEFAULT_FEATURES)
+
+        # Pages normalized before version 2 stored the default features
+        WebsitePage.objects.filter(pk=page.pk).update(content={'features': DEFAULT_FEATURES, CONTENT_VERSION_KEY: 1})
+        page.refresh_from_db()
+        self.assertEqual(page_render_content(page, self.website, website_features=True)['features'], features)
+
+class ImageDerivativeTest(TestCase):
+    """Test the resized/WebP image derivatives and the srcset that references them"""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        
+    def save_image(self, name, width, height):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), (200, 100, 50)).save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+        
+    def test_derivatives_generated(self):
+        """Test that 1x/2x and WebP files are written with content-hash names"""
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from .assets import generate_derivatives
+        
+        path = self.save_image('website_media/hero.jpg', 3000, 1500)
+        record = generate_derivatives(path)
+        
+        self.assertEqual(set(record.derivatives), {'1x', '2x'})
+        one_x = record.derivatives['1x']['original']
+        self.assertIn(record.content_hash[:12], one_x)
+        with default_storage.open(one_x[len('/media/'):]) as f:
+            self.assertEqual(Image.open(f).size, (1200, 600))
+        self.assertTrue(record.derivatives['2x']['webp'].endswith('.2x.webp'))
+        
+    def test_small_images_are_not_upscaled(self):
+        """Test that no 2x derivative is made for an image narrower than the 1x width"""
+        from .assets import generate_derivatives
+        
+        path = self.save_image('website_media/thumb.jpg', 400, 300)
+        record = generate_derivatives(path)
+        self.assertEqual(set(record.derivatives), {'1x'})
+        
+    def test_srcset_only_references_existing_derivatives(self):
+        """Test that the rewritten markup only lists generated files"""
+        from .assets import generate_derivatives
+        from .html_rewriter import rewrite_html_cached
+        
+        path = self.save_image('website_media/about.jpg', 3000, 1500)
+        html = '<img src="/media/website_media/about.jpg"><img src="/media/website_media/missing.jpg">'
+        
+        # Nothing generated yet: no srcset at all
+        self.assertNotIn(b'srcset', rewrite_html_cached(html.encode('utf-8')))
+        
+        record = generate_derivatives(path)
+        rewritten = rewrite_html_cached(html.encode('utf-8')).decode('utf-8')
+        self.assertIn(f'{record.derivatives["2x"]["original"]} 2x', rewritten)
+        self.assertIn('<source type="image/webp"', rewritten)
+        self.assertNotIn('missing.2x', rewritten)
+        self.assertNotIn('-2x', rewritten)
+
+class DomainLogBufferTest(TestCase):
+    """Test that buffered DomainLog rows are written without waiting for another request"""
+    
+    def test_rows_are_flushed_by_a_timer(self):
+        """Test that a lone 404 schedules a flush instead of waiting in memory"""
+        from . import domains
+        from .models import DomainLog
+        
+        buffer = domains.DomainLogBuffer()
+        buffer.record('unknown.example.com', 404, 'Domain not found or not verified')
+        timer = buffer._timer
+        
+        # A repeat within the sample window reuses the pending timer
+        buffer.record('unknown.example.com', 404, 'Domain not found or not verified')
+        self.assertIs(buffer._timer, timer)
+        timer.cancel()
+        self.assertTrue(timer.daemon)
+        self.assertEqual(timer.interval, domains.LOG_FLUSH_INTERVAL)
+        self.assertFalse(DomainLog.objects.exists())
+        
+        timer.function()
+        self.assertEqual(DomainLog.objects.get().domain, 'unknown.example.com')
+
+class BatchHealthScanTest(TestCase):
+    """Test the batched, incremental check_website_health scan"""
+    
+    def setUp(self):
+        self.template = WebsiteTemplate.objects.create(
+            name="Test Template",
+            description="A test template",
+            template_path="website/template1",
+            content_schema={"type": "object"}
+        )
+        self.websites = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'healthuser{i}', password='password123')
+            website = Website.objects.create(
+                user=user,
+                template=self.template,
+                name=f"Health Website {i}",
+                content={"site_name": f"Health Website {i}", "description": "Test"}
+            )
+            WebsitePage.objects.create(website=website, title="Home", slug="home", template_file="home.html", is_homepage=True)
+            self.websites.append(website)
+            
+    def scan(self, *args):
+        from django.core.management import call_command
+        from io import StringIO
+        out = StringIO()
+        call_command('check_website_health', '--all', '--batch', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+        
+    def test_scores_are_stored(self):
+        """Test that a batch scan stores one score per website"""
+        from .models import WebsiteHealthScore
+        output = self.scan()
+        self.assertIn('scored: 3, unchanged: 0', output)
+        self.assertEqual(WebsiteHealthScore.objects.count(), 3)
+        
+    def test_only_changed_websites_are_rescored(self):
+        """Test that a rescan skips unchanged websites and picks up page changes"""
+        self.scan()
+        self.assertIn('scored: 0, unchanged: 3', self.scan())
+        
+        WebsitePage.objects.create(website=self.websites[1], title="About", slug="about", template_file="about.html")
+        self.assertIn('scored: 1, unchanged: 2', self.scan())
+        self.assertIn('scored: 3, unchanged: 0', self.scan('--force'))
+
+class StoredSitemapTest(TestCase):
+    """Test the chunked sitemap files written to storage and served from it"""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        
+        self.template = WebsiteTemplate.objects.create(
+            name="Test Template",
+            description="A test template",
+            template_path="website/template1",
+            content_schema={"type": "object"}
+        )
+        self.website = Website.objects.create(
+            user=User.objects.create_user(username='sitemapuser', password='password123'),
+            template=self.template,
+            name="Sitemap Website",
+            content={"site_name": "Sitemap Website"},
+            public_slug="sitemap-shop"
+        )
+        WebsitePage.objects.create(website=self.website, title="Home", slug="home", template_file="home.html", is_homepage=True)
+        for i in range(5):
+            WebsiteProduct.objects.create(website=self.website, title=f"Product {i}", description="Test", price=10, image1="p.jpg")
+        self.client = Client()
+        
+    def fetch(self, name):
+        response = self.client.get(f'/website/s/sitemap-shop/{name}')
+        return response.status_code, b''.join(response.streaming_content).decode('utf-8') if response.status_code == 200 else ''
+        
+    def test_index_points_at_chunked_files(self):
+        """Test that large sections are split into several urlset files"""
+        from unittest import mock
+        
+        with mock.patch('website.sitemaps.MAX_URLS_PER_FILE', 2):
+            status, index = self.fetch('sitemap.xml')
+        self.assertEqual(status, 200)
+        self.assertIn('<sitemapindex', index)
+        self.assertIn('/website/s/sitemap-shop/sitemap-products-3.xml', index)
+        
+        status, chunk = self.fetch('sitemap-products-3.xml')
+        self.assertEqual(chunk.count('<url>'), 1)
+        status, robots = self.fetch('robots.txt')
+        self.assertIn('Sitemap: https://1matrix.io/website/s/sitemap-shop/sitemap.xml', robots)
+        
+    def test_section_regeneration(self):
+        """Test that a scheduled regeneration only rewrites the changed section"""
+        from .sitemaps import run_scheduled_regeneration
+        
+        self.fetch('sitemap.xml')
+        WebsiteProduct.objects.create(website=self.website, title="New Product", description="Test", price=10, image1="p.jpg")
+        manifest = run_scheduled_regeneration(self.website.id, 'products')
+        
+        self.assertEqual(manifest['sections']['products'][0]['urls'], 6)
+        status, products = self.fetch('sitemap-products-1.xml')
+        self.assertIn('/product/new-product/', products)
+        self.assertEqual(self.fetch('sitemap-missing-1.xml')[0], 404)
+
+class CatalogImportTest(TestCase):
+    """Test batched catalog imports and bulk product actions"""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        
+        self.template = WebsiteTemplate.objects.create(
+            name="Test Template",
+            description="A test template",
+            template_path="website/template1",
+            content_schema={"type": "object"}
+        )
+        self.website = Website.objects.create(
+            user=User.objects.create_user(username='cataloguser', password='password123'),
+            template=self.template,
+            name="Catalog Website",
+            content={"site_name": "Catalog Website"}
+        )
+        
+    def run_import(self, name, content):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from .catalog import catalog_format, run_catalog_import
+        from .models import WebsiteCatalogImport
+        
+        catalog_import = WebsiteCatalogImport.objects.create(
+            website=self.website,
+            file_format=catalog_format(name),
+            file_path=default_storage.save(f'catalog_imports/{name}', ContentFile(content.encode('utf-8')))
+        )
+        run_catalog_import(catalog_import.id)
+        catalog_import.refresh_from_db()
+        return catalog_import
+        
+    def test_csv_import_creates_products_and_categories(self):
+        """Test that valid rows are inserted and invalid ones reported"""
+        catalog_import = self.run_import('catalog.csv', (
+            "Name,Price,Category,GST\n"
+            "Blue Shirt,499.00,Shirts,12\n"
+            "Red Shirt,599.00,Shirts,12\n"
+            ",100\n"
+            "Cap,abc,Hats,5\n"
+        ))
+        self.assertEqual(catalog_import.status, 'completed')
+        self.assertEqual(catalog_import.created_count, 2)
+        self.assertEqual(catalog_import.error_count, 2)
+        self.assertEqual(catalog_import.errors[0], {'row': 3, 'error': 'Missing title'})
+        self.assertEqual(WebsiteCategory.objects.filter(website=self.website).count(), 1)
+        self.assertEqual(WebsiteProduct.objects.get(slug='red-shirt').category.name, 'Shirts')
+        
+    def test_reimport_updates_existing_products(self):
+        """Test that products are matched by slug and only changed rows are written"""
+        self.run_import('first.json', json.dumps([{"title": "Mug", "price": 10}, {"title": "Plate", "price": 20}]))
+        catalog_import = self.run_import('second.json', json.dumps({"products": [
+            {"title": "Mug", "price": 12},
+            {"title": "Plate", "price": 20},
+        ]}))
+        self.assertEqual(catalog_import.created_count, 0)
+        self.assertEqual(catalog_import.updated_count, 1)
+        self.assertEqual(WebsiteProduct.objects.get(slug='mug').price, 12)
+        
+    def test_bulk_product_action(self):
+        """Test that bulk actions only touch the website's products"""
+        from .catalog import bulk_product_action
+        
+        self.run_import('catalog.json', json.dumps([{"title": f"Item {i}", "price": 5} for i in range(3)]))
+        product_ids = list(WebsiteProduct.objects.values_list('product_id', flat=True)[:2])
+        self.assertEqual(bulk_product_action(self.website, 'deactivate', product_ids), 2)
+        self.assertEqual(WebsiteProduct.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(bulk_product_action(self.website, 'delete', product_ids), 2)
+        self.assertEqual(WebsiteProduct.objects.count(), 1)
+        with self.assertRaises(ValueError):
+            bulk_product_action(self.website, 'archive', product_ids)
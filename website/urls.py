@@ -35,11 +35,18 @@ urlpatterns = [
     path('products/edit/<uuid:product_id>/', views.product_edit, name='website_product_edit'),
     path('products/delete/<uuid:product_id>/', views.product_delete, name='website_product_delete'),
     path('products/detail/<uuid:product_id>/', views.product_detail, name='website_product_detail'),
+    path('products/import/', views.product_import, name='website_product_import'),
+    path('products/import/<uuid:import_id>/', views.product_import_status, name='website_product_import_status'),
+    path('products/bulk/', views.product_bulk_action, name='website_product_bulk_action'),
     
     # Public shareable URL
     path('s/<slug:public_slug>/', views.public_website, name='public_website'),
     path('s/<slug:public_slug>/<slug:page_slug>/', views.public_website_page, name='public_website_page'),
     
+    # Stored sitemaps and robots.txt
+    path('s/<slug:public_slug>/robots.txt', views.website_robots_txt, name='website_robots_txt'),
+    path('s/<slug:public_slug>/<slug:name>.xml', views.website_sitemap, name='website_sitemap'),
+    
     # Shop redirect URL
     path('<str:public_slug>/shop/', views.shop_redirect, name='shop_redirect'),
     
@@ -244,8 +244,8 @@ def process_media_upload(file_obj, subfolder='website_media', prefix=None, allow
         directory = os.path.dirname(os.path.join(settings.MEDIA_ROOT, normalized_path))
         os.makedirs(directory, exist_ok=True)
         
-        # Save file using Django's storage system
-        saved_path = default_storage.save(normalized_path, ContentFile(file_obj.read()))
+        # Save file using Django's storage system (uploaded files are written in chunks)
+        saved_path = default_storage.save(normalized_path, file_obj)
         
         # Log the file paths for debugging
         logger.info(f"File upload details: Original name={file_obj.name}, Content type={file_obj.content_type}")
@@ -264,6 +264,12 @@ def process_media_upload(file_obj, subfolder='website_media', prefix=None, allow
             url_path = url_path.replace('//', '/')
         
         logger.info(f"Final image URL: {url_path}")
+
+        # Resized and WebP versions are generated in the background
+        if file_obj.content_type and file_obj.content_type.startswith('image/'):
+            from .assets import queue_image_derivatives
+            queue_image_derivatives(saved_path, website_id)
+
         return url_path
         
     except Exception as e:
@@ -349,9 +355,9 @@ def delete_media_file(file_path):
 class SEOAnalyzer:
     """Website SEO analyzer utility class"""
     
-    def __init__(self, website):
+    def __init__(self, website, content=None):
         self.website = website
-        self.content = website.get_content()
+        self.content = content if content is not None else website.get_content()
         self.seo_data = self.content.get('seo', {})
         
     def analyze(self):
@@ -443,9 +449,8 @@ class SEOAnalyzer:
         else:
             score += 10
             
-        # Check if pages have content
-        website_pages = self.website.get_pages()
-        if not website_pages:
+        # Check if pages have content (uses prefetched pages when available)
+        if not self.website.pages.exists():
             recommendations.append("No pages found. Add more pages with relevant content.")
         else:
             score += 10
@@ -558,7 +563,10 @@ class SEOAnalyzer:
             recommendations.append("No organization schema found. Add structured data for better search engine understanding.")
             
         # Add recommendation for product schema if there are products
-        if hasattr(self.website, 'products') and self.website.products.count() > 0:
+        product_count = getattr(self.website, 'product_count', None)
+        if product_count is None:
+            product_count = self.website.products.count()
+        if product_count > 0:
             recommendations.append("Consider adding Product schema markup for your product pages.")
             
         return {
@@ -610,60 +618,36 @@ class SEOAnalyzer:
         
         return improvement_plan
 
+def get_website_base_url(website):
+    """
+    Public base URL of a website: its first custom domain, else its shareable link
+    """
+    domain = website.customdomain_set.order_by('pk').values_list('domain', flat=True).first()
+    if domain:
+        return f"https://{domain}"
+    return f"https://1matrix.io/website/s/{website.public_slug}"
+
 def generate_sitemap_xml(website):
     """
     Generate a sitemap.xml file content for the website
+
+    Published websites are served the chunked, stored sitemaps from
+    website.sitemaps; this builds a single urlset in memory.
     """
-    base_url = f"https://{website.customdomain_set.first().domain}" if website.customdomain_set.exists() else f"https://1matrix.io/website/s/{website.public_slug}"
-    
-    # XML header
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    
-    # Add homepage
-    xml_content += '  <url>\n'
-    xml_content += f'    <loc>{base_url}/</loc>\n'
-    xml_content += '    <changefreq>weekly</changefreq>\n'
-    xml_content += '    <priority>1.0</priority>\n'
-    xml_content += '  </url>\n'
-    
-    # Add all website pages
-    for page in website.get_pages():
-        if not page.is_homepage:  # Skip homepage as it's already added
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{base_url}/{page.slug}/</loc>\n'
-            xml_content += '    <changefreq>monthly</changefreq>\n'
-            xml_content += '    <priority>0.8</priority>\n'
-            xml_content += '  </url>\n'
-    
-    # Add product pages if they exist
-    if hasattr(website, 'products'):
-        for product in website.products.filter(is_active=True):
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{base_url}/product/{product.slug}/</loc>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.9</priority>\n'
-            xml_content += '  </url>\n'
-    
-    # Add category pages if they exist
-    if hasattr(website, 'categories'):
-        for category in website.categories.filter(is_active=True):
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{base_url}/category/{category.slug}/</loc>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.7</priority>\n'
-            xml_content += '  </url>\n'
-    
-    # Close XML
-    xml_content += '</urlset>'
-    
-    return xml_content
+    from .sitemaps import iter_sitemap_entries, urlset_lines
+
+    base_url = get_website_base_url(website)
+    entries = []
+    for section in ('pages', 'products', 'categories'):
+        entries.extend(iter_sitemap_entries(website, base_url, section))
+    return ''.join(urlset_lines(entries))
 
-def generate_robots_txt(website, allow_indexing=True):
+def generate_robots_txt(website, allow_indexing=True, base_url=None):
     """
     Generate a robots.txt file content for the website
     """
-    base_url = f"https://{website.customdomain_set.first().domain}" if website.customdomain_set.exists() else f"https://1matrix.io/website/s/{website.public_slug}"
+    if base_url is None:
+        base_url = get_website_base_url(website)
     
     content = "User-agent: *\n"
     
@@ -822,31 +806,17 @@ class WebsiteDeployer:
     
     def _generate_seo_files(self, deployment):
         """Generate sitemap.xml and robots.txt"""
-        deployment.add_log("Generating SEO files...")
-        
-        # Generate files paths
-        import os
-        from django.conf import settings
+        from .sitemaps import regenerate_sitemaps, sitemap_storage_path
         
-        # Define paths for sitemap and robots.txt
-        website_files_dir = os.path.join(settings.MEDIA_ROOT, 'website_files', str(self.website.id))
-        os.makedirs(website_files_dir, exist_ok=True)
-        
-        sitemap_path = os.path.join(website_files_dir, 'sitemap.xml')
-        robots_path = os.path.join(website_files_dir, 'robots.txt')
+        deployment.add_log("Generating SEO files...")
         
-        # Generate sitemap.xml
-        sitemap_content = generate_sitemap_xml(self.website)
-        with open(sitemap_path, 'w') as f:
-            f.write(sitemap_content)
-            
-        deployment.add_log(f"Sitemap.xml generated at {sitemap_path}")
-            
-        # Generate robots.txt
-        robots_content = generate_robots_txt(self.website, allow_indexing=True)
-        with open(robots_path, 'w') as f:
-            f.write(robots_content)
+        # Sitemap index, chunked sitemaps and robots.txt are written to storage
+        manifest = regenerate_sitemaps(self.website)
+        url_count = sum(item['urls'] for files in manifest['sections'].values() for item in files)
+        sitemap_path = sitemap_storage_path(self.website.id, 'sitemap.xml')
+        robots_path = sitemap_storage_path(self.website.id, 'robots.txt')
             
+        deployment.add_log(f"Sitemap.xml generated at {sitemap_path} ({url_count} URLs)")
         deployment.add_log(f"Robots.txt generated at {robots_path}")
         
         # Update deployment config
@@ -858,15 +828,30 @@ class WebsiteDeployer:
     
     def _optimize_assets(self, deployment):
         """Optimize website assets"""
+        from .assets import collect_media_urls, queue_image_derivatives, storage_path_for_url
+        from .models import WebsiteImageDerivative
+
         deployment.add_log("Optimizing website assets...")
-        
-        # This would typically involve tasks like:
-        # - Image compression
-        # - Minifying CSS/JS
-        # - Creating WebP versions of images
-        
-        # For now, we'll implement a basic version that just logs
-        deployment.add_log("Asset optimization completed")
+
+        # Images referenced by the website and its pages
+        urls = collect_media_urls(self.website.content)
+        for page_content in self.website.get_pages().values_list('content', flat=True):
+            urls |= collect_media_urls(page_content)
+
+        existing = set(
+            WebsiteImageDerivative.objects.filter(original_url__in=urls).values_list('original_url', flat=True)
+        )
+        queued = 0
+        for url in urls - existing:
+            path = storage_path_for_url(url)
+            if path and default_storage.exists(path):
+                queue_image_derivatives(path, self.website.id)
+                queued += 1
+
+        deployment.add_log(
+            f"Asset optimization completed: {len(urls)} images, {len(existing)} already optimized, "
+            f"{queued} queued for resizing/WebP"
+        )
     
     def _update_dns_records(self, deployment):
         """Update DNS records for custom domains"""
@@ -913,6 +898,9 @@ class WebsiteDeployer:
 def check_website_health(website):
     """
     Perform a health check on a website and return a report
+
+    Pages and custom domains prefetched on the website (see website.health)
+    are used instead of querying them again.
     """
     health_report = {
         'status': 'healthy',
@@ -935,7 +923,7 @@ def check_website_health(website):
         health_report['status'] = 'warning'
         
     # Check if website has pages
-    if not website.get_pages().exists():
+    if not website.pages.exists():
         health_report['issues'].append({
             'type': 'content',
             'severity': 'high',
@@ -971,7 +959,7 @@ def check_website_health(website):
         })
         
     # Run SEO analysis for more insights
-    analyzer = SEOAnalyzer(website)
+    analyzer = SEOAnalyzer(website, content)
     seo_analysis = analyzer.analyze()
     
     # Add SEO score to metrics
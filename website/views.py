@@ -7,6 +7,11 @@ from django.core.exceptions import ValidationError
 from django.http import JsonResponse, Http404
 from .models import *
 from .utils import *
+from .content import page_render_content, website_render_content
+from .catalog import bulk_product_action, start_catalog_import
+from .conditional import bump_content_version
+from .page_cache import cache_public_page
+from .sitemaps import serve_artifact
 import json
 from django.utils.text import slugify
 import logging
@@ -879,101 +884,14 @@ def edit_website(request, website_id):
 def preview_website(request, website_id):
     website = get_object_or_404(Website, id=website_id, user=request.user)
     
-    # Ensure required fields exist in website content
-    required_fields = [
-        'meta_description', 'meta_keywords', 'site_name', 
-        'hero_title', 'hero_subtitle', 'hero_button',
-        'features_title', 'features_subtitle', 'features',
-        'about_title', 'about_content', 'about_image', 'about_button',
-        'cta_title', 'cta_subtitle', 'cta_main_button'
-    ]
-    
-    # Copy description to meta_description if available
-    if 'meta_description' not in website.content and 'description' in website.content:
-        website.content['meta_description'] = website.content['description']
-    
-    # Ensure websiteName is copied to site_name if needed
-    if 'site_name' not in website.content and 'websiteName' in website.content:
-        website.content['site_name'] = website.content['websiteName']
-    
-    # Set default empty values for all required fields if missing
-    for field in required_fields:
-        if field not in website.content:
-            if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                website.content[field] = {'url': '#', 'label': 'Learn More'}
-            elif field == 'features':
-                website.content[field] = [
-                    {
-                        'icon': 'palette',
-                        'title': 'Beautiful Design',
-                        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                    },
-                    {
-                        'icon': 'mobile-alt',
-                        'title': 'Responsive Layout',
-                        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                    },
-                    {
-                        'icon': 'bolt',
-                        'title': 'Performance Optimized',
-                        'description': 'Fast loading times and smooth performance for the best user experience.'
-                    }
-                ]
-            elif field == 'about_image':
-                website.content[field] = 'https://via.placeholder.com/600x400'
-            else:
-                website.content[field] = ""
+    # Defaults are applied when the content is saved (see content)
+    website_render_content(website)
     
     homepage = website.pages.filter(is_homepage=True).first()
     
     if homepage:
-        # Ensure required fields exist in page content
-        if homepage.content is None:
-            homepage.content = {}
-            
-        # Set default empty values for all required fields if missing in page content
-        for field in required_fields:
-            if field not in homepage.content:
-                if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                    homepage.content[field] = {'url': '#', 'label': 'Learn More'}
-                elif field == 'features':
-                    homepage.content[field] = [
-                        {
-                            'icon': 'palette',
-                            'title': 'Beautiful Design',
-                            'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                        },
-                        {
-                            'icon': 'mobile-alt',
-                            'title': 'Responsive Layout',
-                            'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                        },
-                        {
-                            'icon': 'bolt',
-                            'title': 'Performance Optimized',
-                            'description': 'Fast loading times and smooth performance for the best user experience.'
-                        }
-                    ]
-                elif field == 'about_image':
-                    homepage.content[field] = 'https://via.placeholder.com/600x400'
-                else:
-                    homepage.content[field] = ""
-        
         # Copy Australian Lifestyle Brand section content from website to homepage content
-        aus_brand_fields = [
-            'aus_brand_heading', 
-            'aus_brand_subheading', 
-            'aus_brand_description',
-            'aus_brand_section_label', 
-            'aus_brand_section_title', 
-            'aus_brand_section_description',
-            'aus_brand_main_image', 
-            'aus_brand_secondary_image'
-        ]
-        
-        for field in aus_brand_fields:
-            if field in website.content:
-                homepage.content[field] = website.content[field]
+        page_render_content(homepage, website)
         
         # Use template path with forward slashes for Django template loader
         template_path = f"{website.template.template_path.strip('/')}/{homepage.template_file}"
@@ -1137,13 +1055,19 @@ def reorder_pages(request, website_id):
     
     if request.method == 'POST':
         try:
-            page_order = json.loads(request.body).get('page_order', [])
+            page_order = [int(page_id) for page_id in json.loads(request.body).get('page_order', [])]
+            positions = {page_id: index for index, page_id in enumerate(page_order)}
             
-            # Update the order of each page
-            for index, page_id in enumerate(page_order):
-                WebsitePage.objects.filter(id=page_id, website=website).update(order=index)
+            # Update the order of all pages with a single UPDATE ... CASE statement
+            pages = list(WebsitePage.objects.filter(id__in=positions, website=website).only('id', 'order'))
+            for page in pages:
+                page.order = positions[page.id]
+            WebsitePage.objects.bulk_update(pages, ['order'])
             
-            return JsonResponse({'status': 'success'})
+            # bulk_update skips the signals that invalidate cached storefront pages
+            bump_content_version(website.id)
+            
+            return JsonResponse({'status': 'success', 'updated': len(pages)})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     
@@ -1166,86 +1090,15 @@ def about_us(request):
         # Fallback to a default template if no website is found
         return render(request, 'website/template1/about-us.html')
     
-    # Ensure required fields exist in website content
-    required_fields = [
-        'meta_description', 'meta_keywords', 'site_name', 
-        'hero_title', 'hero_subtitle', 'hero_button',
-        'features_title', 'features_subtitle', 'features',
-        'about_title', 'about_content', 'about_image', 'about_button',
-        'cta_title', 'cta_subtitle', 'cta_main_button'
-    ]
-    
-    # Copy description to meta_description if available
-    if 'meta_description' not in website.content and 'description' in website.content:
-        website.content['meta_description'] = website.content['description']
-    
-    # Ensure websiteName is copied to site_name if needed
-    if 'site_name' not in website.content and 'websiteName' in website.content:
-        website.content['site_name'] = website.content['websiteName']
-    
-    # Set default empty values for all required fields if missing
-    for field in required_fields:
-        if field not in website.content:
-            if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                website.content[field] = {'url': '#', 'label': 'Learn More'}
-            elif field == 'features':
-                website.content[field] = [
-                    {
-                        'icon': 'palette',
-                        'title': 'Beautiful Design',
-                        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                    },
-                    {
-                        'icon': 'mobile-alt',
-                        'title': 'Responsive Layout',
-                        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                    },
-                    {
-                        'icon': 'bolt',
-                        'title': 'Performance Optimized',
-                        'description': 'Fast loading times and smooth performance for the best user experience.'
-                    }
-                ]
-            elif field == 'about_image':
-                website.content[field] = 'https://via.placeholder.com/600x400'
-            else:
-                website.content[field] = ""
+    # Defaults are applied when the content is saved (see content)
+    website_render_content(website)
     
     # Try to find the about-us page in the website's pages
     about_page = website.pages.filter(slug='about-us').first()
     
     if about_page:
-        # Ensure required fields exist in page content
-        if about_page.content is None:
-            about_page.content = {}
-            
-        # Set default empty values for required fields if missing in page content
-        for field in required_fields:
-            if field not in about_page.content:
-                if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                    about_page.content[field] = {'url': '#', 'label': 'Learn More'}
-                elif field == 'features':
-                    about_page.content[field] = website.content.get('features', [])
-                elif field == 'about_image':
-                    about_page.content[field] = 'https://via.placeholder.com/600x400'
-                else:
-                    about_page.content[field] = ""
-        
-        # Copy Australian Lifestyle Brand section content from website to page content
-        aus_brand_fields = [
-            'aus_brand_heading', 
-            'aus_brand_subheading', 
-            'aus_brand_description',
-            'aus_brand_section_label', 
-            'aus_brand_section_title', 
-            'aus_brand_section_description',
-            'aus_brand_main_image', 
-            'aus_brand_secondary_image'
-        ]
-        
-        for field in aus_brand_fields:
-            if field in website.content:
-                about_page.content[field] = website.content[field]
+        # Copy Australian Lifestyle Brand section content and the features from website to page content
+        page_render_content(about_page, website, website_features=True)
         
         # Use template path with forward slashes for Django template loader
         template_path = f"{website.template.template_path.strip('/')}/{about_page.template_file}"
@@ -1282,6 +1135,22 @@ def about_us(request):
             ]
         })
 
+def _website_artifact(public_slug, name):
+    website_id = Website.objects.filter(public_slug=public_slug).values_list('id', flat=True).first()
+    response = serve_artifact(website_id, name) if website_id else None
+    if response is None:
+        raise Http404("File not found")
+    return response
+
+def website_sitemap(request, public_slug, name):
+    """Serve a stored sitemap index or sitemap chunk of a public website"""
+    return _website_artifact(public_slug, f"{name}.xml")
+
+def website_robots_txt(request, public_slug):
+    """Serve the stored robots.txt of a public website"""
+    return _website_artifact(public_slug, 'robots.txt')
+
+@cache_public_page
 def public_website(request, public_slug):
     """View for public access to a website via its shareable link"""
     # Handle 'None' string as a special case
@@ -1289,102 +1158,16 @@ def public_website(request, public_slug):
         raise Http404("Website not found. Invalid public link.")
         
     website = get_object_or_404(Website, public_slug=public_slug)
+    request.website = website
     
-    # Ensure required fields exist in website content
-    required_fields = [
-        'meta_description', 'meta_keywords', 'site_name', 
-        'hero_title', 'hero_subtitle', 'hero_button',
-        'features_title', 'features_subtitle', 'features',
-        'about_title', 'about_content', 'about_image', 'about_button',
-        'cta_title', 'cta_subtitle', 'cta_main_button'
-    ]
-    
-    # Copy description to meta_description if available
-    if 'meta_description' not in website.content and 'description' in website.content:
-        website.content['meta_description'] = website.content['description']
-    
-    # Ensure websiteName is copied to site_name if needed
-    if 'site_name' not in website.content and 'websiteName' in website.content:
-        website.content['site_name'] = website.content['websiteName']
-    
-    # Set default empty values for all required fields if missing
-    for field in required_fields:
-        if field not in website.content:
-            if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                website.content[field] = {'url': '#', 'label': 'Learn More'}
-            elif field == 'features':
-                website.content[field] = [
-                    {
-                        'icon': 'palette',
-                        'title': 'Beautiful Design',
-                        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                    },
-                    {
-                        'icon': 'mobile-alt',
-                        'title': 'Responsive Layout',
-                        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                    },
-                    {
-                        'icon': 'bolt',
-                        'title': 'Performance Optimized',
-                        'description': 'Fast loading times and smooth performance for the best user experience.'
-                    }
-                ]
-            elif field == 'about_image':
-                website.content[field] = 'https://via.placeholder.com/600x400'
-            else:
-                website.content[field] = ""
+    # Defaults are applied when the content is saved (see content)
+    website_render_content(website)
     
     homepage = website.pages.filter(is_homepage=True).first()
     
     if homepage:
-        # Ensure required fields exist in page content
-        if homepage.content is None:
-            homepage.content = {}
-            
-        # Set default empty values for all required fields if missing in page content
-        for field in required_fields:
-            if field not in homepage.content:
-                if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                    homepage.content[field] = {'url': '#', 'label': 'Learn More'}
-                elif field == 'features':
-                    homepage.content[field] = [
-                        {
-                            'icon': 'palette',
-                            'title': 'Beautiful Design',
-                            'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                        },
-                        {
-                            'icon': 'mobile-alt',
-                            'title': 'Responsive Layout',
-                            'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                        },
-                        {
-                            'icon': 'bolt',
-                            'title': 'Performance Optimized',
-                            'description': 'Fast loading times and smooth performance for the best user experience.'
-                        }
-                    ]
-                elif field == 'about_image':
-                    homepage.content[field] = 'https://via.placeholder.com/600x400'
-                else:
-                    homepage.content[field] = ""
-        
         # Copy Australian Lifestyle Brand section content from website to homepage content
-        aus_brand_fields = [
-            'aus_brand_heading', 
-            'aus_brand_subheading', 
-            'aus_brand_description',
-            'aus_brand_section_label', 
-            'aus_brand_section_title', 
-            'aus_brand_section_description',
-            'aus_brand_main_image', 
-            'aus_brand_secondary_image'
-        ]
-        
-        for field in aus_brand_fields:
-            if field in website.content:
-                homepage.content[field] = website.content[field]
+        page_render_content(homepage, website)
         
         # Use template path with forward slashes for Django template loader
         template_path = f"{website.template.template_path.strip('/')}/{homepage.template_file}"
@@ -1440,6 +1223,7 @@ def public_website(request, public_slug):
         
         return response
 
+@cache_public_page
 def public_website_page(request, public_slug, page_slug):
     """View for public access to a specific page of a website via its shareable link"""
     # Handle 'None' string as a special case
@@ -1447,100 +1231,14 @@ def public_website_page(request, public_slug, page_slug):
         raise Http404("Website not found. Invalid public link.")
         
     website = get_object_or_404(Website, public_slug=public_slug)
+    request.website = website
     page = get_object_or_404(WebsitePage, website=website, slug=page_slug)
     
-    # Ensure required fields exist in website content
-    required_fields = [
-        'meta_description', 'meta_keywords', 'site_name', 
-        'hero_title', 'hero_subtitle', 'hero_button',
-        'features_title', 'features_subtitle', 'features',
-        'about_title', 'about_content', 'about_image', 'about_button',
-        'cta_title', 'cta_subtitle', 'cta_main_button'
-    ]
-    
-    # Copy description to meta_description if available
-    if 'meta_description' not in website.content and 'description' in website.content:
-        website.content['meta_description'] = website.content['description']
-    
-    # Ensure websiteName is copied to site_name if needed
-    if 'site_name' not in website.content and 'websiteName' in website.content:
-        website.content['site_name'] = website.content['websiteName']
-    
-    # Set default empty values for all required fields if missing
-    for field in required_fields:
-        if field not in website.content:
-            if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                website.content[field] = {'url': '#', 'label': 'Learn More'}
-            elif field == 'features':
-                website.content[field] = [
-                    {
-                        'icon': 'palette',
-                        'title': 'Beautiful Design',
-                        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                    },
-                    {
-                        'icon': 'mobile-alt',
-                        'title': 'Responsive Layout',
-                        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                    },
-                    {
-                        'icon': 'bolt',
-                        'title': 'Performance Optimized',
-                        'description': 'Fast loading times and smooth performance for the best user experience.'
-                    }
-                ]
-            elif field == 'about_image':
-                website.content[field] = 'https://via.placeholder.com/600x400'
-            else:
-                website.content[field] = ""
-    
-    # Ensure required fields exist in page content
-    if page.content is None:
-        page.content = {}
-        
-    # Set default empty values for all required fields if missing in page content
-    for field in required_fields:
-        if field not in page.content:
-            if field == 'hero_button' or field == 'about_button' or field == 'cta_main_button':
-                page.content[field] = {'url': '#', 'label': 'Learn More'}
-            elif field == 'features':
-                page.content[field] = [
-                    {
-                        'icon': 'palette',
-                        'title': 'Beautiful Design',
-                        'description': 'Modern and elegant designs that capture attention and create memorable experiences.'
-                    },
-                    {
-                        'icon': 'mobile-alt',
-                        'title': 'Responsive Layout',
-                        'description': 'Our websites look amazing on all devices, from desktops to smartphones.'
-                    },
-                    {
-                        'icon': 'bolt',
-                        'title': 'Performance Optimized',
-                        'description': 'Fast loading times and smooth performance for the best user experience.'
-                    }
-                ]
-            elif field == 'about_image':
-                page.content[field] = 'https://via.placeholder.com/600x400'
-            else:
-                page.content[field] = ""
+    # Defaults are applied when the content is saved (see content)
+    website_render_content(website)
     
     # Copy Australian Lifestyle Brand section content from website to page content
-    aus_brand_fields = [
-        'aus_brand_heading', 
-        'aus_brand_subheading', 
-        'aus_brand_description',
-        'aus_brand_section_label', 
-        'aus_brand_section_title', 
-        'aus_brand_section_description',
-        'aus_brand_main_image', 
-        'aus_brand_secondary_image'
-    ]
-    
-    for field in aus_brand_fields:
-        if field in website.content:
-            page.content[field] = website.content[field]
+    page_render_content(page, website)
     
     # Use the template path with forward slashes for Django template loader
     template_path = f"{website.template.template_path.strip('/')}/{page.template_file}"
@@ -1970,6 +1668,74 @@ def product_delete(request, product_id):
     return redirect('website_products')
 
 
+def _selected_website(request):
+    """The website selected in the product screens, if it belongs to the user"""
+    selected_website_id = request.session.get('selected_website_id')
+    if not selected_website_id:
+        return None
+    return Website.objects.filter(id=selected_website_id, user=request.user).first()
+
+
+def product_import(request):
+    """Upload a CSV/JSON catalog; products are imported in the background"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    
+    selected_website = _selected_website(request)
+    if not selected_website:
+        return JsonResponse({'status': 'error', 'message': 'Please select a website first'}, status=400)
+    
+    catalog_file = request.FILES.get('catalog')
+    if not catalog_file:
+        return JsonResponse({'status': 'error', 'message': 'No catalog file uploaded'}, status=400)
+    
+    try:
+        catalog_import = start_catalog_import(selected_website, catalog_file)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'status': 'success',
+        'import_id': str(catalog_import.id),
+        'status_url': reverse('website_product_import_status', args=[catalog_import.id])
+    }, status=202)
+
+
+def product_import_status(request, import_id):
+    """Progress of a catalog import"""
+    catalog_import = get_object_or_404(WebsiteCatalogImport, id=import_id, website__user=request.user)
+    return JsonResponse({
+        'status': catalog_import.status,
+        'progress': catalog_import.progress,
+        'total_rows': catalog_import.total_rows,
+        'rows_processed': catalog_import.rows_processed,
+        'created': catalog_import.created_count,
+        'updated': catalog_import.updated_count,
+        'error_count': catalog_import.error_count,
+        'errors': catalog_import.errors,
+        'error_message': catalog_import.error_message,
+    })
+
+
+def product_bulk_action(request):
+    """Delete, (de)activate or (un)feature many products at once"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    
+    selected_website = _selected_website(request)
+    if not selected_website:
+        return JsonResponse({'status': 'error', 'message': 'Please select a website first'}, status=400)
+    
+    try:
+        data = json.loads(request.body)
+        product_ids = [uuid.UUID(str(product_id)) for product_id in data.get('product_ids', [])]
+        count = bulk_product_action(selected_website, data.get('action'), product_ids)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    return JsonResponse({'status': 'success', 'count': count})
+
+
 def product_detail(request, product_id):
     """View for viewing product details"""
     # Get the selected website from session